@@ -0,0 +1,40 @@
+"""
+Agent创建开销统计
+统计首次生成工具注册表的耗时、之后每次创建 PBBIAgent 的平均耗时，以及内置工具实际注册的次数
+
+用法: python scripts/bench_agent_init.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.database import Base, engine
+from src.models import settings  # noqa: F401  注册 system_settings 表
+from src.ai.agent import PBBIAgent
+from src.ai.llm_client import LLMConfig
+from src.mcp import registry
+
+ROUNDS = 500
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+
+    start = time.perf_counter()
+    tools = registry.get_tool_registry()
+    print(f"首次注册并生成工具注册表: {(time.perf_counter() - start) * 1000:.1f} ms, 共 {len(tools)} 个工具")
+
+    PBBIAgent(LLMConfig(api_key="bench"))
+    start = time.perf_counter()
+    agents = [PBBIAgent(LLMConfig(api_key="bench")) for _ in range(ROUNDS)]
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+    print(f"创建 PBBIAgent: 平均 {elapsed:.3f} ms（{ROUNDS} 次）")
+    print(f"共享同一工具执行器: {len({id(a.tool_executor) for a in agents}) == 1}")
+    print(f"内置工具注册次数: {registry.registration_count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+LLM客户端连接复用基准测试
+启动本地 OpenAI 兼容的流式桩服务，对比每次请求新建 AsyncClient 与共享连接池的首字延迟（TTFT）
+
+用法: python scripts/bench_llm_client.py [--rounds N] [--port PORT]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from src.ai.llm_client import LLMClient, LLMConfig, close_http_clients
+
+
+def create_stub_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions():
+        async def stream():
+            for word in ["你好", "，", "这是", "桩服务"]:
+                chunk = {"choices": [{"delta": {"content": word}}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def start_stub_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def ttft_fresh_client(base_url: str, payload: dict) -> float:
+    """旧实现：每次请求新建客户端"""
+    start = time.perf_counter()
+    elapsed = None
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        async with client.stream("POST", f"{base_url}/chat/completions", json=payload) as response:
+            async for line in response.aiter_lines():
+                if elapsed is None and line.startswith("data: "):
+                    elapsed = time.perf_counter() - start
+    return elapsed
+
+
+async def ttft_pooled_client(llm: LLMClient, messages: list) -> float:
+    """新实现：LLMClient.chat 复用共享连接池"""
+    start = time.perf_counter()
+    elapsed = None
+    async for _ in llm.chat(messages):
+        if elapsed is None:
+            elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_benchmark(rounds: int, base_url: str):
+    llm = LLMClient()
+    llm.config = LLMConfig(api_key="bench", base_url=base_url, model="stub")
+    messages = [{"role": "user", "content": "你好"}]
+    payload = {"model": "stub", "messages": messages, "stream": True}
+
+    # 预热
+    await ttft_fresh_client(base_url, payload)
+    await ttft_pooled_client(llm, messages)
+
+    fresh = [await ttft_fresh_client(base_url, payload) for _ in range(rounds)]
+    pooled = [await ttft_pooled_client(llm, messages) for _ in range(rounds)]
+    await close_http_clients()
+
+    print(f"\n请求轮数: {rounds}")
+    print(f"{'模式':<16}{'TTFT中位数(ms)':>16}{'TTFT p90(ms)':>16}")
+    for name, values in [("每次新建客户端", fresh), ("共享连接池", pooled)]:
+        values = sorted(values)
+        p90 = values[int(len(values) * 0.9) - 1]
+        print(f"{name:<16}{statistics.median(values) * 1000:>16.2f}{p90 * 1000:>16.2f}")
+    print(f"\n中位数加速比: {statistics.median(fresh) / statistics.median(pooled):.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM客户端连接复用基准测试")
+    parser.add_argument("--rounds", type=int, default=200, help="每种模式的请求次数")
+    parser.add_argument("--port", type=int, default=0, help="桩服务端口（默认随机）")
+    args = parser.parse_args()
+
+    port = args.port or _free_port()
+    server = start_stub_server(port)
+    try:
+        asyncio.run(run_benchmark(args.rounds, f"http://127.0.0.1:{port}/v1"))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
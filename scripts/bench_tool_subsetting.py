@@ -0,0 +1,59 @@
+"""
+工具定义筛选效果统计
+对一组典型提问，比较发送全部工具定义与按意图筛选后的工具数、token估算值与请求体大小
+
+用法: python scripts/bench_tool_subsetting.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.agent import PBBIAgent
+from src.ai.context import estimate_tokens
+from src.ai.llm_client import LLMConfig
+from src.ai.tool_selection import select_tool_groups
+
+SAMPLE_QUERIES = [
+    "帮我画一个各地区销售额的柱状图",
+    "分析一下最近三个月的销售趋势",
+    "查询快照3里面华东地区的订单",
+    "快照5有哪些字段",
+    "从明道云工作表同步数据",
+    "上传一个excel文件并解析",
+    "如何创建仪表盘",
+    "你好",
+]
+
+
+def _payload_stats(tools):
+    body = json.dumps({"tools": tools}, ensure_ascii=False)
+    start = time.perf_counter()
+    for _ in range(200):
+        json.dumps({"tools": tools}, ensure_ascii=False).encode("utf-8")
+    encode_ms = (time.perf_counter() - start) / 200 * 1000
+    return len(tools), estimate_tokens(body), len(body.encode("utf-8")), encode_ms
+
+
+def main():
+    agent = PBBIAgent(LLMConfig(api_key="bench"))
+    full = agent.llm_client.get_tools_definition()
+    full_count, full_tokens, full_bytes, full_ms = _payload_stats(full)
+
+    print(f"全部工具: {full_count} 个, 约 {full_tokens} tokens, {full_bytes} 字节, 序列化 {full_ms:.3f} ms")
+    print(f"\n{'提问':<24}{'意图':<8}{'工具数':>6}{'tokens':>8}{'节省':>8}")
+    saved = []
+    for query in SAMPLE_QUERIES:
+        intent = agent._analyze_user_intent(query)
+        tools = agent.llm_client.get_tools_definition(select_tool_groups(query, intent))
+        count, tokens, _, _ = _payload_stats(tools)
+        saved.append(1 - tokens / full_tokens)
+        print(f"{query:<24}{intent:<8}{count:>6}{tokens:>8}{saved[-1]:>8.0%}")
+    print(f"\n平均节省工具定义token: {sum(saved) / len(saved):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+快照存储迁移脚本
+将 data_snapshots 表中旧的JSON数据迁移为列式存储（config/snapshots 目录）
+
+用法: python scripts/migrate_snapshots.py [--limit N]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.snapshot_store import get_snapshot_store, MAIN_DB_PATH
+
+
+def migrate_snapshots(limit=None):
+    print("=" * 60)
+    print("快照列式存储迁移")
+    print("=" * 60)
+    print(f"\n数据库路径: {MAIN_DB_PATH}")
+
+    if not MAIN_DB_PATH.exists():
+        print(f"错误: 数据库文件不存在: {MAIN_DB_PATH}")
+        return
+
+    store = get_snapshot_store()
+    store.ensure_schema()
+    print(f"列文件目录: {store.root}")
+
+    try:
+        migrated = store.migrate_json_snapshots(limit=limit)
+        print(f"\n迁移完成，共迁移 {len(migrated)} 个快照")
+        if migrated:
+            print(f"快照ID: {migrated}")
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="将JSON快照迁移为列式存储")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多迁移的快照数量")
+    args = parser.parse_args()
+    migrate_snapshots(args.limit)
@@ -3,16 +3,24 @@ PB-BI AI Agent - 核心Agent类
 实现与AI对话、工具调用、数据分析功能
 """
 
+import asyncio
 import json
 from typing import Dict, Any, List, Optional, AsyncGenerator
 from dataclasses import dataclass, field
 from datetime import datetime
 
 from .llm_client import LLMClient, LLMConfig
-from .tools import MCPToolExecutor
-from .tool_parser import parse_tool_calls, tool_calls_to_openai_format
+from .tools import get_tool_executor
+from .tool_parser import StreamingToolCallParser, ToolCall, parse_tool_calls, tool_calls_to_openai_format
+from .context import ContextManager, compact_tool_result, estimate_messages_tokens
+from .tool_selection import select_tool_groups, tool_in_groups
 from src.services.memory_service import MemoryService
 
+# 文本格式的工具调用中，只读取快照数据的工具可在回复结束前提前执行；
+# 其余工具在回复结束且接口没有返回结构化调用后才执行，避免有副作用的工具被执行两次
+EARLY_START_TOOL_GROUPS = frozenset({"snapshot", "analysis"})
+EARLY_START_EXCLUDED_TOOLS = frozenset({"pbbi_execute_sql"})
+
 SYSTEM_PROMPT = """你是PB-BI智能数据分析助手，帮助用户查询和分析数据。
 
 ## 重要：语言要求
@@ -98,11 +106,17 @@ class ChatMessage:
 class PBBIAgent:
     def __init__(self, config: Optional[LLMConfig] = None, session_id: Optional[str] = None, user_id: Optional[int] = None):
         self.llm_client = LLMClient(config)
-        self.tool_executor = MCPToolExecutor()
+        self.tool_executor = get_tool_executor()
         self.conversation_history: List[Dict[str, str]] = []
+        # 已从数据库加载的最后一条消息ID，及历史中来自数据库的消息条数
+        self.history_message_id: Optional[int] = None
+        self.persisted_history_count = 0
         self.session_id = session_id or f"session_{datetime.now().strftime('%Y%m%d%H%M%S')}_{id(self)}"
         self.user_id = user_id
         self._memory_service = None
+        self.context_manager = ContextManager()
+        # 最近一次发送给模型的上下文token估算值（含工具定义）
+        self.last_context_tokens = 0
     
     @property
     def memory_service(self):
@@ -119,9 +133,18 @@ class PBBIAgent:
         """设置用户ID"""
         self.user_id = user_id
     
-    def load_history(self, messages: List[Dict[str, str]]):
-        """加载历史消息"""
+    def load_history(self, messages: List[Dict[str, str]], last_message_id: Optional[int] = None):
+        """加载历史消息，last_message_id 为这些消息中最大的数据库消息ID"""
         self.conversation_history = messages.copy()
+        self.history_message_id = last_message_id
+        self.persisted_history_count = len(messages) if last_message_id is not None else 0
+    
+    def append_history(self, messages: List[Dict[str, str]], last_message_id: int):
+        """增量同步数据库历史：丢弃尚未持久化的本地消息，追加数据库中新增的消息"""
+        del self.conversation_history[self.persisted_history_count:]
+        self.conversation_history.extend(messages)
+        self.history_message_id = last_message_id
+        self.persisted_history_count = len(self.conversation_history)
     
     def _get_memory_context(self, query: str) -> Optional[str]:
         """从三层记忆系统获取上下文，按优先级注入"""
@@ -144,10 +167,18 @@ class PBBIAgent:
         
         return base_prompt
     
-    def _build_messages(self, user_input: str) -> List[Dict[str, str]]:
+    def _build_messages(self, user_input: str, tools: Optional[List[Dict]] = None) -> List[Dict[str, str]]:
         messages = [{"role": "system", "content": self._get_system_prompt(user_input)}]
         messages.extend(self.conversation_history)
         messages.append({"role": "user", "content": user_input})
+        return self._fit_context(messages, tools)
+    
+    def _fit_context(self, messages: List[Dict], tools: Optional[List[Dict]] = None) -> List[Dict]:
+        """按当前模型的上下文窗口裁剪消息，并记录上下文token数"""
+        self.context_manager.model = self.llm_client.config.model
+        self.context_manager.max_tokens = self.llm_client.config.max_tokens
+        messages = self.context_manager.fit(messages, tools)
+        self.last_context_tokens = estimate_messages_tokens(messages) + self.context_manager.tools_tokens(tools)
         return messages
     
     def _parse_text_tool_calls(self, text: str) -> List[Dict]:
@@ -219,41 +250,6 @@ class PBBIAgent:
         else:
             return result.get("error", "执行失败")[:50]
     
-    def _filter_tool_call_tags(self, content: str) -> str:
-        """过滤掉工具调用标签，返回给用户友好的内容"""
-        import re
-        
-        # 定义需要过滤的模式
-        patterns_to_filter = [
-            # XML格式的工具调用
-            (r'<tool_call>.*?</tool_call>', ''),
-            (r'<arg_key>.*?</arg_key>', ''),
-            (r'<arg_value>.*?</arg_value>', ''),
-            # 其他工具调用格式
-            (r'<｜tool▁calls▁begin｜>.*?<｜tool▁calls▁end｜>', '', re.DOTALL),
-            (r'<｜tool▁call▁begin｜>.*?<｜tool▁call▁end｜>', '', re.DOTALL),
-            (r'```tool_call.*?```', '', re.DOTALL),
-            (r'```tool.*?```', '', re.DOTALL),
-            (r'✿FUNCTION✿.*?✿END✿', '', re.DOTALL),
-            (r'✿CALL✿.*?✿RESULT✿', '', re.DOTALL),
-            # Python函数调用格式
-            (r'pbbi_\w+\s*\([^)]*\)', ''),
-            # 纯文本参数格式
-            (r'pbbi_\w+\s*\n(?:\s*\w+\s*=.*\n?)+', ''),
-        ]
-        
-        result = content
-        for pattern in patterns_to_filter:
-            if len(pattern) == 3:
-                result = re.sub(pattern[0], pattern[1], result, flags=pattern[2])
-            else:
-                result = re.sub(pattern[0], pattern[1], result)
-        
-        # 清理多余的空行
-        result = re.sub(r'\n{3,}', '\n\n', result)
-        
-        return result.strip()
-    
     def _is_tool_call_content(self, content: str) -> bool:
         """检测内容是否是工具调用格式，需要过滤掉不显示给用户"""
         tool_call_patterns = [
@@ -293,16 +289,59 @@ class PBBIAgent:
             self._memory_service.close()
             self._memory_service = None
     
+    def _parse_tool_arguments(self, tool_call: Dict) -> Dict[str, Any]:
+        """解析工具调用的JSON参数，解析失败时返回空字典"""
+        args_str = tool_call["function"].get("arguments") or "{}"
+        try:
+            args = json.loads(args_str)
+        except Exception as e:
+            print(f"[DEBUG] Failed to parse arguments for {tool_call['function'].get('name')}: {e}")
+            return {}
+        return args if isinstance(args, dict) else {}
+    
+    def _start_text_tool_calls(self, calls: List[ToolCall], semaphore: asyncio.Semaphore,
+                               tasks: List[Optional[asyncio.Task]]):
+        """文本格式的只读工具调用一经解析完整就开始执行，不等待回复结束，任务按顺序追加到 tasks
+
+        其他工具（写入、外部数据源、生成图表文件）以及排在它们之后的调用记为None，
+        等回复结束且接口没有返回结构化调用时由 _start_deferred 启动，避免结构化调用重复执行有副作用的工具
+        """
+        for call in calls:
+            early = None not in tasks and call.name not in EARLY_START_EXCLUDED_TOOLS \
+                and tool_in_groups(call.name, EARLY_START_TOOL_GROUPS)
+            print(f"[DEBUG] Text tool call ready: {call.name}{'' if early else ' (deferred)'}")
+            tasks.append(
+                self.tool_executor.start(call.name, call.arguments if isinstance(call.arguments, dict) else {}, semaphore)
+                if early else None
+            )
+    
+    def _start_deferred(self, tasks: List[Optional[asyncio.Task]], tool_calls: List[Dict],
+                        tool_args: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> List[asyncio.Task]:
+        """启动回复结束前未提前执行的文本工具调用，返回与 tool_calls 顺序一致的任务列表"""
+        return [
+            task if task is not None else self.tool_executor.start(tc["function"]["name"], args, semaphore)
+            for task, tc, args in zip(tasks, tool_calls, tool_args)
+        ]
+    
+    @staticmethod
+    def _cancel_pending(tasks: List[Optional[asyncio.Task]]):
+        """取消尚未完成的工具任务（如客户端中途断开）"""
+        for task in tasks:
+            if task is not None and not task.done():
+                task.cancel()
+    
     async def chat(self, user_input: str) -> AsyncGenerator[Dict[str, Any], None]:
-        messages = self._build_messages(user_input)
-        tools = self.llm_client.get_tools_definition()
-        
         yield {
             "type": "thinking_start",
             "message": "正在分析您的问题..."
         }
         
         user_intent = self._analyze_user_intent(user_input)
+        tool_groups = select_tool_groups(user_input, user_intent)
+        tools = self.llm_client.get_tools_definition(tool_groups)
+        print(f"[DEBUG] Tool groups: {sorted(tool_groups) if tool_groups else 'all'}, tools: {len(tools)}")
+        messages = self._build_messages(user_input, tools)
+        
         yield {
             "type": "thinking",
             "stage": "intent_analysis",
@@ -311,7 +350,10 @@ class PBBIAgent:
         
         full_response = ""
         tool_calls_buffer = []
-        current_tool_call = None
+        # 文本格式的工具调用边接收边解析，解析完整的调用立即开始执行
+        text_parser = StreamingToolCallParser()
+        text_semaphore = self.tool_executor.limiter()
+        text_tasks: List[Optional[asyncio.Task]] = []
         
         yield {
             "type": "thinking",
@@ -319,49 +361,65 @@ class PBBIAgent:
             "message": "正在生成回复..."
         }
         
-        async for chunk in self.llm_client.chat(messages, tools, stream=True):
-            delta = chunk.get("choices", [{}])[0].get("delta", {})
-            
-            content = delta.get("content")
-            if content:
-                # 过滤掉工具调用标签，不让用户看到
-                filtered_content = self._filter_tool_call_tags(content)
-                if filtered_content:
-                    print(f"[DEBUG] Content chunk: {repr(content[:50])}...")
-                    full_response += content
-                    yield {
-                        "type": "content",
-                        "content": filtered_content
-                    }
-                else:
-                    print(f"[DEBUG] Tool call content filtered: {repr(content[:50])}...")
+        try:
+            async for chunk in self.llm_client.chat(messages, tools, stream=True):
+                delta = chunk.get("choices", [{}])[0].get("delta", {})
+                
+                content = delta.get("content")
+                if content:
                     full_response += content
+                    # 工具调用标记不展示给用户
+                    visible, completed = text_parser.feed(content)
+                    if visible:
+                        yield {
+                            "type": "content",
+                            "content": visible
+                        }
+                    self._start_text_tool_calls(completed, text_semaphore, text_tasks)
+                
+                if "tool_calls" in delta:
+                    print(f"[DEBUG] API tool_calls in delta: {delta['tool_calls']}")
+                    for tc in delta["tool_calls"]:
+                        print(f"[DEBUG] Processing tool call: index={tc.get('index')}, id={tc.get('id')}, function={tc.get('function', {})}")
+                        idx = tc.get("index", 0)
+                        
+                        if idx >= len(tool_calls_buffer):
+                            tool_calls_buffer.append({
+                                "id": tc.get("id", ""),
+                                "type": "function",
+                                "function": {"name": "", "arguments": ""}
+                            })
+                        
+                        if tc.get("id"):
+                            tool_calls_buffer[idx]["id"] = tc["id"]
+                        
+                        if "function" in tc:
+                            if tc["function"].get("name"):
+                                tool_calls_buffer[idx]["function"]["name"] = tc["function"]["name"]
+                            if tc["function"].get("arguments"):
+                                tool_calls_buffer[idx]["function"]["arguments"] += tc["function"]["arguments"]
             
-            if "tool_calls" in delta:
-                print(f"[DEBUG] API tool_calls in delta: {delta['tool_calls']}")
-                for tc in delta["tool_calls"]:
-                    print(f"[DEBUG] Processing tool call: index={tc.get('index')}, id={tc.get('id')}, function={tc.get('function', {})}")
-                    idx = tc.get("index", 0)
-                    
-                    if idx >= len(tool_calls_buffer):
-                        tool_calls_buffer.append({
-                            "id": tc.get("id", ""),
-                            "type": "function",
-                            "function": {"name": "", "arguments": ""}
-                        })
-                    
-                    if tc.get("id"):
-                        tool_calls_buffer[idx]["id"] = tc["id"]
-                    
-                    if "function" in tc:
-                        if tc["function"].get("name"):
-                            tool_calls_buffer[idx]["function"]["name"] = tc["function"]["name"]
-                        if tc["function"].get("arguments"):
-                            tool_calls_buffer[idx]["function"]["arguments"] += tc["function"]["arguments"]
+            visible, completed = text_parser.finish()
+            if visible:
+                yield {
+                    "type": "content",
+                    "content": visible
+                }
+            self._start_text_tool_calls(completed, text_semaphore, text_tasks)
+        except BaseException:
+            self._cancel_pending(text_tasks)
+            raise
         
         if tool_calls_buffer:
+            # 接口返回了结构化的工具调用时以其为准
+            self._cancel_pending(text_tasks)
             tool_names = [tc["function"]["name"] for tc in tool_calls_buffer]
             
+            # 模型调用了本轮未提供的工具时，后续重试改用全部工具定义
+            offered = {t["function"]["name"] for t in tools}
+            if tool_groups is not None and any(name not in offered for name in tool_names):
+                tools = self.llm_client.get_tools_definition()
+            
             # 打印完整的工具调用参数
             for i, tc in enumerate(tool_calls_buffer):
                 print(f"[DEBUG] Tool call {i}: name={tc['function']['name']}, arguments={repr(tc['function']['arguments'])}")
@@ -383,111 +441,111 @@ class PBBIAgent:
                 "tool_calls": tool_calls_buffer
             })
             
-            for i, tc in enumerate(tool_calls_buffer):
-                tool_name = tc["function"]["name"]
-                args_str = tc["function"]["arguments"]
-                print(f"[DEBUG] Parsing arguments for {tool_name}: {repr(args_str)}")
-                try:
-                    args = json.loads(args_str)
-                    print(f"[DEBUG] Parsed args: {args}")
-                except Exception as e:
-                    print(f"[DEBUG] Failed to parse arguments: {e}")
-                    args = {}
-                
-                tool_display_name = self._get_tool_display_name(tool_name)
-                yield {
-                    "type": "tool_call_start",
-                    "tool": tool_name,
-                    "display_name": tool_display_name,
-                    "arguments": args,
-                    "step": i + 1,
-                    "total": len(tool_calls_buffer)
-                }
-                
-                yield {
-                    "type": "thinking",
-                    "stage": "tool_executing",
-                    "message": f"正在执行: {tool_display_name}..."
-                }
-                
-                result = await self.tool_executor.execute(tool_name, args)
-                
-                # 检查是否需要重试（字段验证失败等情况）
-                if result.get("needs_retry"):
+            tool_args = [self._parse_tool_arguments(tc) for tc in tool_calls_buffer]
+            tasks = self.tool_executor.start_many(
+                [(tc["function"]["name"], args) for tc, args in zip(tool_calls_buffer, tool_args)]
+            )
+            try:
+                for i, tc in enumerate(tool_calls_buffer):
+                    tool_name = tc["function"]["name"]
+                    args = tool_args[i]
+                    
+                    tool_display_name = self._get_tool_display_name(tool_name)
                     yield {
-                        "type": "thinking",
-                        "stage": "error_correction",
-                        "message": f"检测到错误，正在自动修正..."
+                        "type": "tool_call_start",
+                        "tool": tool_name,
+                        "display_name": tool_display_name,
+                        "arguments": args,
+                        "step": i + 1,
+                        "total": len(tool_calls_buffer)
                     }
                     
-                    # 将错误信息反馈给LLM
-                    error_message = f"工具执行失败: {result.get('error')}\n请根据可用字段修正参数后重试。"
-                    if result.get("available_fields"):
-                        error_message += f"\n可用字段: {', '.join(result['available_fields'][:10])}"
+                    yield {
+                        "type": "thinking",
+                        "stage": "tool_executing",
+                        "message": f"正在执行: {tool_display_name}..."
+                    }
                     
-                    # 构建重试消息
-                    retry_messages = messages.copy()
-                    retry_messages.append({
-                        "role": "assistant",
-                        "content": None,
-                        "tool_calls": [tc]
-                    })
-                    retry_messages.append({
-                        "role": "tool",
-                        "tool_call_id": tc["id"],
-                        "content": json.dumps(result, ensure_ascii=False)
-                    })
+                    result = await tasks[i]
                     
-                    # 让LLM重新生成正确的工具调用
-                    retry_success = False
-                    async for chunk in self.llm_client.chat(retry_messages, tools, stream=True):
-                        delta = chunk.get("choices", [{}])[0].get("delta", {})
+                    # 检查是否需要重试（字段验证失败等情况）
+                    if result.get("needs_retry"):
+                        yield {
+                            "type": "thinking",
+                            "stage": "error_correction",
+                            "message": f"检测到错误，正在自动修正..."
+                        }
                         
-                        if "tool_calls" in delta:
-                            for retry_tc in delta["tool_calls"]:
-                                if retry_tc.get("function", {}).get("name"):
-                                    retry_tool_name = retry_tc["function"]["name"]
-                                    try:
-                                        retry_args = json.loads(retry_tc["function"].get("arguments", "{}"))
-                                    except:
-                                        retry_args = {}
-                                    
-                                    # 执行修正后的工具调用
-                                    retry_result = await self.tool_executor.execute(retry_tool_name, retry_args)
-                                    
-                                    if retry_result.get("success"):
-                                        retry_success = True
-                                        result = retry_result
+                        # 将错误信息反馈给LLM
+                        error_message = f"工具执行失败: {result.get('error')}\n请根据可用字段修正参数后重试。"
+                        if result.get("available_fields"):
+                            error_message += f"\n可用字段: {', '.join(result['available_fields'][:10])}"
+                        
+                        # 构建重试消息
+                        retry_messages = messages.copy()
+                        retry_messages.append({
+                            "role": "assistant",
+                            "content": None,
+                            "tool_calls": [tc]
+                        })
+                        retry_messages.append({
+                            "role": "tool",
+                            "tool_call_id": tc["id"],
+                            "content": compact_tool_result(result)
+                        })
+                        
+                        # 让LLM重新生成正确的工具调用
+                        retry_success = False
+                        async for chunk in self.llm_client.chat(retry_messages, tools, stream=True):
+                            delta = chunk.get("choices", [{}])[0].get("delta", {})
+                            
+                            if "tool_calls" in delta:
+                                for retry_tc in delta["tool_calls"]:
+                                    if retry_tc.get("function", {}).get("name"):
+                                        retry_tool_name = retry_tc["function"]["name"]
+                                        try:
+                                            retry_args = json.loads(retry_tc["function"].get("arguments", "{}"))
+                                        except:
+                                            retry_args = {}
                                         
-                                        yield {
-                                            "type": "thinking",
-                                            "stage": "correction_success",
-                                            "message": "自动修正成功！"
-                                        }
+                                        # 执行修正后的工具调用
+                                        retry_result = await self.tool_executor.execute(retry_tool_name, retry_args)
                                         
-                                        # 更新消息
-                                        tc["function"]["arguments"] = json.dumps(retry_args, ensure_ascii=False)
+                                        if retry_result.get("success"):
+                                            retry_success = True
+                                            result = retry_result
+                                            
+                                            yield {
+                                                "type": "thinking",
+                                                "stage": "correction_success",
+                                                "message": "自动修正成功！"
+                                            }
+                                            
+                                            # 更新消息
+                                            tc["function"]["arguments"] = json.dumps(retry_args, ensure_ascii=False)
+                        
+                        if not retry_success:
+                            yield {
+                                "type": "thinking",
+                                "stage": "correction_failed",
+                                "message": "自动修正失败，将显示错误信息"
+                            }
                     
-                    if not retry_success:
-                        yield {
-                            "type": "thinking",
-                            "stage": "correction_failed",
-                            "message": "自动修正失败，将显示错误信息"
-                        }
-                
-                result_summary = self._get_result_summary(result)
-                yield {
-                    "type": "tool_result",
-                    "tool": tool_name,
-                    "result": result,
-                    "summary": result_summary
-                }
-                
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tc["id"],
-                    "content": json.dumps(result, ensure_ascii=False)
-                })
+                    result_summary = self._get_result_summary(result)
+                    yield {
+                        "type": "tool_result",
+                        "tool": tool_name,
+                        "result": result,
+                        "summary": result_summary
+                    }
+                    
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": tc["id"],
+                        "content": compact_tool_result(result)
+                    })
+            finally:
+                self._cancel_pending(tasks)
             
             yield {
                 "type": "thinking",
@@ -498,9 +556,9 @@ class PBBIAgent:
             async for chunk in self._continue_conversation(messages):
                 yield chunk
         else:
-            text_tool_calls = self._parse_text_tool_calls(full_response)
+            text_tool_calls = tool_calls_to_openai_format(text_parser.tool_calls)
             
-            print(f"[DEBUG] Parsed text tool calls: {len(text_tool_calls)} from response length {len(full_response)}")
+            print(f"[DEBUG] Parsed text tool calls: {len(text_tool_calls)} ({text_parser.format}) from response length {len(full_response)}")
             if text_tool_calls:
                 for tc in text_tool_calls:
                     print(f"[DEBUG] Tool: {tc['function']['name']}, args: {tc['function']['arguments'][:100] if tc['function'].get('arguments') else 'empty'}")
@@ -524,44 +582,46 @@ class PBBIAgent:
                     "content": full_response
                 })
                 
-                for i, tc in enumerate(text_tool_calls):
-                    tool_name = tc["function"]["name"]
-                    try:
-                        args = json.loads(tc["function"]["arguments"])
-                    except:
-                        args = {}
-                    
-                    tool_display_name = self._get_tool_display_name(tool_name)
-                    yield {
-                        "type": "tool_call_start",
-                        "tool": tool_name,
-                        "display_name": tool_display_name,
-                        "arguments": args,
-                        "step": i + 1,
-                        "total": len(text_tool_calls)
-                    }
-                    
-                    yield {
-                        "type": "thinking",
-                        "stage": "tool_executing",
-                        "message": f"正在执行: {tool_display_name}..."
-                    }
-                    
-                    result = await self.tool_executor.execute(tool_name, args)
-                    
-                    result_summary = self._get_result_summary(result)
-                    yield {
-                        "type": "tool_result",
-                        "tool": tool_name,
-                        "result": result,
-                        "summary": result_summary
-                    }
-                    
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tc["id"],
-                        "content": json.dumps(result, ensure_ascii=False)
-                    })
+                tool_args = [self._parse_tool_arguments(tc) for tc in text_tool_calls]
+                tasks = self._start_deferred(text_tasks, text_tool_calls, tool_args, text_semaphore)
+                try:
+                    for i, tc in enumerate(text_tool_calls):
+                        tool_name = tc["function"]["name"]
+                        args = tool_args[i]
+                        
+                        tool_display_name = self._get_tool_display_name(tool_name)
+                        yield {
+                            "type": "tool_call_start",
+                            "tool": tool_name,
+                            "display_name": tool_display_name,
+                            "arguments": args,
+                            "step": i + 1,
+                            "total": len(text_tool_calls)
+                        }
+                        
+                        yield {
+                            "type": "thinking",
+                            "stage": "tool_executing",
+                            "message": f"正在执行: {tool_display_name}..."
+                        }
+                        
+                        result = await tasks[i]
+                        
+                        result_summary = self._get_result_summary(result)
+                        yield {
+                            "type": "tool_result",
+                            "tool": tool_name,
+                            "result": result,
+                            "summary": result_summary
+                        }
+                        
+                        messages.append({
+                            "role": "tool",
+                            "tool_call_id": tc["id"],
+                            "content": compact_tool_result(result)
+                        })
+                finally:
+                    self._cancel_pending(tasks)
                 
                 yield {
                     "type": "thinking",
@@ -585,21 +645,40 @@ class PBBIAgent:
             }
             return
         
+        messages = self._fit_context(messages)
         full_response = ""
+        text_parser = StreamingToolCallParser()
+        text_semaphore = self.tool_executor.limiter()
+        text_tasks: List[Optional[asyncio.Task]] = []
         
-        async for chunk in self.llm_client.chat(messages, stream=True):
-            delta = chunk.get("choices", [{}])[0].get("delta", {})
+        try:
+            async for chunk in self.llm_client.chat(messages, stream=True):
+                delta = chunk.get("choices", [{}])[0].get("delta", {})
+                
+                content = delta.get("content")
+                if content:
+                    full_response += content
+                    visible, completed = text_parser.feed(content)
+                    if visible:
+                        yield {
+                            "type": "content",
+                            "content": visible
+                        }
+                    self._start_text_tool_calls(completed, text_semaphore, text_tasks)
             
-            content = delta.get("content")
-            if content:
-                full_response += content
+            visible, completed = text_parser.finish()
+            if visible:
                 yield {
                     "type": "content",
-                    "content": content
+                    "content": visible
                 }
+            self._start_text_tool_calls(completed, text_semaphore, text_tasks)
+        except BaseException:
+            self._cancel_pending(text_tasks)
+            raise
         
         # 检查是否有文本工具调用
-        text_tool_calls = self._parse_text_tool_calls(full_response)
+        text_tool_calls = tool_calls_to_openai_format(text_parser.tool_calls)
         
         print(f"[DEBUG] _continue_conversation: Parsed {len(text_tool_calls)} text tool calls from response length {len(full_response)}")
         print(f"[DEBUG] _continue_conversation: full_response = {repr(full_response[:500])}")
@@ -623,41 +702,41 @@ class PBBIAgent:
                 "content": full_response
             })
             
-            for i, tc in enumerate(text_tool_calls):
-                tool_name = tc["function"]["name"]
-                try:
-                    args = json.loads(tc["function"]["arguments"])
-                except:
-                    args = {}
-                
-                tool_display_name = self._get_tool_display_name(tool_name)
-                yield {
-                    "type": "tool_call_start",
-                    "tool": tool_name,
-                    "display_name": tool_display_name,
-                    "arguments": args,
-                    "step": i + 1,
-                    "total": len(text_tool_calls)
-                }
-                
-                yield {
-                    "type": "thinking",
-                    "stage": "tool_executing",
-                    "message": f"正在执行: {tool_display_name}..."
-                }
-                
-                result = await self.tool_executor.execute(tool_name, args)
-                
-                # 检查是否需要重试（字段验证失败等情况）
-                if result.get("needs_retry"):
+            tool_args = [self._parse_tool_arguments(tc) for tc in text_tool_calls]
+            tasks = self._start_deferred(text_tasks, text_tool_calls, tool_args, text_semaphore)
+            try:
+                for i, tc in enumerate(text_tool_calls):
+                    tool_name = tc["function"]["name"]
+                    args = tool_args[i]
+                    
+                    tool_display_name = self._get_tool_display_name(tool_name)
+                    yield {
+                        "type": "tool_call_start",
+                        "tool": tool_name,
+                        "display_name": tool_display_name,
+                        "arguments": args,
+                        "step": i + 1,
+                        "total": len(text_tool_calls)
+                    }
+                    
                     yield {
                         "type": "thinking",
-                        "stage": "error_correction",
-                        "message": f"⚠️ 工具执行失败: {result.get('error', '未知错误')}，正在尝试自动修正..."
+                        "stage": "tool_executing",
+                        "message": f"正在执行: {tool_display_name}..."
                     }
                     
-                    # 构建详细的错误反馈信息
-                    error_feedback = f"""工具调用失败，需要修正参数：
+                    result = await tasks[i]
+                    
+                    # 检查是否需要重试（字段验证失败等情况）
+                    if result.get("needs_retry"):
+                        yield {
+                            "type": "thinking",
+                            "stage": "error_correction",
+                            "message": f"⚠️ 工具执行失败: {result.get('error', '未知错误')}，正在尝试自动修正..."
+                        }
+                        
+                        # 构建详细的错误反馈信息
+                        error_feedback = f"""工具调用失败，需要修正参数：
 
 **错误信息**: {result.get('error', '未知错误')}
 
@@ -675,131 +754,133 @@ class PBBIAgent:
 {('...' if len(result.get('available_fields', [])) > 15 else '')}
 
 请使用正确的字段名重新生成工具调用。"""
-                    
-                    # 构建重试消息
-                    retry_messages = messages.copy()
-                    retry_messages.append({
-                        "role": "assistant",
-                        "content": full_response
-                    })
-                    retry_messages.append({
-                        "role": "user",
-                        "content": error_feedback
-                    })
-                    
-                    yield {
-                        "type": "thinking",
-                        "stage": "retrying",
-                        "message": "正在请求AI重新生成正确的工具调用..."
-                    }
-                    
-                    # 让LLM重新生成正确的工具调用
-                    retry_full_response = ""
-                    retry_success = False
-                    
-                    async for chunk in self.llm_client.chat(retry_messages, stream=True):
-                        delta = chunk.get("choices", [{}])[0].get("delta", {})
-                        content = delta.get("content", "")
                         
-                        if content:
-                            retry_full_response += content
-                            # 实时显示AI的思考过程
-                            if len(content) > 10:  # 只显示有意义的内容
-                                yield {
-                                    "type": "thinking",
-                                    "stage": "ai_thinking",
-                                    "message": content[:100] + ("..." if len(content) > 100 else "")
-                                }
-                    
-                    # 解析重试响应中的工具调用
-                    if retry_full_response:
-                        retry_tool_calls = self._parse_text_tool_calls(retry_full_response)
+                        # 构建重试消息
+                        retry_messages = messages.copy()
+                        retry_messages.append({
+                            "role": "assistant",
+                            "content": full_response
+                        })
+                        retry_messages.append({
+                            "role": "user",
+                            "content": error_feedback
+                        })
                         
-                        if retry_tool_calls:
-                            yield {
-                                "type": "thinking",
-                                "stage": "retry_tool_detected",
-                                "message": f"检测到 {len(retry_tool_calls)} 个修正后的工具调用"
-                            }
+                        yield {
+                            "type": "thinking",
+                            "stage": "retrying",
+                            "message": "正在请求AI重新生成正确的工具调用..."
+                        }
+                        
+                        # 让LLM重新生成正确的工具调用
+                        retry_full_response = ""
+                        retry_success = False
+                        
+                        async for chunk in self.llm_client.chat(retry_messages, stream=True):
+                            delta = chunk.get("choices", [{}])[0].get("delta", {})
+                            content = delta.get("content", "")
                             
-                            for retry_tc in retry_tool_calls:
-                                retry_tool_name = retry_tc["function"]["name"]
-                                try:
-                                    retry_args = json.loads(retry_tc["function"]["arguments"])
-                                except:
-                                    retry_args = {}
-                                
-                                yield {
-                                    "type": "tool_call_start",
-                                    "tool": retry_tool_name,
-                                    "display_name": self._get_tool_display_name(retry_tool_name),
-                                    "arguments": retry_args,
-                                    "step": 1,
-                                    "total": 1,
-                                    "is_retry": True
-                                }
-                                
-                                # 执行修正后的工具调用
-                                retry_result = await self.tool_executor.execute(retry_tool_name, retry_args)
-                                
-                                if retry_result.get("success"):
-                                    retry_success = True
-                                    result = retry_result
-                                    
+                            if content:
+                                retry_full_response += content
+                                # 实时显示AI的思考过程
+                                if len(content) > 10:  # 只显示有意义的内容
                                     yield {
                                         "type": "thinking",
-                                        "stage": "correction_success",
-                                        "message": "✅ 自动修正成功！图表已生成。"
+                                        "stage": "ai_thinking",
+                                        "message": content[:100] + ("..." if len(content) > 100 else "")
                                     }
+                        
+                        # 解析重试响应中的工具调用
+                        if retry_full_response:
+                            retry_tool_calls = self._parse_text_tool_calls(retry_full_response)
+                            
+                            if retry_tool_calls:
+                                yield {
+                                    "type": "thinking",
+                                    "stage": "retry_tool_detected",
+                                    "message": f"检测到 {len(retry_tool_calls)} 个修正后的工具调用"
+                                }
+                                
+                                for retry_tc in retry_tool_calls:
+                                    retry_tool_name = retry_tc["function"]["name"]
+                                    try:
+                                        retry_args = json.loads(retry_tc["function"]["arguments"])
+                                    except:
+                                        retry_args = {}
                                     
                                     yield {
-                                        "type": "tool_result",
+                                        "type": "tool_call_start",
                                         "tool": retry_tool_name,
-                                        "result": retry_result,
-                                        "summary": self._get_result_summary(retry_result),
+                                        "display_name": self._get_tool_display_name(retry_tool_name),
+                                        "arguments": retry_args,
+                                        "step": 1,
+                                        "total": 1,
                                         "is_retry": True
                                     }
-                                else:
-                                    yield {
-                                        "type": "thinking",
-                                        "stage": "correction_failed",
-                                        "message": f"❌ 自动修正仍然失败: {retry_result.get('error', '未知错误')}"
-                                    }
                                     
-                                    yield {
-                                        "type": "tool_result",
-                                        "tool": retry_tool_name,
-                                        "result": retry_result,
-                                        "summary": f"修正失败: {retry_result.get('error', '未知错误')}",
-                                        "is_retry": True
-                                    }
-                        else:
+                                    # 执行修正后的工具调用
+                                    retry_result = await self.tool_executor.execute(retry_tool_name, retry_args)
+                                    
+                                    if retry_result.get("success"):
+                                        retry_success = True
+                                        result = retry_result
+                                        
+                                        yield {
+                                            "type": "thinking",
+                                            "stage": "correction_success",
+                                            "message": "✅ 自动修正成功！图表已生成。"
+                                        }
+                                        
+                                        yield {
+                                            "type": "tool_result",
+                                            "tool": retry_tool_name,
+                                            "result": retry_result,
+                                            "summary": self._get_result_summary(retry_result),
+                                            "is_retry": True
+                                        }
+                                    else:
+                                        yield {
+                                            "type": "thinking",
+                                            "stage": "correction_failed",
+                                            "message": f"❌ 自动修正仍然失败: {retry_result.get('error', '未知错误')}"
+                                        }
+                                        
+                                        yield {
+                                            "type": "tool_result",
+                                            "tool": retry_tool_name,
+                                            "result": retry_result,
+                                            "summary": f"修正失败: {retry_result.get('error', '未知错误')}",
+                                            "is_retry": True
+                                        }
+                            else:
+                                yield {
+                                    "type": "thinking",
+                                    "stage": "no_retry_tool",
+                                    "message": "AI没有生成修正后的工具调用"
+                                }
+                        
+                        if not retry_success:
                             yield {
                                 "type": "thinking",
-                                "stage": "no_retry_tool",
-                                "message": "AI没有生成修正后的工具调用"
+                                "stage": "correction_failed",
+                                "message": "❌ 自动修正失败，请检查字段名是否正确"
                             }
                     
-                    if not retry_success:
-                        yield {
-                            "type": "thinking",
-                            "stage": "correction_failed",
-                            "message": "❌ 自动修正失败，请检查字段名是否正确"
-                        }
-                
-                result_summary = self._get_result_summary(result)
-                yield {
-                    "type": "tool_result",
-                    "tool": tool_name,
-                    "result": result,
-                    "summary": result_summary
-                }
-                
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tc["id"],
-                    "content": json.dumps(result, ensure_ascii=False)
-                })
+                    result_summary = self._get_result_summary(result)
+                    yield {
+                        "type": "tool_result",
+                        "tool": tool_name,
+                        "result": result,
+                        "summary": result_summary
+                    }
+                    
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": tc["id"],
+                        "content": compact_tool_result(result)
+                    })
+            finally:
+                self._cancel_pending(tasks)
             
             # 继续对话
             yield {
@@ -827,6 +908,8 @@ class PBBIAgent:
     
     def clear_history(self):
         self.conversation_history = []
+        self.history_message_id = None
+        self.persisted_history_count = 0
     
     def get_history(self) -> List[Dict[str, str]]:
         return self.conversation_history.copy()
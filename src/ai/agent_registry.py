@@ -0,0 +1,220 @@
+"""
+会话Agent注册表
+按会话ID缓存 PBBIAgent，限制会话数量、空闲时间与对话历史总字节数，
+超出时按最近最少使用（LRU）淘汰，被淘汰的会话下次请求时从数据库恢复历史
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from src.core.config import AGENT_MAX_SESSIONS, AGENT_IDLE_TTL, AGENT_MAX_HISTORY_BYTES
+
+
+def history_bytes(agent: Any) -> int:
+    """估算Agent对话历史占用的字节数（按UTF-8编码的消息内容计）"""
+    total = 0
+    for message in getattr(agent, "conversation_history", None) or []:
+        content = message.get("content")
+        if content:
+            total += len(content.encode("utf-8")) if isinstance(content, str) else len(str(content))
+    return total
+
+
+class AgentRegistry:
+    """带容量、空闲过期与历史字节预算的Agent LRU注册表
+
+    正在处理请求的Agent通过 get/put 的 checkout 参数借出，release 归还；
+    借出期间被淘汰的Agent不会立即关闭，归还时才关闭。关闭Agent均在锁外进行
+    """
+
+    def __init__(self, max_sessions: int = AGENT_MAX_SESSIONS, idle_ttl: float = AGENT_IDLE_TTL,
+                 max_history_bytes: int = AGENT_MAX_HISTORY_BYTES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history_bytes = max_history_bytes
+        self._clock = clock
+        # 会话ID -> [agent, 最近访问时间, 历史字节数]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        # id(agent) -> 借出次数
+        self._checkouts: Dict[int, int] = {}
+        # 借出期间被淘汰、等待归还后关闭的Agent：id(agent) -> agent
+        self._retired: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, session_id: str, checkout: bool = False) -> Optional[Any]:
+        with self._lock:
+            closing = self._expire()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                entry[1] = self._clock()
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                if checkout:
+                    self._checkout(entry[0])
+        _close_all(closing)
+        return None if entry is None else entry[0]
+
+    def put(self, session_id: str, agent: Any, checkout: bool = False):
+        size = history_bytes(agent)
+        with self._lock:
+            if checkout:
+                self._checkout(agent)
+            closing = []
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+                if old[0] is not agent:
+                    closing += self._discard(old)
+            self._entries[session_id] = [agent, self._clock(), size]
+            self._bytes += size
+            closing += self._expire()
+            closing += self._evict(keep=session_id)
+        _close_all(closing)
+
+    def release(self, agent: Any):
+        """归还借出的Agent，借出期间已被淘汰时在此关闭"""
+        with self._lock:
+            key = id(agent)
+            count = self._checkouts.get(key, 0) - 1
+            if count > 0:
+                self._checkouts[key] = count
+                return
+            self._checkouts.pop(key, None)
+            retired = self._retired.pop(key, None)
+        if retired is not None:
+            _close(retired)
+
+    def touch(self, session_id: str):
+        """对话结束后重新计算该会话的历史字节数，并按预算淘汰其他会话"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+        size = history_bytes(entry[0])
+        with self._lock:
+            if self._entries.get(session_id) is not entry:
+                return
+            self._bytes += size - entry[2]
+            entry[1] = self._clock()
+            entry[2] = size
+            self._entries.move_to_end(session_id)
+            closing = self._evict(keep=session_id)
+        _close_all(closing)
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return False
+            self._bytes -= entry[2]
+            closing = self._discard(entry)
+        _close_all(closing)
+        return True
+
+    def clear(self):
+        with self._lock:
+            closing = []
+            for entry in self._entries.values():
+                closing += self._discard(entry)
+            self._entries.clear()
+            self._bytes = 0
+        _close_all(closing)
+
+    def _checkout(self, agent: Any):
+        self._checkouts[id(agent)] = self._checkouts.get(id(agent), 0) + 1
+
+    def _discard(self, entry: list) -> List[Any]:
+        """移出注册表的Agent：未借出时返回待关闭列表，借出中时等待归还后关闭"""
+        agent = entry[0]
+        if id(agent) in self._checkouts:
+            self._retired[id(agent)] = agent
+            return []
+        return [agent]
+
+    def _drop_oldest(self) -> List[Any]:
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry[2]
+        return self._discard(entry)
+
+    def _expire(self) -> List[Any]:
+        closing = []
+        if not self.idle_ttl:
+            return closing
+        deadline = self._clock() - self.idle_ttl
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry[1] > deadline:
+                break
+            closing += self._drop_oldest()
+            self.expirations += 1
+        return closing
+
+    def _evict(self, keep: str) -> List[Any]:
+        closing = []
+        # 当前会话即使单独超出预算也保留，避免刚创建就被淘汰
+        while self._entries and next(iter(self._entries)) != keep and (
+            len(self._entries) > self.max_sessions or self._bytes > self.max_history_bytes
+        ):
+            closing += self._drop_oldest()
+            self.evictions += 1
+        return closing
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "max_sessions": self.max_sessions,
+                "history_bytes": self._bytes,
+                "max_history_bytes": self.max_history_bytes,
+                "idle_ttl": self.idle_ttl,
+                "checked_out": len(self._checkouts),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+def _close(agent: Any):
+    close = getattr(agent, "close", None)
+    if close:
+        try:
+            close()
+        except Exception as e:
+            print(f"Close agent error: {e}")
+
+
+def _close_all(agents: List[Any]):
+    for agent in agents:
+        _close(agent)
+
+
+_agent_registry: Optional[AgentRegistry] = None
+
+
+def get_agent_registry() -> AgentRegistry:
+    """获取进程内共享的会话Agent注册表"""
+    global _agent_registry
+    if _agent_registry is None:
+        _agent_registry = AgentRegistry()
+    return _agent_registry
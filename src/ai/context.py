@@ -0,0 +1,208 @@
+"""
+对话上下文管理
+估算消息的token数，按模型上下文窗口裁剪历史消息，并压缩工具返回的大结果集
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from src.core.config import CONTEXT_WINDOW, CONTEXT_TOOL_RESULT_ROWS, CONTEXT_MESSAGE_MAX_CHARS
+
+# 模型名称关键字 -> 上下文窗口（token），按顺序匹配
+MODEL_CONTEXT_WINDOWS = [
+    ("128k", 131072),
+    ("32k", 32768),
+    ("8k", 8192),
+    ("gpt-4o", 128000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-3.5", 16385),
+    ("deepseek", 65536),
+    ("qwen", 32768),
+    ("glm", 131072),
+    ("kimi", 131072),
+]
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 每条消息的固定开销（角色、分隔符等）
+_MESSAGE_OVERHEAD = 4
+_CJK_RE = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算文本token数：中日韩字符约1个token，其余约4个字符1个token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    tokens = _MESSAGE_OVERHEAD + estimate_tokens(message.get("content"))
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += estimate_tokens(function.get("name")) + estimate_tokens(function.get("arguments"))
+    return tokens
+
+
+def estimate_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(estimate_message_tokens(m) for m in messages)
+
+
+def context_window(model: Optional[str]) -> int:
+    """模型的上下文窗口大小，CONTEXT_WINDOW 配置优先"""
+    if CONTEXT_WINDOW:
+        return CONTEXT_WINDOW
+    name = (model or "").lower()
+    for keyword, window in MODEL_CONTEXT_WINDOWS:
+        if keyword in name:
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def _column_stats(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """结果集各列的简要统计：数值列给出最小/最大/平均值，其余列给出不同值数量"""
+    stats = {}
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in stats:
+                stats[key] = None
+                columns.append(key)
+    for column in columns:
+        values = [row.get(column) for row in rows]
+        present = [v for v in values if v is not None and v != ""]
+        numbers = [v for v in present if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        item = {"null_count": len(values) - len(present)}
+        if present and len(numbers) == len(present):
+            item.update(min=min(numbers), max=max(numbers), avg=round(sum(numbers) / len(numbers), 4))
+        else:
+            distinct = {str(v) for v in present}
+            item["distinct_count"] = len(distinct)
+            if len(distinct) <= 10:
+                item["values"] = sorted(distinct)
+        stats[column] = item
+    return stats
+
+
+def _compact(value: Any, max_rows: int) -> Any:
+    if isinstance(value, dict):
+        return {k: _compact(v, max_rows) for k, v in value.items()}
+    if isinstance(value, list):
+        if len(value) > max_rows and all(isinstance(v, dict) for v in value):
+            return {
+                "rows": [_compact(v, max_rows) for v in value[:max_rows]],
+                "truncated": True,
+                "total_rows": len(value),
+                "column_stats": _column_stats(value),
+            }
+        if len(value) > max_rows * 5:
+            return value[:max_rows * 5] + [f"...（共 {len(value)} 项，已省略）"]
+        return [_compact(v, max_rows) for v in value]
+    return value
+
+
+def compact_tool_result(result: Any, max_rows: int = CONTEXT_TOOL_RESULT_ROWS) -> str:
+    """序列化工具结果作为 tool 消息内容，行数过多的结果集只保留前 max_rows 行与列统计"""
+    return json.dumps(_compact(result, max_rows), ensure_ascii=False, default=str)
+
+
+def _truncate_text(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"...（已截断，原文 {len(text)} 字）"
+
+
+class ContextManager:
+    """按token预算裁剪发送给模型的消息列表"""
+
+    def __init__(self, model: Optional[str] = None, max_tokens: int = 0,
+                 message_max_chars: int = CONTEXT_MESSAGE_MAX_CHARS):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.message_max_chars = message_max_chars
+        self._tools_ref: Optional[List[Dict]] = None
+        self._tools_tokens = 0
+
+    def budget(self, tools: Optional[List[Dict]] = None) -> int:
+        """可用于消息的token数：上下文窗口减去回复预留和工具定义"""
+        window = context_window(self.model)
+        reserve = min(self.max_tokens or 0, window // 2)
+        return max(window - reserve - self.tools_tokens(tools), window // 8)
+
+    def tools_tokens(self, tools: Optional[List[Dict]]) -> int:
+        if not tools:
+            return 0
+        if tools is not self._tools_ref:
+            self._tools_ref = tools
+            self._tools_tokens = estimate_tokens(json.dumps(tools, ensure_ascii=False))
+        return self._tools_tokens
+
+    def fit(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict]] = None) -> List[Dict[str, Any]]:
+        """返回不超过预算的消息列表（不修改传入的列表）
+
+        依次：截断较早的超长消息；从最早的对话开始整轮删除，并以一条摘要消息说明省略的提问。
+        系统提示和最后一轮消息始终保留。
+        """
+        budget = self.budget(tools)
+        if estimate_messages_tokens(messages) <= budget:
+            return messages
+
+        head = [m for m in messages[:1] if m.get("role") == "system"]
+        body = messages[len(head):]
+        keep_from = _last_turn_start(body)
+
+        older = []
+        for message in body[:keep_from]:
+            content = message.get("content")
+            if isinstance(content, str) and len(content) > self.message_max_chars:
+                message = dict(message, content=_truncate_text(content, self.message_max_chars))
+            older.append(message)
+        recent = body[keep_from:]
+
+        fixed = estimate_messages_tokens(head) + estimate_messages_tokens(recent)
+        older_tokens = [estimate_message_tokens(m) for m in older]
+        total = fixed + sum(older_tokens)
+
+        dropped = []
+        start = 0
+        while start < len(older) and total + _summary_tokens(dropped) > budget:
+            end = _next_turn(older, start)
+            dropped.extend(older[start:end])
+            total -= sum(older_tokens[start:end])
+            start = end
+
+        result = list(head)
+        if dropped:
+            result.append(_summary_message(dropped))
+        result.extend(older[start:])
+        result.extend(recent)
+        return result
+
+
+def _last_turn_start(body: List[Dict[str, Any]]) -> int:
+    """最后一条用户消息的位置，此后的消息（包括进行中的工具调用）不裁剪"""
+    for i in range(len(body) - 1, -1, -1):
+        if body[i].get("role") == "user":
+            return i
+    return len(body)
+
+
+def _next_turn(messages: List[Dict[str, Any]], start: int) -> int:
+    """从 start 开始的一轮对话的结束位置，保证 tool 消息不会与发起调用的 assistant 消息分开"""
+    end = start + 1
+    while end < len(messages) and messages[end].get("role") != "user":
+        end += 1
+    return end
+
+
+def _summary_message(dropped: List[Dict[str, Any]]) -> Dict[str, str]:
+    questions = [m["content"] for m in dropped if m.get("role") == "user" and isinstance(m.get("content"), str)]
+    lines = [f"（为控制上下文长度，已省略较早的 {len(dropped)} 条消息）"]
+    if questions:
+        lines.append("较早的提问: " + "；".join(_truncate_text(q, 50) for q in questions[-5:]))
+    return {"role": "system", "content": "\n".join(lines)}
+
+
+def _summary_tokens(dropped: List[Dict[str, Any]]) -> int:
+    return estimate_message_tokens(_summary_message(dropped)) if dropped else 0
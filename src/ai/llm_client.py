@@ -3,11 +3,73 @@ LLM客户端 - 调用DeepSeek API
 """
 
 import httpx
+import asyncio
 import json
-from typing import Optional, List, Dict, Any, AsyncGenerator
+import threading
+from typing import Optional, List, Dict, Any, AsyncGenerator, Tuple, FrozenSet
 from dataclasses import dataclass
 import os
 
+from src.core.config import (
+    LLM_HTTP2,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+)
+
+from .tool_selection import filter_tools
+
+# 按 base_url 共享的长连接客户端，值为 (所属事件循环, 客户端)
+_http_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_http_clients_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """获取 base_url 对应的共享 AsyncClient，复用TCP/TLS连接
+
+    httpx 的连接池绑定创建时的事件循环，循环变化（如测试中多次 asyncio.run）时重新创建
+    """
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        entry = _http_clients.get(base_url)
+        if entry and entry[0] is loop and not entry[1].is_closed:
+            return entry[1]
+        http2 = LLM_HTTP2 and _http2_available()
+        if LLM_HTTP2 and not http2:
+            print("LLM_HTTP2 已开启但未安装 h2，使用 HTTP/1.1")
+        client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _http_clients[base_url] = (loop, client)
+        return client
+
+
+async def close_http_clients():
+    """关闭所有共享客户端（应用关闭时调用）"""
+    with _http_clients_lock:
+        entries = list(_http_clients.values())
+        _http_clients.clear()
+    loop = asyncio.get_running_loop()
+    for client_loop, client in entries:
+        if client_loop is loop:
+            await client.aclose()
+
 @dataclass
 class LLMConfig:
     api_key: str = ""
@@ -16,39 +78,86 @@ class LLMConfig:
     max_tokens: int = 4096
     temperature: float = 0.7
 
+# 工具定义与按工具组筛选后的子集缓存
+_tools_definition: Optional[List[Dict]] = None
+_tools_subsets: Dict[FrozenSet[str], List[Dict]] = {}
+
+# 数据库中AI设置的进程内缓存，update_ai_settings 等写入后调用 invalidate_llm_settings 使其失效
+_settings_lock = threading.Lock()
+_settings_version = 0
+_settings_cache: Optional[Tuple[int, Optional[Dict[str, Any]]]] = None
+
+
+def invalidate_llm_settings():
+    """AI设置已修改，递增版本号，各LLMClient在下次请求时重新加载"""
+    global _settings_version, _settings_cache
+    with _settings_lock:
+        _settings_version += 1
+        _settings_cache = None
+
+
+def get_llm_settings_version() -> int:
+    return _settings_version
+
+
+def _read_llm_settings() -> Optional[Dict[str, Any]]:
+    """从数据库读取并解密AI设置，没有设置记录时返回None"""
+    from src.core.database import SessionLocal
+    from src.models.settings import SystemSettings
+    from src.core.crypto import decrypt_value, is_encrypted
+    
+    db = SessionLocal()
+    try:
+        settings = db.query(SystemSettings).first()
+        if not settings:
+            return None
+        values = {}
+        if settings.ai_api_key:
+            values["api_key"] = decrypt_value(settings.ai_api_key) if is_encrypted(settings.ai_api_key) else settings.ai_api_key
+        if settings.ai_base_url:
+            values["base_url"] = settings.ai_base_url
+        if settings.ai_model:
+            values["model"] = settings.ai_model
+        try:
+            values["temperature"] = float(settings.ai_temperature)
+        except:
+            pass
+        if settings.ai_max_tokens:
+            values["max_tokens"] = settings.ai_max_tokens
+        return values
+    finally:
+        db.close()
+
+
+def get_llm_settings() -> Tuple[int, Optional[Dict[str, Any]]]:
+    """返回 (版本号, AI设置)，同一版本只查询和解密一次"""
+    global _settings_cache
+    cached = _settings_cache
+    if cached is not None:
+        return cached
+    with _settings_lock:
+        if _settings_cache is None:
+            version = _settings_version
+            _settings_cache = (version, _read_llm_settings())
+        return _settings_cache
+
+
 class LLMClient:
     def __init__(self, config: Optional[LLMConfig] = None):
         self.config = config or LLMConfig()
+        self._settings_version: Optional[int] = None
         self._load_config()
     
     def _load_config(self):
         from src.core.config import LLM_API_KEY, LLM_BASE_URL, LLM_MODEL
         
         try:
-            from src.core.database import SessionLocal
-            from src.models.settings import SystemSettings
-            from src.core.crypto import decrypt_value, is_encrypted
-            
-            db = SessionLocal()
-            try:
-                settings = db.query(SystemSettings).first()
-                if settings:
-                    if settings.ai_api_key:
-                        api_key = decrypt_value(settings.ai_api_key) if is_encrypted(settings.ai_api_key) else settings.ai_api_key
-                        self.config.api_key = api_key
-                    if settings.ai_base_url:
-                        self.config.base_url = settings.ai_base_url
-                    if settings.ai_model:
-                        self.config.model = settings.ai_model
-                    try:
-                        self.config.temperature = float(settings.ai_temperature)
-                    except:
-                        pass
-                    if settings.ai_max_tokens:
-                        self.config.max_tokens = settings.ai_max_tokens
-                    return
-            finally:
-                db.close()
+            version, settings = get_llm_settings()
+            self._settings_version = version
+            if settings is not None:
+                for key, value in settings.items():
+                    setattr(self.config, key, value)
+                return
         except Exception as e:
             print(f"Load config from database error: {e}")
         
@@ -56,6 +165,11 @@ class LLMClient:
         self.config.base_url = LLM_BASE_URL or self.config.base_url
         self.config.model = LLM_MODEL or self.config.model
     
+    def refresh_config(self):
+        """AI设置版本变化时重新加载配置，未变化时不访问数据库"""
+        if self._settings_version != get_llm_settings_version():
+            self._load_config()
+    
     async def chat(
         self, 
         messages: List[Dict[str, str]], 
@@ -79,27 +193,27 @@ class LLMClient:
             payload["tools"] = tools
             payload["tool_choice"] = "auto"
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{self.config.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    raise Exception(f"LLM API error: {response.status_code} - {error_text.decode()}")
-                
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            yield chunk
-                        except json.JSONDecodeError:
-                            continue
+        client = get_http_client(self.config.base_url)
+        async with client.stream(
+            "POST",
+            f"{self.config.base_url}/chat/completions",
+            headers=headers,
+            json=payload
+        ) as response:
+            if response.status_code != 200:
+                error_text = await response.aread()
+                raise Exception(f"LLM API error: {response.status_code} - {error_text.decode()}")
+            
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        yield chunk
+                    except json.JSONDecodeError:
+                        continue
     
     async def chat_sync(
         self,
@@ -123,19 +237,35 @@ class LLMClient:
             payload["tools"] = tools
             payload["tool_choice"] = "auto"
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.config.base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"LLM API error: {response.status_code} - {response.text}")
-            
-            return response.json()
+        client = get_http_client(self.config.base_url)
+        response = await client.post(
+            f"{self.config.base_url}/chat/completions",
+            headers=headers,
+            json=payload
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"LLM API error: {response.status_code} - {response.text}")
+        
+        return response.json()
+    
+    def get_tools_definition(self, groups: Optional[FrozenSet[str]] = None) -> List[Dict]:
+        """工具定义（进程内只构建一次），指定 groups 时只返回这些工具组的定义
+
+        返回的列表为共享缓存，调用方不要修改
+        """
+        global _tools_definition
+        if _tools_definition is None:
+            _tools_definition = self._build_tools_definition()
+        if groups is None:
+            return _tools_definition
+        subset = _tools_subsets.get(groups)
+        if subset is None:
+            subset = filter_tools(_tools_definition, groups)
+            _tools_subsets[groups] = subset
+        return subset
     
-    def get_tools_definition(self) -> List[Dict]:
+    def _build_tools_definition(self) -> List[Dict]:
         return [
             # Database MCP Tools
             {
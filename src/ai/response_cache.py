@@ -0,0 +1,285 @@
+"""
+AI响应缓存
+对不依赖对话上下文的重复分析提问，按规范化提问、模型配置与用户缓存本轮的工具计划和结果事件流，
+命中时直接回放而不调用LLM；缓存条目记录引用快照的内容版本，快照变化或删除后条目失效，
+引用的图表文件被清理后条目同样失效
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from src.ai.tool_selection import tool_in_groups
+from src.core.config import CONFIG_DIR, AGENT_RESPONSE_CACHE_TTL, AGENT_RESPONSE_CACHE_MAX_ENTRIES
+from src.core.snapshot_store import get_snapshot_store
+
+# 只读取快照数据、结果仅由快照内容决定的工具组，其余工具（外部数据源、数据库、写入类）的结果不缓存
+CACHEABLE_TOOL_GROUPS = frozenset({"snapshot", "analysis", "chart"})
+UNCACHEABLE_TOOLS = frozenset({"pbbi_execute_sql"})
+# 结果依赖快照列表的工具，条目同时记录快照列表版本
+CATALOG_TOOLS = frozenset({"pbbi_list_snapshots"})
+# 出现以下阶段说明本轮经过自动修正，实际执行的参数与记录的不一致，不缓存
+_CORRECTION_STAGES = frozenset({"error_correction", "correction_success", "correction_failed"})
+
+CHARTS_DIR = CONFIG_DIR / "charts"
+# 事件中引用的图表地址，如 http://localhost:8001/api/charts/chart_bar_1700000000.png
+_CHART_URL_RE = re.compile(r"/api/charts/([\w.\-]+)")
+
+
+# 紧邻数字时决定数值含义的符号（小数点、负号、百分号、时间与日期分隔符），规范化时保留
+_NUMERIC_MARKS = frozenset(".-%:/")
+
+
+def normalize_query(query: str) -> str:
+    """规范化提问：全角转半角、小写，去除空白与标点
+
+    紧邻数字的 . - % : / 保留，两个数字之间的空白保留为一个空格，
+    避免 "1.5" 与 "15"、"-5%" 与 "5%"、"2023-10" 与 "202310" 得到相同的缓存键
+    """
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    kept = []
+    for i, ch in enumerate(text):
+        if not unicodedata.category(ch).startswith(("P", "Z", "C")):
+            kept.append(ch)
+            continue
+        prev_digit = i > 0 and text[i - 1].isdigit()
+        next_digit = i + 1 < len(text) and text[i + 1].isdigit()
+        if ch in _NUMERIC_MARKS and (prev_digit or next_digit):
+            kept.append(ch)
+        elif ch.isspace() and kept and kept[-1].isdigit():
+            rest = text[i + 1:].lstrip()
+            if rest[:1].isdigit():
+                kept.append(" ")
+    return "".join(kept)
+
+
+def cacheable_tool(name: str) -> bool:
+    return name not in UNCACHEABLE_TOOLS and (
+        name in CATALOG_TOOLS or tool_in_groups(name, CACHEABLE_TOOL_GROUPS)
+    )
+
+
+def _plan_dependencies(events: List[Dict[str, Any]]) -> Optional[Tuple[FrozenSet[int], bool]]:
+    """分析一轮事件流，返回 (引用的快照ID, 是否依赖快照列表)；不可缓存时返回None"""
+    snapshot_ids = set()
+    uses_catalog = False
+    for event in events:
+        kind = event.get("type")
+        if kind == "error":
+            return None
+        if kind == "thinking" and event.get("stage") in _CORRECTION_STAGES:
+            return None
+        if kind == "tool_call_start":
+            name = event.get("tool", "")
+            if not cacheable_tool(name):
+                return None
+            uses_catalog = uses_catalog or name in CATALOG_TOOLS
+            snapshot_id = (event.get("arguments") or {}).get("snapshot_id")
+            if snapshot_id is not None:
+                try:
+                    snapshot_ids.add(int(snapshot_id))
+                except (TypeError, ValueError):
+                    return None
+        elif kind == "tool_result":
+            result = event.get("result")
+            if not isinstance(result, dict) or not result.get("success"):
+                return None
+    if not events or events[-1].get("type") != "done":
+        return None
+    return frozenset(snapshot_ids), uses_catalog
+
+
+def _chart_files(events: List[Dict[str, Any]]) -> FrozenSet[str]:
+    """事件流（工具结果与回答内容）中引用的图表文件名"""
+    text = json.dumps(events, ensure_ascii=False, default=str)
+    return frozenset(_CHART_URL_RE.findall(text))
+
+
+class ResponseCache:
+    """按提问缓存Agent事件流的LRU缓存，带过期时间与快照版本校验"""
+
+    def __init__(self, max_entries: int = AGENT_RESPONSE_CACHE_MAX_ENTRIES, ttl: float = AGENT_RESPONSE_CACHE_TTL,
+                 store: Any = None, clock: Callable[[], float] = time.monotonic,
+                 charts_dir: Path = CHARTS_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.charts_dir = Path(charts_dir)
+        self._store = store
+        self._clock = clock
+        # 缓存键 -> {"events", "versions", "catalog", "charts", "created"}
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def store(self):
+        return self._store if self._store is not None else get_snapshot_store()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def make_key(query: str, config: Any, user_id: Optional[int] = None) -> Tuple:
+        """缓存键：规范化提问、模型配置与用户（不同用户可访问的快照不同）"""
+        return (
+            normalize_query(query),
+            getattr(config, "base_url", None),
+            getattr(config, "model", None),
+            getattr(config, "temperature", None),
+            getattr(config, "max_tokens", None),
+            user_id,
+        )
+
+    def _current_versions(self, snapshot_ids: FrozenSet[int]) -> Dict[int, str]:
+        return self.store.content_versions(sorted(snapshot_ids))
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """查找缓存的事件流；过期、引用的快照内容已变化或图表文件已删除时删除条目并返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.ttl and self._clock() - entry["created"] > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                self.invalidations += 1
+                return None
+
+        try:
+            valid = self._current_versions(frozenset(entry["versions"])) == entry["versions"]
+            if valid and entry["catalog"] is not None:
+                valid = self.store.catalog_version() == entry["catalog"]
+            if valid:
+                valid = all((self.charts_dir / name).is_file() for name in entry["charts"])
+        except sqlite3.Error as e:
+            print(f"Response cache validation error: {e}")
+            valid = False
+
+        with self._lock:
+            if not valid:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                self.misses += 1
+                self.invalidations += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["events"]
+
+    def put(self, key: Tuple, events: List[Dict[str, Any]]) -> bool:
+        """缓存一轮完整的事件流，只有全部工具均为只读快照工具且执行成功时才缓存"""
+        dependencies = _plan_dependencies(events)
+        if dependencies is None:
+            with self._lock:
+                self.skipped += 1
+            return False
+        snapshot_ids, uses_catalog = dependencies
+        try:
+            versions = self._current_versions(snapshot_ids)
+            catalog = self.store.catalog_version() if uses_catalog else None
+        except sqlite3.Error as e:
+            print(f"Response cache store error: {e}")
+            return False
+        if len(versions) != len(snapshot_ids):
+            with self._lock:
+                self.skipped += 1
+            return False
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                "events": list(events),
+                "versions": versions,
+                "catalog": catalog,
+                "charts": _chart_files(events),
+                "created": self._clock()
+            }
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+async def cached_chat(agent: Any, user_input: str,
+                      cache: Optional[ResponseCache] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """带响应缓存的 agent.chat
+
+    只缓存会话的第一个提问（没有对话历史），有上下文的追问结果依赖历史，直接调用 agent.chat
+    """
+    if agent.conversation_history:
+        async for event in agent.chat(user_input):
+            yield event
+        return
+
+    if cache is None:
+        cache = get_response_cache()
+    agent.llm_client.refresh_config()
+    key = cache.make_key(user_input, agent.llm_client.config, agent.user_id)
+    events = cache.get(key)
+
+    if events is not None:
+        yield {
+            "type": "thinking",
+            "stage": "cache_hit",
+            "message": "命中缓存，直接返回之前的分析结果"
+        }
+        content = ""
+        for event in events:
+            if event.get("type") == "content":
+                content += event.get("content") or ""
+            yield event
+        agent.conversation_history.append({"role": "user", "content": user_input})
+        agent.conversation_history.append({"role": "assistant", "content": content})
+        return
+
+    recorded = []
+    async for event in agent.chat(user_input):
+        recorded.append(event)
+        yield event
+    cache.put(key, recorded)
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """获取进程内共享的AI响应缓存"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -6,7 +6,7 @@
 import json
 import re
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 
 
@@ -190,6 +190,45 @@ class GLMToolCallParser(ToolCallParser):
         return tool_calls
 
 
+class GLMXMLToolCallParser(ToolCallParser):
+    """智谱GLM XML参数格式解析器
+    
+    处理GLM-4.5等模型输出的格式：
+    <tool_call>tool_name
+    <arg_key>param1</arg_key>
+    <arg_value>value1</arg_value>
+    </tool_call>
+    """
+    
+    def detect(self, content: str) -> bool:
+        return '<tool_call>' in content and '</tool_call>' in content
+    
+    def parse(self, content: str) -> List[ToolCall]:
+        tool_calls = []
+        
+        for body in re.findall(r'<tool_call>(.*?)</tool_call>', content, re.DOTALL):
+            tool_name = body.split('<arg_key>', 1)[0].strip()
+            if not re.fullmatch(r'\w+', tool_name):
+                continue
+            
+            args = {}
+            pairs = re.findall(r'<arg_key>(.*?)</arg_key>\s*<arg_value>(.*?)</arg_value>', body, re.DOTALL)
+            for key, value in pairs:
+                value = value.strip()
+                try:
+                    args[key.strip()] = json.loads(value)
+                except:
+                    args[key.strip()] = value
+            
+            tool_calls.append(ToolCall(
+                id=f"call_{len(tool_calls)}",
+                name=tool_name,
+                arguments=args
+            ))
+        
+        return tool_calls
+
+
 class GLM5TextParser(ToolCallParser):
     """GLM-5纯文本格式解析器
     
@@ -556,6 +595,7 @@ class ToolCallParserRegistry:
             MinimaxToolCallParser(),
             AnthropicToolCallParser(),
             GLMToolCallParser(),
+            GLMXMLToolCallParser(),
             GLM5TextParser(),
             GLM5PythonCallParser(),
             GLM5PlainTextParser(),
@@ -601,3 +641,223 @@ def parse_tool_calls(content: str) -> List[ToolCall]:
 def tool_calls_to_openai_format(tool_calls: List[ToolCall]) -> List[Dict]:
     """转换为OpenAI格式的便捷函数"""
     return parser_registry.to_openai_format(tool_calls)
+
+
+@dataclass(frozen=True)
+class _BlockSpec:
+    """流式解析中一种工具调用块的起止规则"""
+    format: str
+    start: str
+    parser: ToolCallParser
+    end: Optional[str] = None
+    # marker: 以 end 标记结束；json: 花括号配平；lines: 连续的 key=value 行
+    end_kind: str = "marker"
+    literal: bool = True
+    # 解析前包裹在块两侧的文本（块本身不含外层标记的格式）
+    prefix: str = ""
+    suffix: str = ""
+
+
+_STREAM_BLOCKS = [
+    _BlockSpec("kimi", "<|tool_call_begin|>", KimiToolCallParser(), "<|tool_call_end|>",
+               prefix="<|tool_calls_section_begin|>", suffix="<|tool_calls_section_end|>"),
+    _BlockSpec("openai", "<｜tool▁call▁begin｜>", OpenAIToolCallParser(), "<｜tool▁call▁end｜>"),
+    _BlockSpec("dsml", "<｜DSML｜invoke", DeepSeekDSMLParser(), "</｜DSML｜invoke>"),
+    _BlockSpec("minimax", "<invoke ", MinimaxToolCallParser(), "</invoke>"),
+    _BlockSpec("anthropic", "<tool_calltools>", AnthropicToolCallParser(), "</tool_calltools>"),
+    _BlockSpec("anthropic", "<invoke_tool>", AnthropicToolCallParser(), "</invoke_tool>"),
+    _BlockSpec("glm_xml", "<tool_call>", GLMXMLToolCallParser(), "</tool_call>"),
+    _BlockSpec("glm", "```tool", GLMToolCallParser(), "```"),
+    _BlockSpec("glm5_text", "࿏", GLM5TextParser(), "⛔"),
+    _BlockSpec("qwen", "✿FUNCTION✿", QwenToolCallParser(), "✿END✿"),
+    _BlockSpec("qwen", "✿CALL✿", QwenToolCallParser(), "✿RESULT✿"),
+    _BlockSpec("glm5_call", r"pbbi_\w+\s*\(", GLM5PythonCallParser(), ")", literal=False),
+    _BlockSpec("glm5_call", r"pbbi_\w+[ \t]*\n[a-zA-Z_]\w*=", GLM5PlainTextParser(), end_kind="lines", literal=False),
+    _BlockSpec("json", r'\{ ?"(?:tool_calls|function_call)"', JSONToolCallParser(), end_kind="json", literal=False),
+]
+
+# 工具调用块外层的包裹标记，不展示给用户
+_STREAM_HIDDEN_MARKERS = {
+    "kimi": ["<|tool_calls_section_begin|>", "<|tool_calls_section_end|>"],
+    "openai": ["<｜tool▁calls▁begin｜>", "<｜tool▁calls▁end｜>"],
+    "dsml": ["<｜DSML｜function_calls>", "</｜DSML｜function_calls>"],
+    "minimax": ["<minimax:tool_call>", "</minimax:tool_call>"],
+    "anthropic": ["<tool_calls>", "</tool_calls>"],
+}
+
+# 文本末尾可能是正则起始标记的前缀时暂缓输出（pbbi_xxx 调用、JSON 工具调用）
+_STREAM_PARTIAL_PATTERNS = {
+    "glm5_call": r"p(?:b(?:b(?:i(?:_\w*[ \t]*(?:\n(?:[a-zA-Z_]\w*)?)?)?)?)?)?\Z|pbbi_\w+\s*\Z",
+    "json": r'\{ ?(?:"\w*)?\Z',
+}
+_STREAM_KV_LINE = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*=')
+# 暂缓输出的文本最大长度
+_STREAM_MAX_HOLD = 256
+
+
+class StreamingToolCallParser:
+    """流式工具调用解析器
+    
+    逐段接收模型输出的文本增量并单遍扫描：普通文本立即返回用于展示，工具调用块在结束标记到达时
+    即用对应格式的解析器解析，调用方不必等待整个回复结束就可以开始执行工具。
+    识别到第一个工具调用后锁定格式，之后只匹配该格式的标记；每段增量只扫描新内容和末尾少量
+    可能是标记前缀的字符。
+    """
+    
+    def __init__(self):
+        self.format: Optional[str] = None
+        self.tool_calls: List[ToolCall] = []
+        self._buffer = ""
+        self._block: Optional[_BlockSpec] = None
+        self._body_start = 0
+        self._scan = 0
+        self._json_state = (0, False, False)
+        self._compile(_STREAM_BLOCKS, [m for markers in _STREAM_HIDDEN_MARKERS.values() for m in markers])
+    
+    def _compile(self, blocks: List[_BlockSpec], hidden: List[str]):
+        self._groups: Dict[str, Optional[_BlockSpec]] = {}
+        alternatives = []
+        literals = list(hidden)
+        for idx, spec in enumerate(blocks):
+            self._groups[f"b{idx}"] = spec
+            alternatives.append(f"(?P<b{idx}>{re.escape(spec.start) if spec.literal else spec.start})")
+            if spec.literal:
+                literals.append(spec.start)
+        for idx, marker in enumerate(hidden):
+            self._groups[f"h{idx}"] = None
+            alternatives.append(f"(?P<h{idx}>{re.escape(marker)})")
+        self._start_re = re.compile("|".join(alternatives))
+        
+        self._prefixes = {m[:k] for m in literals for k in range(1, len(m))}
+        self._max_prefix = max((len(p) for p in self._prefixes), default=0)
+        partials = {_STREAM_PARTIAL_PATTERNS[s.format] for s in blocks if s.format in _STREAM_PARTIAL_PATTERNS}
+        self._partial_re = re.compile("|".join(sorted(partials))) if partials else None
+    
+    def feed(self, chunk: str) -> Tuple[str, List[ToolCall]]:
+        """输入一段文本增量，返回 (可展示的文本, 本段完成的工具调用)"""
+        self._buffer += chunk
+        return self._drain(final=False)
+    
+    def finish(self) -> Tuple[str, List[ToolCall]]:
+        """输入结束，返回剩余的可展示文本和工具调用；未闭合且无法解析的块按普通文本返回"""
+        return self._drain(final=True)
+    
+    def _drain(self, final: bool) -> Tuple[str, List[ToolCall]]:
+        text_parts = []
+        completed = []
+        while True:
+            if self._block is None:
+                match = self._start_re.search(self._buffer)
+                if match is None:
+                    cut = len(self._buffer) - (0 if final else self._partial_length())
+                    text_parts.append(self._buffer[:cut])
+                    self._buffer = self._buffer[cut:]
+                    break
+                text_parts.append(self._buffer[:match.start()])
+                spec = self._groups[match.lastgroup]
+                if spec is None:
+                    self._buffer = self._buffer[match.end():]
+                    continue
+                self._buffer = self._buffer[match.start():]
+                self._enter_block(spec, match.end() - match.start())
+                continue
+            
+            end = self._find_block_end(final)
+            if end is None:
+                if final:
+                    block, self._buffer, self._block = self._buffer, "", None
+                    calls = self._parse_block(self._block_spec, block)
+                    completed.extend(calls)
+                    if not calls:
+                        text_parts.append(block)
+                break
+            block, self._buffer = self._buffer[:end], self._buffer[end:]
+            self._block = None
+            calls = self._parse_block(self._block_spec, block)
+            completed.extend(calls)
+            if not calls:
+                # 形似工具调用但无法解析的块（如普通JSON）按普通文本返回
+                text_parts.append(block)
+        return "".join(text_parts), completed
+    
+    def _enter_block(self, spec: _BlockSpec, start_length: int):
+        self._block = self._block_spec = spec
+        self._body_start = start_length
+        if spec.end_kind == "json":
+            self._scan = 0
+            self._json_state = (0, False, False)
+        elif spec.end_kind == "lines":
+            self._scan = self._buffer.index("\n") + 1
+        else:
+            self._scan = start_length
+    
+    def _partial_length(self) -> int:
+        """缓冲区末尾可能是起始标记前缀的字符数"""
+        buffer = self._buffer
+        held = 0
+        for k in range(min(len(buffer), self._max_prefix), 0, -1):
+            if buffer[-k:] in self._prefixes:
+                held = k
+                break
+        if self._partial_re is not None:
+            tail = buffer[-_STREAM_MAX_HOLD:]
+            match = self._partial_re.search(tail)
+            if match:
+                held = max(held, len(tail) - match.start())
+        return held
+    
+    def _find_block_end(self, final: bool) -> Optional[int]:
+        """当前块的结束位置（不含之后的文本），尚未结束时返回None；只扫描上次之后新增的内容"""
+        spec = self._block
+        buffer = self._buffer
+        if spec.end_kind == "marker":
+            idx = buffer.find(spec.end, max(self._body_start, self._scan - len(spec.end) + 1))
+            self._scan = len(buffer)
+            return idx + len(spec.end) if idx >= 0 else None
+        
+        if spec.end_kind == "json":
+            depth, in_string, escaped = self._json_state
+            for i in range(self._scan, len(buffer)):
+                ch = buffer[i]
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif ch == "\\":
+                        escaped = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                elif ch == "{":
+                    depth += 1
+                elif ch == "}":
+                    depth -= 1
+                    if depth == 0:
+                        return i + 1
+            self._scan = len(buffer)
+            self._json_state = (depth, in_string, escaped)
+            return None
+        
+        pos = self._scan
+        while True:
+            newline = buffer.find("\n", pos)
+            if newline < 0 and not final:
+                self._scan = pos
+                return None
+            line = buffer[pos:newline if newline >= 0 else len(buffer)]
+            if not _STREAM_KV_LINE.match(line):
+                return pos
+            if newline < 0:
+                return len(buffer)
+            pos = newline + 1
+    
+    def _parse_block(self, spec: _BlockSpec, block: str) -> List[ToolCall]:
+        calls = spec.parser.parse(spec.prefix + block + spec.suffix)
+        for call in calls:
+            call.id = f"call_{len(self.tool_calls)}"
+            self.tool_calls.append(call)
+        if calls and self.format is None:
+            self.format = spec.format
+            self._compile([s for s in _STREAM_BLOCKS if s.format == spec.format],
+                          _STREAM_HIDDEN_MARKERS.get(spec.format, []))
+        return calls
@@ -0,0 +1,64 @@
+"""
+工具定义按意图筛选
+按用户意图和关键字选择本轮需要的工具组，只把这些工具的定义发送给模型，减少提示词token
+"""
+
+from typing import Dict, FrozenSet, List, Optional
+
+# 工具组 -> 工具名称前缀或名称
+TOOL_GROUPS: Dict[str, List[str]] = {
+    "snapshot": ["pbbi_list_snapshots", "pbbi_get_snapshot_schema", "pbbi_query_snapshot", "pbbi_execute_sql"],
+    "analysis": ["pbbi_aggregate_data", "pbbi_statistics", "pbbi_recommend_chart"],
+    "chart": ["pbbi_generate_"],
+    "mingdao": ["pbbi_mingdao_"],
+    "localfile": ["pbbi_local_"],
+    "dataflow": ["pbbi_list_dataflows", "pbbi_get_dataflow", "pbbi_get_dataflow_snapshots"],
+    "dashboard": ["pbbi_list_dashboards", "pbbi_get_dashboard", "pbbi_create_dashboard"],
+    "user": ["pbbi_get_current_user", "pbbi_get_user_resources"],
+}
+
+# 意图 -> 工具组，None 表示发送全部工具
+INTENT_TOOL_GROUPS: Dict[str, Optional[List[str]]] = {
+    "图表生成": ["snapshot", "analysis", "chart"],
+    "数据分析": ["snapshot", "analysis"],
+    "数据查询": ["snapshot", "analysis", "dataflow", "dashboard"],
+    "结构查询": ["snapshot", "dataflow"],
+    "帮助咨询": None,
+    "一般对话": None,
+}
+
+# 关键字 -> 额外加入的工具组
+KEYWORD_TOOL_GROUPS = [
+    (["图", "chart", "可视化"], "chart"),
+    (["明道", "mingdao", "工作表"], "mingdao"),
+    (["文件", "上传", "excel", "csv", "xlsx"], "localfile"),
+    (["数据流", "dataflow"], "dataflow"),
+    (["仪表盘", "看板", "dashboard"], "dashboard"),
+    (["用户", "权限", "我的"], "user"),
+]
+
+
+def select_tool_groups(query: str, intent: str) -> Optional[FrozenSet[str]]:
+    """根据意图与关键字选择工具组，返回None表示使用全部工具
+
+    意图不明确（帮助咨询、一般对话）时，若提问命中关键字则使用快照工具加命中的工具组，否则使用全部工具
+    """
+    query_lower = (query or "").lower()
+    matched = {group for keywords, group in KEYWORD_TOOL_GROUPS if any(kw in query_lower for kw in keywords)}
+    groups = INTENT_TOOL_GROUPS.get(intent)
+    if groups is None:
+        return frozenset(matched | {"snapshot"}) if matched else None
+    return frozenset(set(groups) | matched)
+
+
+def tool_in_groups(name: str, groups: FrozenSet[str]) -> bool:
+    for group in groups:
+        for pattern in TOOL_GROUPS.get(group, []):
+            if name == pattern or (pattern.endswith("_") and name.startswith(pattern)):
+                return True
+    return False
+
+
+def filter_tools(tools: List[Dict], groups: FrozenSet[str]) -> List[Dict]:
+    """从完整工具定义中筛选属于指定工具组的定义"""
+    return [t for t in tools if tool_in_groups(t["function"]["name"], groups)]
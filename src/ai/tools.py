@@ -3,27 +3,34 @@ MCP工具执行器 - 执行PB-BI的MCP工具
 包含字段验证和错误反馈机制
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from src.mcp.service import mcp_service
-from src.mcp.tools import register_all_tools
-from src.mcp.chart_mcp import register_chart_tools
-import sqlite3
+from src.mcp.registry import ToolRegistry, get_tool_registry
+from src.core.config import AGENT_TOOL_CONCURRENCY
+from src.core.snapshot_store import get_snapshot_store
+import asyncio
 import json
 
-register_all_tools(mcp_service)
-register_chart_tools(mcp_service)
-
-def _get_db_connection():
-    """获取数据库连接"""
-    from src.core.config import CONFIG_DIR
-    db_path = CONFIG_DIR / "pb_bi.db"
-    conn = sqlite3.connect(str(db_path))
-    conn.row_factory = sqlite3.Row
-    return conn
-
+# 执行前需要验证字段参数的图表工具
+FIELD_VALIDATED_TOOLS = frozenset({
+    "pbbi_generate_line_chart",
+    "pbbi_generate_bar_chart",
+    "pbbi_generate_pie_chart",
+    "pbbi_generate_scatter_chart",
+    "pbbi_generate_heatmap",
+    "pbbi_generate_radar_chart",
+    "pbbi_generate_histogram"
+})
 
 class FieldValidator:
-    """字段验证器 - 在执行工具前验证字段是否存在"""
+    """字段验证器 - 在执行工具前验证字段是否存在（使用按快照缓存的字段索引）"""
+    
+    def __init__(self, store: Any = None):
+        self._store = store
+    
+    @property
+    def store(self):
+        return self._store if self._store is not None else get_snapshot_store()
     
     async def validate_fields(self, snapshot_id: int, fields: List[str]) -> Dict[str, Any]:
         """
@@ -37,54 +44,27 @@ class FieldValidator:
             验证结果，包含是否有效、缺失字段、可用字段等
         """
         try:
-            conn = _get_db_connection()
-            cursor = conn.cursor()
+            index = self.store.field_index(snapshot_id)
             
-            cursor.execute(
-                "SELECT fields FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            conn.close()
-            
-            if not row:
+            if index is None:
                 return {
                     "valid": False,
                     "error": f"快照 {snapshot_id} 不存在",
                     "available_fields": []
                 }
             
-            fields_json = row["fields"]
-            if not fields_json:
+            if not index.has_fields:
                 return {
                     "valid": False,
                     "error": f"快照 {snapshot_id} 没有字段信息",
                     "available_fields": []
                 }
             
-            field_list = json.loads(fields_json)
-            # 支持多种字段格式：{"name": "xxx"} 或 {"field_name": "xxx"} 或 {"field_id": "xxx"}
-            available_fields = []
-            for f in field_list:
-                if isinstance(f, dict):
-                    field_name = f.get("name") or f.get("field_name") or f.get("field_id")
-                    if field_name:
-                        available_fields.append(field_name)
-                else:
-                    available_fields.append(str(f))
-            
-            print(f"[DEBUG] Available fields: {available_fields[:10]}...")
-            print(f"[DEBUG] Fields to validate: {fields}")
-            
-            # 检查每个字段
-            missing_fields = []
-            for field in fields:
-                if field not in available_fields:
-                    similar = self._find_similar_field(field, available_fields)
-                    missing_fields.append({
-                        "field": field,
-                        "similar": similar
-                    })
+            available_fields = list(index.names)
+            missing_fields = [
+                {"field": field, "similar": index.suggest(field)}
+                for field in index.missing(fields)
+            ]
             
             if missing_fields:
                 return {
@@ -106,22 +86,6 @@ class FieldValidator:
                 "available_fields": []
             }
     
-    def _find_similar_field(self, field: str, available_fields: List[str]) -> Optional[str]:
-        """查找相似的字段名"""
-        if not field:
-            return None
-        
-        field_lower = field.lower().replace(" ", "").replace("（", "(").replace("）", ")")
-        
-        for available in available_fields:
-            if not available:
-                continue
-            available_lower = available.lower().replace(" ", "").replace("（", "(").replace("）", ")")
-            if field_lower in available_lower or available_lower in field_lower:
-                return available
-        
-        return None
-    
     def _format_field_error(self, missing_fields: List[Dict], available_fields: List[str]) -> str:
         """格式化字段错误信息"""
         errors = []
@@ -138,42 +102,34 @@ class FieldValidator:
 
 
 class MCPToolExecutor:
-    def __init__(self):
-        self._tools_registered = False
-        self._validator = FieldValidator()
-        self._register_tools()
+    """工具执行器，引用进程内共享的工具注册表与字段验证器，创建时不注册工具"""
+    
+    def __init__(self, max_concurrency: Optional[int] = None, registry: Optional[ToolRegistry] = None):
+        self.max_concurrency = max_concurrency or AGENT_TOOL_CONCURRENCY
+        self._registry = registry
+        self._validator = _field_validator
     
-    def _register_tools(self):
-        if not self._tools_registered:
-            register_all_tools(mcp_service)
-            self._tools_registered = True
+    @property
+    def registry(self) -> ToolRegistry:
+        """工具注册表快照，未指定时使用全局注册表（有新工具注册时自动更新）"""
+        return self._registry or get_tool_registry()
     
     def list_available_tools(self) -> list:
-        tools = mcp_service.list_tools()
-        return [
-            {
-                "name": t.name,
-                "description": t.description,
-                "parameters": t.parameters
-            }
-            for t in tools
-        ]
+        return list(self.registry.listing)
     
     async def execute(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         print(f"[DEBUG] Executing tool: {tool_name}, arguments: {arguments}")
         
-        # 图表生成工具需要验证字段
-        chart_tools = [
-            "pbbi_generate_line_chart",
-            "pbbi_generate_bar_chart",
-            "pbbi_generate_pie_chart",
-            "pbbi_generate_scatter_chart",
-            "pbbi_generate_heatmap",
-            "pbbi_generate_radar_chart",
-            "pbbi_generate_histogram"
-        ]
+        if tool_name not in self.registry:
+            return {
+                "success": False,
+                "error": f"Tool {tool_name} not found",
+                "tool": tool_name,
+                "needs_retry": True
+            }
         
-        if tool_name in chart_tools:
+        # 图表生成工具需要验证字段
+        if tool_name in FIELD_VALIDATED_TOOLS:
             print(f"[DEBUG] Validating chart tool fields...")
             validation_result = await self._validate_chart_tool(tool_name, arguments)
             print(f"[DEBUG] Validation result: valid={validation_result.get('valid')}, error={validation_result.get('error', 'None')}")
@@ -186,7 +142,7 @@ class MCPToolExecutor:
                     "available_fields": validation_result.get("available_fields", [])
                 }
         
-        result = mcp_service.execute_tool(tool_name, arguments)
+        result = await mcp_service.execute_tool_async(tool_name, arguments)
         
         # 检查外层success
         if not result.get("success", False):
@@ -244,20 +200,54 @@ class MCPToolExecutor:
         
         return await self._validator.validate_fields(snapshot_id, fields_to_validate)
     
+    def limiter(self) -> asyncio.Semaphore:
+        """一轮对话中共享的并发限制，传给 start/start_many"""
+        return asyncio.Semaphore(max(1, self.max_concurrency))
+    
+    def start(self, tool_name: str, arguments: Dict[str, Any],
+              semaphore: Optional[asyncio.Semaphore] = None) -> "asyncio.Task":
+        """启动单个工具调用任务，传入 semaphore 时与同一轮的其他调用共享并发限制"""
+        async def run() -> Dict[str, Any]:
+            if semaphore is None:
+                return await self.execute(tool_name, arguments)
+            async with semaphore:
+                return await self.execute(tool_name, arguments)
+        
+        return asyncio.create_task(run())
+    
+    def start_many(self, tool_calls: List[Tuple[str, Dict[str, Any]]],
+                   semaphore: Optional[asyncio.Semaphore] = None) -> List["asyncio.Task"]:
+        """并发启动多个工具调用，返回与输入顺序一致的任务列表
+
+        同一时间最多执行 max_concurrency 个，调用方按顺序await任务即可保持结果顺序
+        """
+        semaphore = semaphore or self.limiter()
+        return [self.start(name, args, semaphore) for name, args in tool_calls]
+    
     async def execute_multiple(self, tool_calls: list) -> list:
-        results = []
+        calls = []
         for call in tool_calls:
             tool_name = call.get("name") or call.get("function", {}).get("name")
             arguments = call.get("arguments") or call.get("function", {}).get("arguments", {})
             
             if isinstance(arguments, str):
-                import json
                 try:
                     arguments = json.loads(arguments)
                 except:
                     arguments = {}
             
-            result = await self.execute(tool_name, arguments)
-            results.append(result)
+            calls.append((tool_name, arguments))
         
-        return results
+        return await asyncio.gather(*self.start_many(calls))
+
+
+_field_validator = FieldValidator()
+_tool_executor: Optional[MCPToolExecutor] = None
+
+
+def get_tool_executor() -> MCPToolExecutor:
+    """获取进程内共享的工具执行器"""
+    global _tool_executor
+    if _tool_executor is None:
+        _tool_executor = MCPToolExecutor()
+    return _tool_executor
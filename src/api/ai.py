@@ -3,45 +3,93 @@ AI对话API接口
 """
 
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import json
 import asyncio
 
 from src.ai.agent import PBBIAgent
+from src.ai.agent_registry import get_agent_registry
 from src.ai.llm_client import LLMConfig
+from src.ai.response_cache import cached_chat, get_response_cache
 from src.api.auth import get_current_user_optional
+from src.core.config import AGENT_RESPONSE_CACHE
 
 router = APIRouter(prefix="/api/ai", tags=["ai"])
 
-agent_instances: Dict[str, PBBIAgent] = {}
+agent_registry = get_agent_registry()
 
-def get_agent(session_id: Optional[str] = None, user_id: Optional[int] = None) -> PBBIAgent:
-    if session_id and session_id in agent_instances:
-        existing_agent = agent_instances[session_id]
-        existing_agent.llm_client._load_config()
-        existing_agent.set_user_id(user_id)
-        return existing_agent
+def _get_or_create_agent(session_id: Optional[str] = None, user_id: Optional[int] = None,
+                         checkout: bool = False) -> Tuple[PBBIAgent, bool]:
+    """返回 (Agent, 是否新建)，会话不在注册表中时新建并从数据库恢复历史
+
+    checkout 为 True 时从注册表借出，使用完后需调用 agent_registry.release 归还
+    """
+    if session_id:
+        existing_agent = agent_registry.get(session_id, checkout=checkout)
+        if existing_agent is not None:
+            existing_agent.llm_client.refresh_config()
+            existing_agent.set_user_id(user_id)
+            return existing_agent, False
     
     agent = PBBIAgent(session_id=session_id, user_id=user_id)
     
     if session_id:
-        agent_instances[session_id] = agent
+        load_session_history(agent, session_id)
+        agent_registry.put(session_id, agent, checkout=checkout)
     
+    return agent, True
+
+def get_agent(session_id: Optional[str] = None, user_id: Optional[int] = None) -> PBBIAgent:
+    return _get_or_create_agent(session_id, user_id)[0]
+
+def _prepare_agent(session_id: Optional[str], user_id: Optional[int]) -> PBBIAgent:
+    """借出会话的Agent，已有的Agent同步数据库中新增的消息"""
+    agent, created = _get_or_create_agent(session_id, user_id, checkout=True)
+    if session_id and not created:
+        load_session_history(agent, session_id)
     return agent
 
 def load_session_history(agent: PBBIAgent, session_id: str):
-    """从数据库加载会话历史"""
+    """从数据库加载会话历史
+
+    Agent已同步过该会话时只读取新增消息；消息被删除或改写（如其他进程修改了会话）时整体重新加载
+    """
     try:
+        from sqlalchemy import func
         from src.core.database import SessionLocal
         from src.models.conversation import ConversationMessage
         
         db = SessionLocal()
         try:
-            messages = db.query(ConversationMessage).filter(
-                ConversationMessage.session_id == session_id
-            ).order_by(ConversationMessage.created_at).all()
+            session_filter = ConversationMessage.session_id == session_id
+            columns = (ConversationMessage.id, ConversationMessage.role, ConversationMessage.content)
+            
+            last_id = agent.history_message_id
+            if last_id is not None:
+                total, max_id = db.query(
+                    func.count(ConversationMessage.id), func.max(ConversationMessage.id)
+                ).filter(session_filter).one()
+                
+                if max_id == last_id and total == agent.persisted_history_count:
+                    agent.append_history([], last_id)
+                    return
+                
+                if max_id is not None and max_id > last_id:
+                    messages = db.query(*columns).filter(
+                        session_filter, ConversationMessage.id > last_id
+                    ).order_by(ConversationMessage.created_at, ConversationMessage.id).all()
+                    if total == agent.persisted_history_count + len(messages):
+                        agent.append_history(
+                            [{"role": msg.role, "content": msg.content} for msg in messages], max_id
+                        )
+                        return
+            
+            messages = db.query(*columns).filter(session_filter).order_by(
+                ConversationMessage.created_at, ConversationMessage.id
+            ).all()
             
             history = []
             for msg in messages:
@@ -51,16 +99,38 @@ def load_session_history(agent: PBBIAgent, session_id: str):
                 })
             
             if history:
-                agent.load_history(history)
+                agent.load_history(history, max(msg.id for msg in messages))
         finally:
             db.close()
     except Exception as e:
         print(f"Load history error: {e}")
 
+def record_context_tokens(session_id: str, tokens: int):
+    """记录会话最近一次请求发送给模型的上下文token数
+
+    写入 last_prompt_tokens；context_tokens 是各消息token数的累计，由 /api/conversation 维护
+    """
+    try:
+        from src.core.database import SessionLocal
+        from src.models.conversation import ConversationSession
+        
+        db = SessionLocal()
+        try:
+            db.query(ConversationSession).filter(
+                ConversationSession.session_id == session_id
+            ).update({ConversationSession.last_prompt_tokens: tokens}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"Record context tokens error: {e}")
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     clear_history: bool = False
+    # 是否使用响应缓存，未指定时按 AGENT_RESPONSE_CACHE 配置
+    use_cache: Optional[bool] = None
 
 class ConfigRequest(BaseModel):
     api_key: Optional[str] = None
@@ -72,20 +142,36 @@ class ConfigResponse(BaseModel):
     base_url: str
     model: str
 
+async def _checkout_agent(session_id: Optional[str], user_id: Optional[int]) -> PBBIAgent:
+    """在线程池中借出会话的Agent（创建会话与同步历史需要查询数据库，避免阻塞事件循环）
+
+    等待期间请求被取消时，线程中已借出的Agent在线程结束后归还
+    """
+    task = asyncio.ensure_future(run_in_threadpool(_prepare_agent, session_id, user_id))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        def release(done: "asyncio.Future"):
+            if not done.cancelled() and done.exception() is None:
+                agent_registry.release(done.result())
+        task.add_done_callback(release)
+        raise
+
 @router.post("/chat")
 async def chat(request: ChatRequest, current_user = Depends(get_current_user_optional)):
     user_id = current_user.id if current_user else None
-    agent = get_agent(request.session_id, user_id)
-    
-    if request.session_id:
-        load_session_history(agent, request.session_id)
-    
-    if request.clear_history:
-        agent.clear_history()
+    use_cache = AGENT_RESPONSE_CACHE if request.use_cache is None else request.use_cache
     
     async def generate():
+        # 在响应体开始输出后才借出Agent，客户端在此之前断开时不会借出，保证借出与归还成对
+        agent = None
         try:
-            async for event in agent.chat(request.message):
+            agent = await _checkout_agent(request.session_id, user_id)
+            if request.clear_history:
+                agent.clear_history()
+            
+            events = cached_chat(agent, request.message) if use_cache else agent.chat(request.message)
+            async for event in events:
                 event_data = json.dumps(event, ensure_ascii=False)
                 yield f"data: {event_data}\n\n"
             
@@ -93,6 +179,11 @@ async def chat(request: ChatRequest, current_user = Depends(get_current_user_opt
         except Exception as e:
             error_event = json.dumps({"type": "error", "message": str(e)}, ensure_ascii=False)
             yield f"data: {error_event}\n\n"
+        finally:
+            if agent is not None and request.session_id:
+                agent_registry.release(agent)
+                agent_registry.touch(request.session_id)
+                await run_in_threadpool(record_context_tokens, request.session_id, agent.last_context_tokens)
     
     return StreamingResponse(
         generate(),
@@ -141,6 +232,14 @@ async def set_config(request: ConfigRequest):
     
     return {"success": True, "message": "配置已更新"}
 
+@router.get("/sessions/stats")
+async def get_session_stats():
+    return {"success": True, "data": agent_registry.stats()}
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return {"success": True, "data": get_response_cache().stats()}
+
 @router.get("/tools")
 async def list_tools():
     agent = get_agent()
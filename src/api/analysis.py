@@ -17,6 +17,7 @@ from statsmodels.stats.stattools import jarque_bera
 from src.core.database import get_db
 from src.models.config import DataSnapshot
 from src.core.permissions import get_current_user, check_resource_access
+from src.core.snapshot_store import get_snapshot_store
 
 router = APIRouter(prefix="/api/analysis", tags=["analysis"])
 
@@ -152,7 +153,7 @@ class MonteCarloQueueRequest(BaseModel):
     simulation_count: int = 1000
 
 @router.post("/aggregate")
-async def aggregate_data(
+def aggregate_data(
     request: AggregateRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -174,10 +175,9 @@ async def aggregate_data(
         
         for snapshot in snapshots:
             try:
-                data = json.loads(snapshot.data)
+                df = get_snapshot_store().read_frame(snapshot.id)
                 fields = json.loads(snapshot.fields)
                 
-                df = pd.DataFrame(data)
                 dfs.append(df)
                 
                 for field in fields:
@@ -274,7 +274,7 @@ async def aggregate_data(
         raise HTTPException(status_code=500, detail=f"聚合失败: {str(e)}")
 
 @router.post("/transform")
-async def transform_data(request: TransformRequest, db: Session = Depends(get_db)):
+def transform_data(request: TransformRequest, db: Session = Depends(get_db)):
     try:
         snapshot = db.query(DataSnapshot).filter(
             DataSnapshot.id == request.snapshot_id
@@ -296,7 +296,7 @@ async def transform_data(request: TransformRequest, db: Session = Depends(get_db
         raise HTTPException(status_code=500, detail=f"转换失败: {str(e)}")
 
 @router.post("/custom")
-async def custom_calculation(request: CustomCalcRequest, db: Session = Depends(get_db)):
+def custom_calculation(request: CustomCalcRequest, db: Session = Depends(get_db)):
     try:
         snapshot = db.query(DataSnapshot).filter(
             DataSnapshot.id == request.snapshot_id
@@ -317,7 +317,7 @@ async def custom_calculation(request: CustomCalcRequest, db: Session = Depends(g
         raise HTTPException(status_code=500, detail=f"计算失败: {str(e)}")
 
 @router.post("/statistical")
-async def statistical_analysis(
+def statistical_analysis(
     request: StatisticalRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -334,8 +334,7 @@ async def statistical_analysis(
         
         check_resource_access(user, snapshot.user_id, "快照")
         
-        data = json.loads(snapshot.data)
-        df = pd.DataFrame(data)
+        df = get_snapshot_store().read_frame(snapshot.id, [request.field])
         
         if request.field not in df.columns:
             raise HTTPException(status_code=400, detail=f"字段 '{request.field}' 不存在")
@@ -461,7 +460,7 @@ async def statistical_analysis(
         raise HTTPException(status_code=500, detail=f"统计分析失败: {str(e)}")
 
 @router.post("/distribution")
-async def distribution_fit(
+def distribution_fit(
     request: DistributionRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -478,8 +477,7 @@ async def distribution_fit(
         
         check_resource_access(user, snapshot.user_id, "快照")
         
-        data = json.loads(snapshot.data)
-        df = pd.DataFrame(data)
+        df = get_snapshot_store().read_frame(snapshot.id, [request.field])
         
         if request.field not in df.columns:
             raise HTTPException(status_code=400, detail=f"字段 '{request.field}' 不存在")
@@ -663,7 +661,7 @@ async def distribution_fit(
         raise HTTPException(status_code=500, detail=f"分布拟合分析失败: {str(e)}")
 
 @router.post("/regression")
-async def regression_analysis(
+def regression_analysis(
     request: RegressionRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -680,8 +678,7 @@ async def regression_analysis(
         
         check_resource_access(user, snapshot.user_id, "快照")
         
-        data = json.loads(snapshot.data)
-        df = pd.DataFrame(data)
+        df = get_snapshot_store().read_frame(snapshot.id, [request.dependent_var] + list(request.independent_vars))
         
         # 检查字段是否存在
         if request.dependent_var not in df.columns:
@@ -917,7 +914,7 @@ async def regression_analysis(
         raise HTTPException(status_code=500, detail=f"回归分析失败: {str(e)}")
 
 @router.post("/correlation")
-async def correlation_analysis(
+def correlation_analysis(
     request: CorrelationRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -934,8 +931,7 @@ async def correlation_analysis(
         
         check_resource_access(user, snapshot.user_id, "快照")
         
-        data = json.loads(snapshot.data)
-        df = pd.DataFrame(data)
+        df = get_snapshot_store().read_frame(snapshot.id, request.fields)
         
         # 检查字段是否存在
         for field in request.fields:
@@ -980,7 +976,7 @@ async def correlation_analysis(
         raise HTTPException(status_code=500, detail=f"相关分析失败: {str(e)}")
 
 @router.post("/montecarlo")
-async def monte_carlo_analysis(request: MonteCarloRequest, db: Session = Depends(get_db)):
+def monte_carlo_analysis(request: MonteCarloRequest, db: Session = Depends(get_db)):
     """蒙特卡洛分析"""
     try:
         simulation_count = request.simulation_count
@@ -1102,7 +1098,7 @@ async def monte_carlo_analysis(request: MonteCarloRequest, db: Session = Depends
         raise HTTPException(status_code=500, detail=f"蒙特卡洛分析失败: {str(e)}")
 
 @router.post("/multi-correlation")
-async def multi_correlation_analysis(
+def multi_correlation_analysis(
     request: MultiCorrelationRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -1132,8 +1128,7 @@ async def multi_correlation_analysis(
             check_resource_access(user, snapshot.user_id, "快照")
             
             # 读取数据
-            data = json.loads(snapshot.data)
-            df = pd.DataFrame(data)
+            df = get_snapshot_store().read_frame(snapshot.id, [field_req.field_name])
             
             if field_req.field_name not in df.columns:
                 raise HTTPException(status_code=400, detail=f"字段 '{field_req.field_name}' 在快照 {snapshot.name} 中不存在")
@@ -1213,7 +1208,7 @@ async def multi_correlation_analysis(
 
 
 @router.post("/correlation-explore")
-async def correlation_explore(
+def correlation_explore(
     request: CorrelationExploreRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -1243,8 +1238,7 @@ async def correlation_explore(
             check_resource_access(user, snapshot.user_id, "快照")
             
             # 读取数据
-            data = json.loads(snapshot.data)
-            df = pd.DataFrame(data)
+            df = get_snapshot_store().read_frame(snapshot.id, [field_req.field_name])
             
             if field_req.field_name not in df.columns:
                 raise HTTPException(status_code=400, detail=f"字段 '{field_req.field_name}' 在快照 {snapshot.name} 中不存在")
@@ -1325,7 +1319,7 @@ async def correlation_explore(
 
 
 @router.post("/montecarlo/pi")
-async def monte_carlo_pi(request: MonteCarloPiRequest):
+def monte_carlo_pi(request: MonteCarloPiRequest):
     """蒙特卡洛方法计算圆周率 π"""
     try:
         n = request.simulation_count
@@ -1391,7 +1385,7 @@ async def monte_carlo_pi(request: MonteCarloPiRequest):
 
 
 @router.post("/montecarlo/integral")
-async def monte_carlo_integral(request: MonteCarloIntegralRequest):
+def monte_carlo_integral(request: MonteCarloIntegralRequest):
     """蒙特卡洛方法计算定积分"""
     try:
         x_min = request.x_min
@@ -1505,7 +1499,7 @@ async def monte_carlo_integral(request: MonteCarloIntegralRequest):
 
 
 @router.post("/montecarlo/queue")
-async def monte_carlo_queue(request: MonteCarloQueueRequest):
+def monte_carlo_queue(request: MonteCarloQueueRequest):
     """蒙特卡洛方法模拟排队问题"""
     try:
         num_people = request.num_people
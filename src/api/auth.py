@@ -30,7 +30,7 @@ class AuthResponse(BaseModel):
     message: str | None = None
 
 @router.post("/register", response_model=AuthResponse)
-async def register(
+def register(
     request: RegisterRequest,
     db: Session = Depends(get_db)
 ):
@@ -48,7 +48,7 @@ async def register(
     )
 
 @router.post("/login", response_model=AuthResponse)
-async def login(
+def login(
     request: LoginRequest,
     fastapi_request: Request,
     db: Session = Depends(get_db)
@@ -68,7 +68,7 @@ async def login(
     )
 
 @router.post("/logout", response_model=AuthResponse)
-async def logout(
+def logout(
     fastapi_request: Request,
     user_id: int = Depends(require_auth)
 ):
@@ -80,7 +80,7 @@ async def logout(
     )
 
 @router.get("/me", response_model=AuthResponse)
-async def get_current_user(
+def get_current_user(
     user_id: int = Depends(require_auth),
     db: Session = Depends(get_db)
 ):
@@ -97,7 +97,7 @@ async def get_current_user(
     )
 
 
-async def get_current_user_optional(request: Request, db: Session = Depends(get_db)):
+def get_current_user_optional(request: Request, db: Session = Depends(get_db)):
     """可选的用户认证，不强制要求登录"""
     try:
         token = request.cookies.get("session_token")
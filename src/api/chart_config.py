@@ -9,6 +9,7 @@ from typing import Optional, List, Dict, Any
 import json
 
 from src.api.auth import get_current_user_optional
+from src.core.snapshot_store import get_snapshot_store, referenced_fields, dataframe_to_records
 
 router = APIRouter(prefix="/api/chart", tags=["chart"])
 
@@ -361,7 +362,7 @@ def generate_echarts_option(chart_type: str, data: List[Dict], config: ChartConf
 
 
 @router.post("/config")
-async def get_chart_config(
+def get_chart_config(
     request: ChartConfigRequest,
     current_user = Depends(get_current_user_optional)
 ):
@@ -373,16 +374,14 @@ async def get_chart_config(
     data = request.data or []
     
     if request.snapshot_id and not data:
-        from src.core.database import SessionLocal
-        from src.models.dataflow import DataSnapshot
+        # 雷达图未指定字段时默认取前5列，需要读取全部列
+        columns = referenced_fields(request.model_dump())
+        if request.chart_type == "radar" and not request.fields:
+            columns = None
         
-        db = SessionLocal()
-        try:
-            snapshot = db.query(DataSnapshot).filter(DataSnapshot.id == request.snapshot_id).first()
-            if snapshot and snapshot.data:
-                data = json.loads(snapshot.data) if isinstance(snapshot.data, str) else snapshot.data
-        finally:
-            db.close()
+        df = get_snapshot_store().read_frame(request.snapshot_id, columns or None)
+        if df is not None:
+            data = dataframe_to_records(df)
     
     if not data:
         raise HTTPException(status_code=400, detail="数据不能为空")
@@ -403,7 +402,7 @@ async def get_chart_config(
 
 
 @router.get("/types")
-async def get_chart_types():
+def get_chart_types():
     """获取支持的图表类型列表"""
     return {
         "success": True,
@@ -17,7 +17,7 @@ CHARTS_DIR = CONFIG_DIR / "charts"
 
 
 @router.get("/{chart_filename}/png")
-async def export_png(chart_filename: str):
+def export_png(chart_filename: str):
     """导出PNG格式"""
     if not chart_filename.endswith('.png'):
         chart_filename += '.png'
@@ -35,7 +35,7 @@ async def export_png(chart_filename: str):
 
 
 @router.get("/{chart_filename}/svg")
-async def export_svg(chart_filename: str):
+def export_svg(chart_filename: str):
     """导出SVG格式（从PNG转换）"""
     import subprocess
     import tempfile
@@ -83,7 +83,7 @@ async def export_svg(chart_filename: str):
 
 
 @router.get("/{chart_filename}/pdf")
-async def export_pdf(chart_filename: str):
+def export_pdf(chart_filename: str):
     """导出PDF格式"""
     if not chart_filename.endswith('.png'):
         chart_filename += '.png'
@@ -143,7 +143,7 @@ async def export_pdf(chart_filename: str):
 
 
 @router.get("/{chart_filename}/download")
-async def download_chart(chart_filename: str, format: str = "png"):
+def download_chart(chart_filename: str, format: str = "png"):
     """下载图表，支持指定格式"""
     format = format.lower()
     
@@ -151,8 +151,8 @@ async def download_chart(chart_filename: str, format: str = "png"):
         raise HTTPException(status_code=400, detail="不支持的格式，请使用 png、pdf 或 svg")
     
     if format == "png":
-        return await export_png(chart_filename)
+        return export_png(chart_filename)
     elif format == "svg":
-        return await export_svg(chart_filename)
+        return export_svg(chart_filename)
     elif format == "pdf":
-        return await export_pdf(chart_filename)
+        return export_pdf(chart_filename)
@@ -32,7 +32,7 @@ class FeedbackRequest(BaseModel):
 
 
 @router.post("/analyze")
-async def analyze_data(
+def analyze_data(
     request: AnalyzeRequest,
     current_user = Depends(get_current_user_optional)
 ):
@@ -55,7 +55,7 @@ async def analyze_data(
 
 
 @router.post("/recommend")
-async def recommend_charts(
+def recommend_charts(
     request: RecommendRequest,
     current_user = Depends(get_current_user_optional)
 ):
@@ -79,7 +79,7 @@ async def recommend_charts(
 
 
 @router.post("/feedback")
-async def submit_feedback(
+def submit_feedback(
     request: FeedbackRequest,
     current_user = Depends(get_current_user_optional)
 ):
@@ -117,7 +117,7 @@ async def submit_feedback(
 
 
 @router.get("/stats")
-async def get_recommendation_stats(
+def get_recommendation_stats(
     current_user = Depends(get_current_user_optional)
 ):
     """
@@ -165,7 +165,7 @@ async def get_recommendation_stats(
 
 
 @router.get("/chart-types")
-async def get_chart_types():
+def get_chart_types():
     """
     获取支持的图表类型列表
     """
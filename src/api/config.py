@@ -2,15 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, R
 from pydantic import BaseModel, model_validator
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import pandas as pd
-import io
 import json
 from datetime import datetime
 
 from src.core.database import get_db
-from src.models.config import DataFlow, FieldType, DataSnapshot
-from src.services.mingdao import MingDaoService
+from src.models.config import DataFlow, FieldType, DataSnapshot, SyncJob
+from src.services.mingdao import MingDaoError, MingDaoService
+from src.services.dataflow_sync import SYNC_INCREMENTAL, SYNC_MODES, mingdao_service_for, sync_dataflow
+from src.services.auth import is_admin
+from src.services.sync_scheduler import get_sync_scheduler, job_to_dict
+from src.services.file_import import SUPPORTED_EXTENSIONS, EmptyFileError, open_import, upload_extension
 from src.core.permissions import get_current_user, check_resource_access, filter_by_user_permission
+from src.core.snapshot_store import STORAGE_COLUMNAR, get_snapshot_store
 
 router = APIRouter(prefix="/api/dataflows", tags=["dataflows"])
 
@@ -23,6 +26,11 @@ class DataFlowCreate(BaseModel):
     is_private: bool = False
     private_api_url: Optional[str] = None
 
+class ScheduleSave(BaseModel):
+    cron: str
+    mode: str = SYNC_INCREMENTAL
+    is_enabled: bool = True
+
 class DataFlowUpdate(BaseModel):
     name: Optional[str] = None
     appkey: Optional[str] = None
@@ -67,7 +75,7 @@ class PaginationRequest(BaseModel):
     page_size: int = 10
 
 @router.get("", response_model=List[DataFlowResponse])
-async def get_dataflows(
+def get_dataflows(
     page: int = 1,
     page_size: int = 10,
     request: Request = None,
@@ -81,7 +89,7 @@ async def get_dataflows(
     return dataflows
 
 @router.get("/count")
-async def get_dataflows_count(
+def get_dataflows_count(
     request: Request = None,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
@@ -92,7 +100,7 @@ async def get_dataflows_count(
     return {"success": True, "data": {"count": count}}
 
 @router.get("/{dataflow_id}", response_model=DataFlowResponse)
-async def get_dataflow(
+def get_dataflow(
     dataflow_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -105,7 +113,7 @@ async def get_dataflow(
     return dataflow
 
 @router.post("", response_model=DataFlowResponse)
-async def create_dataflow(
+def create_dataflow(
     dataflow: DataFlowCreate,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -130,7 +138,7 @@ async def create_dataflow(
     return db_dataflow
 
 @router.put("/{dataflow_id}", response_model=DataFlowResponse)
-async def update_dataflow(
+def update_dataflow(
     dataflow_id: int,
     dataflow_update: DataFlowUpdate,
     request: Request = None,
@@ -160,7 +168,7 @@ async def update_dataflow(
     return dataflow
 
 @router.delete("/{dataflow_id}")
-async def delete_dataflow(
+def delete_dataflow(
     dataflow_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -176,7 +184,7 @@ async def delete_dataflow(
     return {"success": True, "message": "删除成功"}
 
 @router.post("/{dataflow_id}/test")
-async def test_dataflow_connection(
+def test_dataflow_connection(
     dataflow_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -197,8 +205,58 @@ async def test_dataflow_connection(
     else:
         raise HTTPException(status_code=400, detail="连接失败，请检查配置")
 
+@router.post("/{dataflow_id}/sync")
+def sync_dataflow_snapshot(
+    dataflow_id: int,
+    mode: str = SYNC_INCREMENTAL,
+    request: Request = None,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    dataflow = db.query(DataFlow).filter(DataFlow.id == dataflow_id).first()
+    if not dataflow:
+        raise HTTPException(status_code=404, detail="数据流不存在")
+    check_resource_access(user, dataflow.user_id, "数据流")
+    if dataflow.type == "local":
+        raise HTTPException(status_code=400, detail="本地数据流不支持同步")
+    if mode not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的同步模式: {mode}")
+
+    try:
+        result = sync_dataflow(db, dataflow, mode=mode, user_id=user.id)
+    except MingDaoError as e:
+        db.rollback()
+        raise HTTPException(status_code=502, detail=f"同步失败: {str(e)}")
+    return {"success": True, "data": result}
+
+@router.get("/{dataflow_id}/sync")
+def get_dataflow_sync_state(
+    dataflow_id: int,
+    request: Request = None,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    dataflow = db.query(DataFlow).filter(DataFlow.id == dataflow_id).first()
+    if not dataflow:
+        raise HTTPException(status_code=404, detail="数据流不存在")
+    check_resource_access(user, dataflow.user_id, "数据流")
+
+    state = dataflow.sync_state
+    if not state:
+        return {"success": True, "data": None}
+    return {
+        "success": True,
+        "data": {
+            "snapshot_id": state.snapshot_id,
+            "high_water_mark": state.high_water_mark,
+            "row_count": state.row_count,
+            "last_mode": state.last_mode,
+            "synced_at": state.synced_at.isoformat() if state.synced_at else None
+        }
+    }
+
 @router.get("/{dataflow_id}/fields")
-async def get_dataflow_fields(
+def get_dataflow_fields(
     dataflow_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -254,8 +312,130 @@ async def get_dataflow_fields(
         
         return {"success": True, "data": response_fields}
 
+def _get_mingdao_dataflow(db: Session, dataflow_id: int, user) -> DataFlow:
+    dataflow = db.query(DataFlow).filter(DataFlow.id == dataflow_id).first()
+    if not dataflow:
+        raise HTTPException(status_code=404, detail="数据流不存在")
+    check_resource_access(user, dataflow.user_id, "数据流")
+    if dataflow.type == "local":
+        raise HTTPException(status_code=400, detail="本地数据流不支持同步")
+    return dataflow
+
+def _schedule_dict(schedule) -> dict:
+    return {
+        "cron": schedule.cron,
+        "mode": schedule.mode,
+        "is_enabled": bool(schedule.is_enabled),
+        "next_run_at": schedule.next_run_at.isoformat() if schedule.next_run_at else None
+    }
+
+@router.get("/{dataflow_id}/schedule")
+def get_dataflow_schedule(
+    dataflow_id: int,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    dataflow = _get_mingdao_dataflow(db, dataflow_id, user)
+    schedule = dataflow.schedule
+    return {"success": True, "data": _schedule_dict(schedule) if schedule else None}
+
+@router.put("/{dataflow_id}/schedule")
+def save_dataflow_schedule(
+    dataflow_id: int,
+    schedule_data: ScheduleSave,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """设置数据流的定时刷新计划，由后台调度器按 cron 表达式生成新的快照版本"""
+    _get_mingdao_dataflow(db, dataflow_id, user)
+    try:
+        schedule = get_sync_scheduler().set_schedule(
+            db, dataflow_id, schedule_data.cron, schedule_data.mode, schedule_data.is_enabled
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": _schedule_dict(schedule)}
+
+@router.delete("/{dataflow_id}/schedule")
+def delete_dataflow_schedule(
+    dataflow_id: int,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    dataflow = _get_mingdao_dataflow(db, dataflow_id, user)
+    if dataflow.schedule:
+        db.delete(dataflow.schedule)
+        db.commit()
+    return {"success": True, "message": "刷新计划已删除"}
+
+@router.post("/{dataflow_id}/jobs")
+def create_dataflow_job(
+    dataflow_id: int,
+    mode: str = SYNC_INCREMENTAL,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """把数据流刷新加入后台任务队列并立即返回任务，通过任务接口查询进度"""
+    _get_mingdao_dataflow(db, dataflow_id, user)
+    if mode not in SYNC_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的同步模式: {mode}")
+    job = get_sync_scheduler().enqueue(db, dataflow_id, mode=mode, user_id=user.id)
+    return {"success": True, "data": job_to_dict(job)}
+
+@router.get("/{dataflow_id}/jobs")
+def list_dataflow_jobs(
+    dataflow_id: int,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    _get_mingdao_dataflow(db, dataflow_id, user)
+    jobs = get_sync_scheduler().list_jobs(db, dataflow_id, limit=max(1, min(limit, 100)))
+    return {"success": True, "data": [job_to_dict(job) for job in jobs]}
+
+@router.get("/{dataflow_id}/jobs/{job_id}")
+def get_dataflow_job(
+    dataflow_id: int,
+    job_id: int,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    _get_mingdao_dataflow(db, dataflow_id, user)
+    job = db.query(SyncJob).filter(SyncJob.id == job_id, SyncJob.data_flow_id == dataflow_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="刷新任务不存在")
+    return {"success": True, "data": job_to_dict(job)}
+
+@router.post("/{dataflow_id}/fields/refresh")
+def refresh_dataflow_fields(
+    dataflow_id: int,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """忽略工作表结构缓存，重新从明道云获取字段（仅管理员）"""
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="仅管理员可以强制刷新工作表结构")
+    dataflow = db.query(DataFlow).filter(DataFlow.id == dataflow_id).first()
+    if not dataflow:
+        raise HTTPException(status_code=404, detail="数据流不存在")
+    if dataflow.type == "local":
+        raise HTTPException(status_code=400, detail="本地数据流没有工作表结构")
+
+    result = mingdao_service_for(dataflow).get_fields(dataflow.worksheet_id, refresh=True)
+    if not result["success"]:
+        error_msg = result.get("error_msg", "获取字段失败")
+        raise HTTPException(status_code=400, detail=f"获取字段失败: {error_msg}")
+    return {
+        "success": True,
+        "data": {
+            "field_count": len(result["data"]["data"]),
+            "fetched_at": datetime.fromtimestamp(result["fetched_at"]).isoformat(),
+            "validated_at": datetime.fromtimestamp(result["validated_at"]).isoformat()
+        }
+    }
+
 @router.post("/{dataflow_id}/fields")
-async def save_dataflow_fields(
+def save_dataflow_fields(
     dataflow_id: int,
     field_config: FieldConfigSave,
     request: Request = None,
@@ -285,7 +465,7 @@ async def save_dataflow_fields(
 
 
 @router.post("/{dataflow_id}/import-fields")
-async def import_fields_from_file(
+def import_fields_from_file(
     dataflow_id: int,
     file: UploadFile = File(...),
     request: Request = None,
@@ -298,22 +478,17 @@ async def import_fields_from_file(
             raise HTTPException(status_code=404, detail="数据流不存在")
         check_resource_access(user, dataflow.user_id, "数据流")
         
-        contents = await file.read()
-        file_extension = file.filename.split('.')[-1].lower() if '.' in file.filename else ''
-        
-        df = None
-        if file_extension == 'csv':
-            df = pd.read_csv(io.BytesIO(contents))
-        elif file_extension in ['xlsx', 'xls']:
-            df = pd.read_excel(io.BytesIO(contents))
-        else:
+        file_extension = upload_extension(file.filename)
+        if file_extension not in SUPPORTED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="不支持的文件格式，仅支持CSV和Excel")
         
-        if df is None or df.empty:
+        try:
+            first_chunk, chunks = open_import(file.file, file_extension)
+        except EmptyFileError:
             raise HTTPException(status_code=400, detail="文件内容为空")
         
         fields = []
-        for col in df.columns:
+        for col in first_chunk.columns:
             fields.append({
                 "field_id": str(col),
                 "field_name": str(col),
@@ -321,18 +496,9 @@ async def import_fields_from_file(
                 "is_enabled": "true"
             })
         
-        rows = df.to_dict('records')
-        
-        def clean_nan(obj):
-            if isinstance(obj, float) and pd.isna(obj):
-                return None
-            elif isinstance(obj, dict):
-                return {k: clean_nan(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_nan(item) for item in obj]
-            return obj
-        
-        rows = [clean_nan(row) for row in rows]
+        # 数据逐块写入列式文件，不再整表转换为JSON
+        store = get_snapshot_store()
+        version, row_count = store.write_chunks(chunks)
         
         worksheet_id = f"local_{dataflow_id}_{int(datetime.now().timestamp())}"
         
@@ -349,6 +515,7 @@ async def import_fields_from_file(
             )
             db.add(field_type)
         
+        replaced = db.query(DataSnapshot.id, DataSnapshot.version).filter(DataSnapshot.data_flow_id == dataflow_id).all()
         db.query(DataSnapshot).filter(DataSnapshot.data_flow_id == dataflow_id).delete()
         
         snapshot_name = file.filename.replace(f'.{file_extension}', '')
@@ -358,11 +525,21 @@ async def import_fields_from_file(
             name=snapshot_name,
             worksheet_id=worksheet_id,
             fields=json.dumps(fields),
-            data=json.dumps(rows)
+            data="[]",
+            storage=STORAGE_COLUMNAR,
+            version=version,
+            row_count=row_count
         )
         db.add(db_snapshot)
         
-        db.commit()
+        try:
+            db.commit()
+        except Exception:
+            store.drop_version(version)
+            raise
+        for sid, replaced_version in replaced:
+            store.invalidate(sid)
+            store.retire_version(replaced_version)
         
         return {
             "success": True,
@@ -9,7 +9,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, inspect, text
 import json
 import uuid
 import os
@@ -24,6 +24,22 @@ ARCHIVE_DIR = "archives"
 
 Base.metadata.create_all(bind=engine)
 
+# conversation_sessions 表需要补充的列（旧数据库通过 ALTER TABLE 迁移）
+SESSION_TABLE_COLUMNS = {
+    "last_prompt_tokens": "INTEGER DEFAULT 0",
+}
+
+
+def _ensure_session_columns():
+    columns = {column["name"] for column in inspect(engine).get_columns("conversation_sessions")}
+    with engine.begin() as conn:
+        for name, ddl in SESSION_TABLE_COLUMNS.items():
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE conversation_sessions ADD COLUMN {name} {ddl}"))
+
+
+_ensure_session_columns()
+
 
 class CreateSessionRequest(BaseModel):
     title: Optional[str] = Field(None, description="对话标题")
@@ -70,7 +86,7 @@ def get_db():
 
 
 @router.post("/create", response_model=SessionResponse)
-async def create_session(
+def create_session(
     request: CreateSessionRequest = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -104,7 +120,7 @@ async def create_session(
 
 
 @router.get("/list", response_model=List[SessionResponse])
-async def list_sessions(
+def list_sessions(
     limit: int = 20,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -137,7 +153,7 @@ async def list_sessions(
 
 
 @router.get("/search")
-async def search_conversations(
+def search_conversations(
     q: str = "",
     limit: int = 20,
     db: Session = Depends(get_db),
@@ -194,7 +210,7 @@ async def search_conversations(
 
 
 @router.get("/{session_id}", response_model=SessionDetailResponse)
-async def get_session(
+def get_session(
     session_id: str,
     db: Session = Depends(get_db)
 ):
@@ -242,7 +258,7 @@ async def get_session(
 
 
 @router.post("/{session_id}/archive")
-async def archive_session(
+def archive_session(
     session_id: str,
     db: Session = Depends(get_db)
 ):
@@ -261,7 +277,7 @@ async def archive_session(
 
 
 @router.delete("/{session_id}")
-async def delete_session(
+def delete_session(
     session_id: str,
     db: Session = Depends(get_db)
 ):
@@ -283,7 +299,7 @@ async def delete_session(
 
 
 @router.post("/{session_id}/messages")
-async def add_message(
+def add_message(
     session_id: str,
     request: AddMessageRequest,
     db: Session = Depends(get_db)
@@ -327,7 +343,7 @@ async def add_message(
 
 
 @router.post("/{session_id}/feedback")
-async def rate_message(
+def rate_message(
     session_id: str,
     message_id: int,
     rating: int,
@@ -348,7 +364,7 @@ async def rate_message(
 
 
 @router.get("/active/default")
-async def get_default_active_session(
+def get_default_active_session(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
 ):
@@ -375,7 +391,7 @@ async def get_default_active_session(
 
 
 @router.get("/{session_id}/export")
-async def export_session_markdown(
+def export_session_markdown(
     session_id: str,
     db: Session = Depends(get_db)
 ):
@@ -446,7 +462,7 @@ async def export_session_markdown(
 
 
 @router.get("/{session_id}/download")
-async def download_session_markdown(
+def download_session_markdown(
     session_id: str,
     db: Session = Depends(get_db)
 ):
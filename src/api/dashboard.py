@@ -22,7 +22,7 @@ class DashboardUpdate(BaseModel):
     config: Optional[dict] = None
 
 @router.get("")
-async def get_dashboards(
+def get_dashboards(
     page: int = 1,
     page_size: int = 100,
     request: Request = None,
@@ -48,7 +48,7 @@ async def get_dashboards(
     return result
 
 @router.get("/count")
-async def get_dashboards_count(
+def get_dashboards_count(
     request: Request = None,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
@@ -59,7 +59,7 @@ async def get_dashboards_count(
     return {"success": True, "data": {"count": count}}
 
 @router.get("/{dashboard_id}")
-async def get_dashboard(
+def get_dashboard(
     dashboard_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -84,7 +84,7 @@ async def get_dashboard(
     }
 
 @router.post("")
-async def create_dashboard(
+def create_dashboard(
     dashboard: DashboardCreate,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -115,7 +115,7 @@ async def create_dashboard(
     }
 
 @router.put("/{dashboard_id}")
-async def update_dashboard(
+def update_dashboard(
     dashboard_id: int,
     dashboard: DashboardUpdate,
     request: Request = None,
@@ -153,7 +153,7 @@ async def update_dashboard(
     }
 
 @router.delete("/{dashboard_id}")
-async def delete_dashboard(
+def delete_dashboard(
     dashboard_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 from typing import List, Optional
 import json
-import pandas as pd
-import io
 from datetime import datetime
 
 from src.core.database import get_db
 from src.models.config import DataFlow, FieldType, DataSnapshot
 from src.services.mingdao import MingDaoService
 from src.core.permissions import get_current_user, check_resource_access, filter_by_user_permission
+from src.core.snapshot_store import get_snapshot_store, dataframe_to_records, STORAGE_COLUMNAR
+from src.core.frame_cache import get_frame_cache
+from src.services.file_import import SUPPORTED_EXTENSIONS, EmptyFileError, open_import, upload_extension
 
 router = APIRouter(prefix="/api/data", tags=["data"])
 
@@ -42,7 +43,7 @@ class DataSnapshotResponse(BaseModel):
         from_attributes = True
 
 @router.get("/{dataflow_id}/fields")
-async def get_fields(
+def get_fields(
     dataflow_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -63,7 +64,7 @@ async def get_fields(
         raise HTTPException(status_code=500, detail=f"获取字段失败: {str(e)}")
 
 @router.get("/{dataflow_id}/enabled-fields")
-async def get_enabled_fields(
+def get_enabled_fields(
     dataflow_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -90,7 +91,7 @@ async def get_enabled_fields(
     return {"success": True, "data": response_fields}
 
 @router.post("/query")
-async def query_data(
+def query_data(
     request: DataQueryRequest,
     fastapi_request: Request = None,
     db: Session = Depends(get_db),
@@ -149,7 +150,7 @@ async def query_data(
         raise HTTPException(status_code=500, detail=f"查询数据失败: {str(e)}")
 
 @router.get("/snapshots")
-async def get_all_snapshots(
+def get_all_snapshots(
     page: int = 1,
     page_size: int = 10,
     request: Request = None,
@@ -159,7 +160,10 @@ async def get_all_snapshots(
     offset = (page - 1) * page_size
     query = db.query(DataSnapshot)
     query = filter_by_user_permission(query, user, DataSnapshot.user_id)
-    snapshots = query.order_by(DataSnapshot.created_at.desc()).offset(offset).limit(page_size).all()
+    snapshots = query.options(defer(DataSnapshot.data)).order_by(
+        DataSnapshot.created_at.desc()
+    ).offset(offset).limit(page_size).all()
+    row_counts = get_snapshot_store().row_counts([s.id for s in snapshots])
     
     return {
         "success": True,
@@ -169,6 +173,7 @@ async def get_all_snapshots(
                 "data_flow_id": s.data_flow_id,
                 "name": s.name,
                 "worksheet_id": s.worksheet_id,
+                "row_count": row_counts.get(s.id, 0),
                 "created_at": s.created_at.isoformat() if s.created_at else ""
             }
             for s in snapshots
@@ -176,7 +181,7 @@ async def get_all_snapshots(
     }
 
 @router.get("/snapshots/count")
-async def get_snapshots_count(
+def get_snapshots_count(
     request: Request = None,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
@@ -186,8 +191,15 @@ async def get_snapshots_count(
     count = query.count()
     return {"success": True, "data": {"count": count}}
 
+@router.get("/snapshots/cache-stats")
+def get_snapshot_cache_stats(
+    request: Request = None,
+    user = Depends(get_current_user)
+):
+    return {"success": True, "data": get_frame_cache().stats()}
+
 @router.get("/{dataflow_id}/snapshots")
-async def get_snapshots(
+def get_snapshots(
     dataflow_id: int,
     page: int = 1,
     page_size: int = 10,
@@ -201,9 +213,10 @@ async def get_snapshots(
     check_resource_access(user, dataflow.user_id, "数据流")
     
     offset = (page - 1) * page_size
-    snapshots = db.query(DataSnapshot).filter(
+    snapshots = db.query(DataSnapshot).options(defer(DataSnapshot.data)).filter(
         DataSnapshot.data_flow_id == dataflow_id
     ).order_by(DataSnapshot.created_at.desc()).offset(offset).limit(page_size).all()
+    row_counts = get_snapshot_store().row_counts([s.id for s in snapshots])
     
     return {
         "success": True,
@@ -212,6 +225,7 @@ async def get_snapshots(
                 "id": s.id,
                 "name": s.name,
                 "worksheet_id": s.worksheet_id,
+                "row_count": row_counts.get(s.id, 0),
                 "created_at": s.created_at.isoformat() if s.created_at else ""
             }
             for s in snapshots
@@ -219,7 +233,7 @@ async def get_snapshots(
     }
 
 @router.post("/snapshots")
-async def create_snapshot(
+def create_snapshot(
     snapshot: DataSnapshotCreate,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -235,16 +249,32 @@ async def create_snapshot(
     else:
         worksheet_id = f"aggregate_{int(datetime.now().timestamp())}"
     
+    try:
+        rows = json.loads(snapshot.data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="快照数据格式错误")
+    
+    store = get_snapshot_store()
+    version, row_count = store.write_columns(rows)
+    
     db_snapshot = DataSnapshot(
         user_id=user.id,
         data_flow_id=snapshot.dataflow_id,
         name=snapshot.name,
         worksheet_id=worksheet_id,
         fields=snapshot.fields,
-        data=snapshot.data
+        data="[]",
+        storage=STORAGE_COLUMNAR,
+        version=version,
+        row_count=row_count
     )
-    db.add(db_snapshot)
-    db.commit()
+    try:
+        db.add(db_snapshot)
+        db.commit()
+    except Exception:
+        db.rollback()
+        store.drop_version(version)
+        raise
     db.refresh(db_snapshot)
     
     return {
@@ -257,20 +287,21 @@ async def create_snapshot(
     }
 
 @router.get("/snapshots/{snapshot_id}")
-async def get_snapshot(
+def get_snapshot(
     snapshot_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
-    snapshot = db.query(DataSnapshot).filter(DataSnapshot.id == snapshot_id).first()
+    snapshot = db.query(DataSnapshot).options(defer(DataSnapshot.data)).filter(
+        DataSnapshot.id == snapshot_id
+    ).first()
     if not snapshot:
         raise HTTPException(status_code=404, detail="快照不存在")
     check_resource_access(user, snapshot.user_id, "快照")
     
     try:
         fields = json.loads(snapshot.fields)
-        data = json.loads(snapshot.data)
         
         if snapshot.data_flow_id > 0:
             saved_fields = db.query(FieldType).filter(
@@ -291,13 +322,10 @@ async def get_snapshot(
         
         filtered_fields = [f for f in fields if f.get("is_enabled", "true") == "true"]
         
-        filtered_data = []
-        for row in data:
-            filtered_row = {k: v for k, v in row.items() if k in enabled_field_ids}
-            filtered_data.append(filtered_row)
+        df = get_snapshot_store().read_frame(snapshot.id, [f for f in enabled_field_ids if f])
         
         fields = filtered_fields
-        data = filtered_data
+        data = dataframe_to_records(df)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="数据解析失败")
     
@@ -309,8 +337,24 @@ async def get_snapshot(
         }
     }
 
+@router.get("/snapshots/{snapshot_id}/metadata")
+def get_snapshot_metadata(
+    snapshot_id: int,
+    request: Request = None,
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    snapshot = db.query(DataSnapshot).options(defer(DataSnapshot.data)).filter(
+        DataSnapshot.id == snapshot_id
+    ).first()
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="快照不存在")
+    check_resource_access(user, snapshot.user_id, "快照")
+    
+    return {"success": True, "data": get_snapshot_store().get_metadata(snapshot.id)}
+
 @router.delete("/snapshots/{snapshot_id}")
-async def delete_snapshot(
+def delete_snapshot(
     snapshot_id: int,
     request: Request = None,
     db: Session = Depends(get_db),
@@ -321,13 +365,17 @@ async def delete_snapshot(
         raise HTTPException(status_code=404, detail="快照不存在")
     check_resource_access(user, snapshot.user_id, "快照")
     
+    version = snapshot.version if snapshot.storage == STORAGE_COLUMNAR else None
     db.delete(snapshot)
     db.commit()
+    store = get_snapshot_store()
+    store.invalidate(snapshot_id)
+    store.retire_version(version)
     
     return {"success": True, "message": "快照删除成功"}
 
 @router.post("/import/local")
-async def import_local_file(
+def import_local_file(
     file: UploadFile = File(...),
     dataflow_id: int = Form(...),
     name: Optional[str] = Form(None),
@@ -341,40 +389,27 @@ async def import_local_file(
             raise HTTPException(status_code=404, detail="数据流不存在")
         check_resource_access(user, dataflow.user_id, "数据流")
         
-        contents = await file.read()
-        file_extension = file.filename.split('.')[-1].lower() if '.' in file.filename else ''
-        
-        df = None
-        if file_extension == 'csv':
-            df = pd.read_csv(io.BytesIO(contents))
-        elif file_extension in ['xlsx', 'xls']:
-            df = pd.read_excel(io.BytesIO(contents))
-        else:
+        file_extension = upload_extension(file.filename)
+        if file_extension not in SUPPORTED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="不支持的文件格式，仅支持CSV和Excel")
         
-        if df is None or df.empty:
+        # 分块解析并逐块写入列式文件，第一个数据块用于生成字段定义与预览
+        try:
+            first_chunk, chunks = open_import(file.file, file_extension)
+        except EmptyFileError:
             raise HTTPException(status_code=400, detail="文件内容为空")
         
         fields = []
-        for col in df.columns:
+        for col in first_chunk.columns:
             fields.append({
                 "field_id": str(col),
                 "field_name": str(col),
                 "data_type": "string"
             })
+        preview = dataframe_to_records(first_chunk.head(100))
         
-        rows = df.to_dict('records')
-        
-        def clean_nan(obj):
-            if isinstance(obj, float) and pd.isna(obj):
-                return None
-            elif isinstance(obj, dict):
-                return {k: clean_nan(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [clean_nan(item) for item in obj]
-            return obj
-        
-        rows = [clean_nan(row) for row in rows]
+        store = get_snapshot_store()
+        version, row_count = store.write_chunks(chunks)
         
         snapshot_name = name if name else file.filename
         worksheet_id = f"local_{dataflow_id}_{int(datetime.now().timestamp())}"
@@ -413,10 +448,18 @@ async def import_local_file(
             name=snapshot_name,
             worksheet_id=worksheet_id,
             fields=json.dumps(fields),
-            data=json.dumps(rows)
+            data="[]",
+            storage=STORAGE_COLUMNAR,
+            version=version,
+            row_count=row_count
         )
-        db.add(db_snapshot)
-        db.commit()
+        try:
+            db.add(db_snapshot)
+            db.commit()
+        except Exception:
+            db.rollback()
+            store.drop_version(version)
+            raise
         db.refresh(db_snapshot)
         
         return {
@@ -426,7 +469,7 @@ async def import_local_file(
                 "id": db_snapshot.id,
                 "name": db_snapshot.name,
                 "fields": fields,
-                "rows": rows[:100]
+                "rows": preview
             }
         }
     except HTTPException:
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
@@ -11,10 +12,19 @@ from datetime import datetime
 from src.core.database_async import get_db
 from src.models.config_sqlmodel import DataFlow, FieldType, DataSnapshot
 from src.services.mingdao import MingDaoService
+from src.services.mingdao_client import get_mingdao_client
 from src.core.permissions_async import get_current_user, check_resource_access, filter_by_user_permission
+from src.core.snapshot_store import get_snapshot_store, dataframe_to_records, STORAGE_COLUMNAR
 
 router = APIRouter(prefix="/api/async/data", tags=["async-data"])
 
+def _snapshot_data_json(snapshot: DataSnapshot) -> str:
+    """返回快照数据的JSON字符串（列式存储的快照从列文件还原）"""
+    if snapshot.storage != STORAGE_COLUMNAR:
+        return snapshot.data
+    df = get_snapshot_store().read_frame(snapshot.id)
+    return json.dumps(dataframe_to_records(df), ensure_ascii=False, default=str)
+
 class FieldInfo(BaseModel):
     id: str
     name: str
@@ -61,7 +71,8 @@ async def get_fields(
     base_url = dataflow.private_api_url if is_private_bool else "https://api.mingdao.com"
     service = MingDaoService(dataflow.appkey, dataflow.sign, base_url)
     try:
-        result = service.get_fields(dataflow.worksheet_id)
+        # 工作表结构缓存读取本地数据库，未命中时才请求明道云
+        result = await run_in_threadpool(service.get_fields, dataflow.worksheet_id)
         return {"success": True, "data": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取字段失败: {str(e)}")
@@ -117,10 +128,10 @@ async def query_data(
     
     is_private_bool = bool(dataflow.is_private)
     base_url = dataflow.private_api_url if is_private_bool else "https://api.mingdao.com"
-    service = MingDaoService(dataflow.appkey, dataflow.sign, base_url)
+    client = get_mingdao_client(dataflow.appkey, dataflow.sign, base_url)
     
     try:
-        all_data = service.get_data(
+        all_data = await client.get_data(
             dataflow.worksheet_id,
             page_index=query_req.page_index,
             page_size=query_req.page_size
@@ -169,16 +180,32 @@ async def create_snapshot(
         raise HTTPException(status_code=404, detail="数据流不存在")
     check_resource_access(user, dataflow.user_id, "数据流")
     
+    try:
+        rows = json.loads(snapshot.data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="快照数据格式错误")
+    
+    store = get_snapshot_store()
+    version, row_count = store.write_columns(rows)
+    
     db_snapshot = DataSnapshot(
         user_id=user.id,
         data_flow_id=snapshot.dataflow_id,
         name=snapshot.name,
         worksheet_id=dataflow.worksheet_id,
         fields=snapshot.fields,
-        data=snapshot.data
+        data="[]",
+        storage=STORAGE_COLUMNAR,
+        version=version,
+        row_count=row_count
     )
-    db.add(db_snapshot)
-    await db.commit()
+    try:
+        db.add(db_snapshot)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        store.drop_version(version)
+        raise
     await db.refresh(db_snapshot)
     
     return {
@@ -215,7 +242,7 @@ async def get_snapshots(
                 "name": s.name,
                 "worksheet_id": s.worksheet_id,
                 "fields": s.fields,
-                "data": s.data,
+                "data": _snapshot_data_json(s),
                 "created_at": s.created_at.isoformat() if s.created_at else ""
             }
             for s in snapshots
@@ -245,7 +272,7 @@ async def get_snapshot(
             "name": snapshot.name,
             "worksheet_id": snapshot.worksheet_id,
             "fields": snapshot.fields,
-            "data": snapshot.data,
+            "data": _snapshot_data_json(snapshot),
             "created_at": snapshot.created_at.isoformat() if snapshot.created_at else ""
         }
     }
@@ -265,8 +292,12 @@ async def delete_snapshot(
         raise HTTPException(status_code=404, detail="快照不存在")
     check_resource_access(user, snapshot.user_id, "快照")
     
+    version = snapshot.version if snapshot.storage == STORAGE_COLUMNAR else None
     await db.delete(snapshot)
     await db.commit()
+    store = get_snapshot_store()
+    store.invalidate(snapshot_id)
+    store.retire_version(version)
     
     return {"success": True, "message": "快照已删除"}
 
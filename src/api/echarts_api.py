@@ -8,8 +8,7 @@ from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import json
 
-from src.core.database import SessionLocal
-from src.models.config import DataSnapshot
+from src.core.snapshot_store import get_snapshot_store, referenced_fields
 
 router = APIRouter(prefix="/api/echarts", tags=["echarts"])
 
@@ -20,19 +19,9 @@ class ChartConfigRequest(BaseModel):
     config: Dict[str, Any]
 
 
-def get_snapshot_data(snapshot_id: int) -> List[Dict]:
-    """获取快照数据"""
-    db = SessionLocal()
-    try:
-        snapshot = db.query(DataSnapshot).filter(DataSnapshot.id == snapshot_id).first()
-        if not snapshot:
-            return []
-        
-        import json
-        data = json.loads(snapshot.data) if isinstance(snapshot.data, str) else snapshot.data
-        return data
-    finally:
-        db.close()
+def get_snapshot_data(snapshot_id: int, columns: Optional[List[str]] = None) -> Optional["pd.DataFrame"]:
+    """获取快照数据，columns 指定时只读取这些列"""
+    return get_snapshot_store().read_frame(snapshot_id, columns or None)
 
 
 def generate_bar_config(data: List[Dict], config: Dict) -> Dict:
@@ -426,11 +415,11 @@ CHART_GENERATORS = {
 
 
 @router.post("/config")
-async def generate_chart_config(request: ChartConfigRequest):
+def generate_chart_config(request: ChartConfigRequest):
     """生成ECharts图表配置"""
-    data = get_snapshot_data(request.snapshot_id)
+    data = get_snapshot_data(request.snapshot_id, referenced_fields(request.config))
     
-    if not data:
+    if data is None or len(data) == 0:
         raise HTTPException(status_code=404, detail="快照不存在或没有数据")
     
     generator = CHART_GENERATORS.get(request.chart_type)
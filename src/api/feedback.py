@@ -67,7 +67,7 @@ def get_db():
 
 
 @router.post("/submit", response_model=FeedbackResponse)
-async def submit_feedback(
+def submit_feedback(
     feedback: FeedbackCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -195,7 +195,7 @@ def _update_daily_analytics(db: Session, feedback: FeedbackCreate):
 
 
 @router.get("/memories", response_model=List[Dict])
-async def get_memories(
+def get_memories(
     limit: int = 20,
     memory_type: Optional[str] = None,
     db: Session = Depends(get_db)
@@ -214,7 +214,7 @@ async def get_memories(
 
 
 @router.post("/memories", response_model=Dict)
-async def create_memory(
+def create_memory(
     memory: MemoryCreate,
     db: Session = Depends(get_db)
 ):
@@ -234,7 +234,7 @@ async def create_memory(
 
 
 @router.get("/stats", response_model=FeedbackStats)
-async def get_feedback_stats(
+def get_feedback_stats(
     days: int = 7,
     db: Session = Depends(get_db)
 ):
@@ -265,7 +265,7 @@ async def get_feedback_stats(
 
 
 @router.get("/history")
-async def get_feedback_history(
+def get_feedback_history(
     limit: int = 20,
     rating: Optional[int] = None,
     db: Session = Depends(get_db)
@@ -281,7 +281,7 @@ async def get_feedback_history(
 
 
 @router.get("/context/{session_id}")
-async def get_session_context(
+def get_session_context(
     session_id: str,
     db: Session = Depends(get_db)
 ):
@@ -305,7 +305,7 @@ async def get_session_context(
 
 
 @router.post("/optimize")
-async def optimize_memories(db: Session = Depends(get_db)):
+def optimize_memories(db: Session = Depends(get_db)):
     memories = db.query(FeedbackMemory).filter(
         FeedbackMemory.active == True
     ).all()
@@ -349,7 +349,7 @@ class PreferenceCreate(BaseModel):
 
 
 @router.post("/memory/preferences")
-async def add_user_preference(
+def add_user_preference(
     preference: PreferenceCreate,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -374,7 +374,7 @@ async def add_user_preference(
 
 
 @router.get("/memory/preferences")
-async def get_user_preferences(
+def get_user_preferences(
     limit: int = 10,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -387,7 +387,7 @@ async def get_user_preferences(
 
 
 @router.get("/memory/success-cases")
-async def get_success_cases(
+def get_success_cases(
     query: Optional[str] = None,
     limit: int = 10,
     db: Session = Depends(get_db),
@@ -409,7 +409,7 @@ async def get_success_cases(
 
 
 @router.get("/memory/failure-lessons")
-async def get_failure_lessons(
+def get_failure_lessons(
     query: Optional[str] = None,
     limit: int = 10,
     db: Session = Depends(get_db),
@@ -431,7 +431,7 @@ async def get_failure_lessons(
 
 
 @router.get("/memory/stats")
-async def get_memory_stats(
+def get_memory_stats(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
 ):
@@ -458,7 +458,7 @@ async def get_memory_stats(
 
 
 @router.delete("/memory/preferences/{preference_id}")
-async def delete_preference(
+def delete_preference(
     preference_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -485,7 +485,7 @@ async def delete_preference(
 
 
 @router.delete("/memory/success-cases/{case_id}")
-async def delete_success_case(
+def delete_success_case(
     case_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -510,7 +510,7 @@ async def delete_success_case(
 
 
 @router.delete("/memory/failure-lessons/{lesson_id}")
-async def delete_failure_lesson(
+def delete_failure_lesson(
     lesson_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user_optional)
@@ -4,6 +4,7 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -14,6 +15,7 @@ from src.core.database import SessionLocal, Base, engine
 from src.models.settings import SystemSettings, AIProvider
 from src.api.auth import get_current_user_optional
 from src.core.crypto import encrypt_value, decrypt_value, is_encrypted
+from src.ai.llm_client import invalidate_llm_settings
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
@@ -81,6 +83,7 @@ def _get_or_create_settings(db: Session) -> SystemSettings:
         db.add(settings)
         db.commit()
         db.refresh(settings)
+        invalidate_llm_settings()
     return settings
 
 
@@ -159,14 +162,14 @@ def _init_providers(db: Session):
 
 
 @router.get("", response_model=SettingsResponse)
-async def get_settings(db: Session = Depends(get_db)):
+def get_settings(db: Session = Depends(get_db)):
     _init_providers(db)
     settings = _get_or_create_settings(db)
     return settings.to_dict()
 
 
 @router.put("/ui", response_model=SettingsResponse)
-async def update_ui_settings(
+def update_ui_settings(
     request: UISettingsRequest,
     db: Session = Depends(get_db)
 ):
@@ -189,7 +192,7 @@ async def update_ui_settings(
 
 
 @router.put("/ai", response_model=SettingsResponse)
-async def update_ai_settings(
+def update_ai_settings(
     request: AISettingsRequest,
     db: Session = Depends(get_db)
 ):
@@ -222,12 +225,13 @@ async def update_ai_settings(
     settings.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(settings)
+    invalidate_llm_settings()
     
     return settings.to_dict()
 
 
 @router.get("/providers", response_model=List[ProviderResponse])
-async def get_providers(db: Session = Depends(get_db)):
+def get_providers(db: Session = Depends(get_db)):
     _init_providers(db)
     
     providers = db.query(AIProvider).all()
@@ -249,7 +253,7 @@ async def get_providers(db: Session = Depends(get_db)):
 
 
 @router.get("/providers/{provider_name}/models", response_model=List[ProviderModel])
-async def get_provider_models(
+def get_provider_models(
     provider_name: str,
     db: Session = Depends(get_db)
 ):
@@ -262,6 +266,19 @@ async def get_provider_models(
     return [ProviderModel(**m) for m in models]
 
 
+def _load_provider_api_key(db: Session, provider_name: str) -> Optional[str]:
+    """校验提供商存在并返回解密后的API密钥，未设置时返回None"""
+    settings = _get_or_create_settings(db)
+    
+    provider = db.query(AIProvider).filter(AIProvider.name == provider_name).first()
+    if not provider:
+        raise HTTPException(status_code=404, detail="提供商不存在")
+    
+    if not settings.ai_api_key:
+        return None
+    return decrypt_value(settings.ai_api_key) if is_encrypted(settings.ai_api_key) else settings.ai_api_key
+
+
 @router.get("/providers/{provider_name}/available-models")
 async def get_available_models(
     provider_name: str,
@@ -270,21 +287,16 @@ async def get_available_models(
     """动态获取用户账号下可用的模型列表"""
     import httpx
     
-    settings = _get_or_create_settings(db)
-    
-    provider = db.query(AIProvider).filter(AIProvider.name == provider_name).first()
-    if not provider:
-        raise HTTPException(status_code=404, detail="提供商不存在")
+    # 数据库查询在线程池中执行，请求模型列表时不阻塞事件循环
+    api_key = await run_in_threadpool(_load_provider_api_key, db, provider_name)
     
-    if not settings.ai_api_key:
+    if not api_key:
         return {
             "success": False,
             "message": "请先设置API密钥",
             "models": []
         }
     
-    api_key = decrypt_value(settings.ai_api_key) if is_encrypted(settings.ai_api_key) else settings.ai_api_key
-    
     try:
         async with httpx.AsyncClient() as client:
             if provider_name == "siliconflow":
@@ -394,7 +406,7 @@ async def get_available_models(
 
 
 @router.get("/styles", response_model=List[Dict])
-async def get_ui_styles():
+def get_ui_styles():
     """获取可用的UI风格列表"""
     return [
         {
@@ -421,7 +433,7 @@ async def get_ui_styles():
 
 
 @router.get("/colors", response_model=List[Dict])
-async def get_color_palettes():
+def get_color_palettes():
     """获取可用的颜色方案"""
     return [
         {"id": "#3b82f6", "name": "蓝色", "description": "专业、可信赖"},
@@ -38,7 +38,7 @@ def text_to_embedding(text: str, model: str = "sentence-transformers/all-MiniLM-
         raise HTTPException(status_code=500, detail=f"生成embedding失败: {str(e)}")
 
 @router.post("/embeddings")
-async def create_embeddings(
+def create_embeddings(
     request: VectorConvertRequest,
     current_user = Depends(get_current_user)
 ):
@@ -53,7 +53,7 @@ async def create_embeddings(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/add")
-async def add_vectors(
+def add_vectors(
     request: VectorAddRequest,
     vector_store: VectorStore = Depends(get_vector_store),
     current_user = Depends(get_current_user)
@@ -72,7 +72,7 @@ async def add_vectors(
         raise HTTPException(status_code=500, detail="添加向量失败")
 
 @router.post("/query")
-async def query_vectors(
+def query_vectors(
     request: VectorQueryRequest,
     vector_store: VectorStore = Depends(get_vector_store),
     current_user = Depends(get_current_user)
@@ -90,7 +90,7 @@ async def query_vectors(
         raise HTTPException(status_code=500, detail=result.get("error", "查询失败"))
 
 @router.get("/collections")
-async def list_collections(
+def list_collections(
     vector_store: VectorStore = Depends(get_vector_store),
     current_user = Depends(get_current_user)
 ):
@@ -106,7 +106,7 @@ async def list_collections(
     }
 
 @router.delete("/collections/{collection_name}")
-async def delete_collection(
+def delete_collection(
     collection_name: str,
     vector_store: VectorStore = Depends(get_vector_store),
     current_user = Depends(get_current_user)
@@ -118,7 +118,7 @@ async def delete_collection(
         raise HTTPException(status_code=500, detail="删除集合失败")
 
 @router.get("/collections/{collection_name}/count")
-async def get_collection_count(
+def get_collection_count(
     collection_name: str,
     vector_store: VectorStore = Depends(get_vector_store),
     current_user = Depends(get_current_user)
@@ -7,8 +7,86 @@ CONFIG_DIR.mkdir(exist_ok=True)
 
 DATABASE_URL = f"sqlite:///{CONFIG_DIR / 'pb_bi.db'}"
 
+# SQLite连接参数：WAL日志、同步级别、每个连接的页缓存（KB）、内存映射大小（字节）与锁等待超时（毫秒）
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(32 * 1024)))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+# 每个数据库保留的空闲只读连接数（写连接每个数据库一个）
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+
 SECRET_KEY = os.getenv("SECRET_KEY", "pb-bi-secret-key-change-in-production")
 
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")
 LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.moonshot.cn/v1")
 LLM_MODEL = os.getenv("LLM_MODEL", "moonshot-v1-8k")
+
+# 快照数据缓存的内存预算（字节），默认256MB
+SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv("SNAPSHOT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# 快照被替换或删除后旧版本列文件的保留时间（秒），保证正在读取旧版本的请求可以读完
+SNAPSHOT_VERSION_GRACE = float(os.getenv("SNAPSHOT_VERSION_GRACE", "300"))
+# 快照字段索引（字段校验用）最多缓存的快照数
+FIELD_INDEX_CACHE_MAX_ENTRIES = int(os.getenv("FIELD_INDEX_CACHE_MAX_ENTRIES", "1024"))
+
+# 明道云全量同步：每页行数、并发获取分页的线程数与单次请求超时（秒）
+MINGDAO_SYNC_PAGE_SIZE = int(os.getenv("MINGDAO_SYNC_PAGE_SIZE", "1000"))
+MINGDAO_SYNC_WORKERS = int(os.getenv("MINGDAO_SYNC_WORKERS", "4"))
+MINGDAO_REQUEST_TIMEOUT = float(os.getenv("MINGDAO_REQUEST_TIMEOUT", "30"))
+# 明道云限流或服务端错误时的最大重试次数，以及指数退避的初始与最大等待时间（秒）
+MINGDAO_MAX_RETRIES = int(os.getenv("MINGDAO_MAX_RETRIES", "5"))
+MINGDAO_RETRY_BASE_DELAY = float(os.getenv("MINGDAO_RETRY_BASE_DELAY", "1"))
+MINGDAO_RETRY_MAX_DELAY = float(os.getenv("MINGDAO_RETRY_MAX_DELAY", "30"))
+
+# 明道云HTTP客户端：每个 (appkey, base_url) 每秒请求数与突发上限（令牌桶，0表示不限），每个主机的最大并发请求数
+MINGDAO_RATE_LIMIT = float(os.getenv("MINGDAO_RATE_LIMIT", "10"))
+MINGDAO_RATE_BURST = int(os.getenv("MINGDAO_RATE_BURST", "20"))
+MINGDAO_HOST_CONCURRENCY = int(os.getenv("MINGDAO_HOST_CONCURRENCY", "8"))
+# 明道云熔断器：同一主机连续失败次数达到阈值后暂停请求的时间（秒）
+MINGDAO_BREAKER_THRESHOLD = int(os.getenv("MINGDAO_BREAKER_THRESHOLD", "5"))
+MINGDAO_BREAKER_COOLDOWN = float(os.getenv("MINGDAO_BREAKER_COOLDOWN", "30"))
+
+# 明道云工作表结构缓存的有效期（秒），过期后先返回缓存再在后台重新验证
+MINGDAO_SCHEMA_TTL = float(os.getenv("MINGDAO_SCHEMA_TTL", "600"))
+
+# 数据流定时刷新：是否启动调度器、同时执行的刷新任务数、检查到期计划与待执行任务的间隔（秒）
+SYNC_SCHEDULER_ENABLED = os.getenv("SYNC_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "2"))
+SYNC_POLL_INTERVAL = float(os.getenv("SYNC_POLL_INTERVAL", "15"))
+# 刷新任务的最大尝试次数与重试间隔（秒，每次失败后翻倍）
+SYNC_JOB_MAX_ATTEMPTS = int(os.getenv("SYNC_JOB_MAX_ATTEMPTS", "3"))
+SYNC_JOB_RETRY_DELAY = float(os.getenv("SYNC_JOB_RETRY_DELAY", "60"))
+
+# 本地文件导入时每次解析并写入快照的行数，导入的内存占用与该值而不是文件大小成正比
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "50000"))
+
+# MCP同步工具线程池大小与默认超时（秒，0表示不限）
+MCP_TOOL_WORKERS = int(os.getenv("MCP_TOOL_WORKERS", "8"))
+MCP_TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "120"))
+# 图表工具共享matplotlib全局状态，同一时间最多渲染的图表数
+MCP_CHART_CONCURRENCY = int(os.getenv("MCP_CHART_CONCURRENCY", "1"))
+# 同一轮对话中多个工具调用的最大并发数
+AGENT_TOOL_CONCURRENCY = int(os.getenv("AGENT_TOOL_CONCURRENCY", "4"))
+
+# LLM HTTP客户端连接池（按base_url共享长连接）
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+# AI会话注册表：最多保留的会话数、空闲过期时间（秒，0表示不过期）与对话历史总字节上限
+AGENT_MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "200"))
+AGENT_IDLE_TTL = float(os.getenv("AGENT_IDLE_TTL", "3600"))
+AGENT_MAX_HISTORY_BYTES = int(os.getenv("AGENT_MAX_HISTORY_BYTES", str(64 * 1024 * 1024)))
+
+# 对话上下文：模型上下文窗口（token，0表示按模型名称推断）、工具结果保留的行数、较早消息的最大字符数
+CONTEXT_WINDOW = int(os.getenv("CONTEXT_WINDOW", "0"))
+CONTEXT_TOOL_RESULT_ROWS = int(os.getenv("CONTEXT_TOOL_RESULT_ROWS", "20"))
+CONTEXT_MESSAGE_MAX_CHARS = int(os.getenv("CONTEXT_MESSAGE_MAX_CHARS", "4000"))
+
+# AI响应缓存：默认关闭，开启后相同的无上下文分析提问直接回放缓存的工具计划与结果；过期时间（秒）与最多缓存条数
+AGENT_RESPONSE_CACHE = os.getenv("AGENT_RESPONSE_CACHE", "false").lower() in ("1", "true", "yes")
+AGENT_RESPONSE_CACHE_TTL = float(os.getenv("AGENT_RESPONSE_CACHE_TTL", "3600"))
+AGENT_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("AGENT_RESPONSE_CACHE_MAX_ENTRIES", "500"))
@@ -1,17 +1,25 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlmodel import SQLModel, Field
 from typing import AsyncGenerator
 
-from .config import DATABASE_URL
+from .config import DATABASE_URL, SQLITE_BUSY_TIMEOUT_MS
+from .sqlite_pool import configure_connection
 
 DATABASE_URL_ASYNC = DATABASE_URL.replace("sqlite:///", "sqlite+aiosqlite:///")
 
 engine = create_async_engine(
     DATABASE_URL_ASYNC,
     echo=False,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
 )
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """与原生连接池使用相同的WAL与锁等待设置"""
+    configure_connection(dbapi_connection)
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
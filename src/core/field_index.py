@@ -0,0 +1,198 @@
+"""
+快照字段索引
+将快照的字段列表解码一次后建立索引（精确查找、规范化查找与二元组倒排），
+按快照缓存在进程内，快照删除或更新时由快照存储清除，字段校验无需每次查询数据库和解析JSON
+"""
+
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from src.core.config import FIELD_INDEX_CACHE_MAX_ENTRIES
+
+# 相似字段的最低二元组相似度（Dice系数），低于该值且互不包含时不给出建议
+SUGGEST_MIN_SCORE = 0.5
+
+
+def normalize_field_name(name: str) -> str:
+    """规范化字段名：全角转半角、忽略大小写、去除空白"""
+    text = unicodedata.normalize("NFKC", name or "").casefold()
+    return "".join(ch for ch in text if not ch.isspace())
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def field_names(fields: Any) -> List[str]:
+    """从快照的字段定义中提取字段名
+
+    支持多种字段格式：{"name": "xxx"} 或 {"field_name": "xxx"} 或 {"field_id": "xxx"}，其他元素按字符串处理
+    """
+    if isinstance(fields, (str, bytes)):
+        fields = json.loads(fields)
+    names = []
+    for f in fields or []:
+        if isinstance(f, dict):
+            name = f.get("name") or f.get("field_name") or f.get("field_id")
+            if name:
+                names.append(name)
+        else:
+            names.append(str(f))
+    return names
+
+
+class FieldIndex:
+    """单个快照的字段索引"""
+
+    def __init__(self, names: Iterable[str], has_fields: bool = True):
+        # has_fields 为False表示快照没有字段信息（fields为空）
+        self.has_fields = has_fields
+        self.names: Tuple[str, ...] = tuple(names)
+        self._exact = frozenset(self.names)
+        self._normalized: Dict[str, str] = {}
+        # 二元组 -> 包含该二元组的规范化字段名
+        self._postings: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        # 单字符字段名，不产生二元组，单独判断包含关系
+        self._short: Dict[str, str] = {}
+        self._order: Dict[str, int] = {}
+        for position, name in enumerate(self.names):
+            key = normalize_field_name(name)
+            if not key or key in self._normalized:
+                continue
+            self._normalized[key] = name
+            self._order[key] = position
+            if len(key) == 1:
+                self._short[key] = name
+            self._grams[key] = _bigrams(key)
+            for gram in self._grams[key]:
+                self._postings.setdefault(gram, set()).add(key)
+
+    @classmethod
+    def from_json(cls, fields_json: Optional[str]) -> "FieldIndex":
+        if not fields_json:
+            return cls((), has_fields=False)
+        return cls(field_names(fields_json))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._exact
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, name: str) -> Optional[str]:
+        """精确或规范化（全半角、大小写、空白）匹配的字段名，找不到时返回None"""
+        if name in self._exact:
+            return name
+        return self._normalized.get(normalize_field_name(name))
+
+    def missing(self, names: Iterable[str]) -> List[str]:
+        return [name for name in names if name not in self._exact]
+
+    def suggest(self, name: str, min_score: float = SUGGEST_MIN_SCORE) -> Optional[str]:
+        """查找最相似的字段名
+
+        优先规范化后相同的字段，其次互相包含的字段，再按二元组Dice系数取最高者；
+        同分时取字段列表中靠前的
+        """
+        if not name:
+            return None
+        key = normalize_field_name(name)
+        if not key:
+            return None
+        if key in self._normalized:
+            return self._normalized[key]
+
+        grams = _bigrams(key)
+        candidates: Set[str] = set()
+        for gram in grams:
+            candidates.update(self._postings.get(gram, ()))
+        if len(key) == 1:
+            candidates.update(c for c in self._normalized if key in c)
+        candidates.update(ch for ch in key if ch in self._short)
+
+        best = None
+        best_rank = None
+        for candidate in candidates:
+            contains = key in candidate or candidate in key
+            candidate_grams = self._grams[candidate]
+            total = len(grams) + len(candidate_grams)
+            score = 2 * len(grams & candidate_grams) / total if total else 0.0
+            if not contains and score < min_score:
+                continue
+            rank = (contains, score, -self._order[candidate])
+            if best_rank is None or rank > best_rank:
+                best, best_rank = candidate, rank
+        return self._normalized[best] if best is not None else None
+
+
+class FieldIndexCache:
+    """按快照缓存字段索引的LRU缓存，键为 (存储目录, 快照ID)"""
+
+    def __init__(self, max_entries: int = FIELD_INDEX_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, int], FieldIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次清除缓存时递增，构建期间发生过清除的索引不写入缓存
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[Hashable, int]) -> Optional[FieldIndex]:
+        with self._lock:
+            index = self._entries.get(key)
+            if index is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return index
+
+    def put(self, key: Tuple[Hashable, int], index: FieldIndex, generation: Optional[int] = None) -> bool:
+        """写入索引；传入构建前读取的 generation 时，若期间有快照被清除则放弃写入"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._entries.pop(key, None)
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, root: Hashable, snapshot_id: int) -> bool:
+        with self._lock:
+            self.generation += 1
+            return self._entries.pop((root, snapshot_id), None) is not None
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_field_index_cache: Optional[FieldIndexCache] = None
+
+
+def get_field_index_cache() -> FieldIndexCache:
+    """获取进程内共享的快照字段索引缓存"""
+    global _field_index_cache
+    if _field_index_cache is None:
+        _field_index_cache = FieldIndexCache()
+    return _field_index_cache
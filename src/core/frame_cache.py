@@ -0,0 +1,114 @@
+"""
+快照数据缓存
+进程内缓存已解码的快照列数据，按 (快照ID, 内容版本) 区分，
+超出内存预算时按最近最少使用（LRU）淘汰
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.core.config import SNAPSHOT_CACHE_MAX_BYTES
+
+
+def _estimate_bytes(value: Any) -> int:
+    """估算缓存对象占用的内存字节数
+
+    DataFrame/Series 按 pandas 的内存统计；清单、元数据等字典与列表逐层累加各对象的 sys.getsizeof
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=False, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=False, deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    total = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            stack.extend(item)
+    return total
+
+
+class DataFrameCache:
+    """带内存预算的LRU缓存，键为 (存储目录, 快照ID, 版本, 列名)"""
+
+    def __init__(self, max_bytes: int = SNAPSHOT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, value: Any):
+        size = _estimate_bytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, root: Hashable, snapshot_id: int) -> int:
+        """删除某个快照的全部缓存项，返回删除数量"""
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == root and k[1] == snapshot_id]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_frame_cache: Optional[DataFrameCache] = None
+
+
+def get_frame_cache() -> DataFrameCache:
+    """获取进程内共享的快照数据缓存"""
+    global _frame_cache
+    if _frame_cache is None:
+        _frame_cache = DataFrameCache()
+    return _frame_cache
@@ -0,0 +1,866 @@
+"""
+快照列式存储
+将快照数据按列保存为独立文件（数值列为NumPy数组，文本列为字典编码），
+读取时支持列投影，无需反序列化整个快照
+"""
+
+import json
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.core.config import CONFIG_DIR, SNAPSHOT_VERSION_GRACE
+from src.core.field_index import FieldIndex, get_field_index_cache
+from src.core.frame_cache import get_frame_cache
+from src.core.sqlite_pool import get_sqlite_pool
+
+
+MAIN_DB_PATH = CONFIG_DIR / "pb_bi.db"
+
+STORAGE_JSON = "json"
+STORAGE_COLUMNAR = "columnar"
+
+MANIFEST_FILE = "manifest.json"
+# 待删除的旧版本标记目录，每个文件名为版本号、内容为标记时间
+RETIRED_DIR = ".retired"
+# 逐块合并时精确统计不同值数量的上限，超过后不再统计（distinct_count 为 None），使合并时内存不随行数增长
+DISTINCT_TRACK_LIMIT = 100_000
+
+# data_snapshots 表需要补充的列（旧数据库通过 ALTER TABLE 迁移）
+SNAPSHOT_TABLE_COLUMNS = {
+    "storage": "TEXT NOT NULL DEFAULT 'json'",
+    "version": "TEXT",
+    "row_count": "INTEGER",
+}
+
+
+def _to_frame(data: Union[pd.DataFrame, List[Dict[str, Any]], None]) -> pd.DataFrame:
+    """将行列表或DataFrame统一转换为DataFrame"""
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data or [])
+    return df.rename(columns=str)
+
+
+def _json_safe(values: Sequence[Any]) -> List[Any]:
+    """将NaN/NaT替换为None，便于JSON序列化"""
+    result = []
+    for v in values:
+        if v is None:
+            result.append(None)
+        elif isinstance(v, float) and np.isnan(v):
+            result.append(None)
+        elif v is pd.NaT or v is pd.NA:
+            result.append(None)
+        else:
+            result.append(v)
+    return result
+
+
+def _scalar(value: Any) -> Any:
+    """将NumPy/Pandas标量转换为可JSON序列化的Python值"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def column_stats(series: pd.Series) -> Dict[str, Any]:
+    """计算单列的元数据：推断类型、空值数、不同值数量、数值/日期列的最小最大值"""
+    dtype = pd.api.types.infer_dtype(series, skipna=True)
+    stats = {
+        "dtype": dtype,
+        "null_count": int(series.isna().sum()),
+        "distinct_count": None,
+        "min": None,
+        "max": None
+    }
+    try:
+        stats["distinct_count"] = int(series.nunique(dropna=True))
+    except TypeError:
+        # 列表/字典等不可哈希的值无法统计
+        pass
+
+    is_numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+    if is_numeric or pd.api.types.is_datetime64_any_dtype(series):
+        stats["min"] = _scalar(series.min())
+        stats["max"] = _scalar(series.max())
+    return stats
+
+
+def build_metadata(df: pd.DataFrame) -> Dict[str, Any]:
+    """计算DataFrame的元数据（行数、内存占用与各列统计）"""
+    return {
+        "row_count": int(len(df)),
+        "byte_size": int(df.memory_usage(index=False, deep=True).sum()),
+        "columns": [{"name": str(name), **column_stats(df[name])} for name in df.columns]
+    }
+
+
+def _write_column(directory: Path, prefix: str, name: str, series: pd.Series) -> Dict[str, Any]:
+    """写入单列数据，返回该列的清单描述"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.map(lambda v: v.isoformat() if pd.notna(v) else None)
+
+    entry = {"name": name, "file": f"{prefix}.npy"}
+
+    if pd.api.types.is_bool_dtype(series) and not series.isna().any():
+        entry["kind"] = "bool"
+        np.save(directory / entry["file"], series.to_numpy(dtype=bool))
+        return entry
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        entry["kind"] = "numeric"
+        if pd.api.types.is_integer_dtype(series) and not series.isna().any():
+            values = series.to_numpy(dtype=np.int64)
+        else:
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        np.save(directory / entry["file"], values)
+        return entry
+
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred in ("string", "empty"):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        entry["kind"] = "dict"
+        entry["values"] = f"{prefix}.values.json"
+        np.save(directory / entry["file"], codes.astype(np.int32))
+        with open(directory / entry["values"], "w", encoding="utf-8") as f:
+            json.dump([str(u) for u in uniques], f, ensure_ascii=False)
+        return entry
+
+    entry["kind"] = "json"
+    entry["file"] = f"{prefix}.json"
+    with open(directory / entry["file"], "w", encoding="utf-8") as f:
+        json.dump(_json_safe(series.tolist()), f, ensure_ascii=False, default=str)
+    return entry
+
+
+def _read_column(directory: Path, entry: Dict[str, Any], limit: Optional[int] = None) -> np.ndarray:
+    """读取单列数据"""
+    kind = entry.get("kind")
+    path = directory / entry["file"]
+
+    if kind in ("numeric", "bool"):
+        if limit is None:
+            return np.load(path)
+        return np.array(np.load(path, mmap_mode="r")[:limit])
+
+    if kind == "dict":
+        codes = np.load(path, mmap_mode="r" if limit is not None else None)
+        if limit is not None:
+            codes = np.array(codes[:limit])
+        with open(directory / entry["values"], "r", encoding="utf-8") as f:
+            uniques = json.load(f)
+        lookup = np.empty(len(uniques) + 1, dtype=object)
+        lookup[:len(uniques)] = uniques
+        lookup[-1] = None
+        return lookup[codes]
+
+    with open(path, "r", encoding="utf-8") as f:
+        values = json.load(f)
+    if limit is not None:
+        values = values[:limit]
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+# write_chunks 中每个数据块落盘后的描述：(目录, 行数, 列名 -> 列清单描述)
+ChunkPart = Tuple[Path, int, Dict[str, Dict[str, Any]]]
+
+
+def _format_scalar(value: Any) -> str:
+    """数值与布尔值转换为文本，整数值不带小数点（与CSV中的原文一致）"""
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value))
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value.item() if isinstance(value, np.generic) else value)
+
+
+def _part_strings(directory: Path, entry: Dict[str, Any]) -> Tuple[np.ndarray, List[str]]:
+    """读取数据块中的一列为 (编码, 文本取值表)，非文本列转换为文本"""
+    if entry["kind"] == "dict":
+        with open(directory / entry["values"], "r", encoding="utf-8") as f:
+            uniques = json.load(f)
+        return np.load(directory / entry["file"]), uniques
+    codes, uniques = pd.factorize(_read_column(directory, entry), use_na_sentinel=True)
+    return codes, [_format_scalar(u) for u in uniques]
+
+
+def _merge_numeric(staging: Path, entry: Dict[str, Any], name: str,
+                   parts: Sequence[ChunkPart], row_count: int) -> Dict[str, Any]:
+    """合并数值列：逐块写入内存映射文件，整数列有空值时改为浮点数"""
+    is_int = all(
+        part_entries.get(name) is not None
+        and np.load(directory / part_entries[name]["file"], mmap_mode="r").dtype.kind in "iu"
+        for directory, _, part_entries in parts
+    )
+    dtype = np.int64 if is_int else np.float64
+    out = np.lib.format.open_memmap(staging / entry["file"], mode="w+", dtype=dtype, shape=(row_count,))
+    offset, null_count, low, high = 0, 0, None, None
+    distinct = np.empty(0, dtype=dtype)
+    for directory, length, part_entries in parts:
+        part = part_entries.get(name)
+        if part is None:
+            out[offset:offset + length] = np.nan
+            null_count += length
+        else:
+            values = np.load(directory / part["file"]).astype(dtype, copy=False)
+            out[offset:offset + length] = values
+            valid = values if is_int else values[~np.isnan(values)]
+            null_count += length - len(valid)
+            if len(valid):
+                low = valid.min() if low is None else min(low, valid.min())
+                high = valid.max() if high is None else max(high, valid.max())
+                if distinct is not None:
+                    distinct = np.union1d(distinct, valid)
+                    if len(distinct) > DISTINCT_TRACK_LIMIT:
+                        distinct = None
+        offset += length
+    out.flush()
+    del out
+    return {**entry, "kind": "numeric", "dtype": "integer" if is_int else "floating",
+            "null_count": int(null_count), "distinct_count": None if distinct is None else int(len(distinct)),
+            "min": _scalar(low), "max": _scalar(high)}
+
+
+def _merge_bool(staging: Path, entry: Dict[str, Any], name: str,
+                parts: Sequence[ChunkPart], row_count: int) -> Dict[str, Any]:
+    out = np.lib.format.open_memmap(staging / entry["file"], mode="w+", dtype=bool, shape=(row_count,))
+    offset, seen = 0, set()
+    for directory, length, part_entries in parts:
+        values = np.load(directory / part_entries[name]["file"])
+        out[offset:offset + length] = values
+        seen.update(np.unique(values).tolist())
+        offset += length
+    out.flush()
+    del out
+    return {**entry, "kind": "bool", "dtype": "boolean", "null_count": 0,
+            "distinct_count": len(seen), "min": None, "max": None}
+
+
+def _merge_dict(staging: Path, entry: Dict[str, Any], name: str,
+                parts: Sequence[ChunkPart], row_count: int) -> Dict[str, Any]:
+    """合并文本列：各块的编码按累计的取值表重新映射后写入内存映射文件，
+    与数值块混合时整列转换为文本，避免同一列中按数据块出现不同类型"""
+    table: Dict[str, int] = {}
+    out = np.lib.format.open_memmap(staging / entry["file"], mode="w+", dtype=np.int32, shape=(row_count,))
+    offset, null_count = 0, 0
+    for directory, length, part_entries in parts:
+        part = part_entries.get(name)
+        if part is None:
+            out[offset:offset + length] = -1
+            null_count += length
+        else:
+            codes, uniques = _part_strings(directory, part)
+            # 末尾的 -1 使空值编码 -1 映射为 -1
+            mapping = np.array([table.setdefault(u, len(table)) for u in uniques] + [-1], dtype=np.int32)
+            out[offset:offset + length] = mapping[codes]
+            null_count += int((codes < 0).sum())
+        offset += length
+    out.flush()
+    del out
+    values_entry = {**entry, "kind": "dict", "values": entry["file"].replace(".npy", ".values.json")}
+    with open(staging / values_entry["values"], "w", encoding="utf-8") as f:
+        json.dump(list(table), f, ensure_ascii=False)
+    return {**values_entry, "dtype": "string" if table else "empty", "null_count": null_count,
+            "distinct_count": len(table), "min": None, "max": None}
+
+
+def _merge_json(staging: Path, entry: Dict[str, Any], name: str,
+                parts: Sequence[ChunkPart], row_count: int) -> Dict[str, Any]:
+    """合并对象列（列表、字典或混合类型）：逐块追加写入JSON数组"""
+    json_entry = {**entry, "kind": "json", "file": entry["file"].replace(".npy", ".json")}
+    null_count, distinct, dtypes = 0, set(), set()
+    with open(staging / json_entry["file"], "w", encoding="utf-8") as f:
+        f.write("[")
+        first = True
+        for directory, length, part_entries in parts:
+            part = part_entries.get(name)
+            values = [None] * length if part is None else _json_safe(_read_column(directory, part).tolist())
+            present = [v for v in values if v is not None]
+            null_count += length - len(present)
+            if present:
+                dtypes.add(pd.api.types.infer_dtype(present, skipna=True))
+            if distinct is not None:
+                try:
+                    distinct.update(present)
+                    if len(distinct) > DISTINCT_TRACK_LIMIT:
+                        distinct = None
+                except TypeError:
+                    # 列表/字典等不可哈希的值无法统计
+                    distinct = None
+            for value in values:
+                f.write(("" if first else ", ") + json.dumps(value, ensure_ascii=False, default=str))
+                first = False
+        f.write("]")
+    dtype = dtypes.pop() if len(dtypes) == 1 else ("empty" if not dtypes else "mixed")
+    return {**json_entry, "dtype": dtype, "null_count": null_count,
+            "distinct_count": None if distinct is None else len(distinct), "min": None, "max": None}
+
+
+def _merge_parts(staging: Path, prefix: str, name: str, parts: Sequence[ChunkPart],
+                 row_count: int) -> Dict[str, Any]:
+    """逐块合并同一列，内存中只保留一个数据块的该列与取值表，返回列清单描述（含统计信息）
+
+    各块类型一致时保持原类型；数值、布尔与文本混合时整列转换为文本；含对象值时整列保存为JSON
+    """
+    entry = {"name": name, "file": f"{prefix}.npy"}
+    kinds = {part_entries[name]["kind"] for _, _, part_entries in parts if name in part_entries}
+    has_missing = any(name not in part_entries for _, _, part_entries in parts)
+    if kinds == {"numeric"}:
+        return _merge_numeric(staging, entry, name, parts, row_count)
+    if kinds == {"bool"} and not has_missing:
+        return _merge_bool(staging, entry, name, parts, row_count)
+    if "json" in kinds or kinds == {"bool"}:
+        return _merge_json(staging, entry, name, parts, row_count)
+    return _merge_dict(staging, entry, name, parts, row_count)
+
+
+def referenced_fields(params: Dict[str, Any]) -> List[str]:
+    """收集图表/分析参数中引用的字段名（field、*_field、fields、*_fields），用于列投影"""
+    fields = []
+    for key, value in params.items():
+        if key == "field" or key.endswith("_field"):
+            if isinstance(value, str) and value:
+                fields.append(value)
+        elif key == "fields" or key.endswith("_fields"):
+            if isinstance(value, list):
+                fields.extend(v for v in value if isinstance(v, str))
+    return fields
+
+
+def dataframe_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """DataFrame转换为行列表，NaN转换为None"""
+    if df is None:
+        return []
+    obj = df.astype(object)
+    return obj.where(pd.notna(obj), None).to_dict("records")
+
+
+class SnapshotStore:
+    """快照存储：元信息保存在 data_snapshots 表，列数据保存在 snapshots 目录"""
+
+    def __init__(self, db_path: Union[str, Path] = None):
+        self.db_path = Path(db_path) if db_path else MAIN_DB_PATH
+        self.root = self.db_path.parent / "snapshots"
+        self._schema_checked = False
+        self.pool = get_sqlite_pool(self.db_path)
+        self.version_grace = SNAPSHOT_VERSION_GRACE
+        self.cache = get_frame_cache()
+        self.field_indexes = get_field_index_cache()
+
+    def _check_schema(self):
+        if not self._schema_checked:
+            with self.pool.writer() as conn:
+                self._ensure_schema(conn)
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        self._check_schema()
+        with self.pool.reader() as conn:
+            yield conn
+
+    @contextmanager
+    def _writer(self) -> Iterator[sqlite3.Connection]:
+        self._check_schema()
+        with self.pool.writer() as conn:
+            yield conn
+
+    def _table_columns(self, conn: sqlite3.Connection) -> List[str]:
+        cursor = conn.execute("PRAGMA table_info(data_snapshots)")
+        return [row[1] for row in cursor.fetchall()]
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        columns = self._table_columns(conn)
+        if not columns:
+            return
+        for name, ddl in SNAPSHOT_TABLE_COLUMNS.items():
+            if name not in columns:
+                conn.execute(f"ALTER TABLE data_snapshots ADD COLUMN {name} {ddl}")
+        conn.commit()
+        self._schema_checked = True
+
+    def ensure_schema(self):
+        """为旧数据库补充存储相关的列"""
+        self._schema_checked = False
+        self._check_schema()
+
+    # ============== 列文件 ==============
+
+    def write_columns(self, data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> Tuple[str, int]:
+        """将数据写入列式文件，返回 (存储版本号, 行数)"""
+        df = _to_frame(data)
+        version = uuid.uuid4().hex
+        staging = self.root / f".{version}.tmp"
+        staging.mkdir(parents=True, exist_ok=True)
+
+        try:
+            columns = [
+                {**_write_column(staging, f"c{i}", name, df[name]), **column_stats(df[name])}
+                for i, name in enumerate(df.columns)
+            ]
+            self._publish(staging, version, len(df), columns)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        return version, int(len(df))
+
+    def write_chunks(self, chunks: Iterable[Union[pd.DataFrame, List[Dict[str, Any]]]]) -> Tuple[str, int]:
+        """逐块写入列式文件，返回 (存储版本号, 行数)
+
+        每个数据块先按列落盘，全部写完后再逐列逐块合并（见 _merge_parts），内存中只保留一个数据块，
+        用于分页同步与大文件导入等无法一次取得全部数据的场景；各块的列可以不同，缺失的列补空值
+        """
+        version = uuid.uuid4().hex
+        staging = self.root / f".{version}.tmp"
+        parts_dir = staging / "parts"
+        parts_dir.mkdir(parents=True, exist_ok=True)
+
+        try:
+            parts: List[ChunkPart] = []
+            names: Dict[str, None] = {}
+            for chunk in chunks:
+                df = _to_frame(chunk)
+                if not len(df):
+                    continue
+                directory = parts_dir / str(len(parts))
+                directory.mkdir()
+                entries = {}
+                for i, name in enumerate(df.columns):
+                    names.setdefault(name, None)
+                    entries[name] = _write_column(directory, f"c{i}", name, df[name])
+                parts.append((directory, len(df), entries))
+
+            row_count = sum(length for _, length, _ in parts)
+            columns = [_merge_parts(staging, f"c{i}", name, parts, row_count) for i, name in enumerate(names)]
+
+            shutil.rmtree(parts_dir)
+            self._publish(staging, version, row_count, columns)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        return version, row_count
+
+    def _publish(self, staging: Path, version: str, row_count: int, columns: List[Dict[str, Any]]):
+        """写入清单并将临时目录重命名为版本目录"""
+        manifest = {
+            "version": version,
+            "row_count": int(row_count),
+            "byte_size": sum(f.stat().st_size for f in staging.iterdir()),
+            "columns": columns,
+            "created_at": time.time()
+        }
+        with open(staging / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        staging.rename(self.root / version)
+
+    def drop_version(self, version: Optional[str]):
+        """立即删除指定版本的列文件，只用于读取方不可能引用的版本（如写入失败的新版本）"""
+        if not version:
+            return
+        shutil.rmtree(self.root / version, ignore_errors=True)
+
+    def retire_version(self, version: Optional[str]):
+        """标记不再被快照引用的旧版本，保留 version_grace 秒后删除
+
+        读取方先从 data_snapshots 取得版本号再打开列文件，立即删除会使同时进行的读取失败
+        """
+        if not version:
+            return
+        retired = self.root / RETIRED_DIR
+        retired.mkdir(parents=True, exist_ok=True)
+        (retired / version).write_text(str(time.time()), encoding="utf-8")
+        self.collect_retired()
+
+    def collect_retired(self, grace: Optional[float] = None) -> List[str]:
+        """删除保留时间已过的旧版本，返回删除的版本号"""
+        retired = self.root / RETIRED_DIR
+        if not retired.is_dir():
+            return []
+        grace = self.version_grace if grace is None else grace
+        now = time.time()
+        dropped = []
+        for marker in retired.iterdir():
+            try:
+                retired_at = float(marker.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                retired_at = 0.0
+            if now - retired_at >= grace:
+                self.drop_version(marker.name)
+                marker.unlink(missing_ok=True)
+                dropped.append(marker.name)
+        return dropped
+
+    def read_manifest(self, version: str) -> Dict[str, Any]:
+        path = self.root / version / MANIFEST_FILE
+        if not path.exists():
+            raise FileNotFoundError(f"快照数据文件缺失: version={version}")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def read_version(self, version: str, columns: Optional[Sequence[str]] = None,
+                     limit: Optional[int] = None) -> pd.DataFrame:
+        """按版本读取列式数据，columns 为空时读取全部列，不存在的列会被忽略"""
+        manifest = self.read_manifest(version)
+        directory = self.root / version
+        entries = {entry["name"]: entry for entry in manifest["columns"]}
+
+        if columns is None:
+            names = list(entries.keys())
+        else:
+            names = [c for c in dict.fromkeys(columns) if c in entries]
+
+        row_count = manifest["row_count"] if limit is None else min(limit, manifest["row_count"])
+        return pd.DataFrame(
+            {name: _read_column(directory, entries[name], limit) for name in names},
+            index=pd.RangeIndex(row_count)
+        )
+
+    # ============== 快照读取 ==============
+
+    def _fetch_row(self, conn: sqlite3.Connection, snapshot_id: int,
+                   with_data: bool = True) -> Optional[sqlite3.Row]:
+        table_columns = self._table_columns(conn)
+        storage_expr = "storage" if "storage" in table_columns else f"'{STORAGE_JSON}'"
+        version_expr = "version" if "version" in table_columns else "NULL"
+        extra = [c for c in ("fields", "data_flow_id", "worksheet_id", "user_id", "row_count", "created_at")
+                 if c in table_columns]
+
+        select = ["id", "name", f"{storage_expr} AS storage", f"{version_expr} AS version"] + extra
+        if with_data:
+            select.append(f"CASE WHEN {storage_expr} = '{STORAGE_COLUMNAR}' THEN NULL ELSE data END AS data")
+
+        cursor = conn.execute(
+            f"SELECT {', '.join(select)} FROM data_snapshots WHERE id = ?",
+            (snapshot_id,)
+        )
+        return cursor.fetchone()
+
+    def get_info(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        """获取快照元信息（不读取数据）"""
+        with self._reader() as conn:
+            row = self._fetch_row(conn, snapshot_id, with_data=False)
+            return dict(row) if row else None
+
+    def _cache_key(self, snapshot_id: int, version: Optional[str], kind: str, name: str = None) -> Tuple:
+        return (str(self.root), snapshot_id, version, kind, name)
+
+    def _cached_manifest(self, snapshot_id: int, version: str) -> Dict[str, Any]:
+        key = self._cache_key(snapshot_id, version, "manifest")
+        manifest = self.cache.get(key)
+        if manifest is None:
+            manifest = self.read_manifest(version)
+            self.cache.put(key, manifest)
+        return manifest
+
+    def _read_columnar(self, snapshot_id: int, version: str,
+                       columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """读取列式快照的全部行，逐列使用缓存"""
+        manifest = self._cached_manifest(snapshot_id, version)
+        directory = self.root / version
+        entries = {entry["name"]: entry for entry in manifest["columns"]}
+        index = pd.RangeIndex(manifest["row_count"])
+
+        if columns is None:
+            names = list(entries.keys())
+        else:
+            names = [c for c in dict.fromkeys(columns) if c in entries]
+
+        data = {}
+        for name in names:
+            key = self._cache_key(snapshot_id, version, "column", name)
+            series = self.cache.get(key)
+            if series is None:
+                series = pd.Series(_read_column(directory, entries[name]), index=index, name=name)
+                self.cache.put(key, series)
+            data[name] = series
+        return pd.DataFrame(data, index=index)
+
+    def _read_json(self, conn: sqlite3.Connection, snapshot_id: int) -> pd.DataFrame:
+        """读取旧JSON快照的完整数据（已解码的结果会被缓存）"""
+        key = self._cache_key(snapshot_id, None, "frame")
+        df = self.cache.get(key)
+        if df is None:
+            row = conn.execute("SELECT data FROM data_snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+            records = json.loads(row[0]) if row and row[0] else []
+            df = _to_frame(records)
+            self.cache.put(key, df)
+        return df
+
+    def _read(self, snapshot_id: int, columns: Optional[Sequence[str]] = None,
+              limit: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[pd.DataFrame]]:
+        try:
+            return self._read_once(snapshot_id, columns, limit)
+        except FileNotFoundError:
+            # 读取期间快照被替换且旧版本已被删除，重新读取元信息后按新版本读取
+            return self._read_once(snapshot_id, columns, limit)
+
+    def _read_once(self, snapshot_id: int, columns: Optional[Sequence[str]] = None,
+                   limit: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[pd.DataFrame]]:
+        with self._reader() as conn:
+            row = self._fetch_row(conn, snapshot_id, with_data=False)
+            if not row:
+                return None, None
+            info = dict(row)
+
+            if row["storage"] == STORAGE_COLUMNAR:
+                if limit is not None:
+                    return info, self.read_version(row["version"], columns, limit)
+                return info, self._read_columnar(snapshot_id, row["version"], columns)
+
+            df = self._read_json(conn, snapshot_id)
+
+        if limit is not None:
+            df = df.head(limit)
+        if columns is not None:
+            return info, df[[c for c in dict.fromkeys(columns) if c in df.columns]]
+        return info, df.copy(deep=False)
+
+    def read_frame(self, snapshot_id: int, columns: Optional[Sequence[str]] = None,
+                   limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """读取快照数据为DataFrame，快照不存在时返回None"""
+        return self._read(snapshot_id, columns, limit)[1]
+
+    def load(self, snapshot_id: int, columns: Optional[Sequence[str]] = None,
+             limit: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[pd.DataFrame]]:
+        """读取快照元信息和数据，快照不存在时返回 (None, None)"""
+        return self._read(snapshot_id, columns, limit)
+
+    def row_count(self, snapshot_id: int) -> int:
+        """获取快照行数"""
+        return self.row_counts([snapshot_id]).get(snapshot_id, 0)
+
+    def row_counts(self, snapshot_ids: Sequence[int]) -> Dict[int, int]:
+        """批量获取快照行数，优先使用创建时记录的行数，旧快照回退到读取数据"""
+        if not snapshot_ids:
+            return {}
+        with self._reader() as conn:
+            placeholders = ", ".join("?" for _ in snapshot_ids)
+            rows = conn.execute(
+                f"SELECT id, row_count FROM data_snapshots WHERE id IN ({placeholders})",
+                list(snapshot_ids)
+            ).fetchall()
+            counts = {}
+            for row in rows:
+                if row["row_count"] is not None:
+                    counts[row["id"]] = row["row_count"]
+                    continue
+                info = self._fetch_row(conn, row["id"], with_data=False)
+                try:
+                    if info["storage"] == STORAGE_COLUMNAR:
+                        counts[row["id"]] = self._cached_manifest(row["id"], info["version"])["row_count"]
+                    else:
+                        counts[row["id"]] = len(self._read_json(conn, row["id"]))
+                except (OSError, TypeError, ValueError):
+                    counts[row["id"]] = 0
+            return counts
+
+    def content_versions(self, snapshot_ids: Sequence[int]) -> Dict[int, str]:
+        """批量获取快照内容版本标识（存储方式、版本目录与创建时间），已删除的快照不在结果中
+
+        快照内容变化（重新写入、迁移为列式存储或删除后重建）时标识随之变化，可用于判断派生结果是否过期
+        """
+        if not snapshot_ids:
+            return {}
+        with self._reader() as conn:
+            placeholders = ", ".join("?" for _ in snapshot_ids)
+            rows = conn.execute(
+                f"SELECT id, storage, version, created_at FROM data_snapshots WHERE id IN ({placeholders})",
+                list(snapshot_ids)
+            ).fetchall()
+            return {
+                row["id"]: f"{row['storage'] or STORAGE_JSON}:{row['version'] or ''}:{row['created_at']}"
+                for row in rows
+            }
+
+    def catalog_version(self) -> str:
+        """快照列表的版本标识（数量与最大ID），新增或删除快照时变化"""
+        with self._reader() as conn:
+            row = conn.execute("SELECT COUNT(*), MAX(id) FROM data_snapshots").fetchone()
+            return f"{row[0]}:{row[1]}"
+
+    def get_metadata(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        """获取快照元数据（行数、字节数、各列类型与统计），快照不存在时返回None
+
+        列式快照直接读取写入时生成的清单，不读取列数据；旧JSON快照即时计算
+        """
+        with self._reader() as conn:
+            row = self._fetch_row(conn, snapshot_id, with_data=False)
+            if not row:
+                return None
+            if row["storage"] == STORAGE_COLUMNAR:
+                manifest = self._cached_manifest(snapshot_id, row["version"])
+                return {
+                    "row_count": manifest["row_count"],
+                    "byte_size": manifest.get("byte_size"),
+                    "columns": [
+                        {k: v for k, v in entry.items() if k not in ("file", "kind", "values")}
+                        for entry in manifest["columns"]
+                    ]
+                }
+            key = self._cache_key(snapshot_id, None, "metadata")
+            metadata = self.cache.get(key)
+            if metadata is None:
+                metadata = build_metadata(self._read_json(conn, snapshot_id))
+                self.cache.put(key, metadata)
+            return metadata
+
+    def field_index(self, snapshot_id: int) -> Optional[FieldIndex]:
+        """快照的字段索引（首次访问时解码字段列表并缓存），快照不存在时返回None"""
+        key = (str(self.root), snapshot_id)
+        index = self.field_indexes.get(key)
+        if index is not None:
+            return index
+
+        generation = self.field_indexes.generation
+        with self._reader() as conn:
+            row = conn.execute("SELECT fields FROM data_snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        if not row:
+            return None
+        index = FieldIndex.from_json(row["fields"])
+        self.field_indexes.put(key, index, generation)
+        return index
+
+    def invalidate(self, snapshot_id: int):
+        """快照被删除或更新后，清除其缓存数据与字段索引"""
+        self.cache.invalidate(str(self.root), snapshot_id)
+        self.field_indexes.invalidate(str(self.root), snapshot_id)
+
+    # ============== 快照写入 ==============
+
+    def create_snapshot(self, name: str, fields: List[Dict[str, Any]],
+                        data: Union[pd.DataFrame, List[Dict[str, Any]]],
+                        data_flow_id: int = 0, worksheet_id: Optional[str] = None,
+                        user_id: Optional[int] = None) -> Dict[str, Any]:
+        """创建快照：先写入列文件，再插入元信息行"""
+        version, row_count = self.write_columns(data)
+        return self._insert_snapshot(name, fields, version, row_count, data_flow_id, worksheet_id, user_id)
+
+    def create_snapshot_from_chunks(self, name: str, fields: List[Dict[str, Any]],
+                                    chunks: Iterable[Union[pd.DataFrame, List[Dict[str, Any]]]],
+                                    data_flow_id: int = 0, worksheet_id: Optional[str] = None,
+                                    user_id: Optional[int] = None) -> Dict[str, Any]:
+        """逐块写入数据并创建快照（见 write_chunks）"""
+        version, row_count = self.write_chunks(chunks)
+        return self._insert_snapshot(name, fields, version, row_count, data_flow_id, worksheet_id, user_id)
+
+    def _insert_snapshot(self, name: str, fields: List[Dict[str, Any]], version: str, row_count: int,
+                         data_flow_id: int, worksheet_id: Optional[str],
+                         user_id: Optional[int]) -> Dict[str, Any]:
+        if worksheet_id is None:
+            worksheet_id = f"local_{int(time.time() * 1000)}"
+
+        try:
+            with self._writer() as conn:
+                cursor = conn.execute("""
+                    INSERT INTO data_snapshots (user_id, name, data_flow_id, worksheet_id, fields, data, storage, version, row_count)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (user_id, name, data_flow_id, worksheet_id,
+                      json.dumps(fields, ensure_ascii=False), "[]", STORAGE_COLUMNAR, version, row_count))
+                snapshot_id = cursor.lastrowid
+        except Exception:
+            self.drop_version(version)
+            raise
+
+        return {"snapshot_id": snapshot_id, "row_count": row_count, "version": version}
+
+    def delete_snapshot(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        """删除快照，列文件在保留时间后删除（见 retire_version），快照不存在时返回None"""
+        with self._writer() as conn:
+            row = self._fetch_row(conn, snapshot_id, with_data=False)
+            if not row:
+                return None
+            conn.execute("DELETE FROM data_snapshots WHERE id = ?", (snapshot_id,))
+
+        self.invalidate(snapshot_id)
+        if row["storage"] == STORAGE_COLUMNAR:
+            self.retire_version(row["version"])
+        return dict(row)
+
+    def replace_data(self, snapshot_id: int,
+                     data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """用新数据替换快照内容：写入新版本列文件后更新元信息行并标记旧版本待删除，快照不存在时返回None"""
+        version, row_count = self.write_columns(data)
+        try:
+            with self._writer() as conn:
+                row = self._fetch_row(conn, snapshot_id, with_data=False)
+                if row:
+                    conn.execute(
+                        "UPDATE data_snapshots SET storage = ?, version = ?, data = ?, row_count = ? WHERE id = ?",
+                        (STORAGE_COLUMNAR, version, "[]", row_count, snapshot_id)
+                    )
+        except Exception:
+            self.drop_version(version)
+            raise
+        if not row:
+            self.drop_version(version)
+            return None
+
+        self.invalidate(snapshot_id)
+        if row["storage"] == STORAGE_COLUMNAR:
+            self.retire_version(row["version"])
+        return {"snapshot_id": snapshot_id, "row_count": row_count, "version": version}
+
+    # ============== 迁移 ==============
+
+    def migrate_json_snapshots(self, limit: Optional[int] = None) -> List[int]:
+        """将旧的JSON快照迁移为列式存储，返回迁移成功的快照ID列表"""
+        with self._reader() as conn:
+            query = "SELECT id FROM data_snapshots WHERE storage = ? ORDER BY id"
+            if limit:
+                query += f" LIMIT {int(limit)}"
+            ids = [row["id"] for row in conn.execute(query, (STORAGE_JSON,)).fetchall()]
+
+        migrated = []
+        for snapshot_id in ids:
+            with self._reader() as conn:
+                row = self._fetch_row(conn, snapshot_id)
+            if not row or row["storage"] != STORAGE_JSON:
+                continue
+            records = json.loads(row["data"]) if row["data"] else []
+            if not isinstance(records, list):
+                continue
+            # 列文件在写连接之外生成，写连接只用于更新元信息行
+            version, row_count = self.write_columns(records)
+            try:
+                with self._writer() as conn:
+                    updated = conn.execute(
+                        "UPDATE data_snapshots SET storage = ?, version = ?, data = ?, row_count = ? "
+                        "WHERE id = ? AND storage = ?",
+                        (STORAGE_COLUMNAR, version, "[]", row_count, snapshot_id, STORAGE_JSON)
+                    ).rowcount
+            except Exception:
+                self.drop_version(version)
+                raise
+            if not updated:
+                self.drop_version(version)
+                continue
+            self.invalidate(snapshot_id)
+            migrated.append(snapshot_id)
+        return migrated
+
+
+_stores: Dict[str, SnapshotStore] = {}
+
+
+def get_snapshot_store(db_path: Union[str, Path] = None) -> SnapshotStore:
+    """获取数据库对应的快照存储（按数据库路径复用实例）"""
+    path = Path(db_path) if db_path else MAIN_DB_PATH
+    key = str(path.resolve())
+    store = _stores.get(key)
+    if store is None:
+        store = SnapshotStore(path)
+        _stores[key] = store
+    return store
@@ -0,0 +1,162 @@
+"""
+SQLite连接池
+按数据库文件共享连接：每个数据库一个写连接（进程内串行写入）和若干只读连接，
+连接统一开启WAL并设置同步级别、页缓存、内存映射与锁等待超时，读写互不阻塞，
+避免并发导入和生成图表时出现 "database is locked" 以及每次调用重新建立连接的开销
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from src.core.config import (
+    CONFIG_DIR, SQLITE_WAL, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE,
+    SQLITE_BUSY_TIMEOUT_MS, SQLITE_READ_POOL_SIZE
+)
+
+MAIN_DB_PATH = CONFIG_DIR / "pb_bi.db"
+
+_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def configure_connection(dbapi_connection: Any, read_only: bool = False):
+    """设置连接参数，同时用于 sqlite3 连接和 SQLAlchemy 的 connect 事件（只使用游标接口）"""
+    synchronous = SQLITE_SYNCHRONOUS if SQLITE_SYNCHRONOUS in _SYNCHRONOUS_LEVELS else "NORMAL"
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}")
+        if SQLITE_WAL and not read_only:
+            cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        cursor.execute(f"PRAGMA cache_size = {-int(SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+
+class SQLitePool:
+    """单个数据库文件的连接池
+
+    reader() 借出只读连接（query_only），用完归还；writer() 借出唯一的写连接，
+    同一时间只有一个线程持有，正常退出时提交、异常时回滚
+    """
+
+    def __init__(self, db_path: Union[str, Path], max_idle_readers: int = SQLITE_READ_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.max_idle_readers = max_idle_readers
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_depth = 0
+        self.opened = 0
+        self.reused = 0
+        # 创建连接池时先建立写连接，数据库在此切换为WAL（WAL模式保存在数据库文件中），
+        # 之后建立只读连接不需要等待写锁
+        self._writer = self._open(read_only=False)
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        configure_connection(conn, read_only=read_only)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open(read_only=False)
+            return self._writer
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """借出只读连接"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self.reused += 1
+        if conn is None:
+            conn = self._open(read_only=True)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.max_idle_readers:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """借出写连接；同一线程内嵌套调用时复用同一连接，由最外层提交"""
+        with self._write_lock:
+            conn = self._writer_connection()
+            self._writer_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            else:
+                if self._writer_depth == 1 and conn.in_transaction:
+                    conn.commit()
+            finally:
+                self._writer_depth -= 1
+
+    def close(self):
+        """关闭写连接和空闲的只读连接，之后再使用时重新建立"""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "db_path": str(self.db_path),
+                "opened": self.opened,
+                "reused": self.reused,
+                "idle_readers": len(self._idle),
+                "max_idle_readers": self.max_idle_readers,
+                "writer_open": self._writer is not None
+            }
+
+
+_pools: Dict[str, SQLitePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_sqlite_pool(db_path: Union[str, Path] = None) -> SQLitePool:
+    """获取数据库对应的连接池（按数据库路径复用），默认主数据库 pb_bi.db"""
+    path = Path(db_path) if db_path else MAIN_DB_PATH
+    key = str(path.resolve())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = SQLitePool(path)
+                _pools[key] = pool
+    return pool
+
+
+def close_sqlite_pools():
+    """关闭全部连接池的连接（应用关闭时调用）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
@@ -5,7 +5,7 @@ from starlette.middleware.sessions import SessionMiddleware
 from pathlib import Path
 
 from src.core.database import engine, Base, SessionLocal
-from src.core.config import CONFIG_DIR
+from src.core.config import CONFIG_DIR, SYNC_SCHEDULER_ENABLED
 from src.api import config
 from src.api import data
 from src.api import dashboard
@@ -26,8 +26,17 @@ from src.api import chart_recommend
 from src.api import chart_config
 from src.mcp import mcp_client
 from src.services.auth import create_admin_user
+from src.core.snapshot_store import get_snapshot_store
+from src.ai.llm_client import close_http_clients
+from src.core.sqlite_pool import close_sqlite_pools
+from src.services.mingdao_client import close_mingdao_clients
+from src.services.sync_scheduler import get_sync_scheduler
+from src.mcp.registry import get_tool_registry
 
 Base.metadata.create_all(bind=engine)
+get_snapshot_store().ensure_schema()
+# 删除上次运行时保留期已过的旧快照版本
+get_snapshot_store().collect_retired()
 
 app = FastAPI(title="PB-BI 数据分析平台 API", version="1.0.0")
 
@@ -81,6 +90,19 @@ async def startup_event():
         create_admin_user(db)
     finally:
         db.close()
+    # 启动时注册全部工具并生成共享的工具注册表，之后创建Agent不再重复注册
+    get_tool_registry()
+    # 数据流定时刷新在后台线程中执行，重启前未完成的任务会重新排队
+    if SYNC_SCHEDULER_ENABLED:
+        get_sync_scheduler().start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if SYNC_SCHEDULER_ENABLED:
+        get_sync_scheduler().stop()
+    await close_http_clients()
+    await close_mingdao_clients()
+    close_sqlite_pools()
 
 @app.get("/")
 async def root():
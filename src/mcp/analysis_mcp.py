@@ -6,22 +6,21 @@ Analysis MCP - 数据分析工具
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import json
-import sqlite3
+
+import pandas as pd
 
 from src.mcp.service import MCPTool
 from src.core.config import CONFIG_DIR
+from src.core.snapshot_store import get_snapshot_store, dataframe_to_records
+from src.core.aggregate import aggregate_frame
+from src.core.predicate import (
+    PredicateError, compile_conditions, filter_frame, sort_frame, where_fields
+)
 
 
 MAIN_DB_PATH = CONFIG_DIR / "pb_bi.db"
 
 
-def _get_main_db_connection():
-    """获取主数据库连接（pb_bi.db）"""
-    conn = sqlite3.connect(str(MAIN_DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 class AggregateDataTool:
     """数据聚合"""
 
@@ -29,7 +28,7 @@ class AggregateDataTool:
         return "pbbi_aggregate_data"
 
     def get_description(self) -> str:
-        return "对快照数据进行聚合分析，支持SUM、AVG、COUNT、MAX、MIN等聚合函数"
+        return "对快照数据进行聚合分析，支持SUM、AVG、COUNT、COUNT_DISTINCT、MAX、MIN、MEDIAN及百分位（如P90）等聚合函数"
 
     def get_parameters(self) -> Dict[str, Any]:
         return {
@@ -45,7 +44,7 @@ class AggregateDataTool:
                         "type": "object",
                         "properties": {
                             "field": {"type": "string", "description": "字段名"},
-                            "function": {"type": "string", "description": "聚合函数：SUM, AVG, COUNT, MAX, MIN"},
+                            "function": {"type": "string", "description": "聚合函数：SUM, AVG, COUNT, COUNT_DISTINCT, MAX, MIN, MEDIAN, P90（百分位）"},
                             "alias": {"type": "string", "description": "结果别名"}
                         }
                     },
@@ -76,57 +75,14 @@ class AggregateDataTool:
         if not snapshot_id:
             return {"success": False, "error": "snapshot_id是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "SELECT name, fields, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
+            columns = list(group_by) + [agg.get("field") for agg in aggregations] + where_fields(where)
+            info, df = get_snapshot_store(MAIN_DB_PATH).load(snapshot_id, [c for c in columns if c])
+            if not info:
                 return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-            name = row["name"]
-            all_fields = json.loads(row["fields"]) if row["fields"] else []
-            data = json.loads(row["data"]) if row["data"] else []
-
-            if where:
-                try:
-                    data = [d for d in data if self._evaluate_where(d, where)]
-                except:
-                    pass
-
-            results = []
-            if group_by:
-                groups = {}
-                for row_data in data:
-                    key = tuple(row_data.get(f, "") for f in group_by)
-                    if key not in groups:
-                        groups[key] = []
-                    groups[key].append(row_data)
-                
-                for key, group_data in groups.items():
-                    result = dict(zip(group_by, key))
-                    for agg in aggregations:
-                        field = agg.get("field")
-                        func = agg.get("function", "COUNT").upper()
-                        alias = agg.get("alias", f"{func}_{field}")
-                        
-                        values = [d.get(field) for d in group_data if d.get(field) is not None]
-                        result[alias] = self._aggregate(values, func)
-                    results.append(result)
-            else:
-                result = {}
-                for agg in aggregations:
-                    field = agg.get("field")
-                    func = agg.get("function", "COUNT").upper()
-                    alias = agg.get("alias", f"{func}_{field}")
-                    
-                    values = [d.get(field) for d in data if d.get(field) is not None]
-                    result[alias] = self._aggregate(values, func)
-                results.append(result)
+            name = info["name"]
+            results = aggregate_frame(filter_frame(df, where), group_by, aggregations)
 
             return {
                 "success": True,
@@ -134,67 +90,10 @@ class AggregateDataTool:
                 "snapshot_name": name,
                 "count": len(results)
             }
+        except PredicateError as e:
+            return {"success": False, "error": f"筛选条件无效: {str(e)}"}
         except Exception as e:
             return {"success": False, "error": f"聚合分析失败: {str(e)}"}
-        finally:
-            conn.close()
-
-    def _aggregate(self, values: list, func: str) -> Any:
-        if not values:
-            return 0 if func == "COUNT" else None
-        
-        if func == "COUNT":
-            return len(values)
-        elif func == "SUM":
-            return sum(float(v) for v in values if isinstance(v, (int, float)))
-        elif func == "AVG":
-            nums = [float(v) for v in values if isinstance(v, (int, float))]
-            return sum(nums) / len(nums) if nums else None
-        elif func == "MAX":
-            return max(values)
-        elif func == "MIN":
-            return min(values)
-        return None
-
-    def _evaluate_where(self, row: dict, where: str) -> bool:
-        where_upper = where.upper()
-        
-        if " AND " in where_upper:
-            parts = where.split(" AND ")
-            return all(self._evaluate_where(row, p.strip()) for p in parts)
-        
-        if " OR " in where_upper:
-            parts = where.split(" OR ")
-            return any(self._evaluate_where(row, p.strip()) for p in parts)
-        
-        operators = [">=", "<=", "!=", ">", "<", "="]
-        for op in operators:
-            if op in where:
-                parts = where.split(op, 1)
-                if len(parts) == 2:
-                    field = parts[0].strip()
-                    value = parts[1].strip().strip("'\"")
-                    
-                    row_value = row.get(field)
-                    if row_value is None:
-                        return False
-                    
-                    try:
-                        if op == "=":
-                            return str(row_value) == value or row_value == value
-                        elif op == "!=":
-                            return str(row_value) != value and row_value != value
-                        elif op == ">":
-                            return float(row_value) > float(value)
-                        elif op == "<":
-                            return float(row_value) < float(value)
-                        elif op == ">=":
-                            return float(row_value) >= float(value)
-                        elif op == "<=":
-                            return float(row_value) <= float(value)
-                    except (ValueError, TypeError):
-                        return str(row_value) == value
-        return True
 
 
 class FilterDataTool:
@@ -257,44 +156,18 @@ class FilterDataTool:
         if not conditions:
             return {"success": False, "error": "conditions是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "SELECT name, fields, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
+            info, df = get_snapshot_store(MAIN_DB_PATH).load(snapshot_id)
+            if not info:
                 return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-            name = row["name"]
-            all_fields = json.loads(row["fields"]) if row["fields"] else []
-            data = json.loads(row["data"]) if row["data"] else []
-
-            filtered_data = []
-            for row_data in data:
-                if self._evaluate_conditions(row_data, conditions):
-                    if fields:
-                        filtered_row = {f: row_data.get(f) for f in fields}
-                    else:
-                        filtered_row = row_data
-                    filtered_data.append(filtered_row)
-
-            if order_by:
-                try:
-                    reverse = "DESC" in order_by.upper()
-                    order_field = order_by.split()[0].strip()
-                    filtered_data.sort(
-                        key=lambda x: x.get(order_field, ""),
-                        reverse=reverse
-                    )
-                except:
-                    pass
-
-            total = len(filtered_data)
-            filtered_data = filtered_data[:limit]
+            name = info["name"]
+            df = sort_frame(df[compile_conditions(conditions).mask(df)], order_by)
+            if fields:
+                df = df.reindex(columns=fields)
+
+            total = len(df)
+            filtered_data = dataframe_to_records(df.head(limit))
 
             return {
                 "success": True,
@@ -303,62 +176,10 @@ class FilterDataTool:
                 "count": len(filtered_data),
                 "total": total
             }
+        except PredicateError as e:
+            return {"success": False, "error": f"筛选条件无效: {str(e)}"}
         except Exception as e:
             return {"success": False, "error": f"数据筛选失败: {str(e)}"}
-        finally:
-            conn.close()
-
-    def _evaluate_conditions(self, row: dict, conditions: list) -> bool:
-        if not conditions:
-            return True
-        
-        result = True
-        for i, cond in enumerate(conditions):
-            field = cond.get("field")
-            operator = cond.get("operator", "=").upper()
-            value = cond.get("value", "")
-            logic = cond.get("logic", "AND").upper() if i > 0 else "AND"
-            
-            row_value = row.get(field)
-            cond_result = False
-            
-            if row_value is not None:
-                if operator == "=":
-                    cond_result = str(row_value) == value or row_value == value
-                elif operator == "!=":
-                    cond_result = str(row_value) != value and row_value != value
-                elif operator == ">":
-                    try:
-                        cond_result = float(row_value) > float(value)
-                    except:
-                        pass
-                elif operator == "<":
-                    try:
-                        cond_result = float(row_value) < float(value)
-                    except:
-                        pass
-                elif operator == ">=":
-                    try:
-                        cond_result = float(row_value) >= float(value)
-                    except:
-                        pass
-                elif operator == "<=":
-                    try:
-                        cond_result = float(row_value) <= float(value)
-                    except:
-                        pass
-                elif operator == "LIKE":
-                    cond_result = value.lower() in str(row_value).lower()
-            
-            if i == 0:
-                result = cond_result
-            else:
-                if logic == "AND":
-                    result = result and cond_result
-                else:
-                    result = result or cond_result
-        
-        return result
 
 
 class StatisticsTool:
@@ -401,35 +222,19 @@ class StatisticsTool:
         if not field:
             return {"success": False, "error": "field是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "SELECT name, fields, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
+            info, df = get_snapshot_store(MAIN_DB_PATH).load(snapshot_id, [field] + where_fields(where))
+            if not info:
                 return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-            name = row["name"]
-            data = json.loads(row["data"]) if row["data"] else []
-
-            values = []
-            for row_data in data:
-                if where:
-                    try:
-                        if not self._evaluate_where(row_data, where):
-                            continue
-                    except:
-                        continue
-                
-                val = row_data.get(field)
-                if val is not None and isinstance(val, (int, float)):
-                    values.append(float(val))
-
-            if not values:
+            name = info["name"]
+            df = filter_frame(df, where)
+            if field in df.columns:
+                values = pd.to_numeric(df[field], errors="coerce").dropna().astype(float)
+            else:
+                values = pd.Series([], dtype=float)
+
+            if values.empty:
                 return {
                     "success": True,
                     "data": {
@@ -443,61 +248,24 @@ class StatisticsTool:
                     }
                 }
 
-            sorted_values = sorted(values)
-            n = len(sorted_values)
-            if n % 2 == 0:
-                median = (sorted_values[n//2-1] + sorted_values[n//2]) / 2
-            else:
-                median = sorted_values[n//2]
-
-            mean = sum(values) / n
-            variance = sum((x - mean) ** 2 for x in values) / n
-            std_dev = variance ** 0.5
-
             return {
                 "success": True,
                 "data": {
                     "field": field,
-                    "count": n,
-                    "sum": sum(values),
-                    "avg": mean,
-                    "min": min(values),
-                    "max": max(values),
-                    "median": median,
-                    "std_dev": std_dev
+                    "count": int(len(values)),
+                    "sum": float(values.sum()),
+                    "avg": float(values.mean()),
+                    "min": float(values.min()),
+                    "max": float(values.max()),
+                    "median": float(values.median()),
+                    "std_dev": float(values.std(ddof=0))
                 },
                 "snapshot_name": name
             }
+        except PredicateError as e:
+            return {"success": False, "error": f"筛选条件无效: {str(e)}"}
         except Exception as e:
             return {"success": False, "error": f"统计计算失败: {str(e)}"}
-        finally:
-            conn.close()
-
-    def _evaluate_where(self, row: dict, where: str) -> bool:
-        operators = [">=", "<=", "!=", ">", "<", "="]
-        for op in operators:
-            if op in where:
-                parts = where.split(op, 1)
-                if len(parts) == 2:
-                    field = parts[0].strip()
-                    value = parts[1].strip().strip("'\"")
-                    row_value = row.get(field)
-                    if row_value is None:
-                        return False
-                    try:
-                        if op == "=":
-                            return str(row_value) == value or row_value == value
-                        elif op == ">":
-                            return float(row_value) > float(value)
-                        elif op == "<":
-                            return float(row_value) < float(value)
-                        elif op == ">=":
-                            return float(row_value) >= float(value)
-                        elif op == "<=":
-                            return float(row_value) <= float(value)
-                    except:
-                        return str(row_value) == value
-        return True
 
 
 class PivotTableTool:
@@ -531,8 +299,8 @@ class PivotTableTool:
                 },
                 "agg_function": {
                     "type": "string",
-                    "description": "聚合函数：SUM, COUNT, AVG",
-                    "enum": ["SUM", "COUNT", "AVG"]
+                    "description": "聚合函数：SUM, COUNT, AVG, MIN, MAX, COUNT_DISTINCT, MEDIAN",
+                    "enum": ["SUM", "COUNT", "AVG", "MIN", "MAX", "COUNT_DISTINCT", "MEDIAN"]
                 },
                 "where": {
                     "type": "string",
@@ -556,62 +324,26 @@ class PivotTableTool:
         if not row_field or not value_field:
             return {"success": False, "error": "row_field和value_field是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "SELECT name, fields, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
+            columns = [row_field, column_field, value_field] + where_fields(where)
+            info, df = get_snapshot_store(MAIN_DB_PATH).load(snapshot_id, [c for c in columns if c])
+            if not info:
                 return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-            name = row["name"]
-            data = json.loads(row["data"]) if row["data"] else []
-
-            if where:
-                try:
-                    data = [d for d in data if self._evaluate_where(d, where)]
-                except:
-                    pass
+            name = info["name"]
+            df = filter_frame(df, where)
+            aggregations = [{"field": value_field, "function": agg_function, "alias": value_field}]
 
             if column_field:
                 pivot_data = {}
-                for row_data in data:
-                    row_key = row_data.get(row_field, "")
-                    col_key = row_data.get(column_field, "")
+                for item in aggregate_frame(df, [row_field, column_field], aggregations):
+                    row_key = item[row_field]
                     if row_key not in pivot_data:
-                        pivot_data[row_key] = {}
-                    if col_key not in pivot_data[row_key]:
-                        pivot_data[row_key][col_key] = []
-                    val = row_data.get(value_field)
-                    if val is not None:
-                        pivot_data[row_key][col_key].append(float(val) if isinstance(val, (int, float)) else val)
-
-                results = []
-                for row_key, cols in pivot_data.items():
-                    result = {row_field: row_key}
-                    for col_key, values in cols.items():
-                        result[col_key] = self._aggregate(values, agg_function)
-                    results.append(result)
+                        pivot_data[row_key] = {row_field: row_key}
+                    pivot_data[row_key][item[column_field]] = item[value_field]
+                results = list(pivot_data.values())
             else:
-                groups = {}
-                for row_data in data:
-                    key = row_data.get(row_field, "")
-                    if key not in groups:
-                        groups[key] = []
-                    val = row_data.get(value_field)
-                    if val is not None:
-                        groups[key].append(float(val) if isinstance(val, (int, float)) else val)
-
-                results = []
-                for key, values in groups.items():
-                    results.append({
-                        row_field: key,
-                        value_field: self._aggregate(values, agg_function)
-                    })
+                results = aggregate_frame(df, [row_field], aggregations)
 
             return {
                 "success": True,
@@ -624,50 +356,10 @@ class PivotTableTool:
                     "agg_function": agg_function
                 }
             }
+        except PredicateError as e:
+            return {"success": False, "error": f"筛选条件无效: {str(e)}"}
         except Exception as e:
             return {"success": False, "error": f"透视表创建失败: {str(e)}"}
-        finally:
-            conn.close()
-
-    def _aggregate(self, values: list, func: str) -> Any:
-        if not values:
-            return 0 if func == "COUNT" else None
-        
-        nums = [v for v in values if isinstance(v, (int, float))]
-        
-        if func == "COUNT":
-            return len(values)
-        elif func == "SUM":
-            return sum(nums) if nums else None
-        elif func == "AVG":
-            return sum(nums) / len(nums) if nums else None
-        return None
-
-    def _evaluate_where(self, row: dict, where: str) -> bool:
-        operators = [">=", "<=", "!=", ">", "<", "="]
-        for op in operators:
-            if op in where:
-                parts = where.split(op, 1)
-                if len(parts) == 2:
-                    field = parts[0].strip()
-                    value = parts[1].strip().strip("'\"")
-                    row_value = row.get(field)
-                    if row_value is None:
-                        return False
-                    try:
-                        if op == "=":
-                            return str(row_value) == value or row_value == value
-                        elif op == ">":
-                            return float(row_value) > float(value)
-                        elif op == "<":
-                            return float(row_value) < float(value)
-                        elif op == ">=":
-                            return float(row_value) >= float(value)
-                        elif op == "<=":
-                            return float(row_value) <= float(value)
-                    except:
-                        return str(row_value) == value
-        return True
 
 
 class RecommendChartTool:
@@ -706,21 +398,14 @@ class RecommendChartTool:
         if not fields:
             return {"success": False, "error": "fields是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "SELECT name, fields, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
+            info, df = get_snapshot_store(MAIN_DB_PATH).load(snapshot_id)
+            if not info:
                 return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-            name = row["name"]
-            all_fields = json.loads(row["fields"]) if row["fields"] else []
-            data = json.loads(row["data"]) if row["data"] else []
+            name = info["name"]
+            all_fields = json.loads(info["fields"]) if info.get("fields") else []
+            data = dataframe_to_records(df)
 
             field_types = {}
             for field in fields:
@@ -785,8 +470,6 @@ class RecommendChartTool:
             }
         except Exception as e:
             return {"success": False, "error": f"图表推荐失败: {str(e)}"}
-        finally:
-            conn.close()
 
 
 def register_analysis_tools(mcp_service):
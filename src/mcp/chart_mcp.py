@@ -6,14 +6,14 @@ Chart MCP - 图表生成工具
 from typing import Dict, Any, List, Optional, Tuple
 from abc import ABC, abstractmethod
 import json
-import sqlite3
 import time
 import hashlib
 from pathlib import Path
 import os
 
 from src.mcp.service import MCPTool
-from src.core.config import CONFIG_DIR
+from src.core.config import CONFIG_DIR, MCP_CHART_CONCURRENCY
+from src.core.snapshot_store import get_snapshot_store, referenced_fields
 
 
 MAIN_DB_PATH = CONFIG_DIR / "pb_bi.db"
@@ -53,25 +53,14 @@ class BaseChartTool(ABC):
         """返回图表类型标识"""
         return self.get_name().replace("pbbi_generate_", "")
     
-    def _get_data_from_snapshot(self, snapshot_id: int) -> Tuple[Optional[List[Dict]], Optional[str]]:
-        """从快照获取数据"""
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "SELECT name, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
-                return None, f"快照不存在: id={snapshot_id}"
-            
-            data = json.loads(row["data"]) if row["data"] else []
-            if not data:
-                return None, "快照没有数据"
-            return data, None
-        finally:
-            conn.close()
+    def _get_data_from_snapshot(self, snapshot_id: int, columns: Optional[List[str]] = None) -> Tuple[Optional["pd.DataFrame"], Optional[str]]:
+        """从快照获取数据，columns 指定时只读取这些列"""
+        df = get_snapshot_store(MAIN_DB_PATH).read_frame(snapshot_id, columns or None)
+        if df is None:
+            return None, f"快照不存在: id={snapshot_id}"
+        if len(df) == 0:
+            return None, "快照没有数据"
+        return df, None
     
     def _create_result(self, chart_type: str, chart_url: str, title: str, 
                        data: Dict = None, statistics: Dict = None) -> Dict[str, Any]:
@@ -148,13 +137,6 @@ def _setup_chinese_font():
         print(f"配置中文字体失败: {e}")
 
 
-def _get_main_db_connection():
-    """获取主数据库连接（pb_bi.db）"""
-    conn = sqlite3.connect(str(MAIN_DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 def _get_chart_cache_key(chart_type: str, params: dict) -> str:
     """生成图表缓存键"""
     key_data = f"{chart_type}_{json.dumps(params, sort_keys=True, ensure_ascii=False)}"
@@ -252,7 +234,7 @@ class GenerateBarChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -354,7 +336,7 @@ class GeneratePieChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -444,7 +426,7 @@ class GenerateLineChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -535,7 +517,7 @@ class GenerateScatterChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -627,7 +609,7 @@ class GenerateBoxPlotTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -723,7 +705,7 @@ class GenerateHistogramTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -803,7 +785,7 @@ class GenerateHeatmapTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -889,7 +871,7 @@ class GenerateRadarChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -976,7 +958,7 @@ class GenerateFunnelChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1079,7 +1061,7 @@ class GenerateGaugeChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1172,7 +1154,7 @@ class GenerateComboChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1272,7 +1254,7 @@ class GenerateBar3DChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1378,7 +1360,7 @@ class GenerateScatter3DChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1467,7 +1449,7 @@ class GenerateSurface3DChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1599,7 +1581,7 @@ class GenerateLEDWaferChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1704,7 +1686,7 @@ class GenerateMultipleYAxisChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1811,7 +1793,7 @@ class GenerateStackedBarChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -1910,7 +1892,7 @@ class GenerateStackedLineChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -2012,7 +1994,7 @@ class GenerateLinkedChartTool(BaseChartTool):
         if cached:
             return cached
         
-        data, error = self._get_data_from_snapshot(snapshot_id)
+        data, error = self._get_data_from_snapshot(snapshot_id, referenced_fields(params))
         if error:
             return self._create_error(error)
         
@@ -2122,6 +2104,8 @@ def register_chart_tools(mcp_service):
             description=tool.get_description(),
             parameters=tool.get_parameters()
         ))
-        mcp_service.register_handler(tool.get_name(), tool.execute)
+        # matplotlib的pyplot状态不是线程安全的，所有图表工具共用一个并发组
+        mcp_service.register_handler(tool.get_name(), tool.execute,
+                                     max_concurrency=MCP_CHART_CONCURRENCY, group="chart")
     
     return tools
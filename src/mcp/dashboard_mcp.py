@@ -379,16 +379,13 @@ class GetUserResourcesTool:
         db = SessionLocal()
         try:
             from src.models.config import DataFlow
-            from src.mcp.database_mcp import _get_snapshot_connection
+            from src.mcp.database_mcp import _get_main_db_connection
 
             dataflow_count = db.query(DataFlow).count()
             dashboard_count = db.query(Dashboard).count()
 
-            conn = _get_snapshot_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM snapshots")
-            snapshot_count = cursor.fetchone()[0]
-            conn.close()
+            with _get_main_db_connection() as conn:
+                snapshot_count = conn.execute("SELECT COUNT(*) FROM data_snapshots").fetchone()[0]
 
             return {
                 "success": True,
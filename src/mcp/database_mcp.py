@@ -12,16 +12,17 @@ from pathlib import Path
 
 from src.mcp.service import MCPTool
 from src.core.config import CONFIG_DIR
+from src.core.sqlite_pool import get_sqlite_pool
+from src.core.snapshot_store import get_snapshot_store, dataframe_to_records
+from src.core.predicate import PredicateError, filter_frame, sort_frame
 
 
 MAIN_DB_PATH = CONFIG_DIR / "pb_bi.db"
 
 
 def _get_main_db_connection():
-    """获取主数据库连接（pb_bi.db）"""
-    conn = sqlite3.connect(str(MAIN_DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+    """借出主数据库（pb_bi.db）的只读连接，用法：with _get_main_db_connection() as conn"""
+    return get_sqlite_pool(MAIN_DB_PATH).reader()
 
 
 class ListSnapshotsTool:
@@ -59,17 +60,16 @@ class ListSnapshotsTool:
         page_size = max(1, params.get("page_size", 20))
         offset = (page - 1) * page_size
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
+        with _get_main_db_connection() as conn:
+            cursor = conn.cursor()
 
-        try:
             if data_flow_id:
                 count_query = "SELECT COUNT(*) FROM data_snapshots WHERE data_flow_id = ?"
                 cursor.execute(count_query, (data_flow_id,))
                 total = cursor.fetchone()[0]
 
                 query = """
-                    SELECT id, name, data_flow_id, worksheet_id, fields, data, created_at
+                    SELECT id, name, data_flow_id, worksheet_id, fields, created_at
                     FROM data_snapshots 
                     WHERE data_flow_id = ?
                     ORDER BY created_at DESC
@@ -82,7 +82,7 @@ class ListSnapshotsTool:
                 total = cursor.fetchone()[0]
 
                 query = """
-                    SELECT id, name, data_flow_id, worksheet_id, fields, data, created_at
+                    SELECT id, name, data_flow_id, worksheet_id, fields, created_at
                     FROM data_snapshots 
                     ORDER BY created_at DESC
                     LIMIT ? OFFSET ?
@@ -91,23 +91,15 @@ class ListSnapshotsTool:
 
             rows = cursor.fetchall()
 
+            row_counts = get_snapshot_store(MAIN_DB_PATH).row_counts([row["id"] for row in rows])
             snapshots = []
             for row in rows:
-                data_json = row["data"]
-                row_count = 0
-                if data_json:
-                    try:
-                        data_list = json.loads(data_json)
-                        row_count = len(data_list) if isinstance(data_list, list) else 0
-                    except:
-                        pass
-                
                 snapshots.append({
                     "id": row["id"],
                     "name": row["name"],
                     "data_flow_id": row["data_flow_id"],
                     "worksheet_id": row["worksheet_id"],
-                    "row_count": row_count,
+                    "row_count": row_counts.get(row["id"], 0),
                     "created_at": row["created_at"]
                 })
 
@@ -121,8 +113,6 @@ class ListSnapshotsTool:
                     "total_pages": (total + page_size - 1) // page_size
                 }
             }
-        finally:
-            conn.close()
 
 
 class GetSnapshotSchemaTool:
@@ -160,18 +150,17 @@ class GetSnapshotSchemaTool:
                 "error": "必须提供snapshot_id或table_name"
             }
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
+        with _get_main_db_connection() as conn:
+            cursor = conn.cursor()
 
-        try:
             if snapshot_id:
                 cursor.execute(
-                    "SELECT id, name, fields, data FROM data_snapshots WHERE id = ?",
+                    "SELECT id, name, fields FROM data_snapshots WHERE id = ?",
                     (snapshot_id,)
                 )
             else:
                 cursor.execute(
-                    "SELECT id, name, fields, data FROM data_snapshots WHERE name = ?",
+                    "SELECT id, name, fields FROM data_snapshots WHERE name = ?",
                     (table_name,)
                 )
 
@@ -186,21 +175,25 @@ class GetSnapshotSchemaTool:
             snapshot_id = row["id"]
             name = row["name"]
             fields = json.loads(row["fields"]) if row["fields"] else []
-            data = json.loads(row["data"]) if row["data"] else []
+            store = get_snapshot_store(MAIN_DB_PATH)
+            metadata = store.get_metadata(snapshot_id) or {"row_count": 0, "columns": []}
+            column_stats = {c["name"]: c for c in metadata["columns"]}
+            sample_df = store.read_frame(snapshot_id, limit=3)
 
             columns = []
             if fields:
                 for field in fields:
                     field_name = field.get("name") or field.get("field_name", "unknown")
                     field_type = field.get("type") or field.get("data_type", "text")
+                    stats = column_stats.get(field_name)
                     columns.append({
                         "name": field_name,
                         "type": field_type,
-                        "nullable": True,
+                        "nullable": stats["null_count"] > 0 if stats else True,
                         "primary_key": False
                     })
 
-            sample_data = data[:3] if data else []
+            sample_data = dataframe_to_records(sample_df)
 
             return {
                 "success": True,
@@ -210,11 +203,10 @@ class GetSnapshotSchemaTool:
                     "columns": columns,
                     "fields": fields,
                     "sample_data": sample_data,
-                    "row_count": len(data)
+                    "column_stats": metadata["columns"],
+                    "row_count": metadata["row_count"]
                 }
             }
-        finally:
-            conn.close()
 
 
 class QuerySnapshotTool:
@@ -273,118 +265,54 @@ class QuerySnapshotTool:
                 "error": "必须提供snapshot_id"
             }
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
+        info, df = get_snapshot_store(MAIN_DB_PATH).load(snapshot_id)
+        if not info:
+            return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-        try:
-            cursor.execute(
-                "SELECT name, fields, data FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
-                return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
+        name = info["name"]
+        all_fields = json.loads(info["fields"]) if info.get("fields") else []
 
-            name = row["name"]
-            all_fields = json.loads(row["fields"]) if row["fields"] else []
-            data = json.loads(row["data"]) if row["data"] else []
+        if fields:
+            field_names = fields
+        else:
+            field_names = [f.get("name") or f.get("field_name", "unknown") for f in all_fields]
 
-            if fields:
-                field_names = fields
+        # 字段名与数据列的对应关系（允许部分匹配）
+        column_map = {}
+        for fn in field_names:
+            if fn in df.columns:
+                column_map[fn] = fn
             else:
-                field_names = [f.get("name") or f.get("field_name", "unknown") for f in all_fields]
-
-            filtered_data = []
-            for row_data in data:
-                if where:
-                    try:
-                        if not self._evaluate_where(row_data, where):
-                            continue
-                    except:
-                        continue
-                
-                row_dict = {}
-                for fn in field_names:
-                    if fn in row_data:
-                        row_dict[fn] = row_data[fn]
-                    else:
-                        for key in row_data.keys():
-                            if fn in key or key in fn:
-                                row_dict[fn] = row_data[key]
-                                break
-                
-                if row_dict:
-                    filtered_data.append(row_dict)
-
-            if order_by:
-                try:
-                    reverse = "DESC" in order_by.upper()
-                    order_field = order_by.split()[0].strip()
-                    filtered_data.sort(
-                        key=lambda x: x.get(order_field, ""),
-                        reverse=reverse
-                    )
-                except:
-                    pass
-
-            total = len(filtered_data)
-            paginated_data = filtered_data[offset:offset + limit]
+                for key in df.columns:
+                    if fn in key or key in fn:
+                        column_map[fn] = key
+                        break
 
-            return {
-                "success": True,
-                "data": paginated_data,
-                "count": len(paginated_data),
-                "total": total,
-                "snapshot_name": name,
-                "pagination": {
-                    "limit": limit,
-                    "offset": offset,
-                    "total": total
-                }
+        try:
+            df = filter_frame(df, where)
+        except PredicateError as e:
+            return {"success": False, "error": f"筛选条件无效: {str(e)}"}
+
+        if not column_map:
+            df = df.iloc[0:0]
+        df = df[list(column_map.values())].set_axis(list(column_map.keys()), axis=1)
+        df = sort_frame(df, order_by)
+
+        total = len(df)
+        paginated_data = dataframe_to_records(df.iloc[offset:offset + limit])
+
+        return {
+            "success": True,
+            "data": paginated_data,
+            "count": len(paginated_data),
+            "total": total,
+            "snapshot_name": name,
+            "pagination": {
+                "limit": limit,
+                "offset": offset,
+                "total": total
             }
-        finally:
-            conn.close()
-
-    def _evaluate_where(self, row: dict, where: str) -> bool:
-        """简单条件评估"""
-        where_upper = where.upper()
-        
-        if " AND " in where_upper:
-            parts = where.split(" AND ")
-            return all(self._evaluate_where(row, p.strip()) for p in parts)
-        
-        if " OR " in where_upper:
-            parts = where.split(" OR ")
-            return any(self._evaluate_where(row, p.strip()) for p in parts)
-        
-        operators = [">=", "<=", "!=", ">", "<", "="]
-        for op in operators:
-            if op in where:
-                parts = where.split(op, 1)
-                if len(parts) == 2:
-                    field = parts[0].strip()
-                    value = parts[1].strip().strip("'\"")
-                    
-                    row_value = row.get(field)
-                    if row_value is None:
-                        return False
-                    
-                    try:
-                        if op == "=":
-                            return str(row_value) == value or row_value == value
-                        elif op == "!=":
-                            return str(row_value) != value and row_value != value
-                        elif op == ">":
-                            return float(row_value) > float(value)
-                        elif op == "<":
-                            return float(row_value) < float(value)
-                        elif op == ">=":
-                            return float(row_value) >= float(value)
-                        elif op == "<=":
-                            return float(row_value) <= float(value)
-                    except (ValueError, TypeError):
-                        return str(row_value) == value
-        return True
+        }
 
 
 class ExecuteSQLTool:
@@ -428,29 +356,27 @@ class ExecuteSQLTool:
             if keyword in sql_upper:
                 return {"success": False, "error": f"禁止使用{keyword}语句"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
+        with _get_main_db_connection() as conn:
+            cursor = conn.cursor()
 
-        try:
-            if "LIMIT" not in sql_upper:
-                sql += f" LIMIT {limit}"
+            try:
+                if "LIMIT" not in sql_upper:
+                    sql += f" LIMIT {limit}"
 
-            cursor.execute(sql)
-            rows = cursor.fetchall()
+                cursor.execute(sql)
+                rows = cursor.fetchall()
 
-            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
 
-            return {
-                "success": True,
-                "data": [dict(zip(columns, row)) for row in rows],
-                "count": len(rows),
-                "columns": columns,
-                "sql": sql
-            }
-        except sqlite3.Error as e:
-            return {"success": False, "error": f"SQL执行错误: {str(e)}"}
-        finally:
-            conn.close()
+                return {
+                    "success": True,
+                    "data": [dict(zip(columns, row)) for row in rows],
+                    "count": len(rows),
+                    "columns": columns,
+                    "sql": sql
+                }
+            except sqlite3.Error as e:
+                return {"success": False, "error": f"SQL执行错误: {str(e)}"}
 
 
 class CreateSnapshotTableTool:
@@ -500,31 +426,25 @@ class CreateSnapshotTableTool:
         if not name:
             return {"success": False, "error": "name是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute("""
-                INSERT INTO data_snapshots (name, data_flow_id, worksheet_id, fields, data)
-                VALUES (?, ?, ?, ?, ?)
-            """, (name, data_flow_id, worksheet_id, json.dumps(fields, ensure_ascii=False), json.dumps(data, ensure_ascii=False)))
-
-            snapshot_id = cursor.lastrowid
-            conn.commit()
+            created = get_snapshot_store(MAIN_DB_PATH).create_snapshot(
+                name=name,
+                fields=fields,
+                data=data,
+                data_flow_id=data_flow_id,
+                worksheet_id=worksheet_id
+            )
 
             return {
                 "success": True,
                 "data": {
-                    "snapshot_id": snapshot_id,
+                    "snapshot_id": created["snapshot_id"],
                     "name": name,
-                    "row_count": len(data)
+                    "row_count": created["row_count"]
                 }
             }
         except sqlite3.Error as e:
-            conn.rollback()
             return {"success": False, "error": f"数据库错误: {str(e)}"}
-        finally:
-            conn.close()
 
 
 class DeleteSnapshotTool:
@@ -554,36 +474,20 @@ class DeleteSnapshotTool:
         if not snapshot_id:
             return {"success": False, "error": "snapshot_id是必需的"}
 
-        conn = _get_main_db_connection()
-        cursor = conn.cursor()
-
         try:
-            cursor.execute(
-                "SELECT name FROM data_snapshots WHERE id = ?",
-                (snapshot_id,)
-            )
-            row = cursor.fetchone()
-            if not row:
+            deleted = get_snapshot_store(MAIN_DB_PATH).delete_snapshot(snapshot_id)
+            if not deleted:
                 return {"success": False, "error": f"快照不存在: id={snapshot_id}"}
 
-            name = row["name"]
-
-            cursor.execute("DELETE FROM data_snapshots WHERE id = ?", (snapshot_id,))
-
-            conn.commit()
-
             return {
                 "success": True,
                 "data": {
                     "deleted_snapshot_id": snapshot_id,
-                    "deleted_name": name
+                    "deleted_name": deleted["name"]
                 }
             }
         except sqlite3.Error as e:
-            conn.rollback()
             return {"success": False, "error": f"数据库错误: {str(e)}"}
-        finally:
-            conn.close()
 
 
 def register_database_tools(mcp_service):
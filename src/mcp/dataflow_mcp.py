@@ -289,37 +289,34 @@ class GetDataFlowSnapshotsTool:
         if not dataflow_id:
             return {"success": False, "error": "dataflow_id是必需的"}
 
-        from src.mcp.database_mcp import _get_snapshot_connection
+        from src.mcp.database_mcp import _get_main_db_connection
+        from src.core.snapshot_store import get_snapshot_store
 
-        conn = _get_snapshot_connection()
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(
-                "SELECT id, name, table_name, row_count, created_at FROM snapshots WHERE data_flow_id = ? ORDER BY created_at DESC",
+        with _get_main_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT id, name, created_at FROM data_snapshots WHERE data_flow_id = ? ORDER BY created_at DESC",
                 (dataflow_id,)
-            )
-            rows = cursor.fetchall()
+            ).fetchall()
 
-            return {
-                "success": True,
-                "data": {
-                    "dataflow_id": dataflow_id,
-                    "snapshots": [
-                        {
-                            "id": row["id"],
-                            "name": row["name"],
-                            "table_name": row["table_name"],
-                            "row_count": row["row_count"],
-                            "created_at": row["created_at"]
-                        }
-                        for row in rows
-                    ],
-                    "total": len(rows)
-                }
+        row_counts = get_snapshot_store().row_counts([row["id"] for row in rows])
+        return {
+            "success": True,
+            "data": {
+                "dataflow_id": dataflow_id,
+                "snapshots": [
+                    {
+                        "id": row["id"],
+                        "name": row["name"],
+                        # 快照以名称作为表名（与 pbbi_get_snapshot_schema 的 table_name 参数一致）
+                        "table_name": row["name"],
+                        "row_count": row_counts.get(row["id"], 0),
+                        "created_at": row["created_at"]
+                    }
+                    for row in rows
+                ],
+                "total": len(rows)
             }
-        finally:
-            conn.close()
+        }
 
 
 def register_dataflow_tools(mcp_service):
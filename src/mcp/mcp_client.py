@@ -5,9 +5,9 @@ import httpx
 import json
 
 from src.mcp.service import mcp_service
-from src.mcp.tools import register_all_tools
+from src.mcp.registry import get_tool_registry, register_builtin_tools
 
-register_all_tools(mcp_service)
+register_builtin_tools(mcp_service)
 
 router = APIRouter(prefix="", tags=["mcp"])
 
@@ -19,17 +19,7 @@ class McpToolRequest(BaseModel):
 @router.post("/v1/tool/list")
 async def list_mcp_tools(request: McpToolRequest):
     """MCP工具列表接口 - JoyAgent需要调用此接口获取工具列表"""
-    tools = mcp_service.list_tools()
-    return {
-        "tools": [
-            {
-                "name": t.name,
-                "description": t.description,
-                "parameters": t.parameters
-            }
-            for t in tools
-        ]
-    }
+    return {"tools": list(get_tool_registry(mcp_service).listing)}
 
 @router.post("/v1/tool/call")
 async def call_mcp_tool(request: McpToolRequest):
@@ -38,7 +28,7 @@ async def call_mcp_tool(request: McpToolRequest):
         raise HTTPException(status_code=400, detail="Tool name is required")
     
     arguments = request.arguments or {}
-    result = mcp_service.execute_tool(request.name, arguments)
+    result = await mcp_service.execute_tool_async(request.name, arguments)
     
     if not result.get("success", False):
         raise HTTPException(status_code=400, detail=result.get("error", "Tool execution failed"))
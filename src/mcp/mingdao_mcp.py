@@ -5,8 +5,11 @@ MingDao MCP - 明道云API操作工具
 
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import itertools
 import json
 
+from src.core.config import MINGDAO_SYNC_PAGE_SIZE
+from src.core.snapshot_store import MAIN_DB_PATH, get_snapshot_store
 from src.mcp.service import MCPTool
 from src.services.mingdao import MingDaoService
 
@@ -292,7 +295,7 @@ class MingDaoSaveSnapshotTool:
                 },
                 "page_size": {
                     "type": "integer",
-                    "description": "获取数据数量，默认1000"
+                    "description": "每页获取的行数，默认1000（会分页获取工作表的全部数据）"
                 },
                 "connection_name": {
                     "type": "string",
@@ -318,7 +321,7 @@ class MingDaoSaveSnapshotTool:
         worksheet_id = params.get("worksheet_id")
         snapshot_name = params.get("snapshot_name")
         field_ids = params.get("field_ids")
-        page_size = params.get("page_size", 1000)
+        page_size = params.get("page_size", MINGDAO_SYNC_PAGE_SIZE)
         connection_name = params.get("connection_name", "default")
 
         if not worksheet_id or not snapshot_name:
@@ -344,51 +347,54 @@ class MingDaoSaveSnapshotTool:
             
             fields = fields_result.get("data", {}).get("data", [])
 
-            rows = service.get_data(
+            import time
+
+            table_name = f"mingdao_{worksheet_id}_{int(time.time())}"
+            snapshot_fields = [
+                {
+                    "name": f.get("name") or f.get("fieldName"),
+                    "field_id": f.get("fieldId") or f.get("field_id"),
+                    "type": f.get("type")
+                }
+                for f in fields
+                if not field_ids or (f.get("fieldId") or f.get("field_id")) in field_ids
+            ]
+
+            # 分页获取全部数据并逐页写入快照，不在内存中保留整个工作表
+            progress = {"fetched": 0, "total": None, "pages": 0}
+
+            def on_progress(fetched: int, total: Optional[int]):
+                progress.update(fetched=fetched, total=total, pages=progress["pages"] + 1)
+
+            pages = service.iter_pages(
                 worksheet_id,
                 field_ids=field_ids,
-                page_size=page_size
+                page_size=page_size,
+                on_progress=on_progress
             )
-
-            if not rows:
+            first_page = next(pages, [])
+            if not first_page:
                 return {"success": False, "error": "获取的数据为空"}
 
-            from src.mcp.database_mcp import CreateSnapshotTableTool
-            import time
-            
-            table_name = f"mingdao_{worksheet_id}_{int(time.time())}"
-            
-            create_params = {
-                "name": snapshot_name,
-                "table_name": table_name,
-                "fields": [
-                    {
-                        "name": f.get("name") or f.get("fieldName"),
-                        "field_id": f.get("fieldId") or f.get("field_id"),
-                        "type": f.get("type")
-                    }
-                    for f in fields
-                    if not field_ids or (f.get("fieldId") or f.get("field_id")) in field_ids
-                ],
-                "data": rows
-            }
-
-            create_tool = CreateSnapshotTableTool()
-            create_result = create_tool.execute(create_params)
+            created = get_snapshot_store(MAIN_DB_PATH).create_snapshot_from_chunks(
+                name=snapshot_name,
+                fields=snapshot_fields,
+                chunks=itertools.chain([first_page], pages),
+                worksheet_id=worksheet_id
+            )
 
-            if create_result.get("success"):
-                return {
-                    "success": True,
-                    "data": {
-                        "snapshot_name": snapshot_name,
-                        "table_name": table_name,
-                        "row_count": len(rows),
-                        "worksheet_id": worksheet_id,
-                        "snapshot_id": create_result.get("data", {}).get("snapshot_id")
-                    }
+            return {
+                "success": True,
+                "data": {
+                    "snapshot_name": snapshot_name,
+                    "table_name": table_name,
+                    "row_count": created["row_count"],
+                    "total": progress["total"],
+                    "pages": progress["pages"],
+                    "worksheet_id": worksheet_id,
+                    "snapshot_id": created["snapshot_id"]
                 }
-            else:
-                return {"success": False, "error": f"创建快照失败: {create_result.get('error')}"}
+            }
 
         except Exception as e:
             return {"success": False, "error": f"保存快照失败: {str(e)}"}
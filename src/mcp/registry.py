@@ -0,0 +1,110 @@
+"""
+MCP工具注册表
+进程内只注册一次全部内置工具，并生成不可变的工具快照（名称查找表与工具列表），
+Agent、工具执行器与各接口共享同一份快照，不再各自重复注册和构建工具列表
+"""
+
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from src.mcp.service import MCPService, MCPTool, mcp_service
+
+
+def _builtin_registrars() -> List[Callable[[MCPService], Any]]:
+    """内置工具的注册函数，后注册的同名工具覆盖先注册的"""
+    from src.mcp.tools import register_all_tools
+    from src.mcp.database_mcp import register_database_tools
+    from src.mcp.mingdao_mcp import register_mingdao_tools
+    from src.mcp.localfile_mcp import register_localfile_tools
+    from src.mcp.dataflow_mcp import register_dataflow_tools
+    from src.mcp.analysis_mcp import register_analysis_tools
+    from src.mcp.dashboard_mcp import register_dashboard_tools
+    from src.mcp.chart_mcp import register_chart_tools
+
+    return [
+        register_all_tools,
+        register_database_tools,
+        register_mingdao_tools,
+        register_localfile_tools,
+        register_dataflow_tools,
+        register_analysis_tools,
+        register_dashboard_tools,
+        register_chart_tools,
+    ]
+
+
+@dataclass(frozen=True, eq=False)
+class ToolRegistry:
+    """某一时刻已注册工具的只读快照"""
+    tools: Mapping[str, MCPTool]
+    names: FrozenSet[str]
+    # 与 /tools 接口返回格式一致的工具列表（name、description、parameters）
+    listing: Tuple[Dict[str, Any], ...]
+    listing_by_name: Mapping[str, Dict[str, Any]]
+    version: int
+    build_seconds: float = 0.0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, name: str) -> Optional[MCPTool]:
+        return self.tools.get(name)
+
+    def describe(self, name: str) -> Optional[Dict[str, Any]]:
+        """工具的列表项（name、description、parameters），不存在时返回None"""
+        return self.listing_by_name.get(name)
+
+
+_lock = threading.RLock()
+_registered: "weakref.WeakSet[MCPService]" = weakref.WeakSet()
+_registries: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+# 内置工具实际注册的次数（每个服务只应注册一次）
+registration_count = 0
+
+
+def register_builtin_tools(service: MCPService = mcp_service) -> MCPService:
+    """向服务注册全部内置工具，同一服务重复调用时直接返回"""
+    global registration_count
+    if service in _registered:
+        return service
+    with _lock:
+        if service not in _registered:
+            for register in _builtin_registrars():
+                register(service)
+            _registered.add(service)
+            registration_count += 1
+    return service
+
+
+def get_tool_registry(service: MCPService = mcp_service) -> ToolRegistry:
+    """获取服务的工具注册表快照，首次调用时注册内置工具；之后有新工具注册时重新生成快照"""
+    registry = _registries.get(service)
+    if registry is not None and registry.version == service.version:
+        return registry
+    with _lock:
+        register_builtin_tools(service)
+        registry = _registries.get(service)
+        if registry is None or registry.version != service.version:
+            start = time.perf_counter()
+            tools = dict(service.tools)
+            listing = tuple(
+                {"name": t.name, "description": t.description, "parameters": t.parameters}
+                for t in tools.values()
+            )
+            registry = ToolRegistry(
+                tools=MappingProxyType(tools),
+                names=frozenset(tools),
+                listing=listing,
+                listing_by_name=MappingProxyType({item["name"]: item for item in listing}),
+                version=service.version,
+                build_seconds=time.perf_counter() - start,
+            )
+            _registries[service] = registry
+        return registry
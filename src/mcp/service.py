@@ -1,8 +1,16 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any, Callable
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import asyncio
+import inspect
+import threading
+import weakref
 import json
 
+from src.core.config import MCP_TOOL_WORKERS, MCP_TOOL_TIMEOUT
+
 class MCPTool(BaseModel):
     name: str
     description: str
@@ -12,17 +20,58 @@ class MCPTool(BaseModel):
         frozen = True
 
 class MCPService:
-    def __init__(self):
+    """MCP工具注册与执行
+
+    异步处理函数直接在事件循环中await；同步处理函数（sqlite3读写、图表渲染等）
+    放入有界线程池执行，避免阻塞事件循环上的其他请求。
+    每个工具可单独配置并发上限与超时，多个工具可共用一个并发组（如共享matplotlib状态的图表工具）。
+    同步入口 execute_tool 与 execute_tool_async 共用同一组并发上限（同步入口不设超时）。
+    """
+
+    def __init__(self, max_workers: int = None, default_timeout: float = None):
         self.tools: Dict[str, MCPTool] = {}
         self.tool_handlers: Dict[str, Callable] = {}
+        self.tool_limits: Dict[str, Dict[str, Any]] = {}
+        # 工具或处理函数每次注册时递增，用于判断工具注册表快照是否过期
+        self.version = 0
+        self.max_workers = max_workers or MCP_TOOL_WORKERS
+        self.default_timeout = MCP_TOOL_TIMEOUT if default_timeout is None else default_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # asyncio.Semaphore绑定事件循环，按循环分别保存，用于在提交到线程池前排队
+        self._semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # 并发组 -> 线程信号量，同步处理函数执行期间持有，跨事件循环与同步入口限制同一组的并发
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
 
-    def register_tool(self, tool: MCPTool, handler: Callable = None):
+    def register_tool(self, tool: MCPTool, handler: Callable = None, **limits):
         self.tools[tool.name] = tool
+        self.version += 1
         if handler:
             self.tool_handlers[tool.name] = handler
+        if limits:
+            self.configure_tool(tool.name, **limits)
 
-    def register_handler(self, name: str, handler: Callable):
+    def register_handler(self, name: str, handler: Callable, **limits):
         self.tool_handlers[name] = handler
+        self.version += 1
+        if limits:
+            self.configure_tool(name, **limits)
+
+    def configure_tool(self, name: str, max_concurrency: int = None, timeout: float = None,
+                       group: str = None):
+        """设置工具的并发上限、超时（秒）与并发组，未设置的项保持不变"""
+        limits = self.tool_limits.setdefault(name, {})
+        if max_concurrency is not None:
+            limits["max_concurrency"] = max_concurrency
+        if timeout is not None:
+            limits["timeout"] = timeout
+        if group is not None:
+            limits["group"] = group
+        for semaphores in self._semaphores.values():
+            semaphores.pop(limits.get("group", name), None)
+        with self._slots_lock:
+            self._slots.pop(limits.get("group", name), None)
 
     def get_tool(self, name: str) -> Optional[MCPTool]:
         return self.tools.get(name)
@@ -30,20 +79,126 @@ class MCPService:
     def list_tools(self) -> List[MCPTool]:
         return list(self.tools.values())
 
-    def execute_tool(self, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def _resolve(self, name: str):
         tool = self.get_tool(name)
         if not tool:
-            return {"success": False, "error": f"Tool {name} not found"}
+            return None, {"success": False, "error": f"Tool {name} not found"}
 
         handler = self.tool_handlers.get(name)
         if not handler:
-            return {"success": False, "error": f"No handler for tool {name}"}
+            return None, {"success": False, "error": f"No handler for tool {name}"}
+        return handler, None
+
+    def execute_tool(self, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        handler, error = self._resolve(name)
+        if error:
+            return error
 
         try:
+            result = self._run_limited(handler, params, self._get_slot(name), await_result=True)
+            return {"success": True, "data": result}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="mcp-tool"
+                    )
+        return self._executor
+
+    def _get_slot(self, name: str) -> Optional[threading.BoundedSemaphore]:
+        limits = self.tool_limits.get(name, {})
+        max_concurrency = limits.get("max_concurrency")
+        if not max_concurrency:
+            return None
+        key = limits.get("group", name)
+        with self._slots_lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(max_concurrency)
+            return self._slots[key]
+
+    @staticmethod
+    def _run_limited(handler: Callable, params: Dict[str, Any],
+                     slot: Optional[threading.BoundedSemaphore], await_result: bool = False) -> Any:
+        """在当前线程执行处理函数，执行期间持有并发组的线程信号量"""
+        with slot or nullcontext():
             result = handler(params)
+            return asyncio.run(result) if await_result and inspect.isawaitable(result) else result
+
+    def _get_semaphore(self, name: str) -> Optional[asyncio.Semaphore]:
+        limits = self.tool_limits.get(name, {})
+        max_concurrency = limits.get("max_concurrency")
+        if not max_concurrency:
+            return None
+        key = limits.get("group", name)
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if key not in semaphores:
+            semaphores[key] = asyncio.Semaphore(max_concurrency)
+        return semaphores[key]
+
+    async def _call_sync(self, handler: Callable, params: Dict[str, Any],
+                         semaphore: Optional[asyncio.Semaphore], timeout: Optional[float],
+                         slot: Optional[threading.BoundedSemaphore] = None) -> Any:
+        """在线程池中执行同步处理函数
+
+        超时只结束等待，线程中的处理函数仍会运行到结束，因此并发许可在线程结束后才释放，
+        避免超时后同一并发组（如共享matplotlib状态的图表工具）的下一次调用与仍在运行的调用重叠
+        """
+        loop = asyncio.get_running_loop()
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            future = self._get_executor().submit(self._run_limited, handler, params, slot)
+        except BaseException:
+            if semaphore is not None:
+                semaphore.release()
+            raise
+
+        if semaphore is not None:
+            def release(_):
+                try:
+                    loop.call_soon_threadsafe(semaphore.release)
+                except RuntimeError:
+                    # 事件循环已关闭，信号量随循环一起失效
+                    pass
+            future.add_done_callback(release)
+
+        result = await asyncio.wait_for(asyncio.wrap_future(future), timeout or None)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def execute_tool_async(self, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """在事件循环中执行工具，同步处理函数在线程池中运行"""
+        handler, error = self._resolve(name)
+        if error:
+            return error
+
+        timeout = self.tool_limits.get(name, {}).get("timeout", self.default_timeout)
+        semaphore = self._get_semaphore(name)
+        try:
+            if not inspect.iscoroutinefunction(handler):
+                result = await self._call_sync(handler, params, semaphore, timeout, self._get_slot(name))
+            elif semaphore is None:
+                result = await asyncio.wait_for(handler(params), timeout or None)
+            else:
+                async with semaphore:
+                    result = await asyncio.wait_for(handler(params), timeout or None)
             return {"success": True, "data": result}
+        except asyncio.TimeoutError:
+            return {"success": False, "error": f"工具 {name} 执行超时（{timeout}秒）"}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def shutdown(self):
+        """关闭工具线程池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
 
 mcp_service = MCPService()
@@ -3,6 +3,8 @@ from datetime import datetime
 import json
 
 from src.mcp.service import MCPTool
+from src.core.snapshot_store import get_snapshot_store, dataframe_to_records
+from src.core.sqlite_pool import get_sqlite_pool
 
 class BaseTool:
     def get_name(self) -> str:
@@ -230,10 +232,6 @@ class GetSchemaTool(BaseTool):
         }
 
     def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        from src.core.database import SessionLocal
-        import sqlite3
-
-        db_path = "config/pb_bi.db"
         table_name = params.get("table_name")
 
         tables = ["users", "data_flows", "field_types", "data_snapshots", "dashboards"]
@@ -244,30 +242,28 @@ class GetSchemaTool(BaseTool):
             tables = [table_name]
 
         schema = {}
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        for table in tables:
-            cursor.execute(f"PRAGMA table_info({table})")
-            columns = cursor.fetchall()
+        with get_sqlite_pool().reader() as conn:
+            cursor = conn.cursor()
 
-            cursor.execute(f"SELECT * FROM {table} LIMIT 3")
-            sample_rows = cursor.fetchall()
+            for table in tables:
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = cursor.fetchall()
 
-            schema[table] = {
-                "columns": [
-                    {
-                        "name": col[1],
-                        "type": col[2],
-                        "nullable": not col[3],
-                        "primary_key": bool(col[5])
-                    }
-                    for col in columns
-                ],
-                "sample_data": [dict(zip([c[1] for c in columns], row)) for row in sample_rows]
-            }
+                cursor.execute(f"SELECT * FROM {table} LIMIT 3")
+                sample_rows = cursor.fetchall()
 
-        conn.close()
+                schema[table] = {
+                    "columns": [
+                        {
+                            "name": col[1],
+                            "type": col[2],
+                            "nullable": not col[3],
+                            "primary_key": bool(col[5])
+                        }
+                        for col in columns
+                    ],
+                    "sample_data": [dict(zip([c[1] for c in columns], row)) for row in sample_rows]
+                }
 
         return {
             "success": True,
@@ -294,6 +290,7 @@ class GetSnapshotsTool(BaseTool):
         }
 
     def execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        from sqlalchemy.orm import defer
         from src.core.database import SessionLocal
         from src.models.config import DataSnapshot
 
@@ -305,7 +302,10 @@ class GetSnapshotsTool(BaseTool):
             if dataflow_id:
                 query = query.filter(DataSnapshot.data_flow_id == dataflow_id)
 
-            snapshots = query.order_by(DataSnapshot.created_at.desc()).limit(50).all()
+            snapshots = query.options(defer(DataSnapshot.data)).order_by(
+                DataSnapshot.created_at.desc()
+            ).limit(50).all()
+            row_counts = get_snapshot_store().row_counts([s.id for s in snapshots])
 
             return {
                 "success": True,
@@ -315,7 +315,7 @@ class GetSnapshotsTool(BaseTool):
                         "name": s.name,
                         "data_flow_id": s.data_flow_id,
                         "worksheet_id": s.worksheet_id,
-                        "row_count": len(json.loads(s.data)) if s.data else 0,
+                        "row_count": row_counts.get(s.id, 0),
                         "created_at": s.created_at.isoformat() if s.created_at else None
                     }
                     for s in snapshots
@@ -365,7 +365,7 @@ class GetSnapshotDataTool(BaseTool):
                     "data_flow_id": snapshot.data_flow_id,
                     "worksheet_id": snapshot.worksheet_id,
                     "fields": json.loads(snapshot.fields) if snapshot.fields else [],
-                    "data": json.loads(snapshot.data) if snapshot.data else [],
+                    "data": dataframe_to_records(get_snapshot_store().read_frame(snapshot.id)),
                     "created_at": snapshot.created_at.isoformat() if snapshot.created_at else None
                 }
             }
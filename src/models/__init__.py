@@ -1,4 +1,5 @@
 from src.models.user import User
-from src.models.config import DataFlow, FieldType, DataSnapshot, Dashboard
+from src.models.config import DataFlow, FieldType, DataSnapshot, DataFlowSyncState, DataFlowSchedule, SyncJob, Dashboard
 
-__all__ = ["User", "DataFlow", "FieldType", "DataSnapshot", "Dashboard"]
+__all__ = ["User", "DataFlow", "FieldType", "DataSnapshot", "DataFlowSyncState", "DataFlowSchedule", "SyncJob",
+           "Dashboard"]
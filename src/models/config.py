@@ -19,6 +19,11 @@ class DataFlow(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     field_types = relationship("FieldType", back_populates="data_flow", cascade="all, delete-orphan")
+    sync_state = relationship("DataFlowSyncState", back_populates="data_flow", uselist=False,
+                              cascade="all, delete-orphan")
+    schedule = relationship("DataFlowSchedule", back_populates="data_flow", uselist=False,
+                            cascade="all, delete-orphan")
+    sync_jobs = relationship("SyncJob", back_populates="data_flow", cascade="all, delete-orphan")
 
 class FieldType(Base):
     __tablename__ = "field_types"
@@ -44,10 +49,65 @@ class DataSnapshot(Base):
     worksheet_id = Column(String, nullable=False)
     fields = Column(Text, nullable=False)
     data = Column(Text, nullable=False)
+    storage = Column(String, nullable=False, default="json")
+    version = Column(String, nullable=True)
+    row_count = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     data_flow = relationship("DataFlow")
 
+class DataFlowSyncState(Base):
+    """数据流的同步状态：增量同步写入的快照与已同步到的最后修改时间（高水位）"""
+    __tablename__ = "data_flow_sync_states"
+
+    data_flow_id = Column(Integer, ForeignKey("data_flows.id"), primary_key=True)
+    snapshot_id = Column(Integer, ForeignKey("data_snapshots.id"), nullable=True)
+    high_water_mark = Column(String, nullable=True)
+    field_ids = Column(Text, nullable=True)
+    row_count = Column(Integer, nullable=True)
+    last_mode = Column(String, nullable=True)
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    data_flow = relationship("DataFlow", back_populates="sync_state")
+
+class DataFlowSchedule(Base):
+    """数据流的定时刷新计划：cron 表达式（分 时 日 月 周，本地时间）与下次执行时间"""
+    __tablename__ = "data_flow_schedules"
+
+    data_flow_id = Column(Integer, ForeignKey("data_flows.id"), primary_key=True)
+    cron = Column(String, nullable=False)
+    mode = Column(String, nullable=False, default="incremental")
+    is_enabled = Column(Integer, nullable=False, default=1)
+    next_run_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    data_flow = relationship("DataFlow", back_populates="schedule")
+
+class SyncJob(Base):
+    """数据流刷新任务：状态为 pending/running/succeeded/failed，失败后按重试策略重新排队"""
+    __tablename__ = "sync_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    data_flow_id = Column(Integer, ForeignKey("data_flows.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    mode = Column(String, nullable=False, default="incremental")
+    trigger = Column(String, nullable=False, default="manual")
+    status = Column(String, nullable=False, default="pending", index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=1)
+    fetched = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    run_after = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    data_flow = relationship("DataFlow", back_populates="sync_jobs")
+
 class Dashboard(Base):
     __tablename__ = "dashboards"
 
@@ -45,6 +45,9 @@ class DataSnapshot(SQLModel, table=True):
     worksheet_id: str = Field(default="")
     fields: str = Field(default="[]")
     data: str = Field(default="[]")
+    storage: str = Field(default="json")
+    version: Optional[str] = Field(default=None)
+    row_count: Optional[int] = Field(default=None)
     created_at: Optional[datetime] = Field(default_factory=datetime.now)
 
     data_flow: Optional[DataFlow] = Relationship()
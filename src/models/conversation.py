@@ -27,7 +27,8 @@ class ConversationSession(Base):
     is_active = Column(Boolean, default=True, comment="是否活跃")
     is_archived = Column(Boolean, default=False, comment="是否已归档")
     
-    context_tokens = Column(Integer, default=0, comment="上下文token数")
+    context_tokens = Column(Integer, default=0, comment="上下文token数（各消息token数累计）")
+    last_prompt_tokens = Column(Integer, default=0, comment="最近一次请求发送给模型的上下文token数")
     context_limit = Column(Integer, default=4000, comment="上下文限制")
     
     created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
@@ -43,6 +44,7 @@ class ConversationSession(Base):
             "is_active": self.is_active,
             "is_archived": self.is_archived,
             "context_tokens": self.context_tokens,
+            "last_prompt_tokens": self.last_prompt_tokens or 0,
             "context_limit": self.context_limit,
             "context_warning": self.context_tokens > self.context_limit * 0.8,
             "created_at": self.created_at.isoformat() if self.created_at else None,
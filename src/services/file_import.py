@@ -0,0 +1,100 @@
+"""
+本地文件分块导入
+上传的文件由 Starlette 暂存在磁盘临时文件中，这里按块解析：CSV 使用 pandas 的 chunksize，
+xlsx 使用 openpyxl 只读模式逐行读取，每块交给 SnapshotStore.write_chunks 写入列式文件，
+内存中只保留一个数据块，导入大文件时内存占用不随文件大小增长
+"""
+
+import itertools
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from src.core.config import IMPORT_CHUNK_ROWS
+
+SUPPORTED_EXTENSIONS = ("csv", "xlsx", "xls")
+
+
+class EmptyFileError(ValueError):
+    """文件中没有数据行"""
+
+
+def upload_extension(filename: Optional[str]) -> str:
+    return filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+
+
+def _column_names(header: Sequence[Any]) -> List[str]:
+    """与 pandas.read_excel 相同：空表头命名为 "Unnamed: i"，重复的表头依次加 ".1"、".2" 后缀"""
+    names: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else str(value)
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f"{base}.{seen[base]}"
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+
+def _iter_csv(fileobj: IO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    try:
+        reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+    except pd.errors.EmptyDataError:
+        raise EmptyFileError("文件内容为空")
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _iter_xlsx(fileobj: IO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = (row for row in workbook.active.iter_rows(values_only=True)
+                if any(value is not None for value in row))
+        header = next(rows, None)
+        if header is None:
+            raise EmptyFileError("文件内容为空")
+        columns = _column_names(header)
+        width = len(columns)
+        while True:
+            batch = [tuple(row[:width]) + (None,) * (width - len(row))
+                     for row in itertools.islice(rows, chunk_rows)]
+            if not batch:
+                break
+            yield pd.DataFrame.from_records(batch, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+def _iter_xls(fileobj: IO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    # xls 格式最多 65536 行，直接整表读取后分块
+    df = pd.read_excel(fileobj)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+
+
+def iter_file_chunks(fileobj: IO, extension: str,
+                     chunk_rows: int = IMPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """按块解析 CSV/Excel 文件，每块最多 chunk_rows 行"""
+    readers = {"csv": _iter_csv, "xlsx": _iter_xlsx, "xls": _iter_xls}
+    if extension not in readers:
+        raise ValueError("不支持的文件格式，仅支持CSV和Excel")
+    return readers[extension](fileobj, max(1, chunk_rows))
+
+
+def open_import(fileobj: IO, extension: str,
+                chunk_rows: int = IMPORT_CHUNK_ROWS) -> Tuple[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """开始分块导入，返回 (第一个数据块, 包含第一个数据块在内的全部数据块)
+
+    第一个数据块用于生成字段定义与预览；文件没有数据行时抛出 EmptyFileError
+    """
+    fileobj.seek(0)
+    chunks = (chunk for chunk in iter_file_chunks(fileobj, extension, chunk_rows) if len(chunk))
+    first = next(chunks, None)
+    if first is None:
+        raise EmptyFileError("文件内容为空")
+    return first, itertools.chain([first], chunks)
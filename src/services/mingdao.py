@@ -1,90 +1,77 @@
-import requests
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional
+
+from src.core.config import MINGDAO_SYNC_PAGE_SIZE, MINGDAO_SYNC_WORKERS
+from src.services.mingdao_client import (
+    MingDaoCircuitOpenError, MingDaoError, MingDaoRetryableError, get_mingdao_client, run_coroutine
+)
+from src.services.schema_cache import get_schema_cache
+
+# 行记录的系统字段：记录ID与最后修改时间
+ROW_ID_FIELD = "rowid"
+MODIFIED_FIELD = "utime"
+
+
+def modified_since(mark: str) -> Dict:
+    """筛选最后修改时间不早于 mark 的行（增量同步用，边界上的行会重复获取，按记录ID覆盖即可）"""
+    return {
+        "type": "group",
+        "logic": "AND",
+        "children": [
+            {"type": "condition", "field": MODIFIED_FIELD, "operator": "ge", "value": mark}
+        ]
+    }
+
 
 class MingDaoService:
+    """明道云接口的同步封装，请求由按 (appkey, base_url) 共享的异步客户端执行（见 mingdao_client）"""
+
     def __init__(self, appkey: str, sign: str, base_url: str = "https://api.mingdao.com"):
         self.appkey = appkey
         self.sign = sign
         self.base_url = base_url
-        self.headers = {
-            "Content-Type": "application/json",
-            "HAP-Appkey": appkey,
-            "HAP-Sign": sign
-        }
+        self.client = get_mingdao_client(appkey, sign, base_url)
 
-    def get_fields(self, worksheet_id: str) -> Dict:
-        try:
-            url = f"{self.base_url}/v3/app/worksheets/{worksheet_id}"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            result = response.json()
-            
-            success = result.get("error_code") == 1 or result.get("success") == True
-            fields = []
-            
-            if success:
-                data = result.get("data", {})
-                if isinstance(data, dict):
-                    fields = data.get("fields", [])
-                elif isinstance(data, list):
-                    fields = data
-            
-            return {
-                "success": success,
-                "data": {
-                    "data": fields
-                },
-                "error_msg": result.get("error_msg", ""),
-                "raw_response": result
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "data": {
-                    "data": []
-                },
-                "error_msg": str(e)
-            }
+    def get_fields(self, worksheet_id: str, refresh: bool = False) -> Dict:
+        """获取工作表字段，经过工作表结构缓存（见 schema_cache），refresh 为True时强制重新获取"""
+        return get_schema_cache().get_fields(self, worksheet_id, refresh)
+
+    def fetch_fields(self, worksheet_id: str, etag: Optional[str] = None) -> Dict:
+        """直接请求明道云获取工作表字段（不经过缓存），传入 etag 时发送条件请求"""
+        return run_coroutine(self.client.get_fields(worksheet_id, etag))
 
     def get_rows(self, worksheet_id: str, field_ids: Optional[List[str]] = None, page_size: int = 100) -> Dict:
-        url = f"{self.base_url}/v3/app/worksheets/{worksheet_id}/rows/list"
-        payload = {
-            "pageIndex": 1,
-            "pageSize": page_size
-        }
-        if field_ids:
-            payload["fields"] = field_ids
-        response = requests.post(url, headers=self.headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        return {
-            "success": result.get("error_code") == 1,
-            "data": {
-                "data": result.get("data", {}).get("rows", [])
-            }
-        }
+        return run_coroutine(self.client.get_rows(worksheet_id, field_ids, page_size))
 
     def test_connection(self) -> bool:
-        try:
-            url = f"{self.base_url}/v3/app"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            result = response.json()
-            return result.get("error_code") == 1 or result.get("success") == True
-        except Exception:
-            return False
+        return run_coroutine(self.client.test_connection())
 
     def get_data(self, worksheet_id: str, field_ids: Optional[List[str]] = None, page_index: int = 1, page_size: int = 100) -> List[Dict]:
-        url = f"{self.base_url}/v3/app/worksheets/{worksheet_id}/rows/list"
-        payload = {
-            "pageIndex": page_index,
-            "pageSize": page_size
-        }
-        if field_ids:
-            payload["fields"] = field_ids
-        
-        response = requests.post(url, headers=self.headers, json=payload, timeout=30)
-        result = response.json()
-        
-        if result.get("error_code") == 1:
-            return result.get("data", {}).get("rows", [])
-        else:
-            raise Exception(result.get("error_msg", "Unknown error"))
+        return run_coroutine(self.client.get_data(worksheet_id, field_ids, page_index, page_size))
+
+    def fetch_page(self, worksheet_id: str, field_ids: Optional[List[str]] = None,
+                   page_index: int = 1, page_size: int = 100, row_filter: Optional[Dict] = None) -> Dict:
+        """获取一页数据，返回 {"rows": 行列表, "total": 总行数（接口未返回时为None）}，row_filter 为行筛选条件
+
+        限流、服务端临时错误和网络错误时按指数退避重试，超过重试次数或接口返回其他错误时抛出 MingDaoError
+        """
+        return run_coroutine(self.client.fetch_page(worksheet_id, field_ids, page_index, page_size, row_filter))
+
+    def iter_pages(self, worksheet_id: str, field_ids: Optional[List[str]] = None,
+                   page_size: int = MINGDAO_SYNC_PAGE_SIZE, workers: int = MINGDAO_SYNC_WORKERS,
+                   on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                   row_filter: Optional[Dict] = None) -> Iterator[List[Dict]]:
+        """分页获取工作表的全部数据，按页码顺序逐页返回
+
+        先请求第一页得到总行数，其余分页并发获取：同时发出的请求不超过 workers 个，预取的分页不超过其两倍，
+        调用方逐页消费（如写入快照）时内存中只保留少量分页；接口未返回总行数时顺序翻页直到不足一页。
+        每返回一页调用一次 on_progress(已获取行数, 总行数)
+        """
+        pages = self.client.iter_pages(worksheet_id, field_ids, page_size, workers, on_progress, row_filter)
+        try:
+            while True:
+                try:
+                    yield run_coroutine(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            run_coroutine(pages.aclose())
@@ -0,0 +1,468 @@
+"""
+明道云异步HTTP客户端
+按 (appkey, base_url) 共享 httpx 连接池，请求依次经过熔断器、令牌桶限流和按主机的并发上限，
+限流、服务端临时错误与网络错误按指数退避重试。所有请求在同一个后台事件循环中执行，
+同步代码（run_coroutine）和其他事件循环中的协程都可以调用，限流与熔断状态在进程内共享
+"""
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+
+from src.core.config import (
+    MINGDAO_SYNC_PAGE_SIZE, MINGDAO_SYNC_WORKERS, MINGDAO_REQUEST_TIMEOUT,
+    MINGDAO_MAX_RETRIES, MINGDAO_RETRY_BASE_DELAY, MINGDAO_RETRY_MAX_DELAY,
+    MINGDAO_RATE_LIMIT, MINGDAO_RATE_BURST, MINGDAO_HOST_CONCURRENCY,
+    MINGDAO_BREAKER_THRESHOLD, MINGDAO_BREAKER_COOLDOWN
+)
+
+T = TypeVar("T")
+
+# 需要退避重试的HTTP状态码（限流与服务端临时错误）
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# 明道云接口在响应体中返回的限流错误码
+THROTTLE_ERROR_CODES = {10101}
+
+
+class MingDaoError(Exception):
+    """明道云接口返回错误"""
+
+
+class MingDaoRetryableError(MingDaoError):
+    """限流或服务端临时错误，可以退避后重试"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MingDaoCircuitOpenError(MingDaoError):
+    """主机熔断中，请求没有发出"""
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+# ============== 后台事件循环 ==============
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_loop_lock = threading.Lock()
+
+
+def _client_loop() -> asyncio.AbstractEventLoop:
+    """获取执行明道云请求的后台事件循环（首次调用时启动）"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed() or not _loop_thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="mingdao-client", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run_coroutine(coro: Awaitable[T]) -> T:
+    """在同步代码中执行客户端协程并等待结果"""
+    loop = _client_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("不能在明道云客户端事件循环中同步等待请求")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def _on_client_loop(coro: Awaitable[T]) -> T:
+    """在后台事件循环中执行协程；调用方在其他事件循环中时等待期间不阻塞调用方的循环"""
+    loop = _client_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+# ============== 限流与熔断 ==============
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 capacity 个；令牌不足时预支并等待到补足为止"""
+
+    def __init__(self, rate: float = MINGDAO_RATE_LIMIT, capacity: int = MINGDAO_RATE_BURST):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """取走一个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后熔断 cooldown 秒，期间请求直接失败；
+    冷却结束后只放行一个试探请求，成功则恢复，失败则重新熔断"""
+
+    def __init__(self, threshold: int = MINGDAO_BREAKER_THRESHOLD, cooldown: float = MINGDAO_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.trial or time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.trial = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial or (self.threshold > 0 and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+        self.trial = False
+
+    def release(self):
+        """试探请求被取消时释放试探名额"""
+        self.trial = False
+
+
+# 按主机共享的熔断器与并发上限（只在后台事件循环中使用）
+_breakers: Dict[str, CircuitBreaker] = {}
+_host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _breaker(host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker()
+    return breaker
+
+
+def _host_semaphore(host: str) -> asyncio.Semaphore:
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _host_semaphores[host] = asyncio.Semaphore(max(1, MINGDAO_HOST_CONCURRENCY))
+    return semaphore
+
+
+# ============== 客户端 ==============
+
+class MingDaoClient:
+    """明道云异步客户端，通过 get_mingdao_client 按 (appkey, base_url) 共享
+
+    公开的协程可以在任意事件循环中调用，实际请求在后台事件循环中执行
+    """
+
+    def __init__(self, appkey: str, sign: str, base_url: str = "https://api.mingdao.com"):
+        self.appkey = appkey
+        self.sign = sign
+        self.base_url = base_url.rstrip("/")
+        self.host = urlsplit(self.base_url).netloc or self.base_url
+        self.bucket = TokenBucket()
+        self.max_retries = MINGDAO_MAX_RETRIES
+        self.retry_base_delay = MINGDAO_RETRY_BASE_DELAY
+        self.retry_max_delay = MINGDAO_RETRY_MAX_DELAY
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "HAP-Appkey": self.appkey,
+            "HAP-Sign": self.sign
+        }
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(MINGDAO_REQUEST_TIMEOUT),
+                limits=httpx.Limits(max_connections=max(1, MINGDAO_HOST_CONCURRENCY))
+            )
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """第 attempt 次重试前的等待时间：指数增长并加随机抖动，服务端给出 Retry-After 时以其为准"""
+        if retry_after is not None:
+            return min(retry_after, self.retry_max_delay)
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _send(self, method: str, path: str, payload: Optional[Dict] = None,
+                    headers: Optional[Dict[str, str]] = None) -> Tuple[httpx.Response, Optional[Dict]]:
+        """发送一次请求，返回 (响应, 响应JSON)，304 未修改时JSON为None；
+        限流、服务端临时错误和网络错误时抛出 MingDaoRetryableError
+
+        网络错误和5xx计为主机失败，限流（429与限流错误码）说明主机可用，不计为失败
+        """
+        breaker = _breaker(self.host)
+        if not breaker.allow():
+            raise MingDaoCircuitOpenError(f"{self.host} 连续请求失败，暂停请求 {breaker.cooldown:g} 秒")
+        try:
+            await self.bucket.acquire()
+            async with _host_semaphore(self.host):
+                response = await self._client().request(method, path, json=payload,
+                                                        headers={**self.headers, **(headers or {})})
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            raise MingDaoRetryableError(f"网络错误: {e!r}") from e
+        except BaseException:
+            breaker.release()
+            raise
+
+        if response.status_code in RETRY_STATUS_CODES:
+            if response.status_code == 429:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            raise MingDaoRetryableError(f"HTTP {response.status_code}",
+                                        _retry_after(response.headers.get("Retry-After")))
+        breaker.record_success()
+
+        if response.status_code == 304:
+            return response, None
+        try:
+            result = response.json()
+        except ValueError:
+            raise MingDaoError(f"HTTP {response.status_code}: 响应不是有效的JSON")
+        if result.get("error_code") in THROTTLE_ERROR_CODES:
+            raise MingDaoRetryableError(result.get("error_msg") or "请求被限流")
+        return response, result
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict] = None,
+                       headers: Optional[Dict[str, str]] = None) -> Tuple[httpx.Response, Optional[Dict]]:
+        attempt = 0
+        while True:
+            try:
+                return await self._send(method, path, payload, headers)
+            except MingDaoRetryableError as e:
+                if attempt >= self.max_retries:
+                    raise MingDaoError(f"请求 {path} 失败（已重试{attempt}次）: {e}") from e
+                await asyncio.sleep(self._backoff(attempt, e.retry_after))
+                attempt += 1
+
+    async def request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        """发送请求并在可重试的错误时按指数退避重试，返回响应JSON（需在后台事件循环中执行）"""
+        return (await self._request(method, path, payload))[1]
+
+    # ============== 接口 ==============
+
+    async def get_fields(self, worksheet_id: str, etag: Optional[str] = None) -> Dict:
+        """获取工作表字段，返回结构与 MingDaoService.get_fields 相同，出错时不抛出异常
+
+        传入上次的 etag 时发送条件请求，服务端返回304时结果中 not_modified 为True且不包含字段
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        try:
+            response, result = await _on_client_loop(
+                self._request("GET", f"/v3/app/worksheets/{worksheet_id}", headers=headers)
+            )
+        except Exception as e:
+            return {"success": False, "data": {"data": []}, "error_msg": str(e)}
+
+        if result is None:
+            return {"success": True, "not_modified": True, "data": {"data": []}, "error_msg": "", "etag": etag}
+
+        success = result.get("error_code") == 1 or result.get("success") == True
+        fields = []
+        if success:
+            data = result.get("data", {})
+            if isinstance(data, dict):
+                fields = data.get("fields", [])
+            elif isinstance(data, list):
+                fields = data
+        return {
+            "success": success,
+            "data": {
+                "data": fields
+            },
+            "error_msg": result.get("error_msg", ""),
+            "etag": response.headers.get("ETag"),
+            "raw_response": result
+        }
+
+    async def test_connection(self) -> bool:
+        try:
+            result = await _on_client_loop(self.request("GET", "/v3/app"))
+        except Exception:
+            return False
+        return result.get("error_code") == 1 or result.get("success") == True
+
+    def _rows_payload(self, field_ids: Optional[List[str]], page_index: int, page_size: int,
+                      row_filter: Optional[Dict]) -> Dict:
+        payload = {
+            "pageIndex": page_index,
+            "pageSize": page_size
+        }
+        if field_ids:
+            payload["fields"] = field_ids
+        if row_filter:
+            payload["filter"] = row_filter
+        return payload
+
+    async def get_rows(self, worksheet_id: str, field_ids: Optional[List[str]] = None,
+                       page_size: int = 100) -> Dict:
+        """获取第一页数据，返回 {"success": ..., "data": {"data": 行列表}}"""
+        result = await _on_client_loop(self.request(
+            "POST", f"/v3/app/worksheets/{worksheet_id}/rows/list",
+            self._rows_payload(field_ids, 1, page_size, None)
+        ))
+        return {
+            "success": result.get("error_code") == 1,
+            "data": {
+                "data": (result.get("data") or {}).get("rows", [])
+            }
+        }
+
+    async def _fetch_page(self, worksheet_id: str, field_ids: Optional[List[str]], page_index: int,
+                          page_size: int, row_filter: Optional[Dict]) -> Dict:
+        result = await self.request(
+            "POST", f"/v3/app/worksheets/{worksheet_id}/rows/list",
+            self._rows_payload(field_ids, page_index, page_size, row_filter)
+        )
+        if result.get("error_code") != 1:
+            raise MingDaoError(result.get("error_msg", "Unknown error"))
+        data = result.get("data") or {}
+        total = data.get("total")
+        return {"rows": data.get("rows", []), "total": int(total) if total is not None else None}
+
+    async def fetch_page(self, worksheet_id: str, field_ids: Optional[List[str]] = None,
+                         page_index: int = 1, page_size: int = 100, row_filter: Optional[Dict] = None) -> Dict:
+        """获取一页数据，返回 {"rows": 行列表, "total": 总行数（接口未返回时为None）}，row_filter 为行筛选条件
+
+        接口返回错误或超过重试次数时抛出 MingDaoError
+        """
+        return await _on_client_loop(self._fetch_page(worksheet_id, field_ids, page_index, page_size, row_filter))
+
+    async def get_data(self, worksheet_id: str, field_ids: Optional[List[str]] = None,
+                       page_index: int = 1, page_size: int = 100) -> List[Dict]:
+        return (await self.fetch_page(worksheet_id, field_ids, page_index, page_size))["rows"]
+
+    async def _pages(self, worksheet_id: str, field_ids: Optional[List[str]], page_size: int,
+                     workers: int, row_filter: Optional[Dict]) -> AsyncIterator[Tuple[List[Dict], Optional[int]]]:
+        """按页码顺序生成 (行列表, 总行数)，需在后台事件循环中迭代"""
+        first = await self._fetch_page(worksheet_id, field_ids, 1, page_size, row_filter)
+        total = first["total"]
+        yield first["rows"], total
+
+        if total is None:
+            page_index, rows = 1, first["rows"]
+            while len(rows) >= page_size:
+                page_index += 1
+                rows = (await self._fetch_page(worksheet_id, field_ids, page_index, page_size, row_filter))["rows"]
+                if not rows:
+                    break
+                yield rows, total
+            return
+
+        pages = iter(range(2, math.ceil(total / page_size) + 1))
+        workers = max(1, workers)
+        # workers 限制同时发出的请求数，预取的分页不超过 workers 的两倍
+        running = asyncio.Semaphore(workers)
+        pending: Deque[asyncio.Task] = deque()
+
+        async def fetch(page_index: int) -> Dict:
+            async with running:
+                return await self._fetch_page(worksheet_id, field_ids, page_index, page_size, row_filter)
+
+        def submit_next():
+            page_index = next(pages, None)
+            if page_index is not None:
+                pending.append(asyncio.ensure_future(fetch(page_index)))
+
+        try:
+            for _ in range(workers * 2):
+                submit_next()
+            while pending:
+                rows = (await pending.popleft())["rows"]
+                submit_next()
+                yield rows, total
+        finally:
+            # 提前停止消费或出错时取消尚未完成的请求
+            for task in pending:
+                task.cancel()
+
+    async def iter_pages(self, worksheet_id: str, field_ids: Optional[List[str]] = None,
+                         page_size: int = MINGDAO_SYNC_PAGE_SIZE, workers: int = MINGDAO_SYNC_WORKERS,
+                         on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                         row_filter: Optional[Dict] = None) -> AsyncIterator[List[Dict]]:
+        """分页获取工作表的全部数据，按页码顺序逐页返回（见 MingDaoService.iter_pages）"""
+        pages = self._pages(worksheet_id, field_ids, page_size, workers, row_filter)
+        fetched = 0
+        try:
+            while True:
+                try:
+                    rows, total = await _on_client_loop(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+                fetched += len(rows)
+                if on_progress:
+                    on_progress(fetched, total)
+                yield rows
+        finally:
+            await _on_client_loop(pages.aclose())
+
+
+_clients: Dict[Tuple[str, str], MingDaoClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_mingdao_client(appkey: str, sign: str, base_url: str = "https://api.mingdao.com") -> MingDaoClient:
+    """获取 (appkey, base_url) 对应的共享客户端，sign 变化时更新为最新值"""
+    key = (appkey or "", (base_url or "").rstrip("/"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = MingDaoClient(appkey, sign, base_url)
+        client.sign = sign
+        return client
+
+
+async def close_mingdao_clients():
+    """关闭所有客户端的连接池（应用关闭时调用），之后再使用时重新建立"""
+    with _clients_lock:
+        clients = list(_clients.values())
+
+    async def close_all():
+        for client in clients:
+            await client.aclose()
+
+    await _on_client_loop(close_all())
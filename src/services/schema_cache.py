@@ -0,0 +1,215 @@
+"""
+明道云工作表结构缓存
+按 (base_url, worksheet_id) 缓存工作表字段，保存在主数据库的 worksheet_schemas 表中，重启后仍然有效。
+有效期内直接返回缓存；过期后先返回缓存，再在后台发送条件请求（If-None-Match）重新验证，
+只有没有缓存或强制刷新时才同步请求明道云
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from src.core.config import MINGDAO_SCHEMA_TTL
+from src.core.sqlite_pool import get_sqlite_pool
+
+SCHEMA_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS worksheet_schemas (
+        base_url TEXT NOT NULL,
+        worksheet_id TEXT NOT NULL,
+        fields TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        etag TEXT,
+        fetched_at REAL NOT NULL,
+        validated_at REAL NOT NULL,
+        PRIMARY KEY (base_url, worksheet_id)
+    )
+"""
+
+
+def _checksum(fields: List[Dict[str, Any]]) -> str:
+    return hashlib.sha1(json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class WorksheetSchemaCache:
+    """工作表结构缓存：内存中保存已读取的条目，数据库中保存全部条目
+
+    条目的 fetched_at 为字段内容最后变化的时间，validated_at 为最后一次与明道云确认的时间
+    """
+
+    def __init__(self, db_path: Union[str, Path] = None, ttl: float = MINGDAO_SCHEMA_TTL):
+        self.pool = get_sqlite_pool(db_path)
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._refreshing: Set[Tuple[str, str]] = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="schema-refresh")
+        self._table_ready = False
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def _key(base_url: str, worksheet_id: str) -> Tuple[str, str]:
+        return ((base_url or "").rstrip("/"), worksheet_id)
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            with self.pool.writer() as conn:
+                conn.execute(SCHEMA_TABLE_DDL)
+            self._table_ready = True
+
+    def _load(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        self._ensure_table()
+        with self.pool.reader() as conn:
+            row = conn.execute(
+                "SELECT fields, checksum, etag, fetched_at, validated_at FROM worksheet_schemas "
+                "WHERE base_url = ? AND worksheet_id = ?",
+                key
+            ).fetchone()
+        if row is None:
+            return None
+        entry = {**dict(row), "fields": json.loads(row["fields"])}
+        with self._lock:
+            return self._entries.setdefault(key, entry)
+
+    def _save(self, key: Tuple[str, str], fields: List[Dict[str, Any]], etag: Optional[str],
+              previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """保存获取到的字段；内容与上次相同时只更新确认时间"""
+        now = time.time()
+        checksum = _checksum(fields)
+        unchanged = previous is not None and previous["checksum"] == checksum
+        entry = {
+            "fields": previous["fields"] if unchanged else fields,
+            "checksum": checksum,
+            "etag": etag,
+            "fetched_at": previous["fetched_at"] if unchanged else now,
+            "validated_at": now
+        }
+        self._ensure_table()
+        with self.pool.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO worksheet_schemas "
+                "(base_url, worksheet_id, fields, checksum, etag, fetched_at, validated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(entry["fields"], ensure_ascii=False), checksum, etag,
+                 entry["fetched_at"], now)
+            )
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def _touch(self, key: Tuple[str, str], entry: Dict[str, Any]) -> Dict[str, Any]:
+        """服务端确认未修改，只更新确认时间"""
+        entry = {**entry, "validated_at": time.time()}
+        self._ensure_table()
+        with self.pool.writer() as conn:
+            conn.execute(
+                "UPDATE worksheet_schemas SET validated_at = ? WHERE base_url = ? AND worksheet_id = ?",
+                (entry["validated_at"], *key)
+            )
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def _result(entry: Dict[str, Any], cached: bool) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "data": {
+                "data": entry["fields"]
+            },
+            "error_msg": "",
+            "cached": cached,
+            "fetched_at": entry["fetched_at"],
+            "validated_at": entry["validated_at"]
+        }
+
+    def _fetch(self, service: Any, key: Tuple[str, str], previous: Optional[Dict[str, Any]],
+               conditional: bool = True) -> Dict[str, Any]:
+        """请求明道云获取字段并更新缓存，失败时返回请求结果且不修改缓存"""
+        etag = previous["etag"] if previous and conditional else None
+        result = service.fetch_fields(key[1], etag)
+        if result.get("not_modified") and previous is not None:
+            return self._result(self._touch(key, previous), cached=False)
+        if not result.get("success"):
+            return result
+        entry = self._save(key, result.get("data", {}).get("data", []), result.get("etag"), previous)
+        return self._result(entry, cached=False)
+
+    def _revalidate(self, service: Any, key: Tuple[str, str], previous: Dict[str, Any]):
+        try:
+            self._fetch(service, key, previous)
+        except Exception as e:
+            print(f"工作表结构后台验证失败 {key[1]}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_fields(self, service: Any, worksheet_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """获取工作表字段，返回结构与 MingDaoService.get_fields 相同（另含 cached、fetched_at、validated_at）
+
+        service 为 MingDaoService；refresh 为True时忽略缓存，直接请求明道云
+        """
+        key = self._key(service.base_url, worksheet_id)
+        if refresh:
+            return self._fetch(service, key, self._load(key), conditional=False)
+
+        entry = self._load(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return self._fetch(service, key, None)
+
+        with self._lock:
+            self.hits += 1
+            stale = time.time() - entry["validated_at"] >= self.ttl and key not in self._refreshing
+            if stale:
+                self._refreshing.add(key)
+                self.revalidations += 1
+        if stale:
+            self._executor.submit(self._revalidate, service, key, entry)
+        return self._result(entry, cached=True)
+
+    def invalidate(self, base_url: str, worksheet_id: str):
+        """删除缓存的工作表结构"""
+        key = self._key(base_url, worksheet_id)
+        with self._lock:
+            self._entries.pop(key, None)
+        self._ensure_table()
+        with self.pool.writer() as conn:
+            conn.execute("DELETE FROM worksheet_schemas WHERE base_url = ? AND worksheet_id = ?", key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_schema_cache: Optional[WorksheetSchemaCache] = None
+_schema_cache_lock = threading.Lock()
+
+
+def get_schema_cache() -> WorksheetSchemaCache:
+    """获取进程内共享的工作表结构缓存（保存在主数据库）"""
+    global _schema_cache
+    if _schema_cache is None:
+        with _schema_cache_lock:
+            if _schema_cache is None:
+                _schema_cache = WorksheetSchemaCache()
+    return _schema_cache
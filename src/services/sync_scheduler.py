@@ -0,0 +1,438 @@
+"""
+数据流定时刷新调度器
+刷新计划与刷新任务保存在主数据库（data_flow_schedules、sync_jobs），调度线程定期把到期的计划加入任务队列，
+再把待执行的任务分配给工作线程调用 sync_dataflow 生成新的快照版本，请求处理不再等待明道云。
+
+任务通过条件更新认领，多个进程同时运行调度器时同一任务只会执行一次；执行中的任务由调度线程定期更新心跳，
+进程退出后心跳超时的任务重新排队，因此任务在重启后继续执行
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from src.core.config import (
+    SYNC_JOB_MAX_ATTEMPTS, SYNC_JOB_RETRY_DELAY, SYNC_POLL_INTERVAL, SYNC_WORKERS
+)
+from src.core.database import SessionLocal
+from src.core.snapshot_store import SnapshotStore
+from src.models.config import DataFlow, DataFlowSchedule, SyncJob
+from src.services.dataflow_sync import SYNC_INCREMENTAL, SYNC_MODES, sync_dataflow
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_ACTIVE = (JOB_PENDING, JOB_RUNNING)
+
+TRIGGER_MANUAL = "manual"
+TRIGGER_SCHEDULE = "schedule"
+
+# 进度写入数据库的最小间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+
+class CronExpression:
+    """cron 表达式（分 时 日 月 周），支持 *、数字、a-b、*/n、a-b/n 与逗号分隔的列表，周日为0或7
+
+    与标准 cron 相同，日与周都不是 * 时满足其一即可
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    _ALIASES = {
+        "@hourly": "0 * * * *",
+        "@daily": "0 0 * * *",
+        "@weekly": "0 0 * * 0",
+        "@monthly": "0 0 1 * *"
+    }
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        parts = self._ALIASES.get(self.expression, self.expression).split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式需要5个字段（分 时 日 月 周）: {expression}")
+        values = [self._parse_field(part, low, high) for part, (low, high) in zip(parts, self._RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {day % 7 for day in weekdays}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for item in field.split(","):
+            base, _, step = item.partition("/")
+            try:
+                step_value = int(step) if step else 1
+                if base == "*":
+                    start, end = low, high
+                elif "-" in base:
+                    start, end = (int(v) for v in base.split("-", 1))
+                else:
+                    start = int(base)
+                    end = high if step else start
+            except ValueError:
+                raise ValueError(f"无效的 cron 字段: {field}")
+            if step_value < 1 or start < low or end > high or start > end:
+                raise ValueError(f"cron 字段超出范围 {low}-{high}: {field}")
+            values.update(range(start, end + 1, step_value))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.isoweekday() % 7) in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """返回晚于 after 的下一个执行时间（精确到分钟）"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"cron 表达式没有可执行的时间: {self.expression}")
+
+
+def _job_result(job: SyncJob) -> Optional[Dict[str, Any]]:
+    return json.loads(job.result) if job.result else None
+
+
+def job_to_dict(job: SyncJob) -> Dict[str, Any]:
+    """刷新任务的状态与进度"""
+    return {
+        "id": job.id,
+        "data_flow_id": job.data_flow_id,
+        "mode": job.mode,
+        "trigger": job.trigger,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "progress": {"fetched": job.fetched, "total": job.total},
+        "result": _job_result(job),
+        "error": job.error,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None
+    }
+
+
+class SyncScheduler:
+    """刷新任务调度器：一个调度线程负责排队与分配，最多 workers 个任务同时执行，同一数据流同一时间只执行一个任务"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 store: Optional[SnapshotStore] = None, workers: int = SYNC_WORKERS,
+                 poll_interval: float = SYNC_POLL_INTERVAL, max_attempts: int = SYNC_JOB_MAX_ATTEMPTS,
+                 retry_delay: float = SYNC_JOB_RETRY_DELAY):
+        self.session_factory = session_factory
+        self.store = store
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        # 心跳超过该时间未更新的执行中任务视为所在进程已退出
+        self.stale_after = timedelta(seconds=max(60.0, poll_interval * 4))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- 计划与任务 ----
+
+    def set_schedule(self, db: Session, dataflow_id: int, cron: str, mode: str = SYNC_INCREMENTAL,
+                     is_enabled: bool = True) -> DataFlowSchedule:
+        """创建或更新数据流的刷新计划，cron 或模式无效时抛出 ValueError"""
+        if mode not in SYNC_MODES:
+            raise ValueError(f"不支持的同步模式: {mode}")
+        next_run_at = CronExpression(cron).next_after(datetime.now())
+        schedule = db.query(DataFlowSchedule).filter(DataFlowSchedule.data_flow_id == dataflow_id).first()
+        if schedule is None:
+            schedule = DataFlowSchedule(data_flow_id=dataflow_id)
+            db.add(schedule)
+        schedule.cron = cron.strip()
+        schedule.mode = mode
+        schedule.is_enabled = 1 if is_enabled else 0
+        schedule.next_run_at = next_run_at
+        db.commit()
+        db.refresh(schedule)
+        return schedule
+
+    def enqueue(self, db: Session, dataflow_id: int, mode: str = SYNC_INCREMENTAL,
+                user_id: Optional[int] = None, trigger: str = TRIGGER_MANUAL) -> SyncJob:
+        """把数据流刷新加入任务队列；该数据流已有待执行或执行中的任务时直接返回该任务"""
+        if mode not in SYNC_MODES:
+            raise ValueError(f"不支持的同步模式: {mode}")
+        job = db.query(SyncJob).filter(
+            SyncJob.data_flow_id == dataflow_id,
+            SyncJob.status.in_(JOB_ACTIVE)
+        ).order_by(SyncJob.id).first()
+        if job is None:
+            job = SyncJob(data_flow_id=dataflow_id, user_id=user_id, mode=mode, trigger=trigger,
+                          status=JOB_PENDING, attempts=0, max_attempts=self.max_attempts,
+                          run_after=datetime.now())
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            self._wake.set()
+        return job
+
+    def list_jobs(self, db: Session, dataflow_id: int, limit: int = 20) -> List[SyncJob]:
+        return db.query(SyncJob).filter(SyncJob.data_flow_id == dataflow_id) \
+            .order_by(SyncJob.id.desc()).limit(limit).all()
+
+    # ---- 调度 ----
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """执行一轮调度：重新排队心跳超时的任务、为到期的计划创建任务并分配待执行任务，返回本轮开始执行的任务数"""
+        now = now or datetime.now()
+        db = self.session_factory()
+        try:
+            self._heartbeat(db, now)
+            self._recover_stale(db, now)
+            self._enqueue_due(db, now)
+            return self._dispatch(db, now)
+        finally:
+            db.close()
+
+    def _heartbeat(self, db: Session, now: datetime):
+        with self._lock:
+            running = list(self._running)
+        if running:
+            db.query(SyncJob).filter(SyncJob.id.in_(running)).update(
+                {SyncJob.heartbeat_at: now}, synchronize_session=False
+            )
+            db.commit()
+
+    def _recover_stale(self, db: Session, now: datetime):
+        """心跳超时的执行中任务：与 _fail 相同，未达到最大尝试次数时重新排队，否则标记为失败
+        （避免每次执行都导致进程退出的任务无限重试）"""
+        with self._lock:
+            running = list(self._running)
+        stale = (
+            SyncJob.status == JOB_RUNNING,
+            SyncJob.heartbeat_at < now - self.stale_after,
+            SyncJob.id.notin_(running)
+        )
+        failed = db.query(SyncJob).filter(*stale, SyncJob.attempts >= SyncJob.max_attempts).update({
+            SyncJob.status: JOB_FAILED,
+            SyncJob.error: "任务执行中断（进程退出或心跳超时），已达到最大尝试次数",
+            SyncJob.finished_at: now
+        }, synchronize_session=False)
+        recovered = db.query(SyncJob).filter(*stale).update(
+            {SyncJob.status: JOB_PENDING, SyncJob.run_after: now}, synchronize_session=False
+        )
+        if failed or recovered:
+            db.commit()
+        if failed:
+            print(f"{failed} 个中断的数据流刷新任务已达到最大尝试次数，标记为失败")
+        if recovered:
+            print(f"重新排队 {recovered} 个中断的数据流刷新任务")
+
+    def _enqueue_due(self, db: Session, now: datetime):
+        due = db.query(DataFlowSchedule).filter(
+            DataFlowSchedule.is_enabled == 1,
+            DataFlowSchedule.next_run_at <= now
+        ).all()
+        for schedule in due:
+            scheduled_at = schedule.next_run_at
+            try:
+                next_run_at = CronExpression(schedule.cron).next_after(now)
+            except ValueError as e:
+                print(f"数据流 {schedule.data_flow_id} 的刷新计划无效: {e}")
+                next_run_at = None
+            # 按原下次执行时间条件更新，多个进程中只有一个会为本次计划创建任务
+            claimed = db.query(DataFlowSchedule).filter(
+                DataFlowSchedule.data_flow_id == schedule.data_flow_id,
+                DataFlowSchedule.next_run_at == scheduled_at
+            ).update({DataFlowSchedule.next_run_at: next_run_at}, synchronize_session=False)
+            db.commit()
+            if claimed:
+                self.enqueue(db, schedule.data_flow_id, schedule.mode, trigger=TRIGGER_SCHEDULE)
+
+    def _dispatch(self, db: Session, now: datetime) -> int:
+        with self._lock:
+            free = self.workers - len(self._running)
+        if free <= 0:
+            return 0
+
+        busy = {
+            row[0] for row in db.query(SyncJob.data_flow_id).filter(SyncJob.status == JOB_RUNNING).all()
+        }
+        candidates = db.query(SyncJob).filter(
+            SyncJob.status == JOB_PENDING,
+            SyncJob.run_after <= now
+        ).order_by(SyncJob.run_after, SyncJob.id).all()
+
+        started = 0
+        for job in candidates:
+            if started >= free:
+                break
+            if job.data_flow_id in busy:
+                continue
+            claimed = db.query(SyncJob).filter(
+                SyncJob.id == job.id,
+                SyncJob.status == JOB_PENDING
+            ).update({
+                SyncJob.status: JOB_RUNNING,
+                SyncJob.attempts: SyncJob.attempts + 1,
+                SyncJob.started_at: now,
+                SyncJob.heartbeat_at: now,
+                SyncJob.error: None
+            }, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                continue
+            busy.add(job.data_flow_id)
+            with self._lock:
+                self._running.add(job.id)
+            self._get_executor().submit(self._run, job.id)
+            started += 1
+        return started
+
+    # ---- 执行 ----
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dataflow-sync")
+            return self._executor
+
+    def _update_job(self, job_id: int, values: Dict[Any, Any]):
+        db = self.session_factory()
+        try:
+            db.query(SyncJob).filter(SyncJob.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _progress_writer(self, job_id: int) -> Callable[[int, Optional[int]], None]:
+        last = [0.0]
+
+        def on_progress(fetched: int, total: Optional[int]):
+            if time.monotonic() - last[0] < PROGRESS_INTERVAL and (total is None or fetched < total):
+                return
+            last[0] = time.monotonic()
+            self._update_job(job_id, {SyncJob.fetched: fetched, SyncJob.total: total,
+                                     SyncJob.heartbeat_at: datetime.now()})
+
+        return on_progress
+
+    def _run(self, job_id: int):
+        db = self.session_factory()
+        try:
+            job = db.query(SyncJob).filter(SyncJob.id == job_id).first()
+            if job is None:
+                return
+            dataflow = db.query(DataFlow).filter(DataFlow.id == job.data_flow_id).first()
+            if dataflow is None:
+                self._finish(job_id, JOB_FAILED, error="数据流不存在")
+                return
+            try:
+                result = sync_dataflow(db, dataflow, mode=job.mode, user_id=job.user_id, store=self.store,
+                                       on_progress=self._progress_writer(job_id))
+            except Exception as e:
+                db.rollback()
+                self._fail(job, e)
+                return
+            self._finish(job_id, JOB_SUCCEEDED, result=result)
+        except Exception as e:
+            print(f"数据流刷新任务 {job_id} 执行异常: {e}")
+            self._finish(job_id, JOB_FAILED, error=str(e))
+        finally:
+            db.close()
+            with self._lock:
+                self._running.discard(job_id)
+            self._wake.set()
+
+    def _finish(self, job_id: int, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None):
+        values = {SyncJob.status: status, SyncJob.error: error, SyncJob.finished_at: datetime.now()}
+        if result is not None:
+            values[SyncJob.result] = json.dumps(result, ensure_ascii=False, default=str)
+            values[SyncJob.fetched] = result.get("fetched", 0)
+        self._update_job(job_id, values)
+
+    def _fail(self, job: SyncJob, error: Exception):
+        """未达到最大尝试次数时按指数退避重新排队，否则标记为失败"""
+        if job.attempts < job.max_attempts:
+            delay = self.retry_delay * (2 ** (job.attempts - 1))
+            self._update_job(job.id, {
+                SyncJob.status: JOB_PENDING,
+                SyncJob.error: str(error),
+                SyncJob.run_after: datetime.now() + timedelta(seconds=delay)
+            })
+        else:
+            self._finish(job.id, JOB_FAILED, error=str(error))
+
+    # ---- 生命周期 ----
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"数据流刷新调度失败: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def start(self):
+        """启动调度线程（重复调用无效）"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="dataflow-sync-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, wait: bool = False):
+        """停止调度线程；执行中的任务不会被中断，未完成的任务在下次启动后心跳超时重新排队"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            executor, self._executor = self._executor, None
+        self._stopped.set()
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout=5)
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def wait_idle(self, timeout: float = 30.0) -> bool:
+        """等待当前进程中执行的任务全部结束，返回是否在超时前结束"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._running:
+                    return True
+            time.sleep(0.02)
+        return False
+
+
+_scheduler: Optional[SyncScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_sync_scheduler() -> SyncScheduler:
+    """获取进程内共享的刷新任务调度器"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = SyncScheduler()
+    return _scheduler
@@ -0,0 +1,203 @@
+"""
+会话Agent注册表单元测试
+测试LRU淘汰、空闲过期、历史字节预算与统计
+"""
+
+import unittest
+import sys
+import os
+import asyncio
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.agent_registry import AgentRegistry, history_bytes
+
+
+class FakeAgent:
+    def __init__(self, content: str = ""):
+        self.conversation_history = [{"role": "user", "content": content}] if content else []
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAgentRegistry(unittest.TestCase):
+    """AgentRegistry单元测试"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _registry(self, **kwargs):
+        options = {"max_sessions": 10, "idle_ttl": 0, "max_history_bytes": 1024}
+        options.update(kwargs)
+        return AgentRegistry(clock=self.clock, **options)
+
+    def test_hit_and_miss(self):
+        """UT-AR-001: 命中与未命中计数"""
+        registry = self._registry()
+        agent = FakeAgent()
+        self.assertIsNone(registry.get("s1"))
+        registry.put("s1", agent)
+        self.assertIs(registry.get("s1"), agent)
+
+        stats = registry.stats()
+        self.assertEqual((stats["sessions"], stats["hits"], stats["misses"]), (1, 1, 1))
+
+    def test_lru_eviction_by_count(self):
+        """UT-AR-002: 超出会话数量上限时淘汰最近最少使用的会话并关闭"""
+        registry = self._registry(max_sessions=2)
+        a, b, c = FakeAgent(), FakeAgent(), FakeAgent()
+        registry.put("a", a)
+        registry.put("b", b)
+        registry.get("a")
+        registry.put("c", c)
+
+        self.assertIn("a", registry)
+        self.assertNotIn("b", registry)
+        self.assertTrue(b.closed)
+        self.assertEqual(registry.stats()["evictions"], 1)
+
+    def test_idle_expiration(self):
+        """UT-AR-003: 空闲超时的会话被移除"""
+        registry = self._registry(idle_ttl=60)
+        registry.put("old", FakeAgent())
+        self.clock.now = 30
+        registry.put("new", FakeAgent())
+        self.clock.now = 70
+
+        self.assertIsNone(registry.get("old"))
+        self.assertIsNotNone(registry.get("new"))
+        self.assertEqual(registry.stats()["expirations"], 1)
+
+    def test_history_byte_budget(self):
+        """UT-AR-004: 对话历史总字节超出预算时淘汰，touch重新计算历史大小"""
+        registry = self._registry(max_history_bytes=100)
+        a, b = FakeAgent("x" * 40), FakeAgent("y" * 40)
+        registry.put("a", a)
+        registry.put("b", b)
+        self.assertEqual(registry.stats()["history_bytes"], 80)
+
+        b.conversation_history.append({"role": "assistant", "content": "z" * 30})
+        registry.touch("b")
+        self.assertNotIn("a", registry)
+        self.assertEqual(registry.stats()["history_bytes"], 70)
+
+    def test_current_session_kept_when_oversized(self):
+        """UT-AR-005: 单个会话超出预算时仍保留当前会话"""
+        registry = self._registry(max_history_bytes=10)
+        registry.put("big", FakeAgent("x" * 50))
+        self.assertIn("big", registry)
+
+    def test_history_bytes_utf8(self):
+        """UT-AR-006: 历史字节按UTF-8计算"""
+        self.assertEqual(history_bytes(FakeAgent("数据")), 6)
+
+    def test_remove_and_clear(self):
+        """UT-AR-007: 移除与清空"""
+        registry = self._registry()
+        agent = FakeAgent("abc")
+        registry.put("s", agent)
+        self.assertTrue(registry.remove("s"))
+        self.assertFalse(registry.remove("s"))
+        self.assertTrue(agent.closed)
+        registry.put("t", FakeAgent("abc"))
+        registry.clear()
+        self.assertEqual(registry.stats()["sessions"], 0)
+        self.assertEqual(registry.stats()["history_bytes"], 0)
+
+    def test_checked_out_agent_closed_on_release(self):
+        """UT-AR-008: 借出中的Agent被淘汰时不关闭，归还后才关闭"""
+        registry = self._registry(max_sessions=1)
+        a, b = FakeAgent(), FakeAgent()
+        registry.put("a", a, checkout=True)
+        registry.put("b", b)
+        self.assertNotIn("a", registry)
+        self.assertFalse(a.closed)
+        self.assertEqual(registry.stats()["checked_out"], 1)
+
+        registry.release(a)
+        self.assertTrue(a.closed)
+        self.assertEqual(registry.stats()["checked_out"], 0)
+
+    def test_release_keeps_registered_agent_open(self):
+        """UT-AR-009: 多次借出需全部归还；未被淘汰的Agent归还后保持可用，淘汰时再关闭"""
+        registry = self._registry(max_sessions=1)
+        a = FakeAgent()
+        registry.put("a", a, checkout=True)
+        self.assertIs(registry.get("a", checkout=True), a)
+        registry.release(a)
+        registry.remove("a")
+        self.assertFalse(a.closed)
+        registry.release(a)
+        self.assertTrue(a.closed)
+
+        b = FakeAgent()
+        registry.put("b", b, checkout=True)
+        registry.release(b)
+        registry.put("c", FakeAgent())
+        self.assertTrue(b.closed)
+
+
+class TestChatCheckout(unittest.TestCase):
+    """/api/ai/chat 借出与归还Agent测试"""
+
+    def setUp(self):
+        from src.api import ai
+        self.ai = ai
+        self.registry = AgentRegistry(max_sessions=10, idle_ttl=0, max_history_bytes=1024)
+        patcher = patch.object(ai, "agent_registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_not_checked_out_before_body_starts(self):
+        """UT-AR-011: 响应体未开始输出（客户端提前断开）时不借出Agent"""
+        with patch.object(self.ai, "_prepare_agent") as prepare:
+            request = self.ai.ChatRequest(message="各地区销售额", session_id="s1")
+            response = asyncio.run(self.ai.chat(request, None))
+            asyncio.run(response.body_iterator.aclose())
+        prepare.assert_not_called()
+        self.assertEqual(self.registry.stats()["checked_out"], 0)
+
+    def test_cancelled_checkout_released(self):
+        """UT-AR-012: 借出过程中请求被取消时，线程结束后归还Agent"""
+        agent = FakeAgent()
+        entered, proceed = threading.Event(), threading.Event()
+
+        def prepare(session_id, user_id):
+            entered.set()
+            proceed.wait(5)
+            self.registry.put(session_id, agent, checkout=True)
+            return agent
+
+        async def run():
+            task = asyncio.ensure_future(self.ai._checkout_agent("s1", None))
+            while not entered.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            proceed.set()
+            for _ in range(500):
+                if self.registry.stats()["checked_out"] == 0 and "s1" in self.registry:
+                    break
+                await asyncio.sleep(0.01)
+
+        with patch.object(self.ai, "_prepare_agent", prepare):
+            asyncio.run(run())
+        self.assertIn("s1", self.registry)
+        self.assertEqual(self.registry.stats()["checked_out"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+分组聚合单元测试
+测试分组编码、各聚合函数与空值处理
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.aggregate import aggregate_frame, group_ids, normalize_function
+
+
+def _frame():
+    return pd.DataFrame({
+        "region": ["华东", "华北", "华东", None, "华北"],
+        "channel": ["线上", "线上", "线下", "线上", None],
+        "sales": [100, 200, 300, None, 500],
+        "product": ["A", "B", "A", "A", None],
+    })
+
+
+class TestGroupIds(unittest.TestCase):
+    """group_ids单元测试"""
+
+    def test_first_seen_order(self):
+        """UT-AG-001: 组号按首次出现顺序编号，空值单独成组"""
+        gid, keys = group_ids(_frame(), ["region"])
+        self.assertEqual(gid.tolist(), [0, 1, 0, 2, 1])
+        self.assertEqual(keys["region"].tolist()[:2], ["华东", "华北"])
+        self.assertTrue(pd.isna(keys["region"].iloc[2]))
+
+    def test_multi_column_keys(self):
+        """UT-AG-002: 多列分组"""
+        gid, keys = group_ids(_frame(), ["region", "channel"])
+        self.assertEqual(gid.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(keys.iloc[2].tolist(), ["华东", "线下"])
+
+
+class TestAggregateFrame(unittest.TestCase):
+    """aggregate_frame单元测试"""
+
+    def test_grouped_aggregations(self):
+        """UT-AG-011: 分组后计算多个聚合"""
+        results = aggregate_frame(_frame(), ["region"], [
+            {"field": "sales", "function": "SUM", "alias": "total"},
+            {"field": "sales", "function": "AVG"},
+            {"field": "sales", "function": "COUNT"},
+            {"field": "sales", "function": "MAX"},
+            {"field": "product", "function": "COUNT_DISTINCT"},
+        ])
+        self.assertEqual(results[0], {
+            "region": "华东", "total": 400.0, "AVG_sales": 200.0,
+            "COUNT_sales": 2, "MAX_sales": 300.0, "COUNT_DISTINCT_product": 1
+        })
+        self.assertEqual(results[2]["region"], None)
+        self.assertIsNone(results[2]["total"])
+        self.assertEqual(results[2]["COUNT_sales"], 0)
+
+    def test_ungrouped(self):
+        """UT-AG-012: 不分组时返回一行，COUNT不指定字段时统计行数"""
+        results = aggregate_frame(_frame(), [], [
+            {"function": "COUNT", "alias": "rows"},
+            {"field": "sales", "function": "MEDIAN"},
+            {"field": "sales", "function": "P75"},
+            {"field": "product", "function": "MIN"},
+        ])
+        self.assertEqual(results, [{"rows": 5, "MEDIAN_sales": 250.0, "P75_sales": 350.0, "MIN_product": "A"}])
+
+    def test_empty_frame(self):
+        """UT-AG-013: 空数据"""
+        df = _frame().iloc[0:0]
+        self.assertEqual(aggregate_frame(df, ["region"], [{"field": "sales", "function": "SUM"}]), [])
+        self.assertEqual(
+            aggregate_frame(df, [], [{"field": "sales", "function": "SUM"}, {"field": "sales", "function": "COUNT"}]),
+            [{"SUM_sales": None, "COUNT_sales": 0}]
+        )
+
+    def test_text_numbers_and_missing_field(self):
+        """UT-AG-014: 文本数值参与计算，字段不存在时返回空值"""
+        df = pd.DataFrame({"k": ["a", "a"], "v": ["1.5", "2"]})
+        results = aggregate_frame(df, ["k"], [
+            {"field": "v", "function": "SUM"},
+            {"field": "missing", "function": "SUM"},
+            {"field": "missing", "function": "COUNT"},
+        ])
+        self.assertEqual(results, [{"k": "a", "SUM_v": 3.5, "SUM_missing": None, "COUNT_missing": 0}])
+
+    def test_matches_previous_implementation(self):
+        """UT-AG-018: 默认结果列名、空组与全空组的SUM与原逐行实现一致"""
+        def previous(df, group_by, aggregations):
+            # 原 AggregateDataTool 的逐行分组与 _aggregate
+            def aggregate(values, func):
+                if not values:
+                    return 0 if func == "COUNT" else None
+                if func == "COUNT":
+                    return len(values)
+                if func == "SUM":
+                    return sum(float(v) for v in values if isinstance(v, (int, float)))
+                if func == "AVG":
+                    nums = [float(v) for v in values if isinstance(v, (int, float))]
+                    return sum(nums) / len(nums) if nums else None
+                return max(values) if func == "MAX" else min(values)
+
+            groups = {}
+            for row in df.astype(object).where(df.notna(), None).to_dict("records"):
+                groups.setdefault(tuple(row.get(f, "") for f in group_by), []).append(row)
+            results = []
+            for key, rows in (groups.items() if group_by else [((), df.to_dict("records"))]):
+                result = dict(zip(group_by, key))
+                for agg in aggregations:
+                    func = agg.get("function", "COUNT").upper()
+                    values = [r.get(agg["field"]) for r in rows if r.get(agg["field"]) is not None]
+                    result[f"{func}_{agg['field']}"] = aggregate(values, func)
+                results.append(result)
+            return results
+
+        df = pd.DataFrame({
+            "k": ["a", "a", "b", "c", "c"],
+            "v": [1.5, 2.0, None, None, 4.0],
+            "t": ["x", "y", None, None, "z"],
+        })
+        aggregations = [{"field": field, "function": func}
+                        for field in ("v", "t") for func in ("SUM", "AVG", "COUNT", "MAX", "MIN")]
+        self.assertEqual(aggregate_frame(df, ["k"], aggregations), previous(df, ["k"], aggregations))
+        empty = df.iloc[0:0]
+        numeric = [agg for agg in aggregations if agg["field"] == "v"]
+        self.assertEqual(aggregate_frame(empty, [], numeric), previous(empty, [], numeric))
+
+        results = aggregate_frame(df, ["k"], [{"function": "COUNT"}, {"function": "count"}])
+        self.assertEqual(results[0], {"k": "a", "COUNT": 2})
+
+    def test_unsupported_function(self):
+        """UT-AG-015: 不支持的聚合函数"""
+        with self.assertRaises(ValueError):
+            aggregate_frame(_frame(), [], [{"field": "sales", "function": "MODE"}])
+
+    def test_matches_pandas(self):
+        """UT-AG-016: 与pandas groupby结果一致"""
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            "k": rng.choice(["x", "y", "z"], 1000),
+            "v": rng.random(1000),
+        })
+        expected = df.groupby("k", sort=False)["v"].agg(["sum", "min", "median"])
+        results = aggregate_frame(df, ["k"], [
+            {"field": "v", "function": "SUM", "alias": "sum"},
+            {"field": "v", "function": "MIN", "alias": "min"},
+            {"field": "v", "function": "MEDIAN", "alias": "median"},
+        ])
+        for row in results:
+            for name in ("sum", "min", "median"):
+                self.assertAlmostEqual(row[name], expected.loc[row["k"], name])
+
+    def test_normalize_function(self):
+        """UT-AG-017: 聚合函数名称规范化"""
+        self.assertEqual(normalize_function("count distinct"), "COUNT_DISTINCT")
+        self.assertEqual(normalize_function("mean"), "AVG")
+        self.assertEqual(normalize_function(None), "COUNT")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,9 +6,11 @@ AI Agent集成测试
 import pytest
 import asyncio
 import json
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 from src.ai.agent import PBBIAgent
 from src.ai.llm_client import LLMConfig
+from src.ai.tools import MCPToolExecutor
 
 
 class TestPBBIAgentIntegration:
@@ -66,6 +68,145 @@ class TestPBBIAgentIntegration:
         assert history[0]["content"] == "测试"
 
 
+class TestParallelToolCalls:
+    """同一轮多个工具调用并发执行测试"""
+    
+    @pytest.fixture
+    def agent(self):
+        config = LLMConfig(api_key="test_key", base_url="https://api.test.com/v1", model="test-model")
+        agent = PBBIAgent(config)
+        delays = {"tool_a": 0.3, "tool_b": 0.1, "tool_c": 0.2}
+        
+        async def fake_chat(messages, tools=None, stream=True):
+            if tools is not None:
+                yield {"choices": [{"delta": {"tool_calls": [
+                    {"index": i, "id": f"call_{i}", "function": {"name": name, "arguments": json.dumps({"i": i})}}
+                    for i, name in enumerate(delays)
+                ]}}]}
+            else:
+                yield {"choices": [{"delta": {"content": "完成"}}]}
+        
+        async def fake_execute(tool_name, arguments):
+            await asyncio.sleep(delays[tool_name])
+            return {"success": True, "data": {"i": arguments["i"]}, "tool": tool_name}
+        
+        agent.llm_client.chat = fake_chat
+        # 执行器为进程内共享实例，替换为独立实例后再打桩
+        agent.tool_executor = MCPToolExecutor()
+        agent.tool_executor.execute = fake_execute
+        return agent
+    
+    def test_results_in_order_and_concurrent(self, agent):
+        async def run():
+            return [event async for event in agent.chat("画三个图")]
+        
+        start = time.perf_counter()
+        events = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        
+        sequence = [(e["type"], e["tool"]) for e in events if e["type"] in ("tool_call_start", "tool_result")]
+        assert sequence == [
+            ("tool_call_start", "tool_a"), ("tool_result", "tool_a"),
+            ("tool_call_start", "tool_b"), ("tool_result", "tool_b"),
+            ("tool_call_start", "tool_c"), ("tool_result", "tool_c"),
+        ]
+        results = [e["result"]["data"]["i"] for e in events if e["type"] == "tool_result"]
+        assert results == [0, 1, 2]
+        assert elapsed < 0.55
+    
+    def test_text_tool_call_starts_before_stream_ends(self, agent):
+        marks = {}
+
+        async def fake_chat(messages, tools=None, stream=True):
+            if tools is not None:
+                yield {"choices": [{"delta": {"content": "```tool_call\npbbi_query_snapshot\n{\"i\": 0}\n```"}}]}
+                await asyncio.sleep(0.2)
+                marks["stream_end"] = time.perf_counter()
+                yield {"choices": [{"delta": {"content": "\n稍等"}}]}
+            else:
+                yield {"choices": [{"delta": {"content": "完成"}}]}
+
+        async def fake_execute(tool_name, arguments):
+            marks["tool_start"] = time.perf_counter()
+            return {"success": True, "data": {"i": arguments["i"]}, "tool": tool_name}
+
+        agent.llm_client.chat = fake_chat
+        agent.tool_executor.execute = fake_execute
+
+        async def run():
+            return [event async for event in agent.chat("画一个图")]
+
+        events = asyncio.run(run())
+        assert marks["tool_start"] < marks["stream_end"]
+        assert [e["tool"] for e in events if e["type"] == "tool_result"] == ["pbbi_query_snapshot"]
+        contents = "".join(e["content"] for e in events if e["type"] == "content")
+        assert "tool_call" not in contents
+        assert "稍等" in contents
+
+    def test_side_effect_tool_deferred_until_stream_ends(self, agent):
+        marks = {}
+        executed = []
+
+        async def fake_chat(messages, tools=None, stream=True):
+            if tools is not None:
+                yield {"choices": [{"delta": {"content": "```tool_call\npbbi_delete_snapshot\n{\"i\": 0}\n```"}}]}
+                await asyncio.sleep(0.1)
+                marks["stream_end"] = time.perf_counter()
+                yield {"choices": [{"delta": {"content": "\n稍等"}}]}
+            else:
+                yield {"choices": [{"delta": {"content": "完成"}}]}
+
+        async def fake_execute(tool_name, arguments):
+            executed.append(tool_name)
+            marks["tool_start"] = time.perf_counter()
+            return {"success": True, "data": {"i": arguments["i"]}, "tool": tool_name}
+
+        agent.llm_client.chat = fake_chat
+        agent.tool_executor.execute = fake_execute
+
+        async def run():
+            return [event async for event in agent.chat("删除快照")]
+
+        events = asyncio.run(run())
+        assert marks["tool_start"] >= marks["stream_end"]
+        assert executed == ["pbbi_delete_snapshot"]
+        assert [e["tool"] for e in events if e["type"] == "tool_result"] == ["pbbi_delete_snapshot"]
+
+    def test_structured_calls_skip_deferred_text_calls(self, agent):
+        executed = []
+
+        async def fake_chat(messages, tools=None, stream=True):
+            if tools is not None:
+                yield {"choices": [{"delta": {"content": "```tool_call\npbbi_delete_snapshot\n{\"i\": 0}\n```"}}]}
+                await asyncio.sleep(0.05)
+                yield {"choices": [{"delta": {"tool_calls": [
+                    {"index": 0, "id": "call_0", "function": {"name": "pbbi_delete_snapshot", "arguments": '{"i": 0}'}}
+                ]}}]}
+            else:
+                yield {"choices": [{"delta": {"content": "完成"}}]}
+
+        async def fake_execute(tool_name, arguments):
+            executed.append(tool_name)
+            return {"success": True, "data": {"i": arguments["i"]}, "tool": tool_name}
+
+        agent.llm_client.chat = fake_chat
+        agent.tool_executor.execute = fake_execute
+
+        async def run():
+            return [event async for event in agent.chat("删除快照")]
+
+        asyncio.run(run())
+        assert executed == ["pbbi_delete_snapshot"]
+
+    def test_execute_multiple_fan_out(self, agent):
+        agent.tool_executor.max_concurrency = 1
+        calls = [{"name": "tool_b", "arguments": {"i": 0}}, {"function": {"name": "tool_b", "arguments": '{"i": 1}'}}]
+        start = time.perf_counter()
+        results = asyncio.run(agent.tool_executor.execute_multiple(calls))
+        assert [r["data"]["i"] for r in results] == [0, 1]
+        assert time.perf_counter() - start >= 0.2
+
+
 class TestMCPToolExecutor:
     """MCP工具执行器测试"""
     
@@ -136,6 +277,52 @@ class TestLLMClient:
             assert "name" in tool["function"]
             assert "description" in tool["function"]
             assert "parameters" in tool["function"]
+    
+    def test_shared_http_client(self):
+        from src.ai.llm_client import get_http_client, close_http_clients
+        
+        async def run():
+            first = get_http_client("https://api.test.com/v1")
+            same = get_http_client("https://api.test.com/v1")
+            other = get_http_client("https://api.other.com/v1")
+            await close_http_clients()
+            return first, same, other
+        
+        first, same, other = asyncio.run(run())
+        assert first is same
+        assert first is not other
+        assert first.is_closed and other.is_closed
+        
+        async def new_loop():
+            client = get_http_client("https://api.test.com/v1")
+            await close_http_clients()
+            return client
+        
+        assert asyncio.run(new_loop()) is not first
+    
+    def test_settings_cache_invalidation(self):
+        from src.ai import llm_client
+        from src.ai.llm_client import LLMClient, invalidate_llm_settings
+        
+        settings = {"model": "model-a", "api_key": "key-a"}
+        with patch.object(llm_client, "_read_llm_settings", side_effect=lambda: dict(settings)) as read:
+            invalidate_llm_settings()
+            client = LLMClient(LLMConfig())
+            other = LLMClient(LLMConfig())
+            client.refresh_config()
+            assert client.config.model == "model-a"
+            assert other.config.api_key == "key-a"
+            assert read.call_count == 1
+            
+            settings["model"] = "model-b"
+            client.refresh_config()
+            assert client.config.model == "model-a"
+            
+            invalidate_llm_settings()
+            client.refresh_config()
+            assert client.config.model == "model-b"
+            assert read.call_count == 2
+        invalidate_llm_settings()
 
 
 class TestAIAPIEndpoints:
@@ -0,0 +1,61 @@
+"""
+API路由单元测试
+检查使用同步数据库会话的接口不在事件循环中执行
+"""
+
+import unittest
+import sys
+import os
+import inspect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.routing import APIRoute
+
+from src.core import database
+from src.main import app
+
+# 协程接口中通过 run_in_threadpool 执行数据库操作的例外
+THREADPOOL_OFFLOADED = {"/api/ai/chat", "/api/settings/providers/{provider_name}/available-models"}
+
+
+def _api_routes(routes):
+    for route in routes:
+        if isinstance(route, APIRoute):
+            yield route
+        # 较新版本的FastAPI将 include_router 的路由包装为子路由器
+        router = getattr(route, "original_router", None)
+        if router is not None:
+            yield from _api_routes(router.routes)
+
+
+def _dependency_calls(dependant):
+    for dependency in dependant.dependencies:
+        yield dependency.call
+        yield from _dependency_calls(dependency)
+
+
+class TestSyncSessionRoutes(unittest.TestCase):
+    """同步Session接口测试"""
+
+    def test_sync_session_routes_run_in_threadpool(self):
+        """UT-API-001: 依赖同步 get_db 的接口及其依赖均为普通函数（由线程池执行）"""
+        blocking = []
+        checked = 0
+        for route in _api_routes(app.routes):
+            calls = list(_dependency_calls(route.dependant))
+            if database.get_db not in calls:
+                continue
+            checked += 1
+            if inspect.iscoroutinefunction(route.endpoint) and route.path not in THREADPOOL_OFFLOADED:
+                blocking.append(route.path)
+            blocking.extend(
+                f"{route.path} -> {call.__name__}" for call in calls
+                if inspect.iscoroutinefunction(call)
+            )
+        self.assertGreater(checked, 0)
+        self.assertEqual(blocking, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
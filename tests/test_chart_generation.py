@@ -35,10 +35,9 @@ def test_chart_generation():
     snapshot_name = row["name"]
     print(f"使用快照: ID={snapshot_id}, 名称={snapshot_name}")
     
-    # 获取快照数据
-    cursor.execute("SELECT data FROM data_snapshots WHERE id = ?", (snapshot_id,))
-    data_row = cursor.fetchone()
-    data = json.loads(data_row["data"])
+    # 获取快照数据（快照数据可能为列式存储）
+    from src.core.snapshot_store import get_snapshot_store, dataframe_to_records
+    data = dataframe_to_records(get_snapshot_store(db_path).read_frame(snapshot_id))
     
     print(f"数据行数: {len(data)}")
     if data:
@@ -0,0 +1,123 @@
+"""
+对话上下文管理单元测试
+测试token估算、工具结果压缩与按预算裁剪历史
+"""
+
+import unittest
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.context import (
+    ContextManager,
+    compact_tool_result,
+    context_window,
+    estimate_messages_tokens,
+    estimate_tokens
+)
+
+
+def _history(turns: int, size: int = 400):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"问题{i} " + "x" * size})
+        messages.append({"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{i}", "type": "function", "function": {"name": "pbbi_query_snapshot", "arguments": "{}"}}
+        ]})
+        messages.append({"role": "tool", "tool_call_id": f"call_{i}", "content": "y" * size})
+        messages.append({"role": "assistant", "content": f"回答{i}"})
+    return messages
+
+
+class TestEstimate(unittest.TestCase):
+    """token估算单元测试"""
+
+    def test_estimate_tokens(self):
+        """UT-CX-001: 中文按字计，其余约4个字符1个token"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("数据分析"), 4)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+
+    def test_context_window(self):
+        """UT-CX-002: 按模型名称推断上下文窗口"""
+        self.assertEqual(context_window("moonshot-v1-8k"), 8192)
+        self.assertEqual(context_window("moonshot-v1-128k"), 131072)
+        self.assertEqual(context_window("deepseek-chat"), 65536)
+        self.assertEqual(context_window("unknown"), 8192)
+
+
+class TestCompactToolResult(unittest.TestCase):
+    """工具结果压缩单元测试"""
+
+    def test_large_result_truncated(self):
+        """UT-CX-011: 行数过多时保留前几行与列统计"""
+        rows = [{"region": "华东" if i % 2 else "华北", "sales": i} for i in range(100)]
+        result = json.loads(compact_tool_result({"success": True, "data": {"data": rows, "total": 100}}, max_rows=5))
+        compacted = result["data"]["data"]
+        self.assertEqual(len(compacted["rows"]), 5)
+        self.assertEqual(compacted["total_rows"], 100)
+        self.assertEqual(compacted["column_stats"]["sales"], {"null_count": 0, "min": 0, "max": 99, "avg": 49.5})
+        self.assertEqual(compacted["column_stats"]["region"]["distinct_count"], 2)
+        self.assertEqual(result["data"]["total"], 100)
+
+    def test_small_result_unchanged(self):
+        """UT-CX-012: 小结果保持原样"""
+        value = {"success": True, "data": [{"a": 1}, {"a": 2}]}
+        self.assertEqual(json.loads(compact_tool_result(value, max_rows=5)), value)
+
+
+class TestContextManager(unittest.TestCase):
+    """ContextManager单元测试"""
+
+    def _manager(self):
+        manager = ContextManager(model="test", max_tokens=0)
+        manager.budget = lambda tools=None: 800
+        return manager
+
+    def test_within_budget_unchanged(self):
+        """UT-CX-021: 未超出预算时原样返回"""
+        messages = [{"role": "system", "content": "系统"}, {"role": "user", "content": "你好"}]
+        self.assertIs(self._manager().fit(messages), messages)
+
+    def test_drops_oldest_turns(self):
+        """UT-CX-022: 超出预算时整轮删除最早的对话，保留系统提示与最后一轮"""
+        messages = [{"role": "system", "content": "系统"}] + _history(6) + [{"role": "user", "content": "最新问题"}]
+        fitted = self._manager().fit(messages)
+
+        self.assertLessEqual(estimate_messages_tokens(fitted), 800)
+        self.assertEqual(fitted[0]["content"], "系统")
+        self.assertEqual(fitted[1]["role"], "system")
+        self.assertIn("已省略", fitted[1]["content"])
+        self.assertEqual(fitted[-1]["content"], "最新问题")
+        self.assertEqual(fitted[2]["role"], "user")
+        self.assertEqual(len(messages), 26)
+
+    def test_tool_messages_kept_with_calls(self):
+        """UT-CX-023: tool消息不会与发起调用的assistant消息分开"""
+        messages = [{"role": "system", "content": "系统"}] + _history(6) + [{"role": "user", "content": "最新问题"}]
+        fitted = self._manager().fit(messages)
+        call_ids = {tc["id"] for m in fitted for tc in (m.get("tool_calls") or [])}
+        for message in fitted:
+            if message["role"] == "tool":
+                self.assertIn(message["tool_call_id"], call_ids)
+
+    def test_long_old_message_truncated(self):
+        """UT-CX-024: 较早的超长消息被截断"""
+        manager = self._manager()
+        manager.message_max_chars = 100
+        messages = [
+            {"role": "system", "content": "系统"},
+            {"role": "user", "content": "旧问题"},
+            {"role": "assistant", "content": "z" * 4000},
+            {"role": "user", "content": "新问题"},
+        ]
+        fitted = manager.fit(messages)
+        self.assertEqual(len(fitted), 4)
+        self.assertIn("已截断", fitted[2]["content"])
+        self.assertEqual(len(messages[2]["content"]), 4000)
+
+
+if __name__ == "__main__":
+    unittest.main()
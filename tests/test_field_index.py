@@ -0,0 +1,151 @@
+"""
+快照字段索引单元测试
+测试字段名提取、规范化查找、相似字段建议、索引缓存失效与字段验证器结果
+"""
+
+import unittest
+import sys
+import os
+import asyncio
+import json
+import sqlite3
+import tempfile
+import shutil
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.tools import FieldValidator
+from src.core.field_index import FieldIndex, FieldIndexCache, field_names, normalize_field_name
+from src.core.snapshot_store import SnapshotStore
+
+
+FIELDS = [
+    {"field_id": "region", "field_name": "地区"},
+    {"name": "销售额（元）"},
+    {"field_id": "Order Date"},
+    "利润",
+    {"field_id": "p"},
+]
+
+
+def _create_db(db_path: Path):
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("""
+        CREATE TABLE data_snapshots (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            data_flow_id INTEGER,
+            name TEXT,
+            worksheet_id TEXT,
+            fields TEXT,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+
+class TestFieldIndex(unittest.TestCase):
+    """FieldIndex单元测试"""
+
+    def setUp(self):
+        self.index = FieldIndex(field_names(json.dumps(FIELDS, ensure_ascii=False)))
+
+    def test_field_names(self):
+        """UT-FI-001: 按 name、field_name、field_id 的顺序提取字段名"""
+        self.assertEqual(list(self.index.names), ["地区", "销售额（元）", "Order Date", "利润", "p"])
+        self.assertFalse(FieldIndex.from_json("").has_fields)
+        self.assertTrue(FieldIndex.from_json("[]").has_fields)
+
+    def test_exact_and_normalized_lookup(self):
+        """UT-FI-002: 精确查找区分写法，规范化查找忽略全半角、大小写与空白"""
+        self.assertIn("地区", self.index)
+        self.assertNotIn("order date", self.index)
+        self.assertEqual(self.index.lookup("orderdate"), "Order Date")
+        self.assertEqual(self.index.lookup("销售额(元)"), "销售额（元）")
+        self.assertEqual(self.index.lookup("ＯＲＤＥＲ　ＤＡＴＥ"), "Order Date")
+        self.assertIsNone(self.index.lookup("客户"))
+        self.assertEqual(normalize_field_name(" Ａ b "), "ab")
+
+    def test_suggest(self):
+        """UT-FI-003: 相似字段建议支持包含关系与拼写接近，无相似字段时返回None"""
+        self.assertEqual(self.index.suggest("销售额"), "销售额（元）")
+        self.assertEqual(self.index.suggest("利润率"), "利润")
+        self.assertEqual(self.index.suggest("Ordr Date"), "Order Date")
+        self.assertEqual(self.index.suggest("P"), "p")
+        self.assertIsNone(self.index.suggest("客户名称"))
+        self.assertIsNone(self.index.suggest(""))
+
+    def test_cache_lru_and_generation(self):
+        """UT-FI-004: 缓存按LRU淘汰，构建期间发生清除时不写入旧索引"""
+        cache = FieldIndexCache(max_entries=2)
+        for snapshot_id in (1, 2, 3):
+            cache.put(("root", snapshot_id), self.index)
+        self.assertIsNone(cache.get(("root", 1)))
+        self.assertIs(cache.get(("root", 3)), self.index)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        generation = cache.generation
+        cache.invalidate("root", 3)
+        self.assertFalse(cache.put(("root", 3), self.index, generation))
+        self.assertIsNone(cache.get(("root", 3)))
+
+
+class TestFieldValidator(unittest.TestCase):
+    """FieldValidator使用字段索引的单元测试"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.db_path = self.tmp_dir / "pb_bi.db"
+        _create_db(self.db_path)
+        self.store = SnapshotStore(self.db_path)
+        self.snapshot_id = self.store.create_snapshot("销售", FIELDS, [{"region": "华东"}])["snapshot_id"]
+        self.validator = FieldValidator(self.store)
+
+    def tearDown(self):
+        self.store.invalidate(self.snapshot_id)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _validate(self, snapshot_id, fields):
+        return asyncio.run(self.validator.validate_fields(snapshot_id, fields))
+
+    def test_validate_results(self):
+        """UT-FI-011: 返回结构与提示信息保持不变"""
+        result = self._validate(self.snapshot_id, ["地区", "利润"])
+        self.assertTrue(result["valid"])
+        self.assertEqual(result["available_fields"], ["地区", "销售额（元）", "Order Date", "利润", "p"])
+
+        result = self._validate(self.snapshot_id, ["地区", "销售额"])
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["missing_fields"], [{"field": "销售额", "similar": "销售额（元）"}])
+        self.assertIn("您是否想使用 '销售额（元）'", result["error"])
+
+        self.assertEqual(self._validate(9999, ["地区"])["error"], "快照 9999 不存在")
+
+    def test_index_cached_and_invalidated(self):
+        """UT-FI-012: 字段索引只构建一次，快照删除后不再使用旧索引"""
+        first = self.store.field_index(self.snapshot_id)
+        self.assertIs(self.store.field_index(self.snapshot_id), first)
+
+        self.store.delete_snapshot(self.snapshot_id)
+        self.assertIsNone(self.store.field_index(self.snapshot_id))
+
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute("INSERT INTO data_snapshots (id, name, fields, data) VALUES (?, '新', ?, '[]')",
+                     (self.snapshot_id, json.dumps(["客户"], ensure_ascii=False)))
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._validate(self.snapshot_id, ["客户"])["available_fields"], ["客户"])
+
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute("UPDATE data_snapshots SET fields = NULL WHERE id = ?", (self.snapshot_id,))
+        conn.commit()
+        conn.close()
+        self.store.invalidate(self.snapshot_id)
+        self.assertEqual(self._validate(self.snapshot_id, ["客户"])["error"], f"快照 {self.snapshot_id} 没有字段信息")
+
+
+if __name__ == "__main__":
+    unittest.main()
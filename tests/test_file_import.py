@@ -0,0 +1,106 @@
+"""
+本地文件分块导入单元测试
+测试 CSV 与 xlsx 按块解析、表头处理、空文件检测以及逐块写入快照后与整表读取结果一致
+"""
+
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from openpyxl import Workbook
+
+from src.core.snapshot_store import SnapshotStore
+from src.services.file_import import EmptyFileError, iter_file_chunks, open_import, upload_extension
+
+
+def _xlsx_bytes(rows) -> bytes:
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(list(row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class TestFileImport(unittest.TestCase):
+    """file_import 单元测试"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = SnapshotStore(Path(self.temp_dir) / "main.db")
+
+    def tearDown(self):
+        self.store.pool.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_csv_chunks(self):
+        """UT-FI-001: CSV 按块解析，逐块写入后与整表读取的数据一致（空值保持为空）"""
+        lines = ["city,amount,note"] + [
+            f"城市{i % 3},{'' if i % 4 == 0 else i * 1.5},{'' if i % 5 == 0 else f'备注{i}'}" for i in range(10)
+        ]
+        content = "\n".join(lines).encode("utf-8")
+
+        first, chunks = open_import(io.BytesIO(content), "csv", chunk_rows=3)
+        self.assertEqual(list(first.columns), ["city", "amount", "note"])
+        chunks = list(chunks)
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+
+        version, row_count = self.store.write_chunks(chunks)
+        self.assertEqual(row_count, 10)
+        expected = pd.read_csv(io.BytesIO(content))
+        actual = self.store.read_version(version)
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        self.assertEqual(actual["amount"].isna().sum(), 3)
+        pd.testing.assert_frame_equal(actual.astype(object).where(actual.notna(), None),
+                                      expected.astype(object).where(expected.notna(), None))
+
+    def test_csv_type_changes_after_first_chunk(self):
+        """UT-FI-004: 后续数据块中出现文本时整列按文本保存，与整表读取结果一致"""
+        content = "code\n0\n1\n2\n3\n4\nA01\n".encode("utf-8")
+        first, chunks = open_import(io.BytesIO(content), "csv", chunk_rows=3)
+        self.assertEqual(str(first["code"].dtype), "int64")
+
+        version, _ = self.store.write_chunks(chunks)
+        self.assertEqual(self.store.read_version(version)["code"].tolist(),
+                         pd.read_csv(io.BytesIO(content))["code"].tolist())
+
+    def test_xlsx_chunks(self):
+        """UT-FI-002: xlsx 以只读模式逐行读取，跳过空行，空表头与重复表头与 pandas 命名一致"""
+        content = _xlsx_bytes([
+            (None, None, None),
+            ("name", None, "name"),
+            ("a", 1, 2.5),
+            (None, None, None),
+            ("b", 2, None),
+            ("c", 3, 4.0)
+        ])
+        chunks = list(iter_file_chunks(io.BytesIO(content), "xlsx", chunk_rows=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        df = pd.concat(chunks, ignore_index=True)
+        self.assertEqual(list(df.columns), ["name", "Unnamed: 1", "name.1"])
+        self.assertEqual(df["name"].tolist(), ["a", "b", "c"])
+        self.assertEqual(df["Unnamed: 1"].tolist(), [1, 2, 3])
+        self.assertTrue(pd.isna(df["name.1"][1]))
+
+    def test_empty_and_unsupported(self):
+        """UT-FI-003: 空文件与只有表头的文件抛出 EmptyFileError，不支持的格式抛出 ValueError"""
+        for extension, content in (("csv", b""), ("csv", b"a,b\n"), ("xlsx", _xlsx_bytes([])),
+                                   ("xlsx", _xlsx_bytes([("a", "b")]))):
+            with self.assertRaises(EmptyFileError):
+                open_import(io.BytesIO(content), extension)
+        with self.assertRaises(ValueError):
+            iter_file_chunks(io.BytesIO(b"x"), "txt")
+        self.assertEqual(upload_extension("销售.XLSX"), "xlsx")
+        self.assertEqual(upload_extension("noext"), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+快照数据缓存单元测试
+测试LRU淘汰、内存预算、失效与命中统计
+"""
+
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.frame_cache import DataFrameCache
+from src.core.snapshot_store import SnapshotStore, dataframe_to_records
+
+
+SAMPLE_ROWS = [
+    {"product": "产品A", "sales": 1000},
+    {"product": "产品B", "sales": 1500},
+    {"product": "产品A", "sales": 1200},
+]
+
+
+def _create_legacy_db(db_path: Path):
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("""
+        CREATE TABLE data_snapshots (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            data_flow_id INTEGER,
+            name TEXT,
+            worksheet_id TEXT,
+            fields TEXT,
+            data TEXT
+        )
+    """)
+    conn.execute(
+        "INSERT INTO data_snapshots (name, data_flow_id, worksheet_id, fields, data) VALUES (?, ?, ?, ?, ?)",
+        ("legacy", 0, "ws", "[]", json.dumps(SAMPLE_ROWS, ensure_ascii=False))
+    )
+    conn.commit()
+    conn.close()
+
+
+def _series(n: int) -> pd.Series:
+    return pd.Series(range(n), dtype="int64")
+
+
+class TestDataFrameCache(unittest.TestCase):
+    """DataFrameCache单元测试"""
+
+    def test_hit_and_miss(self):
+        """UT-FC-001: 命中与未命中计数"""
+        cache = DataFrameCache(max_bytes=1024)
+        key = ("root", 1, "v1", "column", "a")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, _series(10))
+        self.assertIsNotNone(cache.get(key))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["bytes"], 80)
+
+    def test_lru_eviction(self):
+        """UT-FC-002: 超出内存预算时淘汰最近最少使用的项"""
+        cache = DataFrameCache(max_bytes=200)
+        a, b, c = [("root", i, "v", "column", "x") for i in range(3)]
+        cache.put(a, _series(10))
+        cache.put(b, _series(10))
+        cache.get(a)
+        cache.put(c, _series(10))
+
+        self.assertIsNotNone(cache.get(a))
+        self.assertIsNone(cache.get(b))
+        self.assertIsNotNone(cache.get(c))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], 200)
+
+    def test_oversized_value_not_cached(self):
+        """UT-FC-003: 超过预算的对象不缓存"""
+        cache = DataFrameCache(max_bytes=100)
+        key = ("root", 1, "v", "column", "x")
+        cache.put(key, _series(100))
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_dict_values_counted(self):
+        """UT-FC-005: 清单与元数据等字典按内容估算大小并计入内存预算"""
+        cache = DataFrameCache(max_bytes=4096)
+        small = {"columns": [{"name": "a", "kind": "numeric"}]}
+        large = {"columns": [{"name": f"c{i}", "kind": "dict"} for i in range(200)]}
+        cache.put(("root", 1, "v", "manifest"), small)
+        self.assertGreater(cache.stats()["bytes"], 0)
+
+        cache.put(("root", 2, "v", "manifest"), large)
+        self.assertIsNone(cache.get(("root", 2, "v", "manifest")))
+        self.assertEqual(cache.get(("root", 1, "v", "manifest")), small)
+
+    def test_invalidate_snapshot(self):
+        """UT-FC-004: 按快照失效只删除该快照的缓存项"""
+        cache = DataFrameCache(max_bytes=1024)
+        cache.put(("root", 1, "v1", "column", "a"), _series(5))
+        cache.put(("root", 1, "v1", "column", "b"), _series(5))
+        cache.put(("root", 2, "v2", "column", "a"), _series(5))
+        cache.put(("other", 1, "v3", "column", "a"), _series(5))
+
+        self.assertEqual(cache.invalidate("root", 1), 2)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(cache.stats()["bytes"], 80)
+
+
+class TestSnapshotStoreCache(unittest.TestCase):
+    """SnapshotStore缓存集成测试"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.db_path = self.tmp_dir / "pb_bi.db"
+        _create_legacy_db(self.db_path)
+        self.store = SnapshotStore(self.db_path)
+        self.store.cache = DataFrameCache(max_bytes=1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_repeated_reads_hit_cache(self):
+        """UT-FC-011: 重复读取同一快照命中缓存"""
+        created = self.store.create_snapshot("缓存", [], SAMPLE_ROWS)
+        self.store.read_frame(created["snapshot_id"], ["sales"])
+        misses = self.store.cache.stats()["misses"]
+
+        df = self.store.read_frame(created["snapshot_id"], ["sales"])
+        self.assertEqual(df["sales"].tolist(), [1000, 1500, 1200])
+        self.assertEqual(self.store.cache.stats()["misses"], misses)
+        self.assertGreater(self.store.cache.stats()["hits"], 0)
+
+    def test_cached_frame_not_mutated_by_caller(self):
+        """UT-FC-012: 调用方修改返回的DataFrame不影响缓存"""
+        created = self.store.create_snapshot("修改", [], SAMPLE_ROWS)
+        df = self.store.read_frame(created["snapshot_id"])
+        df["sales"] = 0
+        df.loc[0, "product"] = "X"
+
+        legacy = self.store.read_frame(1)
+        legacy["extra"] = 1
+
+        self.assertEqual(dataframe_to_records(self.store.read_frame(created["snapshot_id"])), SAMPLE_ROWS)
+        self.assertEqual(dataframe_to_records(self.store.read_frame(1)), SAMPLE_ROWS)
+
+    def test_delete_invalidates(self):
+        """UT-FC-013: 删除快照后缓存失效"""
+        self.store.read_frame(1)
+        self.assertGreater(self.store.cache.stats()["entries"], 0)
+
+        self.store.delete_snapshot(1)
+        self.assertEqual(self.store.cache.stats()["entries"], 0)
+        self.assertIsNone(self.store.read_frame(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
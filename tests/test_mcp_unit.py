@@ -1,6 +1,9 @@
 import unittest
 import sys
 import os
+import asyncio
+import threading
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -15,6 +18,7 @@ from src.mcp.tools import (
     GetDashboardsTool,
     register_all_tools
 )
+from src.mcp import registry
 
 
 class TestMCPTool(unittest.TestCase):
@@ -213,6 +217,36 @@ class TestToolRegistration(unittest.TestCase):
         self.assertIn("pbbi_get_snapshot_data", tool_names)
         self.assertIn("pbbi_get_dashboards", tool_names)
 
+    def test_builtin_tools_registered_once(self):
+        """UT-052: 内置工具每个服务只注册一次，注册表快照在无新注册时复用"""
+        service = MCPService()
+        first = registry.get_tool_registry(service)
+        count = registry.registration_count
+        version = service.version
+
+        registry.register_builtin_tools(service)
+        self.assertIs(registry.get_tool_registry(service), first)
+        self.assertEqual(registry.registration_count, count)
+        self.assertEqual(service.version, version)
+
+        self.assertIn("pbbi_get_dataflows", first)
+        self.assertIn("pbbi_aggregate_data", first)
+        self.assertIn("pbbi_generate_bar_chart", first)
+        self.assertEqual(len(first.listing), len(first))
+        self.assertEqual(first.describe("pbbi_get_dataflows")["name"], "pbbi_get_dataflows")
+        with self.assertRaises(TypeError):
+            first.tools["x"] = None
+
+    def test_registry_refreshed_after_new_tool(self):
+        """UT-053: 注册新工具后生成新的注册表快照"""
+        service = MCPService()
+        first = registry.get_tool_registry(service)
+        service.register_tool(MCPTool(name="extra_tool", description="extra", parameters={}))
+        second = registry.get_tool_registry(service)
+        self.assertIsNot(second, first)
+        self.assertIn("extra_tool", second)
+        self.assertNotIn("extra_tool", first)
+
 
 class TestEdgeCases(unittest.TestCase):
     """边界条件测试"""
@@ -242,5 +276,152 @@ class TestEdgeCases(unittest.TestCase):
         self.assertTrue(result.get("success"))
 
 
+class TestAsyncExecution(unittest.TestCase):
+    """工具异步执行测试"""
+
+    def setUp(self):
+        self.service = MCPService(max_workers=4)
+
+    def tearDown(self):
+        self.service.shutdown()
+
+    def _register(self, name, handler, **limits):
+        self.service.register_tool(MCPTool(name=name, description=name, parameters={}), handler, **limits)
+
+    def test_async_handler(self):
+        """UT-071: 异步处理函数直接await，同步接口也可执行"""
+        async def handler(params):
+            await asyncio.sleep(0)
+            return {"value": params["x"] * 2}
+
+        self._register("async_tool", handler)
+        result = asyncio.run(self.service.execute_tool_async("async_tool", {"x": 2}))
+        self.assertEqual(result, {"success": True, "data": {"value": 4}})
+        self.assertEqual(self.service.execute_tool("async_tool", {"x": 3})["data"], {"value": 6})
+
+    def test_sync_handler_off_loop(self):
+        """UT-072: 同步处理函数在线程池中执行，不阻塞事件循环"""
+        self._register("blocking_tool", lambda params: (time.sleep(0.2), threading.current_thread().name)[1])
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            result = await self.service.execute_tool_async("blocking_tool", {})
+            task.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(run())
+        self.assertTrue(result["success"])
+        self.assertNotEqual(result["data"], threading.current_thread().name)
+        self.assertGreater(ticks, 5)
+
+    def test_timeout(self):
+        """UT-073: 超时返回错误"""
+        self._register("slow_tool", lambda params: time.sleep(0.5), timeout=0.05)
+        result = asyncio.run(self.service.execute_tool_async("slow_tool", {}))
+        self.assertFalse(result["success"])
+        self.assertIn("超时", result["error"])
+
+    def test_concurrency_group(self):
+        """UT-074: 同一并发组内的工具不超过并发上限"""
+        state = {"running": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def handler(params):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.05)
+            with lock:
+                state["running"] -= 1
+            return params
+
+        self._register("chart_a", handler, max_concurrency=1, group="chart")
+        self._register("chart_b", handler, max_concurrency=1, group="chart")
+
+        async def run():
+            return await asyncio.gather(*[
+                self.service.execute_tool_async(name, {"i": i})
+                for i, name in enumerate(["chart_a", "chart_b"] * 3)
+            ])
+
+        results = asyncio.run(run())
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(state["peak"], 1)
+
+    def test_timeout_keeps_group_permit(self):
+        """UT-076: 同步处理函数超时后，线程结束前同一并发组的下一次调用不会开始"""
+        events = []
+        lock = threading.Lock()
+
+        def handler(params):
+            with lock:
+                events.append(("start", params["i"], time.monotonic()))
+            time.sleep(params["sleep"])
+            with lock:
+                events.append(("end", params["i"], time.monotonic()))
+            return params["i"]
+
+        self._register("chart_slow", handler, max_concurrency=1, group="chart", timeout=0.05)
+        self._register("chart_next", handler, max_concurrency=1, group="chart", timeout=5)
+
+        async def run():
+            first = await self.service.execute_tool_async("chart_slow", {"i": 1, "sleep": 0.3})
+            second = await self.service.execute_tool_async("chart_next", {"i": 2, "sleep": 0})
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIn("超时", first["error"])
+        self.assertEqual(second, {"success": True, "data": 2})
+        self.assertEqual([e[:2] for e in events], [("start", 1), ("end", 1), ("start", 2), ("end", 2)])
+
+    def test_sync_entry_respects_group_limit(self):
+        """UT-077: 同步入口 execute_tool 与异步入口共用同一并发组上限"""
+        state = {"running": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def handler(params):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.05)
+            with lock:
+                state["running"] -= 1
+            return params
+
+        self._register("chart_a", handler, max_concurrency=1, group="chart")
+        self._register("chart_b", handler, max_concurrency=1, group="chart")
+
+        threads = [
+            threading.Thread(target=self.service.execute_tool, args=(name, {"i": i}))
+            for i, name in enumerate(["chart_a", "chart_b"] * 2)
+        ]
+        for thread in threads:
+            thread.start()
+        result = asyncio.run(self.service.execute_tool_async("chart_b", {"i": 9}))
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(result["success"])
+        self.assertEqual(state["peak"], 1)
+
+    def test_handler_error_and_missing_tool(self):
+        """UT-075: 处理函数异常与工具不存在"""
+        def handler(params):
+            raise ValueError("bad")
+
+        self._register("error_tool", handler)
+        result = asyncio.run(self.service.execute_tool_async("error_tool", {}))
+        self.assertEqual(result, {"success": False, "error": "bad"})
+        self.assertFalse(asyncio.run(self.service.execute_tool_async("nonexistent", {}))["success"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,154 @@
+"""
+明道云异步客户端单元测试
+测试令牌桶限流、熔断器、按 (appkey, base_url) 共享客户端以及在事件循环中调用时不阻塞
+"""
+
+import unittest
+import sys
+import os
+import asyncio
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.mingdao import MingDaoService
+from src.services.mingdao_client import (
+    CircuitBreaker, MingDaoCircuitOpenError, MingDaoError, TokenBucket, get_mingdao_client
+)
+
+
+def _start_server(delay: float = 0.0):
+    """返回固定一页数据的接口桩，delay 为每个请求的处理时间"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(delay)
+            content = json.dumps({"error_code": 1, "data": {"rows": [{"rowid": "r1"}], "total": 1}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _unused_url() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+class TestRateLimitAndBreaker(unittest.TestCase):
+    """令牌桶与熔断器单元测试"""
+
+    def test_token_bucket(self):
+        """UT-MDC-001: 突发额度用完后按速率等待"""
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+        self.assertEqual(TokenBucket(rate=0).reserve(), 0.0)
+
+    def test_circuit_breaker(self):
+        """UT-MDC-002: 连续失败后熔断，冷却后只放行一个试探请求，成功后恢复"""
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+
+class TestMingDaoClient(unittest.TestCase):
+    """MingDaoClient单元测试"""
+
+    def test_shared_client(self):
+        """UT-MDC-011: 相同 (appkey, base_url) 共享客户端，sign 更新为最新值"""
+        first = MingDaoService("app", "sign1", "https://md.example.com/")
+        second = MingDaoService("app", "sign2", "https://md.example.com")
+        self.assertIs(first.client, second.client)
+        self.assertEqual(second.client.headers["HAP-Sign"], "sign2")
+        self.assertIsNot(get_mingdao_client("other", "s", "https://md.example.com"), first.client)
+
+    def test_circuit_opens_on_connection_errors(self):
+        """UT-MDC-012: 主机不可用时熔断，之后的请求不再发出直接失败"""
+        service = MingDaoService("app", "sign", _unused_url())
+        service.client.retry_base_delay = 0.001
+        service.client.max_retries = 10
+
+        with self.assertRaises(MingDaoError) as ctx:
+            service.get_data("ws")
+        self.assertIsInstance(ctx.exception, MingDaoCircuitOpenError)
+
+        started = time.monotonic()
+        with self.assertRaises(MingDaoCircuitOpenError):
+            service.fetch_page("ws")
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertFalse(service.test_connection())
+        self.assertFalse(service.get_fields("ws")["success"])
+
+    def test_rate_limited(self):
+        """UT-MDC-013: 同一客户端的请求按令牌桶速率发出"""
+        server, base_url = _start_server()
+        try:
+            service = MingDaoService("app", "sign", base_url)
+            service.client.bucket = TokenBucket(rate=20, capacity=1)
+            started = time.monotonic()
+            for _ in range(5):
+                self.assertEqual(service.get_data("ws"), [{"rowid": "r1"}])
+            self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_async_call_does_not_block_loop(self):
+        """UT-MDC-014: 在其他事件循环中等待请求时该循环可以继续处理其他任务"""
+        server, base_url = _start_server(delay=0.2)
+        client = get_mingdao_client("app", "sign", base_url)
+
+        async def main():
+            task = asyncio.ensure_future(client.get_data("ws"))
+            ticks = 0
+            while not task.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            pages = [page async for page in client.iter_pages("ws", page_size=10)]
+            return task.result(), ticks, pages
+
+        try:
+            rows, ticks, pages = asyncio.run(main())
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(rows, [{"rowid": "r1"}])
+        self.assertGreater(ticks, 5)
+        self.assertEqual(pages, [[{"rowid": "r1"}]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -216,7 +216,7 @@ class TestMingDaoSaveSnapshotTool(unittest.TestCase):
             "success": True,
             "data": {"data": [{"fieldId": "f1", "name": "字段1"}]}
         }
-        mock_service.get_data.return_value = []
+        mock_service.iter_pages.return_value = iter([[]])
         mock_service_class.return_value = mock_service
 
         result = self.tool.execute({
@@ -0,0 +1,454 @@
+"""
+明道云全量同步单元测试
+使用本地HTTP桩服务测试分页并发获取、限流退避重试、进度回调与逐页写入快照，以及增量同步与定时刷新任务
+"""
+
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.database import Base
+from src.core.snapshot_store import SnapshotStore
+from src.mcp.mingdao_mcp import MingDaoSaveSnapshotTool, _mingdao_connections
+from src.models.config import DataFlow, DataFlowSchedule, DataFlowSyncState, FieldType, SyncJob
+from src.services.dataflow_sync import SYNC_FULL, SYNC_INCREMENTAL, sync_dataflow
+from src.services.mingdao import MingDaoError, MingDaoService
+from src.services.sync_scheduler import (
+    JOB_FAILED, JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, TRIGGER_SCHEDULE, CronExpression, SyncScheduler
+)
+
+
+class StubMingDao:
+    """明道云接口桩：按页返回行数据，可指定返回限流的分页"""
+
+    def __init__(self, row_count: int, with_total: bool = True):
+        self.rows = [
+            {"rowid": f"r{i}", "name": f"行{i}", "amount": i, "utime": f"2024-01-01 00:{i // 60:02d}:{i % 60:02d}"}
+            for i in range(row_count)
+        ]
+        self.with_total = with_total
+        # 页码 -> 依次返回的限流响应（"http" 为HTTP 429，"code" 为错误码10101）
+        self.throttle = {}
+        self.fail_pages = set()
+        self.requests = []
+        self.sent_rows = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def handle(self, method: str, path: str, body: dict):
+        if method == "GET":
+            return 200, {}, {"success": True, "error_code": 1, "data": {"fields": [
+                {"fieldId": "name", "name": "名称", "type": "Text"},
+                {"fieldId": "amount", "name": "金额", "type": "Number"}
+            ]}}
+
+        page_index, page_size = body["pageIndex"], body["pageSize"]
+        with self.lock:
+            self.requests.append(page_index)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            pending = self.throttle.get(page_index) or []
+            throttled = pending.pop(0) if pending else None
+        try:
+            # 模拟网络延迟，便于观察并发
+            time.sleep(0.01)
+            if throttled == "http":
+                return 429, {"Retry-After": "0"}, {"error_msg": "Too Many Requests"}
+            if throttled == "code":
+                return 200, {}, {"success": False, "error_code": 10101, "error_msg": "请求限流"}
+            if page_index in self.fail_pages:
+                return 200, {}, {"success": False, "error_code": 10005, "error_msg": "工作表不存在"}
+            matched = self.rows
+            for condition in (body.get("filter") or {}).get("children", []):
+                matched = [row for row in matched if row[condition["field"]] >= condition["value"]]
+            start = (page_index - 1) * page_size
+            rows = matched[start:start + page_size]
+            if body.get("fields"):
+                rows = [{k: v for k, v in row.items() if k in body["fields"] or k == "rowid"} for row in rows]
+            with self.lock:
+                self.sent_rows += len(rows)
+            data = {"rows": rows}
+            if self.with_total:
+                data["total"] = len(matched)
+            return 200, {}, {"success": True, "error_code": 1, "data": data}
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _start_server(stub: StubMingDao):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            status, headers, payload = stub.handle(method, self.path, body)
+            content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            self._reply("GET")
+
+        def do_POST(self):
+            self._reply("POST")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class TestMingDaoFullSync(unittest.TestCase):
+    """MingDaoService分页同步测试"""
+
+    def setUp(self):
+        self.stub = StubMingDao(row_count=95)
+        self.server, self.base_url = _start_server(self.stub)
+        self.service = MingDaoService("key", "sign", self.base_url)
+        self.service.client.retry_base_delay = 0.001
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_all_pages_in_order(self):
+        """UT-MDS-001: 按总行数并发获取全部分页，按页码顺序返回并报告进度"""
+        progress = []
+        pages = list(self.service.iter_pages("ws", page_size=10, workers=3,
+                                             on_progress=lambda n, total: progress.append((n, total))))
+
+        self.assertEqual(len(pages), 10)
+        self.assertEqual([row["rowid"] for page in pages for row in page], [f"r{i}" for i in range(95)])
+        self.assertEqual(progress[0], (10, 95))
+        self.assertEqual(progress[-1], (95, 95))
+        self.assertEqual(sorted(self.stub.requests), list(range(1, 11)))
+        self.assertGreater(self.stub.max_active, 1)
+        self.assertLessEqual(self.stub.max_active, 3)
+
+    def test_sequential_without_total(self):
+        """UT-MDS-002: 接口未返回总行数时顺序翻页直到不足一页"""
+        self.stub.with_total = False
+        self.stub.rows = self.stub.rows[:30]
+        pages = list(self.service.iter_pages("ws", page_size=10))
+        self.assertEqual([len(page) for page in pages], [10, 10, 10])
+        self.assertEqual(self.stub.requests, [1, 2, 3, 4])
+
+    def test_retry_on_throttle(self):
+        """UT-MDS-003: HTTP 429 与限流错误码退避后重试，其他错误或超过重试次数时抛出异常"""
+        self.stub.throttle = {2: ["http", "code"], 5: ["code"]}
+        rows = [row for page in self.service.iter_pages("ws", page_size=10, workers=2) for row in page]
+        self.assertEqual(len(rows), 95)
+        self.assertEqual(self.stub.requests.count(2), 3)
+        self.assertEqual(self.stub.requests.count(5), 2)
+
+        self.service.client.max_retries = 1
+        self.stub.throttle = {1: ["http", "http"]}
+        with self.assertRaises(MingDaoError):
+            self.service.get_data("ws", page_size=10)
+
+        self.stub.fail_pages = {3}
+        with self.assertRaises(MingDaoError) as ctx:
+            list(self.service.iter_pages("ws", page_size=10))
+        self.assertIn("工作表不存在", str(ctx.exception))
+
+
+class TestSaveSnapshotFullSync(unittest.TestCase):
+    """MingDaoSaveSnapshotTool全量同步测试"""
+
+    def setUp(self):
+        self.stub = StubMingDao(row_count=2500)
+        self.server, self.base_url = _start_server(self.stub)
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        db_path = self.tmp_dir / "pb_bi.db"
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("""
+            CREATE TABLE data_snapshots (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                data_flow_id INTEGER,
+                name TEXT,
+                worksheet_id TEXT,
+                fields TEXT,
+                data TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.commit()
+        conn.close()
+        self.store = SnapshotStore(db_path)
+        _mingdao_connections.clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.store.pool.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_save_snapshot_not_capped_at_page_size(self):
+        """UT-MDS-011: 保存快照时获取全部分页，行数不再受page_size限制"""
+        with patch("src.mcp.mingdao_mcp.get_snapshot_store", return_value=self.store):
+            result = MingDaoSaveSnapshotTool().execute({
+                "worksheet_id": "ws",
+                "snapshot_name": "全量",
+                "page_size": 1000,
+                "appkey": "key",
+                "sign": "sign",
+                "base_url": self.base_url
+            })
+
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["data"]["row_count"], 2500)
+        self.assertEqual(result["data"]["total"], 2500)
+        self.assertEqual(result["data"]["pages"], 3)
+
+        df = self.store.read_frame(result["data"]["snapshot_id"])
+        self.assertEqual(len(df), 2500)
+        self.assertEqual(df["amount"].tolist(), list(range(2500)))
+        self.assertEqual(self.store.get_info(result["data"]["snapshot_id"])["worksheet_id"], "ws")
+
+
+
+class TestIncrementalSync(unittest.TestCase):
+    """数据流增量同步测试"""
+
+    def setUp(self):
+        self.stub = StubMingDao(row_count=95)
+        self.server, self.base_url = _start_server(self.stub)
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        db_path = self.tmp_dir / "pb_bi.db"
+        self.engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.store = SnapshotStore(db_path)
+        self.dataflow = DataFlow(name="销售", type="mingdao", appkey="key", sign="sign", worksheet_id="ws",
+                                 is_private=1, private_api_url=self.base_url)
+        self.db.add(self.dataflow)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+        self.store.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _sync(self, mode=SYNC_INCREMENTAL):
+        self.stub.sent_rows = 0
+        return sync_dataflow(self.db, self.dataflow, mode=mode, store=self.store)
+
+    def test_first_sync_is_full(self):
+        """UT-MDS-021: 没有同步状态时增量同步改为全量同步，并记录高水位"""
+        result = self._sync()
+        self.assertEqual(result["mode"], SYNC_FULL)
+        self.assertEqual(result["row_count"], 95)
+
+        state = self.db.query(DataFlowSyncState).filter_by(data_flow_id=self.dataflow.id).one()
+        self.assertEqual(state.snapshot_id, result["snapshot_id"])
+        self.assertEqual(state.high_water_mark, "2024-01-01 00:01:34")
+        self.assertEqual(self.store.get_info(result["snapshot_id"])["data_flow_id"], self.dataflow.id)
+
+    def test_incremental_upsert_and_delete(self):
+        """UT-MDS-022: 增量同步只获取修改和新增的行，按记录ID覆盖并删除远端已删除的行"""
+        first = self._sync()
+        self.stub.rows[3] = {**self.stub.rows[3], "amount": 300, "utime": "2024-01-02 08:00:00"}
+        self.stub.rows.append({"rowid": "r95", "name": "行95", "amount": 95, "utime": "2024-01-02 09:00:00"})
+        del self.stub.rows[10]
+
+        result = self._sync()
+        self.assertEqual(result["mode"], SYNC_INCREMENTAL)
+        self.assertEqual(result["snapshot_id"], first["snapshot_id"])
+        self.assertEqual((result["inserted"], result["updated"], result["deleted"]), (1, 1, 1))
+        self.assertEqual(result["row_count"], 95)
+        self.assertEqual(result["high_water_mark"], "2024-01-02 09:00:00")
+
+        df = self.store.read_frame(first["snapshot_id"]).set_index("rowid")
+        self.assertEqual(len(df), 95)
+        self.assertEqual(df.loc["r3", "amount"], 300)
+        self.assertIn("r95", df.index)
+        self.assertNotIn("r10", df.index)
+
+    def test_incremental_without_changes(self):
+        """UT-MDS-023: 没有变化时只传输边界行且不改写快照，字段配置变化时改为全量同步"""
+        first = self._sync()
+        version = self.store.get_info(first["snapshot_id"])["version"]
+
+        result = self._sync()
+        self.assertEqual(result["mode"], SYNC_INCREMENTAL)
+        self.assertEqual(self.stub.sent_rows, 2)
+        self.assertEqual(self.store.get_info(first["snapshot_id"])["version"], version)
+
+        self.db.add(FieldType(data_flow_id=self.dataflow.id, worksheet_id="ws", field_id="amount",
+                              field_name="金额", data_type="number", is_enabled="true"))
+        self.db.commit()
+        result = self._sync()
+        self.assertEqual(result["mode"], SYNC_FULL)
+        self.assertNotEqual(result["snapshot_id"], first["snapshot_id"])
+        self.assertEqual(list(self.store.read_frame(result["snapshot_id"]).columns), ["rowid", "amount", "utime"])
+
+
+class TestCronExpression(unittest.TestCase):
+    """cron 表达式测试"""
+
+    def test_next_after(self):
+        """UT-MDS-031: 计算下一个执行时间，日与周同时指定时满足其一即可"""
+        start = datetime(2024, 1, 31, 23, 59, 30)
+        self.assertEqual(CronExpression("*/15 * * * *").next_after(start), datetime(2024, 2, 1, 0, 0))
+        self.assertEqual(CronExpression("30 2 * * 1-5").next_after(start), datetime(2024, 2, 1, 2, 30))
+        self.assertEqual(CronExpression("0 6 * 3 *").next_after(start), datetime(2024, 3, 1, 6, 0))
+        self.assertEqual(CronExpression("@daily").next_after(start), datetime(2024, 2, 1, 0, 0))
+        # 2024-02-04 为周日
+        self.assertEqual(CronExpression("0 0 15 * 7").next_after(start), datetime(2024, 2, 4, 0, 0))
+        for expression in ("* * *", "60 * * * *", "*/0 * * * *", "a * * * *", "0 0 31 2 *"):
+            with self.assertRaises(ValueError):
+                CronExpression(expression).next_after(start)
+
+
+class TestSyncScheduler(unittest.TestCase):
+    """数据流定时刷新调度器测试"""
+
+    def setUp(self):
+        self.stub = StubMingDao(row_count=95)
+        self.server, self.base_url = _start_server(self.stub)
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        db_path = self.tmp_dir / "pb_bi.db"
+        self.engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.db = self.session_factory()
+        self.store = SnapshotStore(db_path)
+        self.scheduler = self._scheduler()
+        dataflow = DataFlow(name="销售", type="mingdao", appkey="key", sign="sign", worksheet_id="ws",
+                            is_private=1, private_api_url=self.base_url)
+        self.db.add(dataflow)
+        self.db.commit()
+        self.dataflow_id = dataflow.id
+
+    def tearDown(self):
+        self.scheduler.stop(wait=True)
+        self.db.close()
+        self.engine.dispose()
+        self.store.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _scheduler(self, **kwargs):
+        return SyncScheduler(self.session_factory, store=self.store, workers=2, poll_interval=0.05,
+                             **{"max_attempts": 2, "retry_delay": 60, **kwargs})
+
+    def _job(self, job_id):
+        self.db.expire_all()
+        return self.db.get(SyncJob, job_id)
+
+    def test_manual_job(self):
+        """UT-MDS-041: 手动加入的任务在后台执行并记录进度与结果，同一数据流不会重复排队"""
+        job = self.scheduler.enqueue(self.db, self.dataflow_id, mode=SYNC_FULL, user_id=7)
+        self.assertEqual(self.scheduler.enqueue(self.db, self.dataflow_id).id, job.id)
+
+        self.assertEqual(self.scheduler.tick(), 1)
+        self.assertTrue(self.scheduler.wait_idle())
+
+        job = self._job(job.id)
+        self.assertEqual(job.status, JOB_SUCCEEDED)
+        self.assertEqual((job.attempts, job.fetched, job.total), (1, 95, 95))
+        result = json.loads(job.result)
+        self.assertEqual(result["row_count"], 95)
+        self.assertEqual(self.store.get_info(result["snapshot_id"])["user_id"], 7)
+        self.assertNotEqual(self.scheduler.enqueue(self.db, self.dataflow_id).id, job.id)
+
+    def test_schedule_enqueues_once(self):
+        """UT-MDS-042: 到期的计划只创建一个任务并推进下次执行时间，停用的计划不执行"""
+        schedule = self.scheduler.set_schedule(self.db, self.dataflow_id, "0 * * * *")
+        due = schedule.next_run_at
+        self.assertEqual(due.minute, 0)
+
+        self.scheduler.tick(now=due)
+        self.scheduler.tick(now=due)
+        self.assertTrue(self.scheduler.wait_idle())
+        jobs = self.db.query(SyncJob).all()
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual((jobs[0].trigger, jobs[0].status), (TRIGGER_SCHEDULE, JOB_SUCCEEDED))
+        self.db.expire_all()
+        self.assertEqual(self.db.get(DataFlowSchedule, self.dataflow_id).next_run_at, due + timedelta(hours=1))
+
+        self.scheduler.set_schedule(self.db, self.dataflow_id, "0 * * * *", is_enabled=False)
+        self.scheduler.tick(now=due + timedelta(days=1))
+        self.assertEqual(self.db.query(SyncJob).count(), 1)
+        with self.assertRaises(ValueError):
+            self.scheduler.set_schedule(self.db, self.dataflow_id, "0 * * *")
+
+    def test_retry_then_fail(self):
+        """UT-MDS-043: 失败的任务按重试间隔重新排队，达到最大尝试次数后标记为失败"""
+        self.stub.fail_pages = {1}
+        job = self.scheduler.enqueue(self.db, self.dataflow_id, mode=SYNC_FULL)
+        self.scheduler.tick()
+        self.assertTrue(self.scheduler.wait_idle())
+
+        job = self._job(job.id)
+        self.assertEqual((job.status, job.attempts), (JOB_PENDING, 1))
+        self.assertIn("工作表不存在", job.error)
+        self.assertGreater(job.run_after, datetime.now() + timedelta(seconds=50))
+        self.assertEqual(self.scheduler.tick(), 0)
+
+        self.scheduler.tick(now=datetime.now() + timedelta(minutes=2))
+        self.assertTrue(self.scheduler.wait_idle())
+        job = self._job(job.id)
+        self.assertEqual((job.status, job.attempts), (JOB_FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_interrupted_job_resumes(self):
+        """UT-MDS-044: 进程退出时执行中的任务在心跳超时后由新的调度器重新执行"""
+        stale = datetime.now() - timedelta(minutes=10)
+        job = SyncJob(data_flow_id=self.dataflow_id, mode=SYNC_FULL, status=JOB_RUNNING, attempts=1,
+                      max_attempts=2, run_after=stale, started_at=stale, heartbeat_at=stale)
+        self.db.add(job)
+        self.db.commit()
+
+        self.scheduler.start()
+        deadline = time.monotonic() + 10
+        while self._job(job.id).status != JOB_SUCCEEDED and time.monotonic() < deadline:
+            time.sleep(0.05)
+        job = self._job(job.id)
+        self.assertEqual((job.status, job.attempts), (JOB_SUCCEEDED, 2))
+
+    def test_interrupted_job_exhausted(self):
+        """UT-MDS-045: 中断的任务已达到最大尝试次数时标记为失败，不再重新排队"""
+        stale = datetime.now() - timedelta(minutes=10)
+        job = SyncJob(data_flow_id=self.dataflow_id, mode=SYNC_FULL, status=JOB_RUNNING, attempts=2,
+                      max_attempts=2, run_after=stale, started_at=stale, heartbeat_at=stale)
+        self.db.add(job)
+        self.db.commit()
+
+        self.assertEqual(self.scheduler.tick(), 0)
+        job = self._job(job.id)
+        self.assertEqual((job.status, job.attempts), (JOB_FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIn("最大尝试次数", job.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
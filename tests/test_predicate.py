@@ -0,0 +1,142 @@
+"""
+筛选条件编译器单元测试
+测试where字符串解析、运算符优先级与向量化求值
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.predicate import (
+    PredicateError,
+    compile_where,
+    compile_conditions,
+    filter_frame,
+    sort_frame,
+    where_fields
+)
+
+
+def _frame():
+    return pd.DataFrame({
+        "region": ["华东", "华北", None, "华南"],
+        "sales": [100, 250, 300, np.nan],
+        "code": ["10", "x", "30", None],
+        "date": ["2024-01-01", "2024-02-01", "2023-12-31", None],
+    })
+
+
+def _mask(where):
+    return compile_where(where).mask(_frame()).tolist()
+
+
+class TestCompileWhere(unittest.TestCase):
+    """compile_where单元测试"""
+
+    def test_comparison(self):
+        """UT-PR-001: 比较运算符"""
+        self.assertEqual(_mask("region = '华东'"), [True, False, False, False])
+        self.assertEqual(_mask("sales > 200"), [False, True, True, False])
+        self.assertEqual(_mask("sales <= 250"), [True, True, False, False])
+        self.assertEqual(_mask("sales = 100.0"), [True, False, False, False])
+
+    def test_null_never_matches(self):
+        """UT-PR-002: 空值不满足比较条件（包括不等于）"""
+        self.assertEqual(_mask("region != '华北'"), [True, False, False, True])
+        self.assertEqual(_mask("sales IS NULL"), [False, False, False, True])
+        self.assertEqual(_mask("region IS NOT NULL"), [True, True, False, True])
+
+    def test_text_column_numeric_literal(self):
+        """UT-PR-003: 文本列与数值常量按数值比较"""
+        self.assertEqual(_mask("code = 10"), [True, False, False, False])
+        self.assertEqual(_mask("code > 15"), [False, False, True, False])
+
+    def test_text_ordering(self):
+        """UT-PR-004: 非数值常量按文本比较"""
+        self.assertEqual(_mask("date >= '2024-01-01'"), [True, True, False, False])
+
+    def test_precedence_and_parentheses(self):
+        """UT-PR-005: AND优先于OR，括号改变优先级"""
+        self.assertEqual(
+            _mask("sales = 100 OR sales = 300 AND region = '华东'"),
+            [True, False, False, False]
+        )
+        self.assertEqual(
+            _mask("(sales = 100 OR sales = 300) AND region IS NULL"),
+            [False, False, True, False]
+        )
+        self.assertEqual(_mask("NOT (sales > 200)"), [True, False, False, True])
+
+    def test_in_like_between(self):
+        """UT-PR-006: IN、LIKE、BETWEEN"""
+        self.assertEqual(_mask("region IN ('华东', '华南')"), [True, False, False, True])
+        self.assertEqual(_mask("region NOT IN ('华东')"), [False, True, False, True])
+        self.assertEqual(_mask("region LIKE '%北'"), [False, True, False, False])
+        self.assertEqual(_mask("sales BETWEEN 200 AND 300"), [False, True, True, False])
+
+    def test_object_column_values(self):
+        """UT-PR-014: 对象列中的布尔值、数字与文本混合时按文本形式比较"""
+        df = pd.DataFrame({
+            "flag": pd.Series([True, False, None, True], dtype=object),
+            "mixed": pd.Series([1, "A01", 2.5, None], dtype=object)
+        })
+        self.assertEqual(len(filter_frame(df, "flag = True")), 2)
+        self.assertEqual(len(filter_frame(df, "flag != True")), 1)
+        self.assertEqual(compile_where("flag IN ('False')").mask(df).tolist(), [False, True, False, False])
+        self.assertEqual(compile_where("mixed IN ('A01', 1)").mask(df).tolist(), [True, True, False, False])
+        self.assertEqual(compile_where("mixed = '2.5'").mask(df).tolist(), [False, False, True, False])
+
+    def test_like_underscore_literal(self):
+        """UT-PR-015: LIKE 中只有 % 是通配符，下划线按原字符匹配"""
+        df = pd.DataFrame({"code": ["A_01", "AB01", "a_02", None]})
+        self.assertEqual(compile_where("code LIKE 'a_0%'").mask(df).tolist(), [True, False, True, False])
+        node = compile_conditions([{"field": "code", "operator": "LIKE", "value": "_0"}])
+        self.assertEqual(node.mask(df).tolist(), [True, False, True, False])
+
+    def test_missing_field(self):
+        """UT-PR-007: 字段不存在时不匹配"""
+        self.assertEqual(_mask("missing = 1"), [False, False, False, False])
+
+    def test_invalid_syntax(self):
+        """UT-PR-008: 语法错误抛出PredicateError"""
+        for where in ["sales >", "(sales > 1", "sales 1", "sales ! 1"]:
+            with self.assertRaises(PredicateError):
+                compile_where(where)
+
+    def test_where_fields(self):
+        """UT-PR-009: 收集条件引用的字段"""
+        self.assertEqual(where_fields("a = 1 AND (`b c` IN (1, 2) OR d IS NULL)"), ["a", "b c", "d"])
+        self.assertEqual(where_fields(""), [])
+
+
+class TestConditions(unittest.TestCase):
+    """结构化条件与辅助函数单元测试"""
+
+    def test_conditions_left_to_right(self):
+        """UT-PR-011: 条件列表按顺序组合，LIKE不含通配符时为包含匹配"""
+        node = compile_conditions([
+            {"field": "region", "operator": "LIKE", "value": "东"},
+            {"field": "sales", "operator": ">", "value": "200", "logic": "OR"}
+        ])
+        self.assertEqual(node.mask(_frame()).tolist(), [True, True, True, False])
+
+    def test_unsupported_operator(self):
+        """UT-PR-012: 不支持的运算符"""
+        with self.assertRaises(PredicateError):
+            compile_conditions([{"field": "sales", "operator": "~", "value": "1"}])
+
+    def test_filter_and_sort(self):
+        """UT-PR-013: filter_frame与sort_frame"""
+        df = filter_frame(_frame(), "sales >= 100")
+        self.assertEqual(sort_frame(df, "sales DESC")["sales"].tolist(), [300, 250, 100])
+        self.assertEqual(len(filter_frame(_frame(), "")), 4)
+        self.assertEqual(len(sort_frame(_frame(), "missing")), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
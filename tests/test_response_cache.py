@@ -0,0 +1,235 @@
+"""
+AI响应缓存单元测试
+测试提问规范化、可缓存判断、快照变化失效与缓存命中时的事件回放
+"""
+
+import unittest
+import sys
+import os
+import asyncio
+import sqlite3
+import tempfile
+import shutil
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.llm_client import LLMConfig
+from src.ai.response_cache import ResponseCache, cached_chat, normalize_query
+from src.core.snapshot_store import SnapshotStore
+
+
+ROWS = [{"region": "华东", "sales": 100}, {"region": "华北", "sales": 200}]
+
+
+def _create_db(db_path: Path):
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("""
+        CREATE TABLE data_snapshots (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            data_flow_id INTEGER,
+            name TEXT,
+            worksheet_id TEXT,
+            fields TEXT,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+
+def _events(snapshot_id, tool="pbbi_aggregate_data", success=True):
+    return [
+        {"type": "thinking_start", "message": "正在分析您的问题..."},
+        {"type": "tool_call_start", "tool": tool, "arguments": {"snapshot_id": snapshot_id}, "step": 1, "total": 1},
+        {"type": "tool_result", "tool": tool, "result": {"success": success, "data": ROWS}, "summary": ""},
+        {"type": "content", "content": "华北销售额最高"},
+        {"type": "done"},
+    ]
+
+
+class _FakeLLMClient:
+    def __init__(self):
+        self.config = LLMConfig(api_key="test", model="test-model")
+
+    def refresh_config(self):
+        pass
+
+
+class _FakeAgent:
+    def __init__(self, events):
+        self.events = events
+        self.calls = 0
+        self.user_id = 1
+        self.conversation_history = []
+        self.llm_client = _FakeLLMClient()
+
+    async def chat(self, user_input):
+        self.calls += 1
+        for event in self.events:
+            yield event
+        self.conversation_history.append({"role": "user", "content": user_input})
+        self.conversation_history.append({"role": "assistant", "content": "华北销售额最高"})
+
+
+def _collect(agent, query, cache):
+    async def run():
+        return [event async for event in cached_chat(agent, query, cache)]
+    return asyncio.run(run())
+
+
+class TestResponseCache(unittest.TestCase):
+    """ResponseCache单元测试"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.db_path = self.tmp_dir / "pb_bi.db"
+        _create_db(self.db_path)
+        self.store = SnapshotStore(self.db_path)
+        self.snapshot_id = self.store.create_snapshot("销售", [], ROWS)["snapshot_id"]
+        self.now = [0.0]
+        self.cache = ResponseCache(max_entries=2, ttl=60, store=self.store, clock=lambda: self.now[0])
+        self.config = LLMConfig(api_key="test", model="test-model")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _key(self, query="各地区销售额"):
+        return self.cache.make_key(query, self.config, 1)
+
+    def test_normalize_query(self):
+        """UT-RC-001: 忽略大小写、全半角、空白与标点"""
+        self.assertEqual(normalize_query("  各地区 销售额？"), normalize_query("各地区销售额"))
+        self.assertEqual(normalize_query("Top 10 产品!"), normalize_query("ｔｏｐ10产品"))
+        self.assertNotEqual(normalize_query("快照3的行数"), normalize_query("快照4的行数"))
+
+    def test_numeric_questions_not_merged(self):
+        """UT-RC-009: 小数点、负号、百分号与日期分隔符不同的提问不命中彼此的缓存"""
+        for first, second in [("销量大于1.5的产品", "销量大于15的产品"), ("增长率低于-5%的地区", "增长率低于5%的地区"),
+                              ("2023-10的销售额", "202310的销售额"), ("前10 20名", "前1020名"),
+                              ("12:30之后的订单", "1230之后的订单")]:
+            self.assertNotEqual(normalize_query(first), normalize_query(second))
+        self.assertEqual(normalize_query("销量大于1.5的产品。"), normalize_query("销量大于 1.5 的产品"))
+
+        self.cache.put(self._key("销量大于1.5的产品"), _events(self.snapshot_id))
+        self.assertIsNone(self.cache.get(self._key("销量大于15的产品")))
+        self.assertIsNotNone(self.cache.get(self._key("销量大于 1.5 的产品？")))
+
+    def test_hit_and_stats(self):
+        """UT-RC-002: 缓存后命中，统计命中率"""
+        self.assertIsNone(self.cache.get(self._key()))
+        self.assertTrue(self.cache.put(self._key(), _events(self.snapshot_id)))
+        self.assertEqual(self.cache.get(self._key("各地区 销售额。"))[-2]["content"], "华北销售额最高")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_key_includes_model_config(self):
+        """UT-RC-003: 模型配置或用户不同时不命中"""
+        self.cache.put(self._key(), _events(self.snapshot_id))
+        other = LLMConfig(api_key="test", model="other-model")
+        self.assertIsNone(self.cache.get(self.cache.make_key("各地区销售额", other, 1)))
+        self.assertIsNone(self.cache.get(self.cache.make_key("各地区销售额", self.config, 2)))
+
+    def test_uncacheable_turns_skipped(self):
+        """UT-RC-004: 非只读工具、工具失败或未完成的事件流不缓存"""
+        self.assertFalse(self.cache.put(self._key(), _events(self.snapshot_id, tool="pbbi_mingdao_sync_data")))
+        self.assertFalse(self.cache.put(self._key(), _events(self.snapshot_id, tool="pbbi_execute_sql")))
+        self.assertFalse(self.cache.put(self._key(), _events(self.snapshot_id, success=False)))
+        self.assertFalse(self.cache.put(self._key(), _events(self.snapshot_id)[:-1]))
+        self.assertFalse(self.cache.put(self._key(), _events(9999)))
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()["skipped"], 5)
+
+    def test_snapshot_change_invalidates(self):
+        """UT-RC-005: 引用的快照迁移或删除后条目失效"""
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute("INSERT INTO data_snapshots (name, fields, data) VALUES ('旧', '[]', '[{\"a\": 1}]')")
+        conn.commit()
+        conn.close()
+        legacy_id = self.snapshot_id + 1
+
+        self.cache.put(self._key("旧快照"), _events(legacy_id))
+        self.cache.put(self._key(), _events(self.snapshot_id))
+        self.store.migrate_json_snapshots()
+        self.assertIsNone(self.cache.get(self._key("旧快照")))
+
+        self.store.delete_snapshot(self.snapshot_id)
+        self.assertIsNone(self.cache.get(self._key()))
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_catalog_change_invalidates(self):
+        """UT-RC-006: 列出快照的结果在新增快照后失效"""
+        self.cache.put(self._key("有哪些快照"), _events(None, tool="pbbi_list_snapshots"))
+        self.assertIsNotNone(self.cache.get(self._key("有哪些快照")))
+        self.store.create_snapshot("新快照", [], ROWS)
+        self.assertIsNone(self.cache.get(self._key("有哪些快照")))
+
+    def test_ttl_and_capacity(self):
+        """UT-RC-007: 过期条目失效，超出容量按LRU淘汰"""
+        self.cache.put(self._key("a"), _events(self.snapshot_id))
+        self.now[0] = 61
+        self.assertIsNone(self.cache.get(self._key("a")))
+
+        for query in ("a", "b", "c"):
+            self.cache.put(self._key(query), _events(self.snapshot_id))
+        self.assertIsNone(self.cache.get(self._key("a")))
+        self.assertIsNotNone(self.cache.get(self._key("c")))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_deleted_chart_invalidates(self):
+        """UT-RC-008: 事件中引用的图表文件被清理后条目失效"""
+        cache = ResponseCache(store=self.store, charts_dir=self.tmp_dir)
+        chart = self.tmp_dir / "chart_bar_1.png"
+        chart.write_bytes(b"png")
+        events = _events(self.snapshot_id, tool="pbbi_generate_bar_chart")
+        events[2]["result"]["chart_url"] = "http://localhost:8001/api/charts/chart_bar_1.png"
+        events[3]["content"] = "![销售额](http://localhost:8001/api/charts/chart_bar_1.png)"
+
+        self.assertTrue(cache.put(self._key(), events))
+        self.assertIsNotNone(cache.get(self._key()))
+        chart.unlink()
+        self.assertIsNone(cache.get(self._key()))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+
+class TestCachedChat(unittest.TestCase):
+    """cached_chat单元测试"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        _create_db(self.tmp_dir / "pb_bi.db")
+        self.store = SnapshotStore(self.tmp_dir / "pb_bi.db")
+        self.snapshot_id = self.store.create_snapshot("销售", [], ROWS)["snapshot_id"]
+        self.cache = ResponseCache(store=self.store)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_replay_without_llm(self):
+        """UT-RC-011: 第二次提问回放缓存事件，不再调用agent.chat"""
+        first = _FakeAgent(_events(self.snapshot_id))
+        self.assertEqual(_collect(first, "各地区销售额", self.cache), first.events)
+
+        second = _FakeAgent(_events(self.snapshot_id))
+        replayed = _collect(second, "各地区销售额？", self.cache)
+        self.assertEqual(second.calls, 0)
+        self.assertEqual(replayed[0]["stage"], "cache_hit")
+        self.assertEqual(replayed[1:], first.events)
+        self.assertEqual(second.conversation_history[-1], {"role": "assistant", "content": "华北销售额最高"})
+
+    def test_followup_bypasses_cache(self):
+        """UT-RC-012: 已有对话历史的追问不查缓存也不写缓存"""
+        agent = _FakeAgent(_events(self.snapshot_id))
+        agent.conversation_history = [{"role": "user", "content": "之前的问题"}]
+        _collect(agent, "各地区销售额", self.cache)
+        self.assertEqual(agent.calls, 1)
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()["misses"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
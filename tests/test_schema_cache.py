@@ -0,0 +1,146 @@
+"""
+工作表结构缓存单元测试
+使用本地HTTP桩服务测试缓存命中、过期后后台条件请求验证、结构变化、重启后保留与强制刷新
+"""
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.mingdao import MingDaoService
+from src.services.schema_cache import WorksheetSchemaCache
+
+
+class StubSchemaServer:
+    """工作表结构接口桩：响应带 ETag，If-None-Match 与当前版本相同时返回304"""
+
+    def __init__(self):
+        self.fields = [{"fieldId": "name", "name": "名称", "type": "Text"}]
+        self.version = 1
+        # (If-None-Match, 状态码) 列表
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                etag = f'"v{stub.version}"'
+                with stub.lock:
+                    if_none_match = self.headers.get("If-None-Match")
+                    status = 304 if if_none_match == etag else 200
+                    stub.requests.append((if_none_match, status))
+                content = b"" if status == 304 else json.dumps(
+                    {"success": True, "error_code": 1, "data": {"fields": stub.fields}}
+                ).encode()
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def change(self, fields):
+        self.fields = fields
+        self.version += 1
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestWorksheetSchemaCache(unittest.TestCase):
+    """WorksheetSchemaCache单元测试"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = Path(self.temp_dir) / "main.db"
+        self.stub = StubSchemaServer()
+        self.service = MingDaoService("app", "sign", self.stub.base_url)
+
+    def tearDown(self):
+        self.stub.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _wait_requests(self, count: int):
+        deadline = time.monotonic() + 5
+        while len(self.stub.requests) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_hit_without_request(self):
+        """UT-SC-001: 未命中时请求明道云，有效期内再次获取不发出请求"""
+        cache = WorksheetSchemaCache(self.db_path, ttl=60)
+        first = cache.get_fields(self.service, "ws")
+        self.assertTrue(first["success"])
+        self.assertFalse(first["cached"])
+        self.assertEqual(first["data"]["data"][0]["fieldId"], "name")
+
+        second = cache.get_fields(self.service, "ws")
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["data"]["data"], first["data"]["data"])
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_stale_revalidates_in_background(self):
+        """UT-SC-002: 过期后先返回缓存，后台发送条件请求，304时只更新确认时间"""
+        cache = WorksheetSchemaCache(self.db_path, ttl=0)
+        first = cache.get_fields(self.service, "ws")
+
+        stale = cache.get_fields(self.service, "ws")
+        self.assertTrue(stale["cached"])
+        self._wait_requests(2)
+        cache._executor.shutdown(wait=True)
+
+        self.assertEqual(self.stub.requests[1], ('"v1"', 304))
+        entry = cache._load(cache._key(self.stub.base_url, "ws"))
+        self.assertEqual(entry["fetched_at"], first["fetched_at"])
+        self.assertGreater(entry["validated_at"], first["validated_at"])
+
+    def test_changed_schema(self):
+        """UT-SC-003: 结构变化后后台验证获取新字段，之后的读取返回新字段"""
+        cache = WorksheetSchemaCache(self.db_path, ttl=0)
+        cache.get_fields(self.service, "ws")
+        self.stub.change([{"fieldId": "amount", "name": "金额", "type": "Number"}])
+
+        self.assertEqual(cache.get_fields(self.service, "ws")["data"]["data"][0]["fieldId"], "name")
+        self._wait_requests(2)
+        cache._executor.shutdown(wait=True)
+
+        self.assertEqual(self.stub.requests[1], ('"v1"', 200))
+        cache.ttl = 60
+        self.assertEqual(cache.get_fields(self.service, "ws")["data"]["data"][0]["fieldId"], "amount")
+
+    def test_persisted_and_refresh(self):
+        """UT-SC-004: 新的缓存实例从数据库读取缓存；强制刷新时不带条件请求"""
+        WorksheetSchemaCache(self.db_path, ttl=60).get_fields(self.service, "ws")
+
+        cache = WorksheetSchemaCache(self.db_path, ttl=60)
+        self.assertTrue(cache.get_fields(self.service, "ws")["cached"])
+        self.assertEqual(len(self.stub.requests), 1)
+
+        refreshed = cache.get_fields(self.service, "ws", refresh=True)
+        self.assertFalse(refreshed["cached"])
+        self.assertEqual(self.stub.requests[1], (None, 200))
+
+        cache.invalidate(self.stub.base_url + "/", "ws")
+        self.assertFalse(cache.get_fields(self.service, "ws")["cached"])
+        self.assertEqual(len(self.stub.requests), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+会话历史增量加载单元测试
+测试首次全量加载、增量追加、未持久化消息丢弃与改写后全量重载
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.agent import PBBIAgent
+from src.ai.llm_client import LLMConfig
+from src.api.ai import load_session_history, record_context_tokens
+from src.models.conversation import ConversationMessage, ConversationSession
+
+
+class TestLoadSessionHistory(unittest.TestCase):
+    """load_session_history单元测试"""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        ConversationMessage.__table__.create(self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        self.agent = PBBIAgent(LLMConfig(api_key="test"), session_id="s1")
+        patcher = patch("src.core.database.SessionLocal", self.SessionLocal)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _add(self, role, content, session_id="s1"):
+        db = self.SessionLocal()
+        db.add(ConversationMessage(session_id=session_id, role=role, content=content))
+        db.commit()
+        db.close()
+
+    def _contents(self):
+        return [m["content"] for m in self.agent.conversation_history]
+
+    def test_full_then_incremental(self):
+        """UT-SH-001: 首次全量加载，之后只追加新增消息"""
+        self._add("user", "问题1")
+        self._add("assistant", "回答1")
+        self._add("user", "其他会话", session_id="s2")
+        load_session_history(self.agent, "s1")
+        self.assertEqual(self._contents(), ["问题1", "回答1"])
+
+        self._add("user", "问题2")
+        self.statements.clear()
+        load_session_history(self.agent, "s1")
+        self.assertEqual(self._contents(), ["问题1", "回答1", "问题2"])
+        self.assertTrue(any("conversation_messages.id >" in s for s in self.statements))
+
+    def test_unchanged_session_skips_row_fetch(self):
+        """UT-SH-002: 会话无变化时不读取消息内容，并丢弃未持久化的本地消息"""
+        self._add("user", "问题1")
+        load_session_history(self.agent, "s1")
+        self.agent.conversation_history.append({"role": "assistant", "content": "本地回答"})
+
+        self.statements.clear()
+        load_session_history(self.agent, "s1")
+        self.assertEqual(self._contents(), ["问题1"])
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn("count(", self.statements[0])
+
+    def test_rewritten_session_reloads(self):
+        """UT-SH-003: 已加载的消息被删除时全量重新加载"""
+        self._add("user", "问题1")
+        self._add("assistant", "回答1")
+        load_session_history(self.agent, "s1")
+
+        db = self.SessionLocal()
+        db.query(ConversationMessage).filter(ConversationMessage.content == "问题1").delete()
+        db.commit()
+        db.close()
+        self._add("user", "问题2")
+
+        load_session_history(self.agent, "s1")
+        self.assertEqual(self._contents(), ["回答1", "问题2"])
+
+    def test_empty_session_keeps_memory(self):
+        """UT-SH-004: 数据库中没有消息时保留内存中的历史"""
+        self.agent.conversation_history = [{"role": "user", "content": "内存消息"}]
+        load_session_history(self.agent, "s1")
+        self.assertEqual(self._contents(), ["内存消息"])
+
+    def test_clear_history_forces_full_reload(self):
+        """UT-SH-005: 清空历史后下次全量加载"""
+        self._add("user", "问题1")
+        load_session_history(self.agent, "s1")
+        self.agent.clear_history()
+        self.assertIsNone(self.agent.history_message_id)
+
+        load_session_history(self.agent, "s1")
+        self.assertEqual(self._contents(), ["问题1"])
+
+    def test_record_prompt_tokens_keeps_running_total(self):
+        """UT-SH-006: 记录最近一次请求的上下文token数，不覆盖消息token累计与上下文告警"""
+        ConversationSession.__table__.create(self.engine)
+        db = self.SessionLocal()
+        db.add(ConversationSession(session_id="s1", context_tokens=3500, context_limit=4000))
+        db.commit()
+        db.close()
+
+        record_context_tokens("s1", 1200)
+        db = self.SessionLocal()
+        session = db.query(ConversationSession).filter(ConversationSession.session_id == "s1").one()
+        data = session.to_dict()
+        db.close()
+        self.assertEqual(data["last_prompt_tokens"], 1200)
+        self.assertEqual(data["context_tokens"], 3500)
+        self.assertTrue(data["context_warning"])
+
+
+if __name__ == "__main__":
+    unittest.main()
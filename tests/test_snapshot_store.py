@@ -0,0 +1,271 @@
+"""
+快照列式存储单元测试
+测试列文件写入、列投影读取、旧JSON快照兼容与迁移
+"""
+
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from src.core.snapshot_store import (
+    SnapshotStore,
+    STORAGE_COLUMNAR,
+    dataframe_to_records,
+    referenced_fields
+)
+
+
+SAMPLE_ROWS = [
+    {"product": "产品A", "region": "华东", "sales": 1000, "price": 9.5, "tags": ["a"]},
+    {"product": "产品B", "region": None, "sales": 1500, "price": None, "tags": None},
+    {"product": "产品A", "region": "华北", "sales": 1200, "price": 10.0, "tags": ["b", "c"]},
+]
+
+
+def _create_legacy_db(db_path: Path):
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("""
+        CREATE TABLE data_snapshots (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            data_flow_id INTEGER,
+            name TEXT,
+            worksheet_id TEXT,
+            fields TEXT,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "INSERT INTO data_snapshots (name, data_flow_id, worksheet_id, fields, data) VALUES (?, ?, ?, ?, ?)",
+        ("legacy", 0, "ws", "[]", json.dumps(SAMPLE_ROWS, ensure_ascii=False))
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestSnapshotStore(unittest.TestCase):
+    """SnapshotStore单元测试"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.db_path = self.tmp_dir / "pb_bi.db"
+        _create_legacy_db(self.db_path)
+        self.store = SnapshotStore(self.db_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_schema_migrated(self):
+        """UT-SS-001: 旧数据库自动补充storage/version列"""
+        self.store.ensure_schema()
+        conn = sqlite3.connect(str(self.db_path))
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(data_snapshots)").fetchall()]
+        conn.close()
+        self.assertIn("storage", columns)
+        self.assertIn("version", columns)
+
+    def test_create_and_read(self):
+        """UT-SS-002: 创建列式快照并完整读取"""
+        created = self.store.create_snapshot("新快照", [{"name": "product"}], SAMPLE_ROWS)
+        self.assertEqual(created["row_count"], 3)
+
+        info = self.store.get_info(created["snapshot_id"])
+        self.assertEqual(info["storage"], STORAGE_COLUMNAR)
+        self.assertTrue((self.store.root / info["version"]).exists())
+
+        records = dataframe_to_records(self.store.read_frame(created["snapshot_id"]))
+        self.assertEqual(records, SAMPLE_ROWS)
+
+    def test_column_projection(self):
+        """UT-SS-003: 列投影只返回请求的列，忽略不存在的列"""
+        created = self.store.create_snapshot("投影", [], SAMPLE_ROWS)
+        df = self.store.read_frame(created["snapshot_id"], ["sales", "missing"])
+        self.assertEqual(list(df.columns), ["sales"])
+        self.assertEqual(len(df), 3)
+
+        df = self.store.read_frame(created["snapshot_id"], ["missing"])
+        self.assertEqual(len(df.columns), 0)
+        self.assertEqual(len(df), 3)
+
+    def test_limit(self):
+        """UT-SS-004: limit只读取前N行"""
+        created = self.store.create_snapshot("限制", [], SAMPLE_ROWS)
+        df = self.store.read_frame(created["snapshot_id"], limit=2)
+        self.assertEqual(dataframe_to_records(df), SAMPLE_ROWS[:2])
+
+    def test_legacy_json_snapshot(self):
+        """UT-SS-005: 旧JSON快照仍可读取"""
+        df = self.store.read_frame(1, ["product", "sales"])
+        self.assertEqual(df["product"].tolist(), ["产品A", "产品B", "产品A"])
+        self.assertEqual(self.store.row_count(1), 3)
+
+    def test_missing_snapshot(self):
+        """UT-SS-006: 快照不存在时返回None"""
+        self.assertIsNone(self.store.read_frame(999))
+        self.assertEqual(self.store.load(999), (None, None))
+        self.assertIsNone(self.store.delete_snapshot(999))
+
+    def test_delete_removes_files(self):
+        """UT-SS-007: 删除快照后列文件保留到保留期结束再删除"""
+        created = self.store.create_snapshot("删除", [], SAMPLE_ROWS)
+        version_dir = self.store.root / created["version"]
+        self.assertTrue(version_dir.exists())
+
+        deleted = self.store.delete_snapshot(created["snapshot_id"])
+        self.assertEqual(deleted["name"], "删除")
+        self.assertIsNone(self.store.get_info(created["snapshot_id"]))
+        self.assertTrue(version_dir.exists())
+        self.assertEqual(self.store.collect_retired(), [])
+
+        self.assertEqual(self.store.collect_retired(grace=0), [created["version"]])
+        self.assertFalse(version_dir.exists())
+
+    def test_replace_keeps_old_version_for_readers(self):
+        """UT-SS-013: 替换数据后旧版本在保留期内仍可读取，读取时旧版本已删除则按新版本重新读取"""
+        created = self.store.create_snapshot("替换", [], SAMPLE_ROWS)
+        old_version = created["version"]
+        replaced = self.store.replace_data(created["snapshot_id"], SAMPLE_ROWS[:1])
+        self.assertEqual(len(self.store.read_version(old_version)), len(SAMPLE_ROWS))
+
+        read_columnar = self.store._read_columnar
+        calls = []
+
+        def stale_read(snapshot_id, version, columns=None):
+            calls.append(version)
+            if len(calls) == 1:
+                raise FileNotFoundError(version)
+            return read_columnar(snapshot_id, version, columns)
+
+        with patch.object(self.store, "_read_columnar", side_effect=stale_read):
+            df = self.store.read_frame(created["snapshot_id"])
+        self.assertEqual(len(df), 1)
+        self.assertEqual(calls, [replaced["version"], replaced["version"]])
+        self.store.collect_retired(grace=0)
+        self.assertFalse((self.store.root / old_version).exists())
+
+    def test_migrate_json_snapshots(self):
+        """UT-SS-008: 迁移旧JSON快照为列式存储"""
+        migrated = self.store.migrate_json_snapshots()
+        self.assertEqual(migrated, [1])
+
+        info = self.store.get_info(1)
+        self.assertEqual(info["storage"], STORAGE_COLUMNAR)
+        self.assertEqual(dataframe_to_records(self.store.read_frame(1)), SAMPLE_ROWS)
+        self.assertEqual(self.store.migrate_json_snapshots(), [])
+
+    def test_metadata_written_at_creation(self):
+        """UT-SS-009: 创建快照时生成元数据，读取元数据不读取列数据"""
+        created = self.store.create_snapshot("元数据", [], SAMPLE_ROWS)
+        info = self.store.get_info(created["snapshot_id"])
+        self.assertEqual(info["row_count"], 3)
+
+        (self.store.root / created["version"] / "c2.npy").unlink(missing_ok=True)
+        metadata = self.store.get_metadata(created["snapshot_id"])
+        self.assertEqual(metadata["row_count"], 3)
+        self.assertGreater(metadata["byte_size"], 0)
+
+        stats = {c["name"]: c for c in metadata["columns"]}
+        self.assertEqual(stats["sales"]["dtype"], "integer")
+        self.assertEqual(stats["sales"]["min"], 1000)
+        self.assertEqual(stats["sales"]["max"], 1500)
+        self.assertEqual(stats["price"]["null_count"], 1)
+        self.assertEqual(stats["product"]["distinct_count"], 2)
+        self.assertIsNone(stats["product"]["min"])
+        self.assertIsNone(stats["tags"]["distinct_count"])
+
+    def test_legacy_metadata_and_row_counts(self):
+        """UT-SS-010: 旧快照即时计算元数据，批量获取行数"""
+        metadata = self.store.get_metadata(1)
+        self.assertEqual(metadata["row_count"], 3)
+        self.assertEqual(len(metadata["columns"]), 5)
+        self.assertIsNone(self.store.get_metadata(999))
+
+        created = self.store.create_snapshot("批量", [], SAMPLE_ROWS[:2])
+        self.assertEqual(
+            self.store.row_counts([1, created["snapshot_id"], 999]),
+            {1: 3, created["snapshot_id"]: 2}
+        )
+
+    def test_write_chunks(self):
+        """UT-SS-012: 分块写入与一次写入结果相同，各块列不同时补空值，失败时不留下临时目录"""
+        chunks = [SAMPLE_ROWS[:1], [], SAMPLE_ROWS[1:], [{"sales": 800, "extra": "新列"}]]
+        created = self.store.create_snapshot_from_chunks("分块", [], iter(chunks))
+        self.assertEqual(created["row_count"], 4)
+
+        expected = [{**row, "extra": None} for row in SAMPLE_ROWS]
+        expected.append({"product": None, "region": None, "sales": 800, "price": None, "tags": None, "extra": "新列"})
+        df = self.store.read_frame(created["snapshot_id"])
+        self.assertEqual(dataframe_to_records(df), expected)
+        self.assertEqual(str(df["sales"].dtype), "int64")
+
+        metadata = self.store.get_metadata(created["snapshot_id"])
+        columns = {c["name"]: c for c in metadata["columns"]}
+        self.assertEqual(columns["region"]["null_count"], 2)
+        self.assertEqual(columns["sales"]["max"], 1500)
+
+        def failing():
+            yield SAMPLE_ROWS
+            raise RuntimeError("同步中断")
+
+        with self.assertRaises(RuntimeError):
+            self.store.write_chunks(failing())
+        self.assertEqual([p.name for p in self.store.root.iterdir() if p.name.startswith(".")], [])
+
+
+    def test_write_chunks_mixed_kinds(self):
+        """UT-SS-014: 分块写入时列类型在后续数据块中变化，整列统一为文本，对象列逐块写入JSON"""
+        chunks = [
+            pd.DataFrame({"code": [0, 1, 2], "flag": [True, False, True], "score": [1, 2, 3]}),
+            pd.DataFrame({"code": ["3", "4", "A01"], "flag": [True, True, False], "score": [1.5, None, 2.0]}),
+            pd.DataFrame({"code": [None, 5.0], "flag": [False, False], "tags": [["x"], None]})
+        ]
+        version, row_count = self.store.write_chunks(chunks)
+        self.assertEqual(row_count, 8)
+
+        df = self.store.read_version(version)
+        self.assertEqual([row["code"] for row in dataframe_to_records(df[["code"]])],
+                         ["0", "1", "2", "3", "4", "A01", None, "5"])
+        self.assertEqual(df["flag"].tolist(), [True, False, True, True, True, False, False, False])
+        self.assertEqual(str(df["score"].dtype), "float64")
+        self.assertEqual([row["score"] for row in dataframe_to_records(df[["score"]])],
+                         [1.0, 2.0, 3.0, 1.5, None, 2.0, None, None])
+        self.assertEqual(df["tags"].tolist(), [None] * 6 + [["x"], None])
+
+        columns = {c["name"]: c for c in self.store.read_manifest(version)["columns"]}
+        self.assertEqual((columns["code"]["kind"], columns["code"]["distinct_count"]), ("dict", 7))
+        self.assertEqual(columns["code"]["null_count"], 1)
+        self.assertEqual((columns["score"]["min"], columns["score"]["max"]), (1.0, 3.0))
+        self.assertEqual(columns["score"]["null_count"], 3)
+        self.assertEqual(columns["flag"]["kind"], "bool")
+        self.assertEqual(columns["tags"]["kind"], "json")
+        self.assertIsNone(columns["tags"]["distinct_count"])
+
+class TestReferencedFields(unittest.TestCase):
+    """referenced_fields单元测试"""
+
+    def test_collect_fields(self):
+        """UT-SS-011: 收集参数中引用的字段"""
+        params = {
+            "snapshot_id": 1,
+            "x_field": "month",
+            "y_fields": ["sales", "profit"],
+            "field": "price",
+            "title": "标题",
+            "group_field": None
+        }
+        self.assertEqual(referenced_fields(params), ["month", "sales", "profit", "price"])
+
+
+if __name__ == "__main__":
+    unittest.main()
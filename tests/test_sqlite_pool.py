@@ -0,0 +1,141 @@
+"""
+SQLite连接池单元测试
+测试WAL与连接参数、只读连接复用、写连接提交回滚以及并发读写不出现数据库锁定
+"""
+
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.sqlite_pool import SQLitePool, get_sqlite_pool
+
+
+class TestSQLitePool(unittest.TestCase):
+    """SQLitePool单元测试"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.pool = SQLitePool(self.tmp_dir / "pb_bi.db", max_idle_readers=2)
+        with self.pool.writer() as conn:
+            conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_connection_settings(self):
+        """UT-SP-001: 写连接开启WAL，只读连接禁止写入"""
+        with self.pool.writer() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertGreater(conn.execute("PRAGMA busy_timeout").fetchone()[0], 0)
+        with self.pool.reader() as conn:
+            self.assertEqual(conn.execute("PRAGMA query_only").fetchone()[0], 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO items (name) VALUES ('x')")
+
+    def test_reader_reused(self):
+        """UT-SP-002: 归还的只读连接被复用，空闲连接数不超过上限"""
+        with self.pool.reader() as first:
+            pass
+        with self.pool.reader() as second:
+            self.assertIs(second, first)
+        with self.pool.reader(), self.pool.reader(), self.pool.reader():
+            pass
+        stats = self.pool.stats()
+        self.assertEqual(stats["idle_readers"], 2)
+        self.assertGreaterEqual(stats["reused"], 2)
+
+    def test_writer_commit_and_rollback(self):
+        """UT-SP-003: 写连接正常退出时提交，异常时回滚；嵌套时由最外层提交"""
+        with self.pool.writer() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('a')")
+            with self.pool.writer() as inner:
+                self.assertIs(inner, conn)
+                inner.execute("INSERT INTO items (name) VALUES ('b')")
+            self.assertTrue(conn.in_transaction)
+        with self.assertRaises(ValueError):
+            with self.pool.writer() as conn:
+                conn.execute("INSERT INTO items (name) VALUES ('c')")
+                raise ValueError("失败")
+        with self.pool.reader() as conn:
+            names = [row["name"] for row in conn.execute("SELECT name FROM items ORDER BY id")]
+        self.assertEqual(names, ["a", "b"])
+
+    def test_concurrent_readers_and_writers(self):
+        """UT-SP-004: 多线程并发读写与外部连接写入时不出现 database is locked"""
+        errors = []
+
+        def write(n):
+            try:
+                for i in range(20):
+                    with self.pool.writer() as conn:
+                        conn.execute("INSERT INTO items (name) VALUES (?)", (f"{n}-{i}",))
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                for _ in range(50):
+                    with self.pool.reader() as conn:
+                        conn.execute("SELECT COUNT(*) FROM items").fetchone()
+            except Exception as e:
+                errors.append(e)
+
+        def external_write():
+            # 模拟SQLAlchemy等其他连接的写入
+            try:
+                conn = sqlite3.connect(str(self.pool.db_path), timeout=30)
+                for i in range(20):
+                    conn.execute("INSERT INTO items (name) VALUES (?)", (f"ext-{i}",))
+                    conn.commit()
+                conn.close()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        threads.append(threading.Thread(target=external_write))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        with self.pool.reader() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM items").fetchone()[0], 100)
+
+    def test_reader_not_blocked_by_write_transaction(self):
+        """UT-SP-006: 写事务进行中仍可建立新的只读连接并读取已提交的数据"""
+        self.pool.close()
+        opened = threading.Event()
+        counts = []
+
+        def read():
+            with self.pool.reader() as conn:
+                counts.append(conn.execute("SELECT COUNT(*) FROM items").fetchone()[0])
+            opened.set()
+
+        with self.pool.writer() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('pending')")
+            thread = threading.Thread(target=read)
+            thread.start()
+            self.assertTrue(opened.wait(5))
+        thread.join()
+        self.assertEqual(counts, [0])
+
+    def test_pool_shared_by_path(self):
+        """UT-SP-005: 同一数据库路径共享连接池"""
+        path = self.tmp_dir / "shared.db"
+        self.assertIs(get_sqlite_pool(path), get_sqlite_pool(str(path)))
+        get_sqlite_pool(path).close()
+
+
+if __name__ == "__main__":
+    unittest.main()
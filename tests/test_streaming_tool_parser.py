@@ -0,0 +1,126 @@
+"""
+流式工具调用解析器单元测试
+测试逐段输入时各格式的解析结果与整段解析一致、展示文本过滤、格式锁定与缓冲区大小
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.tool_parser import StreamingToolCallParser, parse_tool_calls
+
+
+SAMPLES = {
+    "openai": "好的，我来查询。<｜tool▁calls▁begin｜><｜tool▁call▁begin｜>function<｜tool▁sep｜>pbbi_query_snapshot \n \n"
+              " {\"snapshot_id\": 1} \n \n ```<｜tool▁call▁end｜><｜tool▁calls▁end｜>",
+    "kimi": "<|tool_calls_section_begin|><|tool_call_begin|>functions.pbbi_list_snapshots:0"
+            "<|tool_call_argument_begin|>{}<|tool_call_end|><|tool_call_begin|>functions.pbbi_query_snapshot:1"
+            "<|tool_call_argument_begin|>{\"snapshot_id\": 2}<|tool_call_end|><|tool_calls_section_end|>",
+    "dsml": "<｜DSML｜function_calls><｜DSML｜invoke name=\"pbbi_query_snapshot\">"
+            "<｜DSML｜parameter name=\"snapshot_id\" string=\"false\">3</｜DSML｜parameter></｜DSML｜invoke>"
+            "</｜DSML｜function_calls>",
+    "minimax": "<minimax:tool_call><invoke name=\"pbbi_query_snapshot\"><parameter name=\"snapshot_id\">4</parameter>"
+               "</invoke></minimax:tool_call>",
+    "glm": "```tool_call\npbbi_list_snapshots\n{}\n```",
+    "glm_xml": "<tool_call>pbbi_query_snapshot\n<arg_key>snapshot_id</arg_key>\n<arg_value>3</arg_value>\n</tool_call>",
+    "glm5_text": "࿏pbbi_query_snapshot⋘\n{\"snapshot_id\": 5}\n⛔",
+    "qwen": "✿FUNCTION✿ pbbi_query_snapshot ✿ARGS✿ {\"snapshot_id\": 6} ✿END✿",
+    "glm5_call": "先看看 pbbi_list_snapshots() 再 pbbi_query_snapshot(snapshot_id=3, limit=10)",
+    "json": "{\"tool_calls\": [{\"id\": \"c1\", \"function\": {\"name\": \"pbbi_list_snapshots\", \"arguments\": \"{}\"}}]}",
+}
+
+
+def _stream(text, step=1):
+    parser = StreamingToolCallParser()
+    visible = ""
+    calls = []
+    for i in range(0, len(text), step):
+        chunk_text, chunk_calls = parser.feed(text[i:i + step])
+        visible += chunk_text
+        calls.extend(chunk_calls)
+    chunk_text, chunk_calls = parser.finish()
+    return parser, visible + chunk_text, calls + chunk_calls
+
+
+def _simple(calls):
+    return [(c.name, c.arguments) for c in calls]
+
+
+class TestStreamingToolCallParser(unittest.TestCase):
+    """StreamingToolCallParser单元测试"""
+
+    def test_matches_full_text_parser(self):
+        """UT-STP-001: 各格式逐字符输入的解析结果与整段解析一致"""
+        for fmt, text in SAMPLES.items():
+            for step in (1, 7, len(text)):
+                with self.subTest(fmt=fmt, step=step):
+                    parser, _, calls = _stream(text, step)
+                    self.assertTrue(calls)
+                    self.assertEqual(_simple(calls), _simple(parse_tool_calls(text)))
+                    self.assertEqual(parser.format, fmt)
+
+    def test_markup_hidden(self):
+        """UT-STP-002: 工具调用标记不出现在展示文本中，普通文本原样保留"""
+        _, visible, _ = _stream(SAMPLES["openai"] + "查询完成")
+        self.assertEqual(visible, "好的，我来查询。查询完成")
+        _, visible, _ = _stream(SAMPLES["glm5_call"])
+        self.assertEqual(visible, "先看看  再 ")
+        _, visible, calls = _stream("普通回答，help top p\n包含 { 和 ``` 的文本")
+        self.assertEqual(visible, "普通回答，help top p\n包含 { 和 ``` 的文本")
+        self.assertEqual(calls, [])
+
+    def test_call_ready_before_stream_ends(self):
+        """UT-STP-003: 调用块结束时立即返回，不等待后续文本"""
+        parser = StreamingToolCallParser()
+        _, calls = parser.feed("```tool_call\npbbi_list_snapshots\n{}\n``")
+        self.assertEqual(calls, [])
+        _, calls = parser.feed("`\n接下来")
+        self.assertEqual(_simple(calls), [("pbbi_list_snapshots", {})])
+
+    def test_plain_text_block_ends_at_non_parameter_line(self):
+        """UT-STP-004: key=value 参数块在遇到非参数行或输入结束时结束"""
+        _, visible, calls = _stream("调用:\npbbi_query_snapshot\nsnapshot_id=3\nlimit=5\n接下来分析")
+        self.assertEqual(_simple(calls), [("pbbi_query_snapshot", {"snapshot_id": 3, "limit": 5})])
+        self.assertEqual(visible, "调用:\n接下来分析")
+        _, _, calls = _stream("pbbi_list_snapshots\nlimit=1")
+        self.assertEqual(_simple(calls), [("pbbi_list_snapshots", {"limit": 1})])
+
+    def test_format_locked(self):
+        """UT-STP-005: 识别格式后只匹配该格式的标记，其他格式的文本按普通文本输出"""
+        parser, visible, calls = _stream(SAMPLES["glm"] + "示例: pbbi_list_snapshots()")
+        self.assertEqual(parser.format, "glm")
+        self.assertEqual(len(calls), 1)
+        self.assertIn("pbbi_list_snapshots()", visible)
+        self.assertEqual([c.id for c in _stream(SAMPLES["kimi"])[2]], ["call_0", "call_1"])
+
+    def test_unterminated_block_returned_as_text(self):
+        """UT-STP-006: 未闭合且无法解析的块在结束时按普通文本返回"""
+        _, visible, calls = _stream("说明 ✿FUNCTION✿ 格式")
+        self.assertEqual(calls, [])
+        self.assertEqual(visible, "说明 ✿FUNCTION✿ 格式")
+
+    def test_closed_non_tool_block_returned_as_text(self):
+        """UT-STP-008: 已闭合但不是工具调用的块（如普通JSON）按普通文本返回"""
+        for text in ('结果见 {"tool_calls": 3} 文字', '配置示例 ```tool_call\n不是工具\n``` 结束'):
+            for step in (1, 5, len(text)):
+                with self.subTest(text=text, step=step):
+                    _, visible, calls = _stream(text, step)
+                    self.assertEqual(calls, [])
+                    self.assertEqual(visible, text)
+
+    def test_buffer_bounded(self):
+        """UT-STP-007: 长文本回复时缓冲区只保留可能是标记前缀的少量字符"""
+        parser = StreamingToolCallParser()
+        total = 0
+        for _ in range(2000):
+            text, _ = parser.feed("数据分析结果如下，销售额持续增长。pbbi")
+            total += len(text)
+            self.assertLessEqual(len(parser._buffer), 16)
+        text, _ = parser.finish()
+        self.assertEqual(total + len(text), 2000 * 21)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+工具定义筛选单元测试
+测试意图到工具组的映射、关键字补充与工具定义子集缓存
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ai.llm_client import LLMClient, LLMConfig
+from src.ai.tool_selection import TOOL_GROUPS, select_tool_groups, tool_in_groups
+
+
+class TestToolSelection(unittest.TestCase):
+    """select_tool_groups单元测试"""
+
+    def test_intent_groups(self):
+        """UT-TS-001: 按意图选择工具组"""
+        self.assertEqual(select_tool_groups("画柱状图", "图表生成"), frozenset({"snapshot", "analysis", "chart"}))
+        self.assertEqual(select_tool_groups("快照字段", "结构查询"), frozenset({"snapshot", "dataflow"}))
+
+    def test_keywords_extend_groups(self):
+        """UT-TS-002: 关键字补充工具组"""
+        self.assertIn("dashboard", select_tool_groups("查询看板数据", "数据查询"))
+        self.assertEqual(select_tool_groups("如何上传CSV", "帮助咨询"), frozenset({"snapshot", "localfile"}))
+
+    def test_unclear_intent_uses_all(self):
+        """UT-TS-003: 意图不明确且未命中关键字时使用全部工具"""
+        self.assertIsNone(select_tool_groups("你好", "一般对话"))
+
+    def test_tool_in_groups(self):
+        """UT-TS-004: 前缀匹配与精确匹配"""
+        self.assertTrue(tool_in_groups("pbbi_generate_pie_chart", frozenset({"chart"})))
+        self.assertTrue(tool_in_groups("pbbi_get_dataflow", frozenset({"dataflow"})))
+        self.assertFalse(tool_in_groups("pbbi_get_dashboard", frozenset({"dataflow"})))
+
+    def test_every_tool_has_group(self):
+        """UT-TS-005: 每个工具定义都属于某个工具组"""
+        tools = LLMClient(LLMConfig(api_key="test")).get_tools_definition()
+        all_groups = frozenset(TOOL_GROUPS)
+        for tool in tools:
+            self.assertTrue(tool_in_groups(tool["function"]["name"], all_groups), tool["function"]["name"])
+
+    def test_subset_cached(self):
+        """UT-TS-006: 同一组合的工具定义子集只构建一次"""
+        client = LLMClient(LLMConfig(api_key="test"))
+        groups = frozenset({"snapshot", "chart"})
+        subset = client.get_tools_definition(groups)
+        self.assertIs(subset, client.get_tools_definition(groups))
+        self.assertIs(client.get_tools_definition(), client.get_tools_definition())
+        names = {t["function"]["name"] for t in subset}
+        self.assertIn("pbbi_query_snapshot", names)
+        self.assertIn("pbbi_generate_bar_chart", names)
+        self.assertNotIn("pbbi_mingdao_connect", names)
+
+
+if __name__ == "__main__":
+    unittest.main()